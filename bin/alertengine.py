@@ -18,8 +18,8 @@
 """
 The NAV Alert Engine daemon (alertengine)
 
-This background process polls the alert queue for new alerts from the
-eventengine and sends put alerts to users based on user defined profiles.
+This background process waits for new alerts from the eventengine to be
+queued, and sends put alerts to users based on user defined profiles.
 """
 
 from __future__ import print_function
@@ -50,7 +50,8 @@ import nav.db
 
 # These have to be imported after the envrionment is setup
 from django.db import DatabaseError, connection
-from nav.alertengine.base import check_alerts
+from nav.alertengine.base import (check_alerts, SubscriptionCache, listen,
+                                  wait_for_alerts)
 
 #
 #  PATHS
@@ -140,9 +141,12 @@ def main():
 
     # Loop forever
     logger.info('Starting alertengine loop.')
+    cache = SubscriptionCache()
+    if not args.test:
+        listen()
     while True:
         try:
-            check_alerts(debug=args.test)
+            check_alerts(debug=args.test, cache=cache)
             # nav.db connections are currently not in autocommit mode, and
             # since the current auth code uses legacy db connections we need to
             # be sure that we end all and any transactions so that we don't
@@ -168,9 +172,16 @@ def main():
         if args.test:
             break
         else:
-            # Sleep a bit before the next run
-            logger.debug('Sleeping for %d seconds.', delay)
-            time.sleep(delay)
+            # Wait for new alerts, but check the queued alerts at least once
+            # per delay interval
+            logger.debug('Waiting up to %d seconds for new alerts.', delay)
+            try:
+                wait_for_alerts(delay, cache)
+            except DatabaseError as err:
+                logger.error('Database error while waiting for alerts:\n%s',
+                             err)
+                connection.connection = None
+                time.sleep(delay)
 
     # Exit nicely
     sys.exit(0)
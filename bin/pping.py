@@ -124,19 +124,21 @@ class Pinger(object):
         Report state changes to event engine.
         """
         LOGGER.debug("Checks which hosts didn't answer")
-        answers = self.pinger.results()
-        for ip, rtt in answers:
+        answers = self.pinger.samples()
+        updates = []
+        for ip, rtts in answers:
             # rtt = round trip time (-1 => host didn't reply)
             netboxid = self.ip_to_netboxid.get(ip)
-            self.replies[netboxid].push(rtt)
+            for rtt in rtts:
+                self.replies[netboxid].push(rtt)
+            rtt = min([rtt for rtt in rtts if rtt != -1] or [-1])
             netbox = self.netboxmap[netboxid]
             if rtt != -1:
-                statistics.update(netbox.netboxid, netbox.sysname, 'N', 'UP',
-                                  rtt)
+                updates.append((netbox.sysname, Event.UP, rtt))
             else:
                 # ugly...
-                statistics.update(netbox.netboxid, netbox.sysname, 'N', 'DOWN',
-                                  5)
+                updates.append((netbox.sysname, Event.DOWN, 5))
+        statistics.update_netboxes(updates)
 
         down_now = []
         # Find out which netboxes to consider down
@@ -150,6 +152,7 @@ class Pinger(object):
         report_up = set(self.down) - set(down_now)
         self.down = down_now
 
+        events = []
         # Reporting netboxes as down
         LOGGER.debug("Starts reporting %i hosts as down", len(report_down))
         for netboxid in report_down:
@@ -161,7 +164,7 @@ class Pinger(object):
                               "pping",
                               Event.DOWN
                               )
-            self.db.new_event(new_event)
+            events.append(new_event)
             LOGGER.info("%s marked as down.", netbox)
         # Reporting netboxes as up
         LOGGER.debug("Starts reporting %i hosts as up", len(report_up))
@@ -178,8 +181,9 @@ class Pinger(object):
                               "pping",
                               Event.UP
                               )
-            self.db.new_event(new_event)
+            events.append(new_event)
             LOGGER.info("%s marked as up.", netbox)
+        self.db.new_events(events)
 
     def main(self):
         """
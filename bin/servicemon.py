@@ -22,9 +22,6 @@ This program controls the service monitoring in NAV.
 import os
 import sys
 import time
-import random
-import gc
-import threading
 import signal
 import argparse
 import logging
@@ -33,7 +30,10 @@ from nav import buildconf
 import nav.daemon
 from nav.daemon import safesleep as sleep
 from nav.logs import init_generic_logging
-from nav.statemon import RunQueue, config, db
+from nav.metrics.carbon import install_emitter
+from nav.metrics.emitter import MetricEmitter
+from nav.statemon import config, db
+from nav.statemon.scheduler import Scheduler
 
 
 LOGGER = logging.getLogger('nav.servicemon')
@@ -52,14 +52,17 @@ class Controller:
         LOGGER.debug("Setting checkinterval=%i", self._looptime)
         self.db = db.db()
         LOGGER.debug("Reading database config")
-        LOGGER.debug("Setting up runqueue")
-        self._runqueue = RunQueue.RunQueue(controller=self)
+        LOGGER.debug("Setting up scheduler")
+        self._scheduler = Scheduler(
+            self._looptime,
+            workers=int(self.conf.get("maxthreads", 20)),
+            blocking_workers=int(self.conf.get("blocking threads", 5)))
         self.dirty = 1
 
     def get_checkers(self):
         """
-        Fetches new checkers from the NAV database and appends them to
-        the runqueue.
+        Fetches new checkers from the NAV database and hands them to the
+        scheduler.
         """
         newcheckers = self.db.get_checkers(self.dirty)
         self.dirty = 0
@@ -80,52 +83,34 @@ class Controller:
             LOGGER.info("No checkers left in database, flushing list.")
             self._checkers = []
 
-        # Randomize order of checker plugins
-        random.shuffle(self._checkers)
+        self._scheduler.set_checkers(self._checkers)
 
     def main(self):
         """
-        Loops until SIGTERM is caught. The looptime is defined
-        by self._looptime
+        Loops until SIGTERM is caught, refreshing the list of checkers and
+        reporting scheduling statistics every self._looptime seconds.
+        Each checker is run by the scheduler according to its own deadline.
         """
+        emitter = MetricEmitter.from_config()
+        install_emitter(emitter)
+        emitter.start()
         self.db.start()
-        while self._isrunning:
-            start = time.time()
-            self.get_checkers()
-
-            wait = self._looptime - (time.time() - start)
-            if wait <= 0:
-                LOGGER.warning("System clock has drifted backwards, "
-                               "resetting loop delay")
-                wait = self._looptime
-            if self._checkers:
-                pause = wait/(len(self._checkers)*2)
-            else:
-                pause = 0
-            for checker in self._checkers:
-                self._runqueue.enq(checker)
-                sleep(pause)
-
-            # extensive debugging
-            objects = gc.get_objects()
-            dbgthreads = [i for i in objects if isinstance(i, threading.Thread)]
-            LOGGER.debug("Garbage: %s Objects: %i Threads: %i", gc.garbage,
-                         len(objects), len(dbgthreads))
-
-            wait = self._looptime - (time.time() - start)
-            LOGGER.debug("Waiting %i seconds.", wait)
-            if wait <= 0:
-                LOGGER.critical("Only superman can do this. Humans cannot "
-                                "wait for %i seconds.", wait)
-                wait %= self._looptime
-                sleep(wait)
-            else:
-                sleep(wait)
+        self._scheduler.start()
+        try:
+            while self._isrunning:
+                start = time.time()
+                self.get_checkers()
+                sleep(max(0, self._looptime - (time.time() - start)))
+                try:
+                    self._scheduler.report()
+                except Exception:  # pylint: disable=broad-except
+                    LOGGER.exception("Failed to report scheduler statistics")
+        finally:
+            emitter.stop(timeout=emitter.flush_interval * 2)
 
     def signalhandler(self, signum, _):
         if signum == signal.SIGTERM:
             LOGGER.info("Caught SIGTERM. Exiting.")
-            self._runqueue.terminate()
             sys.exit(0)
         elif signum == signal.SIGHUP:
             # reopen the logfile
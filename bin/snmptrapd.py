@@ -24,6 +24,7 @@ import os
 import re
 import socket
 import sys
+import atexit
 import argparse
 import configparser
 import signal
@@ -33,6 +34,9 @@ from functools import reduce
 from nav import daemon
 import nav.buildconf
 from nav.snmptrapd.plugin import load_handler_modules, ModuleLoadError
+from nav.snmptrapd.dispatcher import (TrapDispatcher, EventBatcher,
+                                      StatsReporter)
+from nav.snmptrapd import cache
 from nav.util import is_valid_ip, address_to_string
 from nav.db import getConnection
 from nav.bootstrap import bootstrap_django
@@ -46,7 +50,6 @@ logfile_path = nav.buildconf.localstatedir + "/log/snmptrapd.log"
 pidfile = nav.buildconf.localstatedir + "/run/snmptrapd.pid"
 logging.raiseExceptions = False  # don't raise exceptions for logging issues
 logger = logging.getLogger('nav.snmptrapd')
-traplogger = logging.getLogger('nav.snmptrapd.traplog')
 handlermodules = None
 config = None
 
@@ -151,8 +154,9 @@ def main():
         signal.signal(signal.SIGTERM, signal_handler)
 
         logger.info("Snmptrapd started, listening on %s", addresses_text)
+        dispatcher = start_dispatcher()
         try:
-            server.listen(opts.community, trap_handler)
+            server.listen(opts.community, dispatcher.dispatch)
         except SystemExit:
             raise
         except Exception as why:
@@ -162,7 +166,8 @@ def main():
         # Start listening and exit cleanly if interrupted.
         try:
             logger.info("Listening on %s", addresses_text)
-            server.listen(opts.community, trap_handler)
+            dispatcher = start_dispatcher()
+            server.listen(opts.community, dispatcher.dispatch)
         except KeyboardInterrupt as why:
             logger.error("Received keyboardinterrupt, exiting.")
             server.close()
@@ -202,38 +207,25 @@ def Address(address):
     raise ValueError("%s is not a valid address" % address)
 
 
-def trap_handler(trap):
-    """Handles a trap.
+def start_dispatcher():
+    """Starts the threads that handle received traps and post their events.
 
-    :type trap: nav.snmptrapd.trap.SNMPTrap
+    Must be called after daemonization, as threads don't survive forking.
 
-    """
-    traplogger.debug("%s", trap)
-    connection = getConnection('default')
-    handled_by = []
+    :returns: A TrapDispatcher instance.
 
-    for mod in handlermodules:
-        logger.debug("Giving trap to %s" % str(mod))
-        try:
-            accepted = mod.handleTrap(trap, config=config)
-            if accepted:
-                handled_by.append(mod.__name__)
-            logger.debug("Module %s %s trap", mod.__name__,
-                         accepted and 'accepted' or 'ignored',)
-        except Exception as why:
-            logger.exception("Error when handling trap with %s: %s"
-                             % (mod.__name__, why))
-        # Assuming that the handler used the same connection as this
-        # function, we rollback any uncommitted changes.  This is to
-        # avoid idling in transactions.
-        connection.rollback()
-
-    if handled_by:
-        logger.info("v%s trap received from %s, handled by %s", trap.version,
-                    trap.src, handled_by)
-    else:
-        logger.info("v%s trap received from %s, no handlers wanted it",
-                    trap.version, trap.src)
+    """
+    cache.configure(config.getint('snmptrapd', 'cachettl', fallback=300))
+    dispatcher = TrapDispatcher(
+        handlermodules, config,
+        workers=config.getint('snmptrapd', 'workers', fallback=4),
+        queue_size=config.getint('snmptrapd', 'queuesize', fallback=10000))
+    batcher = EventBatcher()
+    batcher.start()
+    dispatcher.start()
+    StatsReporter(dispatcher, batcher).start()
+    atexit.register(batcher.flush)
+    return dispatcher
 
 
 def verify_subsystem():
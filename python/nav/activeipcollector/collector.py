@@ -18,29 +18,39 @@
 
 import logging
 import time
+from datetime import timedelta
 
 from nav.models.manage import Netbox  # Needed!
-from django.db import connection
+from django.db import connection, transaction
 
 LOG = logging.getLogger(__name__)
 
+# ARP records may be committed by ipdevpoll some time after their timestamps,
+# so changes are looked for this far back before the previous collection.
+CHANGE_MARGIN = timedelta(minutes=10)
+
+# Prefixes are recounted at least this often, even if no ARP changes were
+# seen for them, e.g. to pick up changes to the prefix address itself.
+FULL_RECOUNT_INTERVAL = timedelta(days=1)
+
 
 def collect(days=None):
     """Collect data from database
 
-    Use either a quick query for updates only, or a slow one for walking
-    through historic data.
+    Use either a quick incremental update of the current counts, or a slow
+    query for walking through historic data.
     """
 
     starttime = time.time()
     intervals = get_intervals(days) if days else 0
 
-    if intervals:
-        LOG.debug('Collecting %s intervals', intervals)
-        query = get_interval_query(intervals)
-    else:
-        query = get_static_query()
+    if not intervals:
+        result = collect_incremental()
+        LOG.debug('Collected in %.2f seconds', time.time() - starttime)
+        return result
 
+    LOG.debug('Collecting %s intervals', intervals)
+    query = get_interval_query(intervals)
     LOG.debug(query)
 
     cursor = connection.cursor()
@@ -51,6 +61,111 @@ def collect(days=None):
     return cursor.fetchall()
 
 
+def collect_incremental():
+    """Updates the stored active address counts of all prefixes whose ARP
+    records have changed since the last collection, and returns the current
+    counts of all prefixes.
+
+    """
+    with transaction.atomic():
+        cursor = connection.cursor()
+        cursor.execute("SELECT MAX(updated_at) FROM prefix_active_ip_count")
+        last_collected = cursor.fetchone()[0]
+
+        if last_collected:
+            prefixids = get_changed_prefixes(cursor,
+                                             last_collected - CHANGE_MARGIN)
+            LOG.debug('%d prefixes changed since %s', len(prefixids),
+                      last_collected)
+        else:
+            prefixids = None
+            LOG.debug('No previous collection found, counting all prefixes')
+
+        if prefixids is None or prefixids:
+            update_counts(cursor, prefixids)
+
+        cursor.execute(get_count_query())
+        return cursor.fetchall()
+
+
+def get_changed_prefixes(cursor, since):
+    """Returns the ids of all prefixes with ARP records that have started or
+    ended since the given time, as well as those that have no stored count,
+    or whose count is due for a recount.
+
+    """
+    cursor.execute("""
+    WITH changed_arp AS (
+        SELECT ip
+        FROM arp
+        WHERE start_time >= %(since)s
+           OR end_time BETWEEN %(since)s AND LOCALTIMESTAMP
+    )
+    SELECT prefix.prefixid
+    FROM vlan
+    JOIN prefix USING (vlanid)
+    LEFT JOIN prefix_active_ip_count AS counted USING (prefixid)
+    WHERE vlan.nettype NOT IN ('loopback')
+      AND (counted.prefixid IS NULL OR
+           counted.updated_at < LOCALTIMESTAMP - %(recount)s)
+    UNION
+    SELECT prefix.prefixid
+    FROM vlan
+    JOIN prefix USING (vlanid)
+    JOIN changed_arp ON (ip << netaddr)
+    WHERE vlan.nettype NOT IN ('loopback')
+    """, dict(since=since, recount=FULL_RECOUNT_INTERVAL))
+    return [prefixid for prefixid, in cursor.fetchall()]
+
+
+def update_counts(cursor, prefixids=None):
+    """Recounts the active addresses of the given prefixes, or of all
+    prefixes if prefixids is None, and stores the new counts.
+
+    """
+    if prefixids is None:
+        cursor.execute("DELETE FROM prefix_active_ip_count")
+        where = "WHERE vlan.nettype NOT IN ('loopback')"
+        args = ()
+    else:
+        cursor.execute(
+            "DELETE FROM prefix_active_ip_count WHERE prefixid = ANY(%s)",
+            (prefixids,))
+        where = "WHERE prefix.prefixid = ANY(%s)"
+        args = (prefixids,)
+
+    cursor.execute("""
+    INSERT INTO prefix_active_ip_count (prefixid, ip_count, mac_count)
+    SELECT
+        prefix.prefixid,
+        COUNT(DISTINCT ip) AS ipcount,
+        COUNT(DISTINCT mac) AS maccount
+    FROM vlan
+    JOIN prefix USING (vlanid)
+    LEFT JOIN arp ON (ip << netaddr AND arp.end_time = 'infinity')
+    """ + where + """
+    GROUP BY prefix.prefixid
+    """, args)
+    LOG.debug('Stored new counts for %d prefixes', cursor.rowcount)
+
+
+def get_count_query():
+    """Return query for fetching the stored counts of all prefixes"""
+    query = """
+    SELECT
+        netaddr,
+        now() AS timeentry,
+        ip_count AS ipcount,
+        mac_count AS maccount
+    FROM vlan
+    JOIN prefix USING (vlanid)
+    JOIN prefix_active_ip_count USING (prefixid)
+    WHERE vlan.nettype NOT IN ('loopback')
+    """
+
+    return query
+
+
 def get_interval_query(intervals):
     """Return query for collecting data for a time interval"""
 
@@ -77,25 +192,6 @@ def get_interval_query(intervals):
     return query
 
 
-def get_static_query():
-    """Return for query for doing a static collection"""
-    query = """
-    SELECT
-        netaddr,
-        now() AS timeentry,
-        COUNT(DISTINCT ip) AS ipcount,
-        COUNT(DISTINCT mac) AS maccount
-    FROM vlan
-    JOIN prefix USING (vlanid)
-    LEFT JOIN arp ON (ip << netaddr AND arp.end_time = 'infinity')
-    WHERE vlan.nettype NOT IN ('loopback')
-    GROUP BY netaddr, timeentry
-    ORDER BY timeentry
-    """
-
-    return query
-
-
 def get_intervals(days):
     """Return number of intervals in given days"""
     intervals_in_day = 2 * 24
@@ -20,8 +20,6 @@ import logging
 import time
 from IPy import IP
 
-from django.utils.six.moves import range
-
 import nav.activeipcollector.collector as collector
 from nav.metrics.carbon import send_metrics
 from nav.metrics.templates import metric_path_for_prefix
@@ -38,24 +36,23 @@ def run(days=None):
 def store(data):
     """Sends data to carbon for storage in Graphite.
 
+    All the metrics are sent in a single batch; to avoid losing metrics to
+    UDP packet drops, configure a TCP based carbon protocol.
+
     :param data: a cursor.fetchall object containing all database rows we
     are to store
 
     """
-
-    # Suspecting package drop - dividing into chunks and giving some
-    # breathing room for each batch of updates.
-    chunks = [data[x:x+100] for x in range(0, len(data), 100)]
-    for chunk in chunks:
-        for db_tuple in chunk:
-            store_tuple(db_tuple)
-        time.sleep(2)
+    metrics = []
+    for db_tuple in data:
+        metrics.extend(get_metrics(db_tuple))
+    send_metrics(metrics)
 
     LOG.info('Sent %s updates', len(data))
 
 
-def store_tuple(db_tuple):
-    """Sends data to whisper with correct metric path
+def get_metrics(db_tuple):
+    """Returns the metrics to send to whisper for a database row
 
     :param db_tuple: a row from a rrd_fetchall object
 
@@ -71,7 +68,7 @@ def store_tuple(db_tuple):
         (metric_path_for_prefix(prefix, 'ip_range'), (when, ip_range))
     ]
     LOG.debug(metrics)
-    send_metrics(metrics)
+    return metrics
 
 
 def find_range(prefix):
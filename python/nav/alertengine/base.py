@@ -18,21 +18,35 @@
 """Alertengine base functionality"""
 
 
+from collections import defaultdict
+import errno
 import gc
 import logging
+import select
+import time
 from datetime import datetime
 
-from django.db import transaction, reset_queries
-from django.utils.lru_cache import lru_cache
+from django.db import connection, transaction, reset_queries
+from psycopg2 import OperationalError
 
 from nav.models.profiles import (Account, AccountAlertQueue, AlertSubscription,
                                  AlertAddress, FilterGroup, AlertPreference,
                                  TimePeriod)
 from nav.models.event import AlertQueue
+from nav.alertengine.matching import AlertMatcher
 
 
-def check_alerts(debug=False):
-    """Handles all new and user queued alerts"""
+# PostgreSQL notification channels used to wake up a waiting alertengine
+NEW_ALERT_CHANNEL = 'new_alert'
+PROFILES_CHANGED_CHANNEL = 'alertprofiles_changed'
+
+
+def check_alerts(debug=False, cache=None):
+    """Handles all new and user queued alerts
+
+    :param cache: A SubscriptionCache to reuse between runs. If omitted,
+                  all alert subscriptions are loaded from the database.
+    """
 
     # We use transaction autocommit so that the changes we make only propogate
     # if the entire loop finishes.
@@ -51,7 +65,8 @@ def check_alerts(debug=False):
     now = datetime.now()
 
     # Get all alerts that aren't in alert queue due to subscription
-    new_alerts = AlertQueue.objects.filter(accountalertqueue__isnull=True)
+    new_alerts = AlertQueue.objects.filter(
+        accountalertqueue__isnull=True).select_related('alert_type', 'netbox')
     num_new_alerts = len(new_alerts)
 
     initial_alerts = AlertQueue.objects.values_list('id', flat=True)
@@ -60,7 +75,7 @@ def check_alerts(debug=False):
                  num_new_alerts)
 
     if num_new_alerts:
-        handle_new_alerts(new_alerts)
+        handle_new_alerts(new_alerts, cache)
 
     # Get all queued alerts.
     queued_alerts = AccountAlertQueue.objects.all()
@@ -116,110 +131,61 @@ def check_alerts(debug=False):
     del queued_alerts
 
     reset_queries()
-    gc.collect()
+    if num_new_alerts:
+        gc.collect()
 
 
 @transaction.atomic()
-def handle_new_alerts(new_alerts):
+def handle_new_alerts(new_alerts, cache=None):
     """Handles new alerts on the queue"""
-    memoized_check_alert = lru_cache()(check_alert_against_filtergroupcontents)
     logger = logging.getLogger('nav.alertengine.handle_new_alerts')
-    accounts = []
-
-    def subscription_sort_key(subscription):
-        """Return a key to sort alertsubscriptions in a prioritized order."""
-        sort_order = [
-            AlertSubscription.NOW,
-            AlertSubscription.NEXT,
-            AlertSubscription.DAILY,
-            AlertSubscription.WEEKLY,
-            ]
-        try:
-            return sort_order.index(subscription.type)
-        except ValueError:
-            return subscription.type
-
-    # Build datastructure that contains accounts and corresponding
-    # filtergroupcontent_set so that we don't redo db queries to much
-    for account in Account.objects.filter(
-            alertpreference__active_profile__isnull=False):
-        profile = account.get_active_profile()
-        time_period = profile.get_active_timeperiod() if profile else None
-
-        if not time_period:
-            continue
-
-        current_alertsubscriptions = sorted(
-            time_period.alertsubscription_set.all(),
-            key=subscription_sort_key)
-
-        tmp = []
-        for alertsubscription in current_alertsubscriptions:
-            tmp.append(
-                (alertsubscription,
-                 alertsubscription.filter_group.filtergroupcontent_set.all()))
-
-        if tmp:
-            permissions = []
-            for filtergroup in FilterGroup.objects.filter(
-                    group_permissions__accounts__in=[account]):
-                permissions.append(filtergroup.filtergroupcontent_set.all())
-
-            accounts.append((account, tmp, permissions))
-            del permissions
-
-        del tmp
-        del current_alertsubscriptions
-        del account
+    if cache is None:
+        cache = SubscriptionCache()
+    matcher = AlertMatcher(new_alerts, cache.compiled_filters)
 
     # Remember which alerts are sent where to avoid duplicates
     dupemap = set()
 
     # Check all acounts against all their active subscriptions
-    for account, alertsubscriptions, permissions in accounts:
+    for account, alertsubscriptions, permissions in (
+            cache.get_active_subscriptions()):
         logger.debug("Checking new alerts for account '%s'", account)
+        _queue_matching_alerts(account, matcher, cache, alertsubscriptions,
+                               permissions, dupemap, logger)
 
-        for alert in new_alerts:
-            _check_match_and_permission(account, alert, alertsubscriptions,
-                                        dupemap, logger, memoized_check_alert,
-                                        permissions)
-            del alert
-        del account
-        del permissions
-
-    del memoized_check_alert
+    del matcher
     del new_alerts
     gc.collect()
 
 
-def _check_match_and_permission(account, alert, alertsubscriptions, dupemap,
-                                logger, memoized_check_alert, permissions):
-    for alertsubscription, filtergroupcontents in alertsubscriptions:
-        # Check if alert matches, and if user has permission
-        if memoized_check_alert(alert, filtergroupcontents, 'match check'):
-            queued = _check_permissions(account, alert, alertsubscription,
-                                        dupemap, logger, memoized_check_alert,
-                                        permissions)
+def _queue_matching_alerts(account, matcher, cache, alertsubscriptions,
+                           permissions, dupemap, logger):
+    def _match(filter_group):
+        return matcher.match_filtergroup(
+            filter_group, cache.get_filtergroup_contents(filter_group))
 
-            if not queued:
-                logger.warning(
-                    'alert %d not queued to %s due to lacking permissions' % (
-                        alert.id, account))
-        else:
+    permitted = None
+    for alertsubscription in alertsubscriptions:
+        matched = _match(alertsubscription.filter_group)
+        if not matched:
             logger.debug(
-                'alert %d: did not match the alertsubscription %d of user %s',
-                alert.id, alertsubscription.id, account)
-
-        del alertsubscription
-        del filtergroupcontents
+                'no alerts matched the alertsubscription %d of user %s',
+                alertsubscription.id, account)
+            continue
 
+        if permitted is None:
+            permitted = frozenset().union(
+                *(_match(permission) for permission in permissions))
 
-def _check_permissions(account, alert, alertsubscription, dupemap, logger,
-                       memoized_check_alert, permissions):
-    for permission in permissions:
-        if memoized_check_alert(alert, permission, 'permission check'):
-            logger.debug(
-                "Matched permission subscription %d" % alertsubscription.id)
+        # Iterate the alerts rather than the match set to keep queue order
+        for alert in matcher.alerts:
+            if alert.id not in matched:
+                continue
+            if alert.id not in permitted:
+                logger.warning(
+                    'alert %d not queued to %s due to lacking permissions',
+                    alert.id, account)
+                continue
 
             # Queue all alerts, avoiding duplicates. The individual users'
             # queues will be processed later.
@@ -237,8 +203,166 @@ def _check_permissions(account, alert, alertsubscription, dupemap, logger,
                     alert.id, account,
                     alertsubscription.alert_address_id)
 
+
+def subscription_sort_key(subscription):
+    """Return a key to sort alertsubscriptions in a prioritized order."""
+    sort_order = [
+        AlertSubscription.NOW,
+        AlertSubscription.NEXT,
+        AlertSubscription.DAILY,
+        AlertSubscription.WEEKLY,
+        ]
+    try:
+        return sort_order.index(subscription.type)
+    except ValueError:
+        return subscription.type
+
+
+class SubscriptionCache(object):
+    """Caches the alert profiles, subscriptions, permissions and filter groups
+    of all accounts that have an active alert profile.
+
+    Everything is loaded on first use and kept until invalidated. The active
+    time period of each profile is selected from the cached time periods on
+    every lookup, so the passing of time periods does not require the cache
+    to be reloaded.
+
+    """
+    def __init__(self):
+        self._accounts = None
+        self._subscriptions = {}
+        self._contents = {}
+        self.compiled_filters = {}
+
+    def invalidate(self):
+        """Discards everything that has been cached"""
+        self._accounts = None
+        self._subscriptions = {}
+        self._contents = {}
+        self.compiled_filters = {}
+
+    def get_active_subscriptions(self, now=None):
+        """Returns the currently active alert subscriptions of every account.
+
+        :returns: A list of (account, subscriptions, permissions) tuples,
+                  where subscriptions are the AlertSubscriptions of the
+                  account's active time period, in a prioritized order, and
+                  permissions are the FilterGroups the account has been given
+                  permission to.
+        """
+        if self._accounts is None:
+            self._load()
+        now = now or datetime.now()
+        valid_during = TimePeriod.get_valid_during(now)
+
+        result = []
+        for account, timeperiods, permissions in self._accounts:
+            time_period = TimePeriod.find_active(
+                [period for period in timeperiods
+                 if period.valid_during in valid_during], now)
+            if not time_period:
+                continue
+            subscriptions = self._subscriptions.get(time_period.id)
+            if subscriptions:
+                result.append((account, subscriptions, permissions))
+        return result
+
+    def get_filtergroup_contents(self, filter_group):
+        """Returns the prioritized contents of a filter group"""
+        if filter_group.id not in self._contents:
+            self._contents[filter_group.id] = list(
+                filter_group.filtergroupcontent_set.select_related('filter'))
+        return self._contents[filter_group.id]
+
+    def _load(self):
+        accounts = []
+        timeperiod_ids = []
+        for account in Account.objects.filter(
+                alertpreference__active_profile__isnull=False):
+            profile = account.get_active_profile()
+            if not profile:
+                continue
+            timeperiods = list(profile.timeperiod_set.order_by('start'))
+            if not timeperiods:
+                continue
+            timeperiod_ids.extend(period.id for period in timeperiods)
+            permissions = list(FilterGroup.objects.filter(
+                group_permissions__accounts__in=[account]).distinct())
+            accounts.append((account, timeperiods, permissions))
+
+        subscriptions = defaultdict(list)
+        for subscription in AlertSubscription.objects.filter(
+                time_period__in=timeperiod_ids).select_related(
+                    'filter_group'):
+            subscriptions[subscription.time_period_id].append(subscription)
+        for period_subscriptions in subscriptions.values():
+            period_subscriptions.sort(key=subscription_sort_key)
+
+        self._accounts = accounts
+        self._subscriptions = dict(subscriptions)
+        logging.getLogger('nav.alertengine.subscriptioncache').debug(
+            'loaded %d alert subscriptions of %d accounts',
+            sum(len(s) for s in self._subscriptions.values()), len(accounts))
+
+
+def listen():
+    """Registers the current database connection as a listener for alert
+    queue and alert profile notifications.
+
+    """
+    cursor = connection.cursor()
+    for channel in (NEW_ALERT_CHANNEL, PROFILES_CHANGED_CHANNEL):
+        cursor.execute('LISTEN %s' % channel)
+
+
+def wait_for_alerts(timeout, cache):
+    """Waits up to timeout seconds for new alerts to be queued.
+
+    Notifications about changes to alert profiles invalidate cache.
+
+    :returns: True if new alerts were queued, False if the timeout passed.
+    """
+    if connection.connection is None:
+        # A fresh connection may have missed notifications
+        cache.invalidate()
+        listen()
+    conn = connection.connection
+
+    deadline = time.time() + timeout
+    while True:
+        # Notifications may already have been received and buffered by
+        # psycopg2 while other queries ran, so look at those before waiting
+        try:
+            conn.poll()
+        except OperationalError:
+            connection.connection = None
             return True
-    return False
+        if _handle_notifications(conn, cache):
+            return True
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        try:
+            select.select([conn], [], [], remaining)
+        except select.error as err:
+            if err.args[0] != errno.EINTR:
+                raise
+
+
+def _handle_notifications(conn, cache):
+    """Consumes the pending notifications of conn, invalidating cache if
+    alert profiles have changed.
+
+    :returns: True if new alerts were queued.
+    """
+    channels = set(notify.channel for notify in conn.notifies)
+    del conn.notifies[:]
+    if PROFILES_CHANGED_CHANNEL in channels:
+        logging.getLogger('nav.alertengine.wait_for_alerts').debug(
+            'alert profiles changed, invalidating subscription cache')
+        cache.invalidate()
+    return NEW_ALERT_CHANNEL in channels
 
 
 def handle_queued_alerts(queued_alerts, now=None):
@@ -0,0 +1,193 @@
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Set-based matching of alert batches against filter groups.
+
+Rather than verifying every alert against every filter with a separate
+database query, an :py:class:`AlertMatcher` matches a whole batch of alerts
+against each distinct filter once, and evaluates filter groups as set
+operations on the resulting sets of alert ids.
+
+Filter expressions that test the most commonly used alert attributes (event
+type, alert type, netbox category and a few others) for equality are compiled
+into predicates that are looked up in an in-memory index of the alert batch.
+Only the remaining expressions of a filter, if any, are checked by the
+database, and only for the alerts that passed the indexed predicates.
+"""
+from collections import defaultdict
+import logging
+
+from nav.models.profiles import Operator
+
+_logger = logging.getLogger(__name__)
+
+
+def _get_alert_type(alert):
+    return alert.alert_type.name if alert.alert_type_id else None
+
+
+def _netbox_attribute(attribute):
+    def _getter(alert):
+        if alert.netbox_id is None:
+            return None
+        return getattr(alert.netbox, attribute)
+    return _getter
+
+
+# Match fields (by value_id) whose equality tests can be evaluated in memory,
+# mapped to functions that extract the matched value from an AlertQueue
+# object.
+INDEXED_FIELDS = {
+    'eventtype.eventtypeid': lambda alert: alert.event_type_id,
+    'alerttype.alerttype': _get_alert_type,
+    'cat.catid': _netbox_attribute('category_id'),
+    'netbox.sysname': _netbox_attribute('sysname'),
+    'room.roomid': _netbox_attribute('room_id'),
+    'org.orgid': _netbox_attribute('organization_id'),
+}
+INDEXED_OPERATORS = (Operator.EQUALS, Operator.IN)
+
+
+class CompiledFilter(object):
+    """A filter whose expressions are split into indexed predicates and
+    residual expressions that must be checked by the database.
+
+    """
+    def __init__(self, filtr):
+        self.filter = filtr
+        self.predicates = []
+        self.residual = []
+
+        for expression in filtr.expression_set.select_related('match_field'):
+            value_id = expression.match_field.value_id
+            if (value_id in INDEXED_FIELDS
+                    and expression.operator in INDEXED_OPERATORS):
+                if expression.operator == Operator.IN:
+                    values = expression.value.split('|')
+                else:
+                    values = [expression.value]
+                self.predicates.append((value_id, frozenset(values)))
+            else:
+                self.residual.append(expression)
+
+    def __repr__(self):
+        return "<CompiledFilter %s: %d predicates, %d residual>" % (
+            self.filter.id, len(self.predicates), len(self.residual))
+
+
+class AlertMatcher(object):
+    """Matches a batch of alerts against filters and filter groups.
+
+    Each distinct filter and filter group is matched only once against the
+    batch, and the results are reused for every subscription or permission
+    that refers to them.
+
+    :param alerts: The batch of AlertQueue objects to match.
+    :param compiled_filters: A dict of CompiledFilter objects by filter id,
+                             to share compiled filters between batches.
+    """
+    def __init__(self, alerts, compiled_filters=None):
+        self.alerts = list(alerts)
+        self.all_ids = frozenset(alert.id for alert in self.alerts)
+        self._index = {}
+        self._compiled = {} if compiled_filters is None else compiled_filters
+        self._filter_matches = {}
+        self._group_matches = {}
+
+    def match_filter(self, filtr):
+        """Returns the set of alert ids in the batch that match filtr"""
+        if filtr.id not in self._filter_matches:
+            self._filter_matches[filtr.id] = self._match_filter(filtr)
+        return self._filter_matches[filtr.id]
+
+    def _match_filter(self, filtr):
+        compiled = self._compile(filtr)
+        candidates = self.all_ids
+        for value_id, values in compiled.predicates:
+            index = self._get_index(value_id)
+            candidates = candidates & frozenset().union(
+                *(index.get(value, ()) for value in values))
+            if not candidates:
+                break
+
+        if candidates and compiled.residual:
+            candidates = frozenset(filtr.get_matching_alert_ids(
+                candidates, compiled.residual))
+
+        _logger.debug("%d of %d alerts matched %r", len(candidates),
+                      len(self.all_ids), compiled)
+        return candidates
+
+    def _compile(self, filtr):
+        if filtr.id not in self._compiled:
+            self._compiled[filtr.id] = CompiledFilter(filtr)
+        return self._compiled[filtr.id]
+
+    def _get_index(self, value_id):
+        """Returns a dict mapping values of an indexed field to the ids of
+        the alerts in the batch that have that value.
+
+        """
+        if value_id not in self._index:
+            getter = INDEXED_FIELDS[value_id]
+            index = defaultdict(set)
+            for alert in self.alerts:
+                value = getter(alert)
+                if value is not None:
+                    index[value].add(alert.id)
+            self._index[value_id] = dict(index)
+        return self._index[value_id]
+
+    def match_filtergroup(self, filter_group, filtergroupcontents=None):
+        """Returns the set of alert ids in the batch that match a filter group.
+
+        This is the set-based equivalent of
+        :py:func:`nav.alertengine.base.check_alert_against_filtergroupcontents`
+
+        :param filter_group: A FilterGroup instance.
+        :param filtergroupcontents: The filter group's contents, in priority
+                                    order, if already loaded.
+        """
+        if filter_group.id not in self._group_matches:
+            if filtergroupcontents is None:
+                filtergroupcontents = (
+                    filter_group.filtergroupcontent_set.select_related(
+                        'filter'))
+            self._group_matches[filter_group.id] = self._match_contents(
+                filtergroupcontents)
+        return self._group_matches[filter_group.id]
+
+    def _match_contents(self, filtergroupcontents):
+        matches = frozenset()
+        for content in filtergroupcontents:
+            if content.include:
+                # Alerts that are not already matched are included if their
+                # filter match equals the content's positive flag
+                if len(matches) == len(self.all_ids):
+                    continue
+                matched = self.match_filter(content.filter)
+                if content.positive:
+                    matches = matches | matched
+                else:
+                    matches = matches | (self.all_ids - matched)
+            elif matches:
+                # Matched alerts are excluded if their filter match equals
+                # the content's positive flag
+                matched = self.match_filter(content.filter)
+                if content.positive:
+                    matches = matches - matched
+                else:
+                    matches = matches & matched
+        return matches
@@ -1,5 +1,5 @@
 #
-# Copyright (C) 2008-2011 Uninett AS
+# Copyright (C) 2008-2011, 2018 Uninett AS
 #
 # This file is part of Network Administration Visualized (NAV).
 #
@@ -15,8 +15,14 @@
 #
 """Asynchronous DNS resolver for lookups on both IPv4 and IPv6.
 
-The API is designed for use in synchronous programs and uses Twisted in
-perverted ways to accomplish the behind-the-curtain asynchronous work.
+A single :py:class:`ResolverService` caches the results of lookups, both
+positive and negative, and caps the number of concurrent lookups.  It has an
+asynchronous, Deferred-based API for use in Twisted programs, such as
+ipdevpoll.
+
+The :py:func:`reverse_lookup` and :py:func:`forward_lookup` functions are
+designed for use in synchronous programs.  They run the lookups in a Twisted
+reactor running in a background thread, and block until the results are in.
 
 We would rather have used adns, but the available versions have poor IPv6
 support.
@@ -24,15 +30,16 @@ support.
 """
 
 import socket
-from itertools import cycle
-from collections import defaultdict
+import threading
+import time
 
 from IPy import IP
 from twisted.names import dns
 from twisted.names import client
-from twisted.internet import defer
+from twisted.internet import defer, threads
 # pylint: disable=E1101
 from twisted.internet import reactor
+from twisted.python import failure, threadable
 # pylint: disable=W0611
 from twisted.names.error import DNSUnknownError
 from twisted.names.error import DomainError, AuthoritativeDomainError
@@ -40,6 +47,15 @@ from twisted.names.error import DNSQueryTimeoutError, DNSFormatError
 from twisted.names.error import DNSServerError, DNSNameError
 from twisted.names.error import DNSNotImplementedError, DNSQueryRefusedError
 
+DEFAULT_TTL = 300
+DEFAULT_NEGATIVE_TTL = 60
+DEFAULT_MAX_CONCURRENT = 100
+DEFAULT_TIMEOUT = (1, 3)
+
+_service = None
+_reactor_thread = None
+_reactor_lock = threading.Lock()
+
 
 def reverse_lookup(addresses):
     """Runs parallel reverse DNS lookups for addresses.
@@ -47,8 +63,7 @@ def reverse_lookup(addresses):
     :returns: A dict of {address: [name, ...]} items
 
     """
-    resolver = ReverseResolver()
-    return resolver.resolve(addresses)
+    return _call_in_reactor(get_resolver().reverse_many, list(addresses))
 
 
 def forward_lookup(names):
@@ -57,112 +72,201 @@ def forward_lookup(names):
     :returns: A dict of {name: [address, ...]} items
 
     """
-    resolver = ForwardResolver()
-    return resolver.resolve(names)
-
-
-class Resolver(object):
-    """Abstract base class for resolvers"""
-    def __init__(self):
-        self._resolvers = cycle([client.Resolver('/etc/resolv.conf')
-                                 for _i in range(3)])
-        self.results = defaultdict(list)
-        self._finished = False
-
-    def resolve(self, names):
-        """Resolves DNS names in parallel"""
-        self._finished = False
-        self.results = defaultdict(list)
-
-        deferred_list = []
-        for name in names:
-            for deferred in self.lookup(name):
-                deferred.addCallback(self._extract_records, name)
-                deferred.addErrback(self._errback, name)
-                deferred_list.append(deferred)
-
-        deferred_list = defer.DeferredList(deferred_list)
-        deferred_list.addCallback(self._parse_result)
-        deferred_list.addCallback(self._finish)
-
-        while not self._finished:
-            reactor.iterate()
-        # Although the results are in at this point, we may need an extra
-        # iteration to ensure the resolver library closes its UDP sockets
-        reactor.iterate()
-
-        return dict(self.results)
-
-    def lookup(self, name):
-        """Initiates possibly multiple asynchronous DNS lookups for a name"""
-        raise NotImplementedError
+    return _call_in_reactor(get_resolver().forward_many, list(names))
 
-    @staticmethod
-    def _extract_records(result, name):
-        raise NotImplementedError
-
-    def _parse_result(self, result):
-        """Parses the result to the correct format"""
-        for _success, (name, response) in result:
-            if isinstance(response, Exception):
-                self.results[name] = response
-            else:
-                self.results[name].extend(response)
 
-    @staticmethod
-    def _errback(failure, host):
-        """Errback"""
-        return host, failure.value
+def get_resolver():
+    """Returns the shared ResolverService instance of this process"""
+    global _service  # pylint: disable=W0603
+    if _service is None:
+        _service = ResolverService()
+    return _service
+
 
-    def _finish(self, _):
-        self._finished = True
+def _call_in_reactor(func, *args):
+    """Calls func in the reactor thread, and blocks until the Deferred it
+    returns has fired, without busy-waiting.
 
+    """
+    if reactor.running and threadable.isInIOThread():
+        raise RuntimeError("synchronous DNS lookups cannot be made from the "
+                           "reactor thread, use get_resolver() instead")
+    _start_reactor_thread()
+    return threads.blockingCallFromThread(reactor, func, *args)
 
-class ForwardResolver(Resolver):
-    """A forward resolver implementation for A and AAAA record lookups.
 
-    NOTE: It will not lookup and follow CNAME records.
+def _start_reactor_thread():
+    """Runs the reactor in a background thread, unless it is already
+    running.
 
     """
+    global _reactor_thread  # pylint: disable=W0603
+    with _reactor_lock:
+        if reactor.running or _reactor_thread:
+            return
+        _reactor_thread = threading.Thread(
+            target=reactor.run, kwargs=dict(installSignalHandlers=False),
+            name="asyncdns")
+        _reactor_thread.daemon = True
+        _reactor_thread.start()
+
+
+class DNSCache(object):
+    """A simple cache of DNS lookup results that expire after a time-to-live.
+
+    :param max_entries: When the cache grows beyond this number of entries,
+                        expired entries are purged.
+    """
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the cached result of key, or None if there is no result
+        or it has expired.
+
+        """
+        entry = self._entries.get(key)
+        if entry:
+            expiry, result = entry
+            if expiry > time.time():
+                return result
+            del self._entries[key]
+
+    def set(self, key, result, ttl):
+        """Caches the result of key for ttl seconds"""
+        if len(self._entries) >= self.max_entries:
+            self.purge()
+        self._entries[key] = (time.time() + ttl, result)
+
+    def purge(self):
+        """Removes all expired entries"""
+        now = time.time()
+        for key in [key for key, (expiry, _) in self._entries.items()
+                    if expiry <= now]:
+            del self._entries[key]
+
+
+class ResolverService(object):
+    """A caching DNS resolver that runs a limited number of lookups
+    concurrently.
+
+    Concurrent lookups of the same name are only sent once.  Empty results
+    and non-existent domains are cached using the negative TTL, while other
+    errors, such as timeouts, are not cached at all.
+
+    All methods must be called from the reactor thread.
+
+    :param ttl: The number of seconds to cache results for.
+    :param negative_ttl: The number of seconds to cache negative results for.
+    :param max_concurrent: The maximum number of lookups to run at a time.
+    :param timeout: A sequence of timeouts, in seconds, for each attempt of
+                    a lookup.
+    """
+    def __init__(self, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 max_concurrent=DEFAULT_MAX_CONCURRENT,
+                 timeout=DEFAULT_TIMEOUT, resolver=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = tuple(timeout)
+        self.cache = DNSCache()
+        self._resolver = resolver or client.Resolver('/etc/resolv.conf')
+        self._semaphore = defer.DeferredSemaphore(max_concurrent)
+        self._pending = {}
 
-    def lookup(self, name):
-        """Returns a deferred object with all records related to hostname"""
+    def reverse(self, address):
+        """Looks up the PTR records of an IP address.
 
-        if type(name) is unicode:
-            name = name.encode('idna')
+        :returns: A Deferred whose result is a list of names.
+
+        """
+        return self._lookup(('PTR', address), self._lookup_names, address)
+
+    def forward(self, name):
+        """Looks up the A and AAAA records of a name.
+
+        NOTE: It will not lookup and follow CNAME records.
+
+        :returns: A Deferred whose result is a list of addresses.
+
+        """
+        return self._lookup(('A', name), self._lookup_addresses, name)
+
+    def reverse_many(self, addresses):
+        """Looks up the PTR records of multiple IP addresses.
 
-        resolver = next(self._resolvers)
-        return [resolver.lookupAddress(name), resolver.lookupIPV6Address(name)]
+        :returns: A Deferred whose result is a dict of
+                  {address: [name, ...]} items, or {address: exception}
+                  items for failed lookups.
+
+        """
+        return self._lookup_many(self.reverse, addresses)
+
+    def forward_many(self, names):
+        """Looks up the A and AAAA records of multiple names.
+
+        :returns: A Deferred whose result is a dict of
+                  {name: [address, ...]} items, or {name: exception} items
+                  for failed lookups.
+
+        """
+        return self._lookup_many(self.forward, names)
 
     @staticmethod
-    def _extract_records(result, name):
-        """Callback for A and AAAA records"""
-        address_list = []
+    def _lookup_many(lookup, keys):
+        keys = list(set(keys))
+        deferred = defer.DeferredList([lookup(key) for key in keys],
+                                      consumeErrors=True)
+
+        def _make_dict(results):
+            return {key: list(result) if success else result.value
+                    for key, (success, result) in zip(keys, results)}
+
+        return deferred.addCallback(_make_dict)
+
+    def _lookup(self, key, lookup, *args):
+        result = self.cache.get(key)
+        if result is not None:
+            if isinstance(result, Exception):
+                return defer.fail(result)
+            return defer.succeed(list(result))
+
+        if key in self._pending:
+            deferred = defer.Deferred()
+            self._pending[key].append(deferred)
+            return deferred
+
+        self._pending[key] = []
+        deferred = self._semaphore.run(lookup, *args)
+        return deferred.addBoth(self._finish_lookup, key)
+
+    def _finish_lookup(self, result, key):
+        if isinstance(result, failure.Failure):
+            if result.check(DNSNameError):
+                self.cache.set(key, result.value, self.negative_ttl)
+        else:
+            self.cache.set(key, result,
+                           self.ttl if result else self.negative_ttl)
+
+        for waiter in self._pending.pop(key, []):
+            if isinstance(result, failure.Failure):
+                waiter.errback(result)
+            else:
+                waiter.callback(list(result))
+        if isinstance(result, failure.Failure):
+            return result
+        return list(result)
 
-        for record_list in result:
-            for record in record_list:
-                if str(record.name) == name:
-                    if record.type == dns.A:
-                        address_list.append(socket.inet_ntop(
-                            socket.AF_INET,
-                            record.payload.address))
-                    elif record.type == dns.AAAA:
-                        address_list.append(socket.inet_ntop(
-                            socket.AF_INET6,
-                            record.payload.address))
-        return name, address_list
-
-
-class ReverseResolver(Resolver):
-    """Reverse resolver implementation for PTR record lookups"""
-    def lookup(self, address):
-        """Returns a deferred object which tries to get the hostname from ip"""
-        resolver = next(self._resolvers)
-        ip = IP(address)
-        return [resolver.lookupPointer(ip.reverseName())]
+    def _lookup_names(self, address):
+        deferred = self._resolver.lookupPointer(IP(address).reverseName(),
+                                                self.timeout)
+        return deferred.addCallback(self._extract_names)
 
     @staticmethod
-    def _extract_records(result, ip):
+    def _extract_names(result):
         """Callback for PTR records"""
         name_list = []
 
@@ -171,4 +275,41 @@ class ReverseResolver(Resolver):
                 if record.type == dns.PTR:
                     name_list.append(str(record.payload.name))
 
-        return ip, name_list
+        return name_list
+
+    def _lookup_addresses(self, name):
+        if not isinstance(name, str):
+            # i.e. unicode on Python 2
+            name = name.encode('idna')
+
+        deferred = defer.DeferredList(
+            [self._resolver.lookupAddress(name, self.timeout),
+             self._resolver.lookupIPV6Address(name, self.timeout)],
+            consumeErrors=True)
+        return deferred.addCallback(self._extract_addresses, name)
+
+    @staticmethod
+    def _extract_addresses(results, name):
+        """Callback for A and AAAA records.
+
+        Fails with the first error if all lookups failed.
+
+        """
+        responses = [response for success, response in results if success]
+        if not responses:
+            return results[0][1]
+
+        address_list = []
+        for result in responses:
+            for record_list in result:
+                for record in record_list:
+                    if str(record.name) == name:
+                        if record.type == dns.A:
+                            address_list.append(socket.inet_ntop(
+                                socket.AF_INET,
+                                record.payload.address))
+                        elif record.type == dns.AAAA:
+                            address_list.append(socket.inet_ntop(
+                                socket.AF_INET6,
+                                record.payload.address))
+        return address_list
@@ -22,6 +22,7 @@ from functools import wraps
 import logging
 import os
 import sys
+import threading
 import time
 
 import psycopg2
@@ -32,6 +33,7 @@ from nav import config
 
 _logger = logging.getLogger('nav.db')
 _connection_cache = nav.ObjectCache()
+_thread_scope = threading.local()
 driver = psycopg2
 
 
@@ -152,7 +154,7 @@ def getConnection(scriptName, database='nav'):
     """
     (dbhost, port, dbname, user, password) = get_connection_parameters(
         scriptName, database)
-    cache_key = (dbname, user)
+    cache_key = (dbname, user, getattr(_thread_scope, 'key', None))
 
     # First, invalidate any dead connections.  Return a connection
     # object from the cache if one exists, open a new one if not.
@@ -173,6 +175,19 @@ def getConnection(scriptName, database='nav'):
     return connection
 
 
+def use_private_connections():
+    """Makes getConnection() return connections that are private to the
+    calling thread, instead of the connections shared by the rest of the
+    process.
+
+    Worker threads that issue queries concurrently with other threads must
+    call this before using getConnection(), to avoid interleaving their
+    transactions with those of other threads.
+
+    """
+    _thread_scope.key = threading.current_thread().ident
+
+
 def closeConnections():
     """Close all cached database connections"""
     for connection in _connection_cache.values():
@@ -80,6 +80,8 @@ class Event(dict):
 
 class EventQ(object):
     """Static class to manipulate the event queue"""
+    _event_fields = ('source', 'target', 'deviceid', 'netboxid', 'subid',
+                     'time', 'eventtypeid', 'state', 'value', 'severity')
 
     @classmethod
     def _get_connection(cls):
@@ -139,6 +141,53 @@ class EventQ(object):
         event.eventqid = eventqid
         return cursor.statusmessage
 
+    @classmethod
+    def post_events(cls, events):
+        """Posts a list of events to the eventq in a single transaction.
+
+        Events with the same set of fields are inserted using a single
+        multi-row INSERT statement, as are all their variables.
+
+        """
+        if not events:
+            return
+        for event in events:
+            if event.eventqid:
+                raise EventAlreadyPostedError(event.eventqid)
+
+        conn = cls._get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT NEXTVAL('eventq_eventqid_seq') "
+                       "FROM generate_series(1, %s)", (len(events),))
+        eventqids = [row[0] for row in cursor.fetchall()]
+
+        rows_by_fields = {}
+        variables = []
+        for eventqid, event in zip(eventqids, events):
+            fields = tuple(attr for attr in cls._event_fields
+                           if getattr(event, attr, None))
+            if not fields:
+                raise EventIncompleteError
+            row = (eventqid,) + tuple(getattr(event, attr) for attr in fields)
+            rows_by_fields.setdefault(fields, []).append(row)
+            variables.extend((eventqid,) + item for item in event.items())
+
+        for fields, rows in rows_by_fields.items():
+            template = "(%s)" % ", ".join(["%s"] * (len(fields) + 1))
+            cursor.execute(
+                "INSERT INTO eventq (eventqid, " + ",".join(fields) + ") "
+                "VALUES " + ", ".join([template] * len(rows)),
+                [value for row in rows for value in row])
+        if variables:
+            cursor.execute(
+                "INSERT INTO eventqvar (eventqid, var, val) VALUES " +
+                ", ".join(["(%s, %s, %s)"] * len(variables)),
+                [value for row in variables for value in row])
+
+        conn.commit()
+        for eventqid, event in zip(eventqids, events):
+            event.eventqid = eventqid
+
     @classmethod
     def consume_events(cls, target):
         """Consume and return a list of Event objects queued for this target.
@@ -21,6 +21,12 @@ SQL is needed::
 
     CREATE RULE eventq_notify AS ON INSERT TO eventq DO ALSO NOTIFY new_event;
 
+Changes to alert history entries are signalled on the ``alerthist_changed``
+channel by a trigger on the alerthist table, and are used to keep the cache of
+unresolved alerts up to date. Likewise, layer 2 topology changes are signalled
+on the ``topology_changed`` channel, and are used to invalidate cached VLAN
+topology graphs.
+
 """
 import logging
 import sched
@@ -33,6 +39,7 @@ from nav.eventengine.plugin import EventHandler
 from nav.eventengine.alerts import AlertGenerator
 from nav.eventengine.config import EVENTENGINE_CONF
 from nav.eventengine import unresolved
+from nav.eventengine import topology
 from nav.models.event import EventQueue as Event
 import nav.db
 from django.db import connection, DatabaseError, transaction
@@ -81,6 +88,9 @@ class EventEngine(object):
     # too often, since we rely on PostgreSQL notification when new events are
     # inserted into the queue.
     CHECK_INTERVAL = 30
+    # the unresolved alerts cache is patched incrementally, but is still
+    # reloaded in full at this interval, just to be on the safe side
+    UNRESOLVED_RESYNC_INTERVAL = 600
     PLUGIN_TASKS_PRIORITY = 1
     _logger = logging.getLogger(__name__)
 
@@ -115,16 +125,42 @@ class EventEngine(object):
                 self._listen()
                 return
             if conn.notifies:
-                self._logger.debug("got event notification from database")
-                self._schedule_next_queuecheck()
+                self._handle_notifications(conn.notifies)
                 del conn.notifies[:]
         else:
             time.sleep(delay)
 
+    def _handle_notifications(self, notifies):
+        changed_alerts = set()
+        new_events = False
+        for notify in notifies:
+            if notify.channel == 'alerthist_changed':
+                if notify.payload.isdigit():
+                    changed_alerts.add(int(notify.payload))
+            elif notify.channel == 'topology_changed':
+                topology.invalidate_graph_cache()
+            else:
+                new_events = True
+
+        if changed_alerts:
+            self._logger.debug("got notification of %d changed alerts",
+                               len(changed_alerts))
+            self._refresh_unresolved(changed_alerts)
+        if new_events:
+            self._logger.debug("got event notification from database")
+            self._schedule_next_queuecheck()
+
+    @staticmethod
+    @swallow_unhandled_exceptions
+    @transaction.atomic()
+    def _refresh_unresolved(alert_ids):
+        unresolved.refresh(alert_ids)
+
     def start(self):
         "Starts the event engine"
         self._logger.info("--- starting event engine ---")
         self._listen()
+        unresolved.update()
         self._load_new_events_and_reschedule()
         self._scheduler.run()
 
@@ -139,6 +175,8 @@ class EventEngine(object):
         _logger.debug("registering event listener with PostgreSQL")
         cursor = connection.cursor()
         cursor.execute('LISTEN new_event')
+        cursor.execute('LISTEN alerthist_changed')
+        cursor.execute('LISTEN topology_changed')
 
     def _load_new_events_and_reschedule(self):
         self.load_new_events()
@@ -165,14 +203,18 @@ class EventEngine(object):
                           if event.id not in self._unfinished]
             self._logger.info("found %d new and %d old events in queue db",
                               len(new_events), len(old_events))
+            if new_events:
+                unresolved.update_if_stale(self.UNRESOLVED_RESYNC_INTERVAL)
             for event in new_events:
-                unresolved.update()
                 try:
                     self.handle_event(event)
                 except Exception:
                     self._logger.exception("Unhandled exception while "
                                            "handling %s, deleting event",
                                            event)
+                    # alert changes noted by the handler may have been
+                    # rolled back
+                    unresolved.update()
                     if event.id:
                         event.delete()
 
@@ -14,9 +14,11 @@
 # along with NAV. If not, see <http://www.gnu.org/licenses/>.
 #
 """"Superclass for plugins that use delayed handling of state events"""
+import time
+
 from nav.eventengine import unresolved
 
-from nav.eventengine.topology import netbox_appears_reachable
+from nav.eventengine.topology import get_reachability
 from nav.models.manage import Netbox
 from nav.eventengine.plugin import EventHandler
 
@@ -33,6 +35,12 @@ class DelayedStateHandler(EventHandler):
     handled_types = (None,)
     __waiting_for_resolve = {}
 
+    # Reachability of netboxes is evaluated in batches, and the results are
+    # kept around for this many seconds
+    REACHABILITY_MAX_AGE = 5
+    __reachability = {}
+    __reachability_timestamp = 0
+
     def __init__(self, *args, **kwargs):
         super(DelayedStateHandler, self).__init__(*args, **kwargs)
         self.task = None
@@ -205,11 +213,37 @@ class DelayedStateHandler(EventHandler):
 
     def _verify_shadow(self):
         netbox = self.event.netbox
-        netbox.up = (Netbox.UP_DOWN if netbox_appears_reachable(netbox)
+        netbox.up = (Netbox.UP_DOWN if self._appears_reachable(netbox)
                      else Netbox.UP_SHADOW)
         Netbox.objects.filter(id=netbox.id).update(up=netbox.up)
         return netbox.up == Netbox.UP_SHADOW
 
+    @classmethod
+    def _appears_reachable(cls, netbox):
+        """Returns True if netbox appears to be reachable through the known
+        topology.
+
+        To avoid evaluating the same topology over and over when many boxes
+        go down at once, the reachability of every netbox that is currently
+        waiting for resolution is evaluated along with netbox, and the results
+        are reused for up to REACHABILITY_MAX_AGE seconds.
+
+        """
+        now = time.time()
+        age = now - DelayedStateHandler.__reachability_timestamp
+        if (age >= cls.REACHABILITY_MAX_AGE
+                or netbox.id not in DelayedStateHandler.__reachability):
+            candidates = dict((plugin.event.netbox.id, plugin.event.netbox)
+                              for plugin in cls.__waiting_for_resolve.values()
+                              if plugin.event.netbox)
+            candidates[netbox.id] = netbox
+            result = get_reachability(candidates.values())
+            DelayedStateHandler.__reachability = dict(
+                (box.id, reachable) for box, reachable in result.items())
+            DelayedStateHandler.__reachability_timestamp = now
+
+        return DelayedStateHandler.__reachability[netbox.id]
+
     def schedule(self, delay, action, args=()):
         "Schedules a callback and makes a note of it in a class variable"
         self.task = self.engine.schedule(delay, action, args=args)
@@ -14,8 +14,10 @@
 # along with NAV. If not, see <http://www.gnu.org/licenses/>.
 #
 """Topology evaluation functions for event processing"""
+from collections import deque
 import socket
 import datetime
+import time
 
 import networkx
 from networkx.exception import NetworkXException
@@ -25,54 +27,173 @@ import logging
 _logger = logging.getLogger(__name__)
 
 
+# Maximum number of seconds to keep a cached VLAN topology graph
+GRAPH_CACHE_MAX_AGE = 300
+
+
 def netbox_appears_reachable(netbox):
     """Returns True if netbox appears to be reachable through the known
     topology.
 
     """
-    target_path = get_path_to_netbox(netbox)
-    nav = NAVServer.make_for(netbox.ip)
-    nav_path = get_path_to_netbox(nav) if nav else True
-    _logger.debug("reachability paths, target_path=%(target_path)r, "
-                  "nav_path=%(nav_path)r", locals())
-    return bool(target_path and nav_path)
+    return get_reachability([netbox])[netbox]
 
 
-def get_path_to_netbox(netbox):
-    """Returns a likely path from netbox to its apparent gateway/router.
+def get_reachability(netboxes):
+    """Evaluates whether each of a set of netboxes appears to be reachable
+    through the known topology.
 
-    If any switches on the path, or the router itself is down,
-    no current path exists and a False value is returned. However,
-    if there is insufficient information for NAV to find a likely path,
-    a True value is returned.
+    Netboxes are grouped by VLAN and router, and each group is evaluated in
+    a single pass over its (cached) VLAN topology graph, which makes this
+    much cheaper than evaluating netboxes one by one when many boxes are
+    down at the same time.
+
+    :returns: A dict mapping each of netboxes to True or False.
+
+    """
+    netboxes = list(netboxes)
+    # the NAV server will typically use the same source address to reach
+    # most netboxes, so there is no need to evaluate its path more than once
+    source_addresses = dict((netbox, get_source_address_for(netbox.ip))
+                            for netbox in netboxes)
+    nav_servers = dict((addr, NAVServer(addr))
+                       for addr in set(source_addresses.values()) if addr)
+
+    paths = _get_paths_exist(netboxes + list(nav_servers.values()))
+    result = {}
+    for netbox in netboxes:
+        nav = nav_servers.get(source_addresses[netbox])
+        target_path = paths[netbox]
+        nav_path = paths[nav] if nav else True
+        _logger.debug("reachability for %s: target_path=%r, nav_path=%r",
+                      netbox, target_path, nav_path)
+        result[netbox] = bool(target_path and nav_path)
+    return result
+
+
+def _get_paths_exist(targets):
+    """Returns a dict mapping each target to a boolean value indicating
+    whether a path appears to exist between the target and its router.
+
+    See get_path_to_netbox() for details.
+
+    """
+    result = {}
+    groups = {}
+    for target in targets:
+        location = _get_vlan_and_router(target)
+        if location:
+            groups.setdefault(location, []).append(target)
+        else:
+            result[target] = True
+
+    for (vlan, router), members in groups.items():
+        graph = get_graph_for_vlan_from_cache(vlan, extra_nodes=members)
+        result.update(_evaluate_paths(graph, vlan, router, members))
+    return result
+
+
+def _evaluate_paths(graph, vlan, router, targets):
+    """Evaluates paths from each of targets to router in graph using a
+    single traversal of the graph from the router.
+
+    """
+    connected = _find_reachable(graph, router)
+    up_nodes = set(node for node in graph if node.up == node.UP_UP)
+    if router in up_nodes:
+        reachable = _find_reachable(graph, router, allowed=up_nodes)
+    else:
+        reachable = set()
+
+    result = {}
+    for target in targets:
+        if target == router:
+            # a router is always on the path to itself, even when it's down
+            result[target] = True
+        elif target not in connected:
+            _logger.warning("cannot find a path between %s and %s on VLAN %s",
+                            target, router, vlan)
+            result[target] = True
+        elif router not in up_nodes:
+            if router.up == router.UP_UP:
+                _logger.warning("%s topology problem: router %s is up, but "
+                                "not in VLAN graph for %r. Defaulting to "
+                                "'reachable' status.", target, router, vlan)
+                result[target] = True
+            else:
+                _logger.debug("%s not reachable, router is down", target)
+                result[target] = False
+        else:
+            # the target itself may well be down, but will be reachable if
+            # any of its neighbors are
+            result[target] = (target in reachable or
+                              any(neighbor in reachable
+                                  for neighbor in graph[target]))
+    return result
+
+
+def _find_reachable(graph, source, allowed=None):
+    """Returns the set of nodes reachable from source in graph, optionally
+    traversing only the nodes in allowed.
+
+    """
+    if source not in graph:
+        return set()
+    seen = set([source])
+    queue = deque([source])
+    while queue:
+        node = queue.popleft()
+        for neighbor in graph[node]:
+            if neighbor not in seen and (allowed is None or
+                                         neighbor in allowed):
+                seen.add(neighbor)
+                queue.append(neighbor)
+    return seen
+
+
+def _get_vlan_and_router(netbox):
+    """Returns a (vlan, router) tuple for netbox, or None if not enough
+    topology information is available.
 
     """
     prefix = netbox.get_prefix()
     if not prefix:
         _logger.warning("couldn't find prefix for %s", netbox)
-        return True
+        return
 
     router_ports = prefix.get_router_ports()
     if router_ports:
         router_port = router_ports[0]
     else:
         _logger.warning("couldn't find router ports for %s", prefix)
-        return True
+        return
 
     router = router_port.interface.netbox
     _logger.debug("reachability check for %s on %s (router: %s)",
                   netbox, prefix, router)
+    return prefix.vlan, router
 
-    graph = get_graph_for_vlan(prefix.vlan)
-    try:
-        netbox.add_to_graph(graph)
-    except AttributeError:
-        pass
+
+def get_path_to_netbox(netbox):
+    """Returns a likely path from netbox to its apparent gateway/router.
+
+    If any switches on the path, or the router itself is down,
+    no current path exists and a False value is returned. However,
+    if there is insufficient information for NAV to find a likely path,
+    a True value is returned.
+
+    """
+    location = _get_vlan_and_router(netbox)
+    if not location:
+        return True
+    vlan, router = location
+
+    graph = get_graph_for_vlan_from_cache(vlan, extra_nodes=[netbox])
 
     # first, see if any path exists
     if not _path_exists(graph, netbox, router):
         _logger.warning("cannot find a path between %s and %s on VLAN %s",
-                        netbox, router, prefix.vlan)
+                        netbox, router, vlan)
         return True
 
     # now, remove nodes that are down and see if a path still exists
@@ -81,7 +202,7 @@ def get_path_to_netbox(netbox):
     if netbox not in graph or router not in graph:
         if router.up == router.UP_UP:
             _logger.warning("%(netbox)s topology problem: router %(router)s "
-                            "is up, but not in VLAN graph for %(prefix)r. "
+                            "is up, but not in VLAN graph for %(vlan)r. "
                             "Defaulting to 'reachable' status.", locals())
             return True
         _logger.debug("%s not reachable, router or box not in graph: %r",
@@ -107,6 +228,78 @@ def _path_exists(graph, source, target):
     return bool(path)
 
 
+class VlanGraphCache(object):
+    """A cache of VLAN topology graphs, as built by get_graph_for_vlan().
+
+    Cached graphs are considered read-only; use get_graph_for_vlan_from_cache()
+    to get a working copy with current netbox states.
+
+    """
+    def __init__(self, max_age=GRAPH_CACHE_MAX_AGE):
+        self.max_age = max_age
+        self._graphs = {}
+
+    def get(self, vlan):
+        """Returns the topology graph of vlan, building it if necessary"""
+        now = time.time()
+        cached = self._graphs.get(vlan.id)
+        if cached and now - cached[0] < self.max_age:
+            return cached[1]
+
+        graph = get_graph_for_vlan(vlan)
+        self._graphs[vlan.id] = (now, graph)
+        return graph
+
+    def invalidate(self, vlan=None):
+        """Invalidates the cached graph of vlan, or all cached graphs if vlan
+        is None.
+
+        """
+        if vlan is None:
+            self._graphs.clear()
+        else:
+            self._graphs.pop(vlan.id, None)
+
+
+_graph_cache = VlanGraphCache()
+
+
+def invalidate_graph_cache(vlan=None):
+    """Invalidates cached topology graphs, e.g. after topology changes"""
+    _graph_cache.invalidate(vlan)
+
+
+def get_graph_for_vlan_from_cache(vlan, extra_nodes=()):
+    """Returns a working copy of the cached topology graph of vlan.
+
+    The up states of all the netboxes in the graph are refreshed from the
+    database, and nodes in extra_nodes that know how to add themselves to
+    the graph (such as NAVServer objects) are added.
+
+    """
+    graph = _graph_cache.get(vlan)
+    # subgraph copies the structure, but not the edge data
+    graph = graph.subgraph(graph.nodes())
+    for node in extra_nodes:
+        try:
+            node.add_to_graph(graph)
+        except AttributeError:
+            pass
+    _refresh_up_states(graph)
+    return graph
+
+
+def _refresh_up_states(graph):
+    netboxes = dict((node.id, node) for node in graph
+                    if isinstance(node, Netbox))
+    if not netboxes:
+        return
+    states = Netbox.objects.filter(id__in=netboxes.keys()).values_list(
+        'id', 'up')
+    for netboxid, up in states:
+        netboxes[netboxid].up = up
+
+
 def get_graph_for_vlan(vlan):
     """Builds a simple topology graph of the active netboxes in vlan.
 
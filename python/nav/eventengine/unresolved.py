@@ -13,7 +13,14 @@
 # details.  You should have received a copy of the GNU General Public License
 # along with NAV. If not, see <http://www.gnu.org/licenses/>.
 #
-"""Loading and caching of unresolved alert states from the database"""
+"""Loading and caching of unresolved alert states from the database.
+
+The cache is loaded in full once, and is then patched incrementally as alert
+states are opened and closed, either by the eventengine itself (see note()),
+or by others, as signalled by PostgreSQL notifications (see refresh()).
+
+"""
+import time
 
 from nav.models.event import AlertHistory
 from nav.models.fields import INFINITY
@@ -21,6 +28,7 @@ import logging
 
 _logger = logging.getLogger(__name__)
 _unresolved_alerts_map = {}
+_last_update = 0
 
 
 def get_map():
@@ -32,10 +40,63 @@ def update():
     """Updates the map of unresolved alerts from the database"""
     # yes mr. pylint, we use global state, this module acts as a singleton
     # pylint: disable=W0603
-    global _unresolved_alerts_map
+    global _unresolved_alerts_map, _last_update
     unresolved = AlertHistory.objects.filter(end_time__gte=INFINITY)
     _unresolved_alerts_map = dict((alert.get_key(), alert)
                                   for alert in unresolved)
+    _last_update = time.time()
+    _logger.debug("loaded %d unresolved alerts from database",
+                  len(_unresolved_alerts_map))
+
+
+def update_if_stale(max_age):
+    """Updates the map of unresolved alerts from the database if it hasn't
+    been fully loaded in the last max_age seconds.
+
+    :returns: True if the map was reloaded.
+
+    """
+    if time.time() - _last_update >= max_age:
+        update()
+        return True
+    return False
+
+
+def note(alert):
+    """Patches the map of unresolved alerts with the current state of alert.
+
+    :param alert: An AlertHistory object that was just created or updated.
+
+    """
+    key = alert.get_key()
+    if alert.is_open():
+        _unresolved_alerts_map[key] = alert
+    else:
+        existing = _unresolved_alerts_map.get(key)
+        if existing is not None and existing.id == alert.id:
+            del _unresolved_alerts_map[key]
+
+
+def refresh(alert_ids):
+    """Patches the map of unresolved alerts with the current database state
+    of a set of alert history entries.
+
+    :param alert_ids: A list of AlertHistory primary keys.
+
+    """
+    alert_ids = set(alert_ids)
+    if not alert_ids:
+        return
+
+    # Forget the current state of these alerts before reapplying whatever the
+    # database says, since their identifying keys may also have changed
+    stale = [key for key, alert in _unresolved_alerts_map.items()
+             if alert.id in alert_ids]
+    for key in stale:
+        del _unresolved_alerts_map[key]
+
+    for alert in AlertHistory.objects.filter(id__in=alert_ids):
+        note(alert)
 
 
 def refers_to_unresolved_alert(event):
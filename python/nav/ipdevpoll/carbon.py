@@ -0,0 +1,208 @@
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Twisted-native metric emitter for ipdevpoll.
+
+Metrics are queued in memory and written to Carbon from the reactor using
+non-blocking Twisted transports, so that stat plugins never block the reactor
+thread while sending metrics.  When carbon cannot keep up with a TCP stream,
+metrics stay in the queue until the transport's write buffer has drained.
+
+"""
+from collections import deque
+import logging
+import socket
+
+from twisted.internet import reactor, protocol
+from twisted.internet.task import LoopingCall
+from twisted.python import threadable
+
+from nav.metrics import carbon
+from nav.metrics.emitter import BaseMetricEmitter
+
+_logger = logging.getLogger(__name__)
+
+
+class TwistedMetricEmitter(BaseMetricEmitter):
+    """A metric emitter that sends metrics from the Twisted reactor"""
+
+    def __init__(self, *args, **kwargs):
+        super(TwistedMetricEmitter, self).__init__(*args, **kwargs)
+        self._queue = deque()
+        self._flush_pending = False
+        self._sender = None
+        self.loop = LoopingCall(self.flush)
+
+    def start(self):
+        """Sets up the carbon connection and starts the flush timer"""
+        if self._sender is None:
+            if self.protocol == 'udp':
+                self._sender = _UDPSender(self.host, self.port)
+            else:
+                self._sender = _StreamSender(self.host, self.port,
+                                             self.protocol,
+                                             on_writable=self.flush)
+        if not self.loop.running:
+            self.loop.start(self.flush_interval, now=False)
+
+    def stop(self):
+        """Stops the flush timer and makes a last attempt at sending any
+        queued metrics.
+
+        """
+        if self.loop.running:
+            self.loop.stop()
+        self.flush()
+
+    def emit(self, metric_tuples):
+        if not threadable.isInIOThread():
+            reactor.callFromThread(self.emit, list(metric_tuples))
+            return
+
+        dropped = 0
+        for metric in metric_tuples:
+            if len(self._queue) < self.queue_size:
+                self._queue.append(metric)
+            else:
+                dropped += 1
+        if dropped:
+            self._count_dropped(dropped)
+
+        if len(self._queue) >= self.batch_size and not self._flush_pending:
+            self._flush_pending = True
+            reactor.callLater(0, self.flush)
+
+    def flush(self):
+        """Writes all queued metrics to carbon, batch by batch.
+
+        Metrics that cannot be written because the carbon connection is
+        currently down, or because its write buffer is full, are kept in the
+        queue for the next flush.
+
+        """
+        self._flush_pending = False
+        if self._sender is None:
+            return
+        while self._queue:
+            count = min(self.batch_size, len(self._queue))
+            batch = [self._queue.popleft() for _ in range(count)]
+            if not self._sender.send(batch):
+                self._queue.extendleft(reversed(batch))
+                break
+            self.sent += count
+
+
+class _UDPSender(protocol.DatagramProtocol):
+    """Writes line protocol datagrams to a carbon UDP receiver"""
+
+    def __init__(self, host, port):
+        family, _, _, _, address = socket.getaddrinfo(
+            host, port, 0, socket.SOCK_DGRAM)[0]
+        self.address = address[:2]
+        interface = '::' if family == socket.AF_INET6 else ''
+        self.listening_port = reactor.listenUDP(0, self,
+                                                interface=interface)
+
+    def send(self, metric_tuples):
+        for packet in carbon.metrics_to_packets(metric_tuples):
+            try:
+                self.transport.write(packet, self.address)
+            except socket.error as error:
+                # pylint: disable=W0212
+                carbon._handle_error(error, *self.address)
+        return True
+
+
+class _CarbonClient(protocol.Protocol):
+    """A carbon TCP connection that keeps track of whether its transport's
+    write buffer is full, by registering itself as a streaming producer.
+
+    """
+    paused = False
+
+    def connectionMade(self):
+        self.transport.registerProducer(self, True)
+        self.factory.writable()
+
+    def pauseProducing(self):
+        self.paused = True
+
+    def resumeProducing(self):
+        self.paused = False
+        self.factory.writable()
+
+    def stopProducing(self):
+        self.paused = True
+
+
+class _StreamSender(protocol.ReconnectingClientFactory):
+    """Writes line or pickle protocol data to a carbon TCP receiver,
+    reconnecting whenever the connection is lost.
+
+    :param on_writable: A function to call whenever the connection is ready
+                        to accept more data after having been unavailable.
+    """
+    maxDelay = 60
+
+    def __init__(self, host, port, carbon_protocol, on_writable=None):
+        self.host = host
+        self.port = port
+        if carbon_protocol == 'pickle':
+            self.encode = carbon.metrics_to_pickles
+        else:
+            self.encode = carbon.metrics_to_stream
+        self.on_writable = on_writable
+        self.client = None
+        reactor.connectTCP(host, port, self,
+                           timeout=carbon.CONNECT_TIMEOUT)
+
+    def buildProtocol(self, addr):
+        _logger.debug("connected to carbon at %s", addr)
+        self.resetDelay()
+        self.client = _CarbonClient()
+        self.client.factory = self
+        return self.client
+
+    def writable(self):
+        """Called by the client when it's ready to accept more data"""
+        if self.on_writable:
+            self.on_writable()
+
+    def clientConnectionLost(self, connector, reason):
+        self.client = None
+        # pylint: disable=W0212
+        carbon._handle_error(reason.getErrorMessage(), self.host, self.port)
+        protocol.ReconnectingClientFactory.clientConnectionLost(
+            self, connector, reason)
+
+    def clientConnectionFailed(self, connector, reason):
+        self.client = None
+        # pylint: disable=W0212
+        carbon._handle_error(reason.getErrorMessage(), self.host, self.port)
+        protocol.ReconnectingClientFactory.clientConnectionFailed(
+            self, connector, reason)
+
+    def send(self, metric_tuples):
+        """Writes metric_tuples to the carbon connection.
+
+        :returns: False if the metrics weren't written because there is no
+                  connection, or because its write buffer is full.
+        """
+        if (self.client is None or self.client.transport is None
+                or self.client.paused):
+            return False
+        for payload in self.encode(metric_tuples):
+            self.client.transport.write(payload)
+        return True
@@ -36,6 +36,10 @@ max_concurrent_jobs = 500
 [snmp]
 timeout = 1.5
 max-repetitions = 10
+max-repetitions-limit = 50
+max-concurrent-requests = 500
+max-concurrent-requests-per-device = 4
+session-idle-timeout = 30
 
 [plugins]
 
@@ -27,11 +27,13 @@ import os
 import logging
 from multiprocessing import cpu_count
 import signal
+import socket
 import time
 import argparse
 
 from twisted.internet import reactor
 from twisted.internet.defer import maybeDeferred, setDebugging
+from twisted.internet.task import LoopingCall
 from twisted.python.failure import Failure
 
 from nav import buildconf
@@ -40,8 +42,11 @@ import nav.daemon
 from nav.daemon import signame
 import nav.logs
 from nav.models import manage
+from nav.metrics.carbon import install_emitter, send_metrics
+from nav.metrics.templates import metric_prefix_for_ipdevpoll_process
 
 from nav.ipdevpoll import ContextFormatter, schedule, db
+from nav.ipdevpoll.carbon import TwistedMetricEmitter
 from . import plugins, pool
 
 
@@ -83,6 +88,7 @@ class IPDevPollProcess(object):
     def run(self):
         """Loads plugins, and initiates polling schedules."""
         reactor.callWhenRunning(self.install_sighandlers)
+        self.setup_metrics_emitter()
 
         if self.options.netbox:
             self.setup_single_job()
@@ -91,8 +97,10 @@ class IPDevPollProcess(object):
                                     self.options.max_jobs)
         elif self.options.worker:
             self.setup_worker()
+            self.setup_snmp_metrics()
         else:
             self.setup_scheduling()
+            self.setup_snmp_metrics()
 
         reactor.suggestThreadPoolSize(self.options.threadpoolsize)
         reactor.addSystemEventTrigger("after", "shutdown", self.shutdown)
@@ -107,6 +115,36 @@ class IPDevPollProcess(object):
         signal.signal(signal.SIGUSR1, self.sigusr1_handler)
         signal.signal(signal.SIGUSR2, self.sigusr2_handler)
 
+    def setup_metrics_emitter(self):
+        "Sets up background queueing and sending of metrics to carbon"
+        emitter = TwistedMetricEmitter.from_config()
+        install_emitter(emitter)
+        reactor.callWhenRunning(emitter.start)
+        reactor.addSystemEventTrigger("before", "shutdown", emitter.stop)
+
+    def setup_snmp_metrics(self, interval=60):
+        "Sets up regular sending of SNMP request scheduling metrics"
+        if self.options.worker:
+            process = "worker%d" % self.options.worker_slot
+        else:
+            process = "main"
+        prefix = metric_prefix_for_ipdevpoll_process(socket.gethostname(),
+                                                     process) + ".snmp"
+        self.snmp_metrics_loop = LoopingCall(self._send_snmp_metrics, prefix)
+        reactor.callWhenRunning(self.snmp_metrics_loop.start, interval,
+                                now=False)
+
+    @staticmethod
+    def _send_snmp_metrics(prefix):
+        from .snmp.scheduler import get_scheduler
+        from .snmp.sessions import get_session_pool
+
+        stats = get_scheduler().collect_stats()
+        stats['sessions'] = len(get_session_pool())
+        timestamp = time.time()
+        send_metrics([("%s.%s" % (prefix, name), (timestamp, value))
+                      for name, value in sorted(stats.items())])
+
     def setup_scheduling(self):
         "Sets up regular job scheduling according to config"
         # NOTE: This is locally imported because it will in turn import
@@ -306,6 +344,8 @@ class CommandProcessor(object):
                  "connections, to use")
         opt("--worker", action="store_true",
             help="Used internally when lauching worker processes")
+        opt("--worker-slot", type=int, default=0, dest="worker_slot",
+            help=argparse.SUPPRESS)
         return parser
 
     def run(self):
@@ -33,6 +33,7 @@ interfering with the daemon's asynchronous operations.
 
 """
 from collections import defaultdict
+from datetime import timedelta
 
 from nav.models import manage, event
 from nav import ipdevpoll
@@ -62,12 +63,23 @@ class NetboxLoader(dict):
     netboxes.  The dictionary keys are netbox table primary keys, the
     values are shadows.Netbox objects.
 
+    After the first load, only the netboxes that have been recorded as
+    changed in the netbox_change table since the previous load are reloaded.
+    Since a change may be committed some time after it was recorded, changes
+    are looked up from CHANGE_MARGIN before the previous load, and all
+    netboxes are reloaded every FULL_RELOAD_INTERVAL.
+
     """
+    CHANGE_MARGIN = timedelta(minutes=10)
+    FULL_RELOAD_INTERVAL = timedelta(hours=1)
+
     _logger = ipdevpoll.ContextLogger()
 
     def __init__(self):
         super(NetboxLoader, self).__init__()
         self.peak_count = 0
+        self._last_load = None
+        self._last_full_load = None
         # touch _logger to initialize logging context right away
         # pylint: disable=W0104
         self._logger
@@ -89,26 +101,27 @@ class NetboxLoader(dict):
             changed in the database since the last load operation.
 
         """
-        related = ('room__location', 'type__vendor',
-                   'category', 'organization', 'device')
         snmp_down = set(event.AlertHistory.objects.unresolved(
             'snmpAgentState').values_list('netbox__id', flat=True))
         self._logger.debug("These netboxes have active snmpAgentStates: %r",
                            snmp_down)
-        queryset = manage.Netbox.objects.filter(deleted_at__isnull=True)
-        queryset = list(queryset.select_related(*related))
-        for netbox in queryset:
-            netbox.snmp_up = netbox.id not in snmp_down
-        netbox_list = storage.shadowify_queryset(queryset)
-        netbox_dict = dict((netbox.id, netbox) for netbox in netbox_list)
-
-        times = load_last_updated_times()
-        for netbox in netbox_list:
-            netbox.last_updated = times.get(netbox.id, {})
 
+        load_time = get_database_time()
+        if self._is_full_load_due(load_time):
+            candidate_ids = None
+        else:
+            candidate_ids = load_changed_netbox_ids(
+                self._last_load - self.CHANGE_MARGIN)
+            candidate_ids.update(
+                netbox.id for netbox in self.values()
+                if netbox.snmp_up == (netbox.id in snmp_down))
+
+        netbox_dict = self._load_netboxes(candidate_ids, snmp_down)
         django_debug_cleanup()
 
         previous_ids = set(self.keys())
+        if candidate_ids is not None:
+            previous_ids.intersection_update(candidate_ids)
         current_ids = set(netbox_dict.keys())
         lost_ids = previous_ids.difference(current_ids)
         new_ids = current_ids.difference(previous_ids)
@@ -126,18 +139,57 @@ class NetboxLoader(dict):
             self[i].copy(netbox_dict[i])
 
         self.peak_count = max(self.peak_count, len(self))
+        self._last_load = load_time
+        if candidate_ids is None:
+            self._last_full_load = load_time
 
         anything_changed = len(new_ids) or len(lost_ids) or len(changed_ids)
         log = self._logger.info if anything_changed else self._logger.debug
 
-        log("Loaded %d netboxes from database "
+        log("Loaded %d netboxes from database in a %s load "
             "(%d new, %d removed, %d changed, %d peak)",
-            len(netbox_dict), len(new_ids), len(lost_ids), len(changed_ids),
+            len(netbox_dict),
+            "full" if candidate_ids is None else "incremental",
+            len(new_ids), len(lost_ids), len(changed_ids),
             self.peak_count
             )
 
         return (new_ids, lost_ids, changed_ids)
 
+    def _is_full_load_due(self, load_time):
+        return (self._last_full_load is None or
+                load_time - self._last_full_load >= self.FULL_RELOAD_INTERVAL)
+
+    @staticmethod
+    def _load_netboxes(netbox_ids, snmp_down):
+        """Loads netboxes as shadow objects.
+
+        :param netbox_ids: The ids of the netboxes to load, or None to load
+                           all netboxes.
+        :param snmp_down: A set of ids of netboxes whose SNMP agents are
+                          down.
+        :returns: A dict of shadow netboxes, keyed by netbox ids.
+
+        """
+        if netbox_ids is not None and not netbox_ids:
+            return {}
+
+        related = ('room__location', 'type__vendor',
+                   'category', 'organization', 'device')
+        queryset = manage.Netbox.objects.filter(deleted_at__isnull=True)
+        if netbox_ids is not None:
+            queryset = queryset.filter(id__in=netbox_ids)
+        queryset = list(queryset.select_related(*related))
+        for netbox in queryset:
+            netbox.snmp_up = netbox.id not in snmp_down
+        netbox_list = storage.shadowify_queryset(queryset)
+
+        times = load_last_updated_times(netbox_ids)
+        for netbox in netbox_list:
+            netbox.last_updated = times.get(netbox.id, {})
+
+        return dict((netbox.id, netbox) for netbox in netbox_list)
+
     def load_all(self):
         """Asynchronously load netboxes from database."""
         return run_in_thread(self.load_all_s)
@@ -170,21 +222,47 @@ def is_netbox_changed(netbox1, netbox2):
     return False
 
 
-def load_last_updated_times():
-    """Loads the last-successful timestamps of each job of each netbox"""
+def load_last_updated_times(netbox_ids=None):
+    """Loads the last-successful timestamps of each job of each netbox
+
+    :param netbox_ids: An optional collection of netbox ids to limit the
+                       results to.
+
+    """
     sql = """SELECT
                netboxid,
                job_name,
-               MAX(end_time) AS end_time
+               end_time
              FROM
-               ipdevpoll_job_log
-             WHERE
-               success
-             GROUP BY netboxid, job_name
+               ipdevpoll_job_last_success
              """
+    args = []
+    if netbox_ids is not None:
+        sql += "WHERE netboxid = ANY(%s)"
+        args.append(list(netbox_ids))
     cursor = django.db.connection.cursor()
-    cursor.execute(sql)
+    cursor.execute(sql, args)
     times = defaultdict(dict)
     for netboxid, job_name, end_time in cursor.fetchall():
         times[netboxid][job_name] = end_time
     return dict(times)
+
+
+def load_changed_netbox_ids(since):
+    """Loads the ids of netboxes that have changed in the database.
+
+    :param since: A timestamp, in database time, to look for changes from.
+    :returns: A set of netbox ids. Deleted netboxes are included.
+
+    """
+    cursor = django.db.connection.cursor()
+    cursor.execute("SELECT netboxid FROM netbox_change WHERE changed_at >= %s",
+                   [since])
+    return set(netboxid for netboxid, in cursor.fetchall())
+
+
+def get_database_time():
+    """Returns the current time of the database server"""
+    cursor = django.db.connection.cursor()
+    cursor.execute("SELECT LOCALTIMESTAMP")
+    return cursor.fetchone()[0]
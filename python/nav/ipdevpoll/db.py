@@ -142,3 +142,40 @@ def purge_old_job_log_entries():
         DELETE FROM ipdevpoll_job_log USING ranked
               WHERE ipdevpoll_job_log.id = ranked.id AND rank > 100;
         """)
+
+
+BULK_BATCH_SIZE = 1000
+
+
+def bulk_update_from_values(table, key, columns, rows,
+                            batch_size=BULK_BATCH_SIZE):
+    """Updates many rows of a table, with individual values for each row,
+    using a single UPDATE ... FROM (VALUES ...) statement per batch of rows.
+
+    :param table: The name of the table to update.
+    :param key: A (column name, SQL type) tuple identifying the primary key
+                column of table.
+    :param columns: A list of (column name, SQL type) tuples of the columns
+                    to update.
+    :param rows: A sequence of tuples of a primary key value followed by one
+                 value for each of the updated columns.
+    :param batch_size: The maximum number of rows to update per statement.
+
+    """
+    key_column, _ = key
+    names = [key_column] + [name for name, _ in columns]
+    row_template = "(%s)" % ", ".join("%%s::%s" % sqltype
+                                      for _, sqltype in [key] + columns)
+    assignments = ", ".join("{0} = v.{0}".format(name)
+                            for name, _ in columns)
+
+    cursor = django.db.connection.cursor()
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        sql = "UPDATE {table} AS t SET {assignments} " \
+              "FROM (VALUES {values}) AS v ({names}) " \
+              "WHERE t.{key} = v.{key}".format(
+                  table=table, assignments=assignments,
+                  values=", ".join([row_template] * len(batch)),
+                  names=", ".join(names), key=key_column)
+        cursor.execute(sql, [value for row in batch for value in row])
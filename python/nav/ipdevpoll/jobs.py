@@ -20,14 +20,14 @@ import pprint
 import logging
 import threading
 import gc
-from itertools import cycle
 
 from twisted.internet import defer, reactor
 from twisted.internet.error import TimeoutError
 
 from nav.ipdevpoll import ContextLogger
-from nav.ipdevpoll.snmp import snmpprotocol, AgentProxy
+from nav.ipdevpoll.snmp import AgentProxy
 from nav.ipdevpoll.snmp.common import SnmpError
+from nav.ipdevpoll.snmp.sessions import get_session_pool
 from nav.metrics.carbon import send_metrics
 from nav.metrics.templates import metric_prefix_for_ipdevpoll_job
 from nav.models import manage
@@ -39,7 +39,6 @@ from .utils import log_unhandled_failure
 from .snmp.common import snmp_parameter_factory
 
 _logger = logging.getLogger(__name__)
-ports = cycle([snmpprotocol.port() for i in range(50)])
 
 
 class AbortedJobError(Exception):
@@ -102,19 +101,16 @@ class JobHandler(object):
             self.agent = None
             return
 
-        port = next(ports)
-        self.agent = AgentProxy(
-            self.netbox.ip, 161,
-            community=self.netbox.read_only,
-            snmpVersion='v%s' % self.netbox.snmp_version,
-            protocol=port.protocol,
-            snmp_parameters=snmp_parameter_factory(self.netbox)
-        )
         try:
-            self.agent.open()
+            self.agent = get_session_pool().acquire(
+                self.netbox.ip,
+                self.netbox.read_only,
+                self.netbox.snmp_version,
+                snmp_parameter_factory(self.netbox)
+            )
         except SnmpError as error:
-            self.agent.close()
-            session_count = self.agent.count_open_sessions()
+            self.agent = None
+            session_count = AgentProxy.count_open_sessions()
             job_count = self.get_instance_count()
             self._logger.error(
                 "%s (%d currently open SNMP sessions, %d job handlers)",
@@ -126,7 +122,7 @@ class JobHandler(object):
 
     def _destroy_agentproxy(self):
         if self.agent:
-            self.agent.close()
+            get_session_pool().release(self.agent)
         self.agent = None
 
     @defer.inlineCallbacks
@@ -35,7 +35,6 @@ the name for historical reasons.
 
 """
 
-import operator
 from datetime import datetime, timedelta
 
 from IPy import IP
@@ -46,6 +45,7 @@ from nav.mibs.ipv6_mib import Ipv6Mib
 from nav.mibs.cisco_ietf_ip_mib import CiscoIetfIpMib
 
 from nav.models import manage
+from nav.prefixindex import PrefixIdIndex
 from nav.ipdevpoll import Plugin, db
 from nav.ipdevpoll import storage, shadows
 
@@ -54,7 +54,7 @@ INCOMPLETE_MAC = '00:00:00:00:00:00'
 
 class Arp(Plugin):
     """Collects ARP records for IPv4 devices and NDP cache for IPv6 devices."""
-    prefix_cache = [] # prefix cache, should be sorted by descending mask length
+    prefix_cache = PrefixIdIndex()
     prefix_cache_update_time = datetime.min
     prefix_cache_max_age = timedelta(minutes=5)
 
@@ -152,24 +152,17 @@ class Arp(Plugin):
     @classmethod
     def _update_prefix_cache(cls):
         cls.prefix_cache_update_time = datetime.now()
-        df = db.run_in_thread(cls._load_prefixes_synchronously)
+        df = db.run_in_thread(cls.prefix_cache.get_changes)
         df.addCallback(cls._update_prefix_cache_with_result)
         return df
 
     @classmethod
-    def _load_prefixes_synchronously(cls):
-        return list(manage.Prefix.objects.all().values('id', 'net_address'))
-
-    @classmethod
-    def _update_prefix_cache_with_result(cls, prefixes):
+    def _update_prefix_cache_with_result(cls, changes):
+        removed, added, _load_time = changes
         cls._logger.debug(
-            "Populating prefix cache with %d prefixes", len(prefixes))
-
-        prefixes = [(IP(p['net_address']), p['id']) for p in prefixes]
-        prefixes.sort(key=operator.itemgetter(1), reverse=True)
-
-        del cls.prefix_cache[:]
-        cls.prefix_cache.extend(prefixes)
+            "Updating prefix cache: %d prefixes removed, %d added",
+            len(removed), len(added))
+        cls.prefix_cache.apply_changes(changes)
 
     def _make_new_mappings(self, mappings):
         """Convert a sequence of (ip, mac) tuples into a Arp shadow containers.
@@ -211,15 +204,13 @@ class Arp(Plugin):
             arp.end_time = timestamp
 
     def _find_largest_matching_prefix(self, ip):
-        """Find the largest prefix that ip is part of.
+        """Find the most specific prefix that ip is part of.
 
         Returns:
 
           An integer prefix ID, or None if no matches were found.
         """
-        for prefix_addr, prefix_id in self.prefix_cache:
-            if ip in prefix_addr:
-                return prefix_id
+        return self.prefix_cache.lookup(ip)
 
 
 def ipv6_address_in_mappings(mappings):
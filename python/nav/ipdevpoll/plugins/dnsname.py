@@ -19,18 +19,14 @@ ipdevpoll plugin to perform reverse DNS lookups on netbox IP addresses.
 Will generate events if there are mismatches between device sysname
 and dnsname.
 """
-from itertools import cycle
-
 from IPy import IP
 
 from twisted.internet import defer, error
-from twisted.names import client, dns
 from twisted.names.error import DomainError
 
+from nav import asyncdns
 from nav.ipdevpoll import Plugin, shadows
 
-_resolvers = cycle([client.Resolver('/etc/resolv.conf') for i in range(3)])
-
 
 class DnsName(Plugin):
     """Performs reverse DNS lookup on netbox IP address"""
@@ -43,9 +39,8 @@ class DnsName(Plugin):
     def handle(self):
         ip = IP(self.netbox.ip)
         self._logger.debug("Doing DNS PTR lookup for %s", ip.reverseName())
-        # Use the OS configured DNS resolver method
-        resolver = next(_resolvers)
-        df = resolver.lookupPointer(ip.reverseName())
+        # Use the shared, caching resolver of this process
+        df = asyncdns.get_resolver().reverse(self.netbox.ip)
         df.addCallbacks(self._find_ptr_response, self._handle_failure,
                         errbackArgs=ip)
         df.addCallback(self._log_name).addCallback(self._verify_name_change)
@@ -61,18 +56,15 @@ class DnsName(Plugin):
             self._logger.warning("DNS lookup error for %s: %s",
                                  ip, failure.type.__name__)
 
-    def _find_ptr_response(self, dns_response):
+    def _find_ptr_response(self, names):
         """
-        Finds and returns a PTR record from a DNS response.
+        Finds and returns a name from the list of PTR record names.
 
         If multiple records are found, prefer to keep the existing name,
         if still applicable.
 
         """
-        self._logger.debug("DNS response: %s", dns_response)
-        ptrs = (record for record_set in dns_response for record in record_set
-                if record.type == dns.PTR)
-        names = [str(record.payload.name) for record in ptrs]
+        self._logger.debug("DNS response: %s", names)
 
         if len(names) > 1:
             self._logger.debug("found multiple PTR records: %s", names)
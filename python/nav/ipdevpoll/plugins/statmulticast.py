@@ -23,8 +23,9 @@ from django.utils.six import iteritems
 from twisted.internet import defer
 
 from nav.ipdevpoll import Plugin
-from nav.metrics.carbon import send_metrics
-from nav.metrics.templates import metric_path_for_multicast_usage
+from nav.metrics.carbon import MetricBatch
+from nav.metrics.templates import (metric_path_for_multicast_usage,
+                                   get_metric_path_cache)
 from nav.mibs.statistics_mib import StatisticsMib
 from nav.enterprise.ids import VENDOR_ID_HEWLETT_PACKARD
 
@@ -52,9 +53,8 @@ class StatMulticast(Plugin):
         if result:
             counts = self._count_ports_by_group(result)
             self._logger.debug("%r", counts)
-            metrics = self._make_metrics_from_counts(counts, timestamp)
-            if metrics:
-                send_metrics(metrics)
+            batch = self._make_metrics_from_counts(counts, timestamp)
+            batch.send()
 
     @staticmethod
     def _count_ports_by_group(report):
@@ -68,7 +68,12 @@ class StatMulticast(Plugin):
         return counter
 
     def _make_metrics_from_counts(self, count_report, timestamp=None):
-        timestamp = timestamp or time.time()
-        return [(metric_path_for_multicast_usage(group, self.netbox),
-                 (timestamp, count))
-                for group, count in iteritems(count_report)]
+        batch = MetricBatch(timestamp)
+        sysname = self.netbox.sysname
+        paths = get_metric_path_cache(sysname, 'statmulticast')
+        for group, count in iteritems(count_report):
+            batch.add(paths.get(metric_path_for_multicast_usage, group,
+                                sysname),
+                      count)
+        paths.sweep()
+        return batch
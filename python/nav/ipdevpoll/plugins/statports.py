@@ -21,8 +21,9 @@ from django.utils.six import itervalues
 from twisted.internet import defer
 from nav.ipdevpoll import Plugin
 from nav.ipdevpoll import db
-from nav.metrics.carbon import send_metrics
-from nav.metrics.templates import metric_path_for_interface
+from nav.metrics.carbon import MetricBatch
+from nav.metrics.templates import (metric_path_for_interface,
+                                   get_metric_path_cache)
 from nav.mibs import reduce_index
 from nav.mibs.if_mib import IfMib
 from nav.mibs.ip_mib import IpMib
@@ -83,11 +84,11 @@ class StatPorts(Plugin):
         timestamp = time.time()
         stats = yield self._get_stats()
         netboxes = yield db.run_in_thread(self._get_netbox_list)
-        tuples = list(self._make_metrics(stats, netboxes=netboxes,
-                                         timestamp=timestamp))
-        if tuples:
+        batch = self._make_metrics(stats, netboxes=netboxes,
+                                   timestamp=timestamp)
+        if batch:
             self._logger.debug("Counters collected")
-            send_metrics(tuples)
+            batch.send()
 
     @defer.inlineCallbacks
     def _get_stats(self):
@@ -107,27 +108,36 @@ class StatPorts(Plugin):
         defer.returnValue(stats)
 
     def _make_metrics(self, stats, netboxes, timestamp=None):
-        timestamp = timestamp or time.time()
+        """Returns a MetricBatch of the counter values in stats, duplicated
+        for all the netboxes.
+
+        """
+        batch = MetricBatch(timestamp)
+        caches = [(netbox, get_metric_path_cache(netbox, 'statports'))
+                  for netbox in netboxes]
         hc_counters = False
 
         for row in itervalues(stats):
             hc_counters = use_hc_counters(row) or hc_counters
+            ifname = row['ifName'] or row['ifDescr']
             for key in LOGGED_COUNTERS:
-                if key not in row:
-                    continue
-                value = row[key]
+                value = row.get(key)
                 if value is not None:
-                    for netbox in netboxes:
-                        # duplicate metrics for all involved netboxes
-                        path = metric_path_for_interface(
-                            netbox, row['ifName'] or row['ifDescr'], key)
-                        yield (path, (timestamp, value))
+                    # duplicate metrics for all involved netboxes
+                    for netbox, paths in caches:
+                        batch.add(paths.get(metric_path_for_interface,
+                                            netbox, ifname, key),
+                                  value)
+
+        for _netbox, paths in caches:
+            paths.sweep()
 
         if stats:
             if hc_counters:
                 self._logger.debug("High Capacity counters used")
             else:
                 self._logger.debug("High Capacity counters NOT used")
+        return batch
 
     @defer.inlineCallbacks
     def _log_instance_details(self):
@@ -23,8 +23,8 @@ from django.utils.six import iteritems
 from nav.ipdevpoll import Plugin
 from nav.ipdevpoll import db
 from nav.ipdevpoll.db import run_in_thread
-from nav.metrics.carbon import send_metrics
-from nav.metrics.templates import metric_path_for_sensor
+from nav.metrics.carbon import MetricBatch, send_metrics
+from nav.metrics.templates import metric_path_for_sensor, get_metric_path_cache
 from nav.models.manage import Sensor
 
 # Ask for no more than this number of values in a single SNMP GET operation
@@ -64,22 +64,26 @@ class StatSensors(Plugin):
             data = yield self.agent.get(req).addCallback(
                 self._response_to_metrics, sensors, netboxes)
             self._logger.debug("got data from sensors: %r", data)
+        for netbox in netboxes:
+            get_metric_path_cache(netbox, 'statsensors').sweep()
 
     def _get_sensors(self):
         sensors = Sensor.objects.filter(netbox=self.netbox.id).values()
         return dict((row['oid'], row) for row in sensors)
 
     def _response_to_metrics(self, result, sensors, netboxes):
-        metrics = []
-        timestamp = time.time()
+        batch = MetricBatch(time.time())
+        caches = [(netbox, get_metric_path_cache(netbox, 'statsensors'))
+                  for netbox in netboxes]
         data = ((sensors[oid], value) for oid, value in iteritems(result)
                 if oid in sensors)
         for sensor, value in data:
             value = convert_to_precision(value, sensor)
-            for netbox in netboxes:
-                path = metric_path_for_sensor(netbox,
-                                              sensor['internal_name'])
-                metrics.append((path, (timestamp, value)))
+            for netbox, paths in caches:
+                batch.add(paths.get(metric_path_for_sensor, netbox,
+                                    sensor['internal_name']),
+                          value)
+        metrics = batch.to_tuples()
         send_metrics(metrics)
         return metrics
 
@@ -21,7 +21,7 @@ from twisted.internet.error import TimeoutError
 
 from nav.ipdevpoll import Plugin
 from nav.ipdevpoll import db
-from nav.metrics.carbon import send_metrics
+from nav.metrics.carbon import send_metrics, MetricBatch
 from nav.metrics.templates import (
     metric_path_for_bandwith,
     metric_path_for_bandwith_peak,
@@ -29,7 +29,8 @@ from nav.metrics.templates import (
     metric_path_for_cpu_utilization,
     metric_path_for_sysuptime,
     metric_path_for_power,
-    metric_prefix_for_memory
+    metric_prefix_for_memory,
+    get_metric_path_cache,
 )
 from nav.mibs.cisco_memory_pool_mib import CiscoMemoryPoolMib
 
@@ -70,12 +71,16 @@ class StatSystem(Plugin):
     def handle(self):
         if self.netbox.master:
             defer.returnValue(None)
-        netboxes = yield db.run_in_thread(self._get_netbox_list)
+        sysnames = yield db.run_in_thread(self._get_netbox_list)
+        netboxes = [(sysname, get_metric_path_cache(sysname, 'statsystem'))
+                    for sysname in sysnames]
         bandwidth = yield self._collect_bandwidth(netboxes)
         cpu = yield self._collect_cpu(netboxes)
         sysuptime = yield self._collect_sysuptime(netboxes)
         memory = yield self._collect_memory(netboxes)
         power = yield self._collect_power(netboxes)
+        for _sysname, paths in netboxes:
+            paths.sweep()
 
         metrics = bandwidth + cpu + sysuptime + memory + power
         if metrics:
@@ -109,16 +114,15 @@ class StatSystem(Plugin):
             self._logger.debug("Found bandwidth values from %s: %s, %s",
                                mib.mib['moduleName'], bandwidth,
                                bandwidth_peak)
-            timestamp = time.time()
-            metrics = []
-            for netbox in netboxes:
-                metrics += [
-                    (metric_path_for_bandwith(netbox, percent),
-                     (timestamp, bandwidth)),
-                    (metric_path_for_bandwith_peak(netbox, percent),
-                     (timestamp, bandwidth_peak)),
-                ]
-            defer.returnValue(metrics)
+            batch = MetricBatch(time.time())
+            for netbox, paths in netboxes:
+                batch.add(paths.get(metric_path_for_bandwith,
+                                    netbox, percent),
+                          bandwidth)
+                batch.add(paths.get(metric_path_for_bandwith_peak,
+                                    netbox, percent),
+                          bandwidth_peak)
+            defer.returnValue(batch.to_tuples())
 
     @defer.inlineCallbacks
     def _collect_cpu(self, netboxes):
@@ -136,34 +140,33 @@ class StatSystem(Plugin):
     @defer.inlineCallbacks
     def _get_cpu_loadavg(self, mib, netboxes):
         load = yield mib.get_cpu_loadavg()
-        timestamp = time.time()
-        metrics = []
+        batch = MetricBatch(time.time())
 
         if load:
             self._logger.debug("Found CPU loadavg from %s: %s",
                                mib.mib['moduleName'], load)
             for cpuname, loadlist in load.items():
                 for interval, value in loadlist:
-                    for netbox in netboxes:
-                        path = metric_path_for_cpu_load(netbox, cpuname,
-                                                        interval)
-                        metrics.append((path, (timestamp, value)))
-        defer.returnValue(metrics)
+                    for netbox, paths in netboxes:
+                        batch.add(paths.get(metric_path_for_cpu_load,
+                                            netbox, cpuname, interval),
+                                  value)
+        defer.returnValue(batch.to_tuples())
 
     @defer.inlineCallbacks
     def _get_cpu_utilization(self, mib, netboxes):
         utilization = yield mib.get_cpu_utilization()
-        timestamp = time.time()
-        metrics = []
+        batch = MetricBatch(time.time())
 
         if utilization:
             self._logger.debug("Found CPU utilization from %s: %s",
                                mib.mib['moduleName'], utilization)
             for cpuname, value in utilization.items():
-                for netbox in netboxes:
-                    path = metric_path_for_cpu_utilization(netbox, cpuname)
-                    metrics.append((path, (timestamp, value)))
-        defer.returnValue(metrics)
+                for netbox, paths in netboxes:
+                    batch.add(paths.get(metric_path_for_cpu_utilization,
+                                        netbox, cpuname),
+                              value)
+        defer.returnValue(batch.to_tuples())
 
     def _mibs_for_me(self, mib_class_dict):
         vendor = (self.netbox.type.get_enterprise_id()
@@ -177,16 +180,13 @@ class StatSystem(Plugin):
     def _collect_sysuptime(self, netboxes):
         mib = Snmpv2Mib(self.agent)
         uptime = yield mib.get_sysUpTime()
-        timestamp = time.time()
+        batch = MetricBatch(time.time())
 
         if uptime:
-            metrics = []
-            for netbox in netboxes:
-                path = metric_path_for_sysuptime(netbox)
-                metrics.append((path, (timestamp, uptime)))
-            defer.returnValue(metrics)
-        else:
-            defer.returnValue([])
+            for netbox, paths in netboxes:
+                batch.add(paths.get(metric_path_for_sysuptime, netbox),
+                          uptime)
+        defer.returnValue(batch.to_tuples())
 
     @defer.inlineCallbacks
     def _collect_power(self, netboxes):
@@ -196,17 +196,13 @@ class StatSystem(Plugin):
         power = {key: val['pethMainPseConsumptionPower']
                  for key, val in power.items()
                  if val['pethMainPseOperStatus'] == 1}
-        timestamp = time.time()
-
-        if power:
-            metrics = []
-            for netbox in netboxes:
-                for index, value in power.items():
-                    path = metric_path_for_power(netbox, index)
-                    metrics.append((path, (timestamp, value)))
-            defer.returnValue(metrics)
-        else:
-            defer.returnValue([])
+        batch = MetricBatch(time.time())
+
+        for netbox, paths in netboxes:
+            for index, value in power.items():
+                batch.add(paths.get(metric_path_for_power, netbox, index),
+                          value)
+        defer.returnValue(batch.to_tuples())
 
     @defer.inlineCallbacks
     def _collect_memory(self, netboxes):
@@ -223,13 +219,10 @@ class StatSystem(Plugin):
                                        mib.mib['moduleName'], mem)
                     memory.update(mem)
 
-        timestamp = time.time()
-        result = []
+        batch = MetricBatch(time.time())
         for name, (used, free) in memory.items():
-            for netbox in netboxes:
-                prefix = metric_prefix_for_memory(netbox, name)
-                result.extend([
-                    (prefix + '.used', (timestamp, used)),
-                    (prefix + '.free', (timestamp, free)),
-                ])
-        defer.returnValue(result)
+            for netbox, paths in netboxes:
+                prefix = paths.get(metric_prefix_for_memory, netbox, name)
+                batch.add(prefix + '.used', used)
+                batch.add(prefix + '.free', free)
+        defer.returnValue(batch.to_tuples())
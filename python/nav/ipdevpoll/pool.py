@@ -182,17 +182,19 @@ class Worker(object):
 
     _logger = ContextLogger()
 
-    def __init__(self, pool, threadpoolsize, max_jobs):
+    def __init__(self, pool, threadpoolsize, max_jobs, slot=0):
         self.active_jobs = 0
         self.total_jobs = 0
         self.max_concurrent_jobs = 0
         self.pool = pool
         self.threadpoolsize = threadpoolsize
         self.max_jobs = max_jobs
+        self.slot = slot
 
     @inlineCallbacks
     def start(self):
-        args = [control.get_process_command(), '--worker', '-f', '-s', '-P']
+        args = [control.get_process_command(), '--worker', '-f', '-s', '-P',
+                '--worker-slot=%d' % self.slot]
         if self.threadpoolsize:
             args.append('--threadpoolsize=%d' % self.threadpoolsize)
         endpoint = ProcessEndpoint(reactor, control.get_process_command(),
@@ -246,6 +248,7 @@ class WorkerPool(object):
     def __init__(self, workers, max_jobs, threadpoolsize=None):
         twisted.internet.endpoints.log = HackLog
         self.workers = set()
+        self.slots = set()
         self.target_count = workers
         self.max_jobs = max_jobs
         self.threadpoolsize = threadpoolsize
@@ -256,12 +259,18 @@ class WorkerPool(object):
 
     def worker_died(self, worker):
         self.workers.remove(worker)
+        self.slots.discard(worker.slot)
         if not worker.done():
             self._spawn_worker()
 
     @inlineCallbacks
     def _spawn_worker(self):
-        worker = yield Worker(self, self.threadpoolsize, self.max_jobs).start()
+        # Slot numbers identify workers in metric paths, so reuse the numbers
+        # of dead workers
+        slot = min(set(range(len(self.slots) + 1)) - self.slots)
+        self.slots.add(slot)
+        worker = yield Worker(self, self.threadpoolsize, self.max_jobs,
+                              slot).start()
         self.workers.add(worker)
 
     def _cleanup(self, result, deferred):
@@ -37,6 +37,7 @@ from .netbox import Netbox
 from .interface import Interface, InterfaceStack, InterfaceAggregate
 from .swportblocked import SwPortBlocked
 from .cam import Cam
+from .arp import Arp
 from .adjacency import AdjacencyCandidate, UnrecognizedNeighbor
 from .entity import NetboxEntity
 from .prefix import Prefix
@@ -576,21 +577,6 @@ class SwPortVlan(Shadow):
     __shadowclass__ = manage.SwPortVlan
 
 
-class Arp(Shadow):
-    __shadowclass__ = manage.Arp
-
-    def save(self, containers):
-        if not self.id:
-            return super(Arp, self).save(containers)
-
-        attrs = dict((attr, getattr(self, attr))
-                     for attr in self.get_touched()
-                     if attr != 'id')
-        if attrs:
-            myself = manage.Arp.objects.filter(id=self.id)
-            myself.update(**attrs)
-
-
 class SwPortAllowedVlan(Shadow):
     __shadowclass__ = manage.SwPortAllowedVlan
     __lookups__ = ['interface']
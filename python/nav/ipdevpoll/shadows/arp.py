@@ -0,0 +1,80 @@
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""arp record storage and handling.
+
+The arp plugin adds one Arp container for each new IP/MAC mapping it finds,
+and one Arp container with an id and an end_time for each open record that
+has expired.  Since there may be thousands of these per router, the
+ArpManager writes them in bulk, instead of saving each container
+individually.
+
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from nav.models import manage
+from nav.ipdevpoll.storage import DefaultManager, Shadow
+from nav.ipdevpoll.db import BULK_BATCH_SIZE
+
+
+class ArpManager(DefaultManager):
+    """Manages Arp records"""
+
+    @transaction.atomic()
+    def save(self):
+        new, expired = [], []
+        for arp in self.get_managed():
+            (expired if arp.id else new).append(arp)
+        self._insert_new(new)
+        self._update_expired(expired)
+
+    def _insert_new(self, arps):
+        records = [
+            manage.Arp(netbox_id=arp.netbox.id if arp.netbox else None,
+                       prefix_id=getattr(arp, 'prefix_id', None),
+                       sysname=arp.sysname, ip=arp.ip, mac=arp.mac,
+                       start_time=arp.start_time, end_time=arp.end_time)
+            for arp in arps
+        ]
+        if records:
+            self._logger.debug("inserting %d new records", len(records))
+            manage.Arp.objects.bulk_create(records,
+                                           batch_size=BULK_BATCH_SIZE)
+
+    def _update_expired(self, arps):
+        # Group records by their new values, so that all records receiving
+        # the same update are updated by a single statement
+        updates = defaultdict(list)
+        for arp in arps:
+            attrs = tuple(sorted((attr, getattr(arp, attr))
+                                 for attr in arp.get_touched()
+                                 if attr != 'id'))
+            if attrs:
+                updates[attrs].append(arp.id)
+
+        for attrs, ids in updates.items():
+            self._logger.debug("updating %d records with %r", len(ids),
+                               attrs)
+            for start in range(0, len(ids), BULK_BATCH_SIZE):
+                manage.Arp.objects.filter(
+                    id__in=ids[start:start + BULK_BATCH_SIZE]
+                ).update(**dict(attrs))
+
+
+class Arp(Shadow):
+    __shadowclass__ = manage.Arp
+    manager = ArpManager
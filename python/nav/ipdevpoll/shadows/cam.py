@@ -52,6 +52,7 @@ from nav.models.fields import INFINITY
 from django.db.models import Q
 from django.db import transaction
 from nav.ipdevpoll.storage import DefaultManager
+from nav.ipdevpoll.db import bulk_update_from_values, BULK_BATCH_SIZE
 from .netbox import Netbox
 from .interface import Interface
 
@@ -118,17 +119,18 @@ class CamManager(DefaultManager):
 
     @transaction.atomic()
     def save(self):
-        # Reuse the same object over and over in an attempt to avoid the
-        # overhead of Python object creation
-        record = manage.Cam(
-            netbox_id=self.netbox.id, sysname=self.netbox.sysname,
-            start_time=datetime.datetime.now(), end_time=INFINITY)
-        for cam in self._new:
-            record.id = None
-            record.port = self._get_port_for(cam.ifindex)
-            record.ifindex = cam.ifindex
-            record.mac = cam.mac
-            record.save()
+        # New records are inserted using multi-row INSERT statements
+        start_time = datetime.datetime.now()
+        records = [
+            manage.Cam(netbox_id=self.netbox.id, sysname=self.netbox.sysname,
+                       start_time=start_time, end_time=INFINITY,
+                       port=self._get_port_for(cam.ifindex),
+                       ifindex=cam.ifindex, mac=cam.mac)
+            for cam in self._new
+        ]
+        if records:
+            manage.Cam.objects.bulk_create(records,
+                                           batch_size=BULK_BATCH_SIZE)
 
         # reclaim recently closed records
         keepers = (self._previously_open[cam] for cam in self._keepers)
@@ -160,24 +162,38 @@ class CamManager(DefaultManager):
 
         return self._ifnames.get(ifindex, '')
 
+    @transaction.atomic()
     def cleanup(self):
-        for cam_detail in self._missing:
-            self._close_missing(cam_detail)
+        now = datetime.datetime.now()
+        closed = [self._get_closed_values(cam_detail, now)
+                  for cam_detail in self._missing]
+        closed = [row for row in closed if row]
+        if closed:
+            self._logger.debug("closing %d records", len(closed))
+            bulk_update_from_values(
+                'cam', ('camid', 'integer'),
+                [('end_time', 'timestamp'), ('misscnt', 'integer')],
+                closed)
+
+    @staticmethod
+    def _get_closed_values(cam_detail, now):
+        """Returns a (camid, end_time, misscnt) tuple of the values needed
+        to close a missing cam record, or None if it needs no update.
 
-    @classmethod
-    def _close_missing(cls, cam_detail):
-        upd = {}
-        cls._logger.debug("closing %r", cam_detail)
-        if cam_detail.end_time >= INFINITY:
-            upd['end_time'] = datetime.datetime.now()
-
-        if cam_detail.miss_count >= 0:
-            miss_count = cam_detail.miss_count + 1
-            upd['miss_count'] = (miss_count if miss_count < MAX_MISS_COUNT
-                                 else None)
-
-        if upd:
-            manage.Cam.objects.filter(id=cam_detail.id).update(**upd)
+        """
+        end_time, miss_count = cam_detail.end_time, cam_detail.miss_count
+        if end_time < INFINITY and miss_count is None:
+            return None
+
+        if end_time >= INFINITY:
+            end_time = now
+
+        if miss_count is not None and miss_count >= 0:
+            miss_count += 1
+            if miss_count >= MAX_MISS_COUNT:
+                miss_count = None
+
+        return cam_detail.id, end_time, miss_count
 
     @classmethod
     def add_sentinel(cls, containers):
@@ -0,0 +1,111 @@
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Parallel retrieval of several table columns using GETBULK.
+
+pynetsnmp's getTable() walks the columns it is given one after another, with
+a single varbind in each GETBULK request.  A :py:class:`ColumnWalker` instead
+puts a varbind for every column that hasn't been fully retrieved yet into
+each request, so that a table of N columns is retrieved in about 1/N of the
+round-trips.
+
+A GETBULK response holds up to max-repetitions rows of varbinds, and each row
+holds the next varbind of every requested column, in request order.  A
+column is finished once its next varbind is outside the column, or is an
+exception value such as endOfMibView.
+"""
+from twisted.internet import defer
+
+from nav.oids import OID
+
+
+class ColumnWalker(object):
+    """Retrieves a set of table columns from an agent in parallel.
+
+    :param agent: An AgentProxy.
+    :param oids: The OIDs of the columns to retrieve.
+    :param maxRepetitions: The max-repetitions value of each GETBULK request.
+    :param timeout: The timeout of each request, if not the agent's default.
+    :param retryCount: The number of retries of each request, if not the
+                       agent's default.
+
+    The result of :py:meth:`walk` has the same form as that of pynetsnmp's
+    getTable(): A dictionary that maps each of the given oids to a dictionary
+    of the {oid string: value} pairs of its column.
+    """
+    def __init__(self, agent, oids, maxRepetitions=10, timeout=None,
+                 retryCount=None, **_kwargs):
+        self.agent = agent
+        self.columns = [_Column(oid) for oid in oids]
+        self.max_repetitions = max(1, maxRepetitions)
+        self.request_kwargs = dict(
+            (key, value)
+            for key, value in (('timeout', timeout),
+                               ('retryCount', retryCount))
+            if value is not None)
+        self.deferred = defer.Deferred()
+
+    def walk(self):
+        """Starts retrieving the columns.
+
+        :returns: A deferred whose result is the retrieved columns.
+        """
+        self._fetch_more()
+        return self.deferred
+
+    def _fetch_more(self):
+        active = [column for column in self.columns if not column.finished]
+        if not active:
+            self.deferred.callback(dict((column.key, column.result)
+                                        for column in self.columns))
+            return
+        df = self.agent._getbulk(0, self.max_repetitions,
+                                 [column.last for column in active],
+                                 **self.request_kwargs)
+        df.addCallback(self._save_results, active)
+        df.addCallback(lambda _: self._fetch_more())
+        df.addErrback(self.deferred.errback)
+
+    @staticmethod
+    def _save_results(varbinds, active):
+        changed = False
+        for index, (oid, value) in enumerate(varbinds or []):
+            column = active[index % len(active)]
+            if column.finished:
+                continue
+            changed = True
+            oid = OID(oid)
+            if (value is None or not column.root.is_a_prefix_of(oid)
+                    or oid <= column.last):
+                column.finished = True
+            else:
+                column.result[str(oid)] = value
+                column.last = oid
+
+        if not changed:
+            # an empty response; don't ask the same question again
+            for column in active:
+                column.finished = True
+
+
+class _Column(object):
+    """The retrieval status of a single column"""
+    __slots__ = ('key', 'root', 'last', 'result', 'finished')
+
+    def __init__(self, oid):
+        self.key = oid
+        self.root = self.last = OID(oid)
+        self.result = {}
+        self.finished = False
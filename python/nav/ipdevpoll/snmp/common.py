@@ -20,17 +20,29 @@ from functools import wraps
 from collections import namedtuple
 
 from twisted.internet import reactor
-from twisted.internet.defer import succeed
+from twisted.internet.defer import succeed, TimeoutError as DeferTimeoutError
+from twisted.internet.error import TimeoutError
 from twisted.internet.task import deferLater
 
+from .bulkwalk import ColumnWalker
+from .scheduler import get_scheduler
+
 _logger = logging.getLogger(__name__)
 
+# The error-status of a response that would have been too large (RFC 3416)
+SNMP_ERR_TOOBIG = 1
+
 
 def cache_for_session(func):
-    """Decorator for AgentProxyMixIn.getTable to cache responses"""
+    """Decorator for AgentProxyMixIn.getTable to cache responses.
+
+    Caching is disabled for sessions whose _result_cache is None.
+    """
     def _wrapper(*args, **kwargs):
         self, oids = args[0], args[1]
         cache = getattr(self, '_result_cache')
+        if cache is None:
+            return func(*args, **kwargs)
         key = tuple(oids)
         if key not in cache:
             df = func(*args, **kwargs)
@@ -65,6 +77,86 @@ def throttled(func):
     return wraps(func)(_wrapper)
 
 
+def scheduled(func):
+    """Decorator for AgentProxyMixIn request methods to send requests through
+    the process-wide SNMP request scheduler.
+
+    """
+    def _wrapper(*args, **kwargs):
+        self = args[0]
+        return get_scheduler().schedule(self.ip, func, *args, **kwargs)
+
+    return wraps(func)(_wrapper)
+
+
+class BulkSizer(object):
+    """Tunes the max-repetitions value of GETBULK requests to a device.
+
+    The tuned value is the number of rows to ask for in a single GETBULK
+    request, whether the request is for a single column or for several
+    columns in parallel. It grows whenever a column needed several full
+    response PDUs, and is halved whenever a table retrieval times out or the
+    device responds with a tooBig error-status.
+
+    """
+    GROWTH_FACTOR = 1.5
+
+    def __init__(self, initial, limit):
+        self.value = max(1, initial)
+        self.limit = max(self.value, limit)
+
+    def __repr__(self):
+        return "<BulkSizer value=%d limit=%d>" % (self.value, self.limit)
+
+    def max_repetitions(self):
+        """Returns the max-repetitions value to use for the next request"""
+        return self.value
+
+    def succeeded(self, result):
+        """Adjusts the tuned value after a successful table retrieval"""
+        if hasattr(result, 'values'):
+            longest = max([len(column) for column in result.values()] or [0])
+            if longest > self.value and self.value < self.limit:
+                self.value = min(self.limit,
+                                 int(self.value * self.GROWTH_FACTOR) + 1)
+                _logger.debug("increased bulk size to %d", self.value)
+        return result
+
+    def failed(self, failure):
+        """Adjusts the tuned value after a failed table retrieval"""
+        if (failure.check(TimeoutError, DeferTimeoutError) or
+                is_too_big(failure)):
+            if self.value > 1:
+                self.value = max(1, self.value // 2)
+                _logger.debug("decreased bulk size to %d", self.value)
+        return failure
+
+
+def is_too_big(failure):
+    """Returns True if failure was caused by an SNMP response with a tooBig
+    error-status.
+
+    """
+    return getattr(failure.value, 'errstat', None) == SNMP_ERR_TOOBIG
+
+
+_bulk_sizers = {}
+
+
+def get_bulk_sizer(ip, snmp_parameters):
+    """Returns the process-wide BulkSizer of the device at ip.
+
+    Tuned values are kept for as long as the process runs, so that every job
+    against a device benefits from what previous jobs have learned.
+
+    """
+    key = str(ip)
+    if key not in _bulk_sizers:
+        _bulk_sizers[key] = BulkSizer(snmp_parameters.max_repetitions,
+                                      snmp_parameters.max_repetitions_limit)
+    return _bulk_sizers[key]
+
+
 # pylint: disable=R0903
 class AgentProxyMixIn(object):
     """Common AgentProxy mix-in class.
@@ -107,35 +199,46 @@ class AgentProxyMixIn(object):
     # hey, we're mimicking someone else's API here, never mind the bollocks:
     # pylint: disable=C0111,C0103
     @cache_for_session
-    def getTable(self, *args, **kwargs):
-        kwargs['maxRepetitions'] = self.snmp_parameters.max_repetitions
-        return super(AgentProxyMixIn, self).getTable(*args, **kwargs)
+    def getTable(self, oids, **kwargs):
+        sizer = get_bulk_sizer(self.ip, self.snmp_parameters)
+        kwargs['maxRepetitions'] = sizer.max_repetitions()
+        if len(oids) > 1 and self.snmpVersion != 'v1':
+            df = ColumnWalker(self, oids, **kwargs).walk()
+        else:
+            df = super(AgentProxyMixIn, self).getTable(oids, **kwargs)
+        if df:
+            df.addCallbacks(sizer.succeeded, sizer.failed)
+        return df
 
     # hey, we're mimicking someone else's API here, never mind the bollocks:
     # pylint: disable=C0111,C0103
     @throttled
+    @scheduled
     def _get(self, *args, **kwargs):
         return super(AgentProxyMixIn, self)._get(*args, **kwargs)
 
     # hey, we're mimicking someone else's API here, never mind the bollocks:
     # pylint: disable=C0111,C0103
     @throttled
+    @scheduled
     def _walk(self, *args, **kwargs):
         return super(AgentProxyMixIn, self)._walk(*args, **kwargs)
 
     # hey, we're mimicking someone else's API here, never mind the bollocks:
     # pylint: disable=C0111,C0103
     @throttled
+    @scheduled
     def _getbulk(self, *args, **kwargs):
         return super(AgentProxyMixIn, self)._getbulk(*args, **kwargs)
 
 
 # pylint: disable=C0103
 SNMPParameters = namedtuple('SNMPParameters',
-                            'timeout max_repetitions throttle_delay')
+                            'timeout max_repetitions max_repetitions_limit '
+                            'throttle_delay')
 
 SNMP_DEFAULTS = SNMPParameters(timeout=1.5, max_repetitions=50,
-                               throttle_delay=0)
+                               max_repetitions_limit=50, throttle_delay=0)
 
 
 # pylint: disable=W0212
@@ -153,6 +256,7 @@ def snmp_parameter_factory(host=None):
 
     for var, getter in [
             ('max-repetitions', config.getint),
+            ('max-repetitions-limit', config.getint),
             ('timeout', config.getfloat),
             ('throttle-delay', config.getfloat),
     ]:
@@ -0,0 +1,193 @@
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Process-wide scheduling of SNMP requests.
+
+Every SNMP request PDU issued by an ipdevpoll AgentProxy passes through a
+single :py:class:`RequestScheduler`, which limits the number of requests in
+flight, both per device and in total. Requests that cannot be sent right
+away are queued, and devices with queued requests are served round-robin as
+soon as in-flight requests complete.
+"""
+from collections import deque, defaultdict
+import logging
+import time
+
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+_logger = logging.getLogger(__name__)
+
+_scheduler = None
+
+
+def get_scheduler():
+    """Returns the process-wide SNMP request scheduler, creating it from
+    ipdevpoll's config on first use.
+
+    """
+    global _scheduler  # pylint: disable=W0603
+    if _scheduler is None:
+        _scheduler = RequestScheduler.from_config()
+    return _scheduler
+
+
+class RequestScheduler(object):
+    """Limits the number of SNMP requests in flight per device and in total.
+
+    :param max_requests: The maximum number of requests in flight in this
+                         process. 0 means no limit.
+    :param max_requests_per_device: The maximum number of requests in flight
+                                    to any single device. 0 means no limit.
+    """
+    def __init__(self, max_requests=500, max_requests_per_device=4):
+        self.max_requests = max_requests
+        self.max_requests_per_device = max_requests_per_device
+
+        self.in_flight = 0
+        self.queued = 0
+        self._in_flight_per_device = defaultdict(int)
+        self._pending = {}
+        self._ready = deque()
+        self._ready_set = set()
+        self._dispatching = False
+        self._reset_stats()
+
+    @classmethod
+    def from_config(cls):
+        """Creates a scheduler from the [snmp] section of ipdevpoll.conf"""
+        from nav.ipdevpoll.config import ipdevpoll_conf as config
+        return cls(
+            max_requests=config.getint('snmp', 'max-concurrent-requests'),
+            max_requests_per_device=config.getint(
+                'snmp', 'max-concurrent-requests-per-device'))
+
+    def __repr__(self):
+        return "<RequestScheduler in_flight=%d queued=%d>" % (self.in_flight,
+                                                             self.queued)
+
+    def schedule(self, device, func, *args, **kwargs):
+        """Calls func(*args, **kwargs) as soon as the request limits allow.
+
+        :param device: A key identifying the device the request is for,
+                       typically its IP address.
+        :param func: A function that sends a single request, returning a
+                     Deferred that fires when the response is received.
+        :returns: A Deferred that fires with the result of the Deferred
+                  returned by func.
+        """
+        deferred = defer.Deferred()
+        request = (deferred, func, args, kwargs, time.time())
+        if device in self._pending:
+            self._pending[device].append(request)
+        else:
+            self._pending[device] = deque([request])
+            if self._device_has_capacity(device):
+                self._mark_ready(device)
+        self.queued += 1
+        self._stats['max_queued'] = max(self._stats['max_queued'],
+                                        self.queued)
+        self._dispatch()
+        return deferred
+
+    def _device_has_capacity(self, device):
+        return (not self.max_requests_per_device or
+                self._in_flight_per_device.get(device, 0) <
+                self.max_requests_per_device)
+
+    def _has_capacity(self):
+        return not self.max_requests or self.in_flight < self.max_requests
+
+    def _mark_ready(self, device):
+        if device not in self._ready_set:
+            self._ready_set.add(device)
+            self._ready.append(device)
+
+    def _dispatch(self):
+        # Requests that fail immediately will re-enter this method through
+        # _finish(); let the outermost call do all the work
+        if self._dispatching:
+            return
+        self._dispatching = True
+        try:
+            while self._ready and self._has_capacity():
+                device = self._ready.popleft()
+                self._ready_set.discard(device)
+                requests = self._pending[device]
+                request = requests.popleft()
+                if not requests:
+                    del self._pending[device]
+                self.queued -= 1
+                self._start(device, *request)
+                if (device in self._pending
+                        and self._device_has_capacity(device)):
+                    self._mark_ready(device)
+        finally:
+            self._dispatching = False
+
+    def _start(self, device, deferred, func, args, kwargs, queued_at):
+        started_at = time.time()
+        self.in_flight += 1
+        self._in_flight_per_device[device] += 1
+        self._stats['started'] += 1
+        self._stats['wait_time'] += started_at - queued_at
+
+        request = defer.maybeDeferred(func, *args, **kwargs)
+        request.addBoth(self._finish, device, started_at)
+        request.chainDeferred(deferred)
+
+    def _finish(self, result, device, started_at):
+        latency = time.time() - started_at
+        self._stats['requests'] += 1
+        self._stats['latency'] += latency
+        self._stats['max_latency'] = max(self._stats['max_latency'], latency)
+        if isinstance(result, Failure):
+            self._stats['failures'] += 1
+
+        self.in_flight -= 1
+        self._in_flight_per_device[device] -= 1
+        if not self._in_flight_per_device[device]:
+            del self._in_flight_per_device[device]
+        if device in self._pending:
+            self._mark_ready(device)
+        self._dispatch()
+        return result
+
+    def _reset_stats(self):
+        self._stats = dict(started=0, requests=0, failures=0, latency=0.0,
+                           max_latency=0.0, wait_time=0.0,
+                           max_queued=self.queued)
+
+    def collect_stats(self):
+        """Returns statistics about the requests that have completed since
+        the last time statistics were collected, and resets them.
+
+        :returns: A dict of statistics. Times are in seconds.
+        """
+        stats = self._stats
+        requests = stats['requests']
+        started = stats['started']
+        result = dict(
+            in_flight=self.in_flight,
+            queued=self.queued,
+            max_queued=stats['max_queued'],
+            requests=requests,
+            failures=stats['failures'],
+            avg_latency=stats['latency'] / requests if requests else 0.0,
+            max_latency=stats['max_latency'],
+            avg_wait_time=stats['wait_time'] / started if started else 0.0,
+        )
+        self._reset_stats()
+        return result
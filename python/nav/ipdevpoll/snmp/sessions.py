@@ -0,0 +1,188 @@
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Process-wide pool of SNMP sessions.
+
+Jobs that poll the same device with the same SNMP credentials share a single
+AgentProxy session, and sessions are kept open for a while after the last job
+releases them, so that jobs that follow each other closely don't need to open
+new sessions.  All sessions send their requests through a shared set of UDP
+sockets.
+"""
+from itertools import cycle
+import logging
+
+from twisted.internet import reactor
+
+from nav.ipdevpoll.snmp import AgentProxy, snmpprotocol
+from nav.ipdevpoll.snmp.common import SnmpError, cache_for_session
+
+_logger = logging.getLogger(__name__)
+
+SOCKET_COUNT = 50
+
+_pool = None
+
+
+def get_session_pool():
+    """Returns the process-wide SNMP session pool, creating it from
+    ipdevpoll's config on first use.
+
+    """
+    global _pool  # pylint: disable=W0603
+    if _pool is None:
+        _pool = SessionPool.from_config()
+    return _pool
+
+
+class SessionPool(object):
+    """A pool of open AgentProxy sessions, keyed by device address, community
+    and SNMP version.
+
+    :param idle_timeout: The number of seconds to keep a session open after
+                         it was last released.
+    """
+    def __init__(self, idle_timeout=30):
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._keys = {}
+        self._ports = None
+
+    @classmethod
+    def from_config(cls):
+        """Creates a session pool from the [snmp] section of ipdevpoll.conf"""
+        from nav.ipdevpoll.config import ipdevpoll_conf as config
+        return cls(idle_timeout=config.getfloat('snmp',
+                                                'session-idle-timeout'))
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def acquire(self, ip, community, snmp_version, snmp_parameters):
+        """Returns a JobAgentProxy for an open AgentProxy session for the
+        given device address and credentials, opening a new session if needed.
+
+        Every acquired session must be given back using :py:meth:`release`.
+
+        :raises SnmpError: if a new session could not be opened.
+        """
+        key = (str(ip), community, snmp_version)
+        if key in self._sessions:
+            session = self._sessions[key]
+            if session.users == 0:
+                session.cancel_close()
+        else:
+            session = self._sessions[key] = _Session(
+                self._open(ip, community, snmp_version, snmp_parameters))
+            self._keys[id(session.agent)] = key
+        session.users += 1
+        return JobAgentProxy(session.agent)
+
+    def release(self, agent):
+        """Gives back an AgentProxy session acquired from this pool.
+
+        The session is closed once it has not been in use for the pool's
+        idle timeout.
+        """
+        agent = getattr(agent, 'pooled_agent', agent)
+        key = self._keys.get(id(agent))
+        session = self._sessions.get(key)
+        if session is None or session.agent is not agent:
+            agent.close()
+            return
+
+        session.users -= 1
+        if session.users <= 0:
+            session.users = 0
+            if self.idle_timeout > 0:
+                session.close_call = reactor.callLater(
+                    self.idle_timeout, self._close, key)
+            else:
+                self._close(key)
+
+    def close_all(self):
+        """Closes all pooled sessions, whether they are in use or not"""
+        for key in list(self._sessions):
+            self._sessions[key].cancel_close()
+            self._close(key)
+
+    def _close(self, key):
+        session = self._sessions.pop(key)
+        del self._keys[id(session.agent)]
+        session.agent.close()
+        _logger.debug("closed idle SNMP session %r", session.agent)
+
+    def _open(self, ip, community, snmp_version, snmp_parameters):
+        if self._ports is None:
+            self._ports = cycle([snmpprotocol.port()
+                                 for _ in range(SOCKET_COUNT)])
+        port = next(self._ports)
+        agent = AgentProxy(
+            ip, 161,
+            community=community,
+            snmpVersion='v%s' % snmp_version,
+            protocol=port.protocol,
+            snmp_parameters=snmp_parameters
+        )
+        # getTable results are cached per job by JobAgentProxy instead
+        agent._result_cache = None  # pylint: disable=W0212
+        try:
+            agent.open()
+        except SnmpError:
+            agent.close()
+            raise
+        _logger.debug("opened SNMP session %r (%d pooled sessions)", agent,
+                      len(self._sessions) + 1)
+        return agent
+
+
+class JobAgentProxy(object):
+    """A single job's handle to a pooled AgentProxy session.
+
+    Everything but getTable is passed straight on to the pooled session.
+    getTable results are cached by the handle, so that jobs that share a
+    session never see each other's cached results.
+    """
+    def __init__(self, pooled_agent):
+        self.pooled_agent = pooled_agent
+        self._result_cache = {}
+
+    def __getattr__(self, name):
+        return getattr(self.pooled_agent, name)
+
+    def __repr__(self):
+        return "<JobAgentProxy for %r>" % self.pooled_agent
+
+    # hey, we're mimicking someone else's API here, never mind the bollocks:
+    # pylint: disable=C0111,C0103
+    @cache_for_session
+    def getTable(self, oids, **kwargs):
+        return self.pooled_agent.getTable(oids, **kwargs)
+
+
+class _Session(object):
+    """A pooled AgentProxy session and its user count"""
+    __slots__ = ('agent', 'users', 'close_call')
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.users = 0
+        self.close_call = None
+
+    def cancel_close(self):
+        """Cancels any pending idle close of this session"""
+        if self.close_call and self.close_call.active():
+            self.close_call.cancel()
+        self.close_call = None
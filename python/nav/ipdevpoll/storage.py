@@ -14,9 +14,13 @@
 # License along with NAV. If not, see <http://www.gnu.org/licenses/>.
 #
 """Storage layer for ipdevpoll"""
+from collections import defaultdict
+from functools import reduce
+import operator
 
 import django.db.models
 from django.db import transaction
+from django.db.models import Q
 from django.utils import six
 
 from nav import toposort
@@ -66,6 +70,7 @@ class DefaultManager(object):
 
     """
     _logger = ipdevpoll.ContextLogger()
+    bulk_resolve = True
 
     def __init__(self, cls, containers):
         """Creates a storage manager.
@@ -82,8 +87,17 @@ class DefaultManager(object):
         self.cls.prepare_for_save(self.containers)
 
     def save(self):
-        """Saves managed shadows in containers"""
-        for obj in self.get_managed():
+        """Saves managed shadows in containers.
+
+        If bulk_resolve is set, the existing database objects of all the
+        managed shadows are resolved in bulk before saving, instead of one by
+        one as each shadow is saved.
+
+        """
+        managed = list(self.get_managed())
+        if self.bulk_resolve and managed:
+            self.cls.resolve_existing_models(managed, self.containers)
+        for obj in managed:
             obj.save(self.containers)
 
     def cleanup(self):
@@ -399,6 +413,102 @@ class Shadow(object):
                     self._cached_existing_model = model
                     return model
 
+    @classmethod
+    def resolve_existing_models(cls, shadows, containers=None):
+        """Resolves the existing Django model objects of a set of shadows in
+        bulk.
+
+        Where get_existing_model() issues one query per shadow and lookup
+        key, this issues one IN-query (in chunks of BULK_LOOKUP_CHUNK_SIZE)
+        per lookup key for the entire set of shadows, and caches each
+        resolved model object on its shadow. Lookups are attempted in the
+        same order as get_existing_model() would use.
+
+        Shadows that cannot be resolved this way, such as those not yet in
+        the database or those with lookup values that are yet unknown, are
+        left alone, to be resolved by get_existing_model() as usual. Shadow
+        classes that override get_existing_model() are left alone entirely.
+
+        :returns: The number of shadows that were resolved.
+
+        """
+        if (six.get_unbound_function(cls.get_existing_model) is not
+                six.get_unbound_function(Shadow.get_existing_model)):
+            return 0
+
+        pending = [shadow for shadow in shadows
+                   if not _get_cached_existing_model(shadow)]
+        pkey = cls._meta.pk
+        resolved = 0
+
+        by_pkey = [shadow for shadow in pending if shadow.get_primary_key()]
+        matches = cls._bulk_lookup(by_pkey, (pkey.name,))
+        for shadow, model in matches:
+            shadow._cached_existing_model = model
+            resolved += 1
+
+        # get_existing_model() never looks further when a primary key is set
+        pending = [shadow for shadow in pending
+                   if not shadow.get_primary_key()]
+        for lookup in cls.__lookups__:
+            if not pending:
+                break
+            fields = lookup if isinstance(lookup, tuple) else (lookup,)
+            if not isinstance(lookup, tuple):
+                candidates = [shadow for shadow in pending
+                              if getattr(shadow, lookup) is not None]
+            else:
+                candidates = pending
+            matches = cls._bulk_lookup(candidates, fields)
+            for shadow, model in matches:
+                setattr(shadow, pkey.name, model.pk)
+                shadow._cached_existing_model = model
+                resolved += 1
+
+            # A shadow that could not be evaluated in bulk for this lookup
+            # must not be matched by any later lookup, lest we get a
+            # different result than get_existing_model() would
+            unknown = set(id(shadow) for shadow in candidates
+                          if _lookup_key(shadow, fields) is None)
+            pending = [shadow for shadow in pending
+                       if not _get_cached_existing_model(shadow)
+                       and id(shadow) not in unknown]
+
+        return resolved
+
+    @classmethod
+    def _bulk_lookup(cls, shadows, fields):
+        """Looks up the model objects matching the values of fields on each
+        of shadows, using as few queries as possible.
+
+        :returns: A list of (shadow, model) tuples for each shadow that
+                  matched exactly one existing model object.
+
+        """
+        wanted = defaultdict(list)
+        for shadow in shadows:
+            key = _lookup_key(shadow, fields)
+            if key is not None:
+                wanted[key].append(shadow)
+        if not wanted:
+            return []
+
+        found = defaultdict(list)
+        keys = list(wanted.keys())
+        for index in range(0, len(keys), BULK_LOOKUP_CHUNK_SIZE):
+            chunk = keys[index:index + BULK_LOOKUP_CHUNK_SIZE]
+            if len(fields) == 1:
+                filtr = Q(**{'%s__in' % fields[0]: [k[0] for k in chunk]})
+            else:
+                filtr = reduce(operator.or_,
+                               (Q(**dict(zip(fields, k))) for k in chunk))
+            for model in cls.__shadowclass__.objects.filter(filtr):
+                found[_model_key(model, fields)].append(model)
+
+        return [(shadow, models[0])
+                for key, models in found.items() if len(models) == 1
+                for shadow in wanted.get(key, [])]
+
     def set_existing_model(self, django_object):
         """Explicitly sets the existing Django model instance this shadow
         instance represents.
@@ -518,6 +628,61 @@ class Shadow(object):
                 if _is_different(a)]
 
 
+BULK_LOOKUP_CHUNK_SIZE = 1000
+
+
+def _get_cached_existing_model(shadow):
+    return getattr(shadow, '_cached_existing_model', None)
+
+
+def _lookup_key(shadow, fields):
+    """Returns a tuple of the lookup values of fields on shadow, suitable for
+    use in a database query, or None if any value is yet unknown.
+
+    """
+    key = []
+    for field in fields:
+        value = getattr(shadow, field)
+        if isinstance(value, Shadow):
+            value = value.get_primary_key()
+        if value is None or isinstance(value, Shadow):
+            return None
+        key.append(value)
+    return _Key(key)
+
+
+def _model_key(model, fields):
+    """Returns a tuple of the values of fields on a Django model object,
+    comparable to the output of _lookup_key().
+
+    """
+    return _Key(getattr(model, model._meta.get_field(field).attname)
+                for field in fields)
+
+
+class _Key(tuple):
+    """A tuple of lookup values that compares by the text representation of
+    its values, since shadows and model objects may use different types for
+    the same database value (e.g. IPy.IP objects vs. strings).
+
+    """
+    def __new__(cls, values):
+        return super(_Key, cls).__new__(cls, values)
+
+    def _normalized(self):
+        return tuple(six.text_type(value) for value in self)
+
+    def __eq__(self, other):
+        return (isinstance(other, _Key) and
+                self._normalized() == other._normalized())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._normalized())
+
+
 def shadowify(model):
     """Return a properly shadowed version of a Django model object.
 
@@ -21,10 +21,17 @@ Syslog messages will be read from the configured file, parsed and
 inserted into structured NAV database tables.  Messages that cannot be
 parsed as Cisco syslog messages are ignored.
 
-The syslog file is truncated upon the exit of this program.  If you
-wish to keep a copy of the syslog messages on file, you should
-configure your syslog daemon to log the messages to two separate
-files, one of which this program will have exclusive access to.
+The contents of the syslog file are moved to a spool file, and the syslog
+file is truncated, as soon as this program starts.  If you wish to keep a
+copy of the syslog messages on file, you should configure your syslog daemon
+to log the messages to two separate files, one of which this program will
+have exclusive access to.
+
+The spool file is read and parsed in a streaming fashion, and messages are
+inserted into the database in batches.  The spool file is only removed once
+all its messages have been committed to the database; if this program
+crashes, the spool file is processed again on the next run.  Messages that
+the database rejects are logged and skipped.
 
 """
 
@@ -33,11 +40,6 @@ files, one of which this program will have exclusive access to.
 ## to make it more maintainable.  Feel free to refactor it further,
 ## where it makes sense.
 
-## BUGS: This program has one glaring problem: All the log lines are
-## read into memory, and the logfile is subsequently truncated.  If
-## the program crashes before the lines are inserted into the
-## database, all the read log lines are lost.
-
 ## TODO: Possible future enhancement is the ability to tail a log file
 ## continually, instead of reading and truncating as a cron job.
 
@@ -50,13 +52,13 @@ import os
 import os.path
 import errno
 import atexit
+import shutil
+from itertools import islice
 import logging
 from configparser import ConfigParser
 import datetime
 import optparse
 
-from django.utils import six
-
 import nav
 import nav.logs
 from nav import db
@@ -65,6 +67,14 @@ from nav.buildconf import localstatedir, sysconfdir
 
 _logger = logging.getLogger("logengine")
 
+BATCH_SIZE = 1000
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Errors that mean the database rejected some of the inserted data, rather
+# than that the database is unavailable
+REJECTED_DATA_ERRORS = (ValueError, db.driver.DataError,
+                        db.driver.IntegrityError)
+
 
 def get_exception_dicts(config):
 
@@ -288,97 +298,98 @@ def get_types(cursor):
     return types
 
 
-def read_log_lines(config):
-    """Read and yield message lines from the watched cisco log file.
+def get_spool_filename(config):
+    """Returns the name of the spool file that log lines are moved to
+    before they are processed.
+
+    """
+    if config.has_option("paths", "spool"):
+        return config.get("paths", "spool")
+    return config.get("paths", "syslog") + ".spool"
+
+
+def rotate_log_file(config):
+    """Moves the contents of the watched cisco log file to the end of the
+    spool file, and truncates the log file.
+
+    The log file is only locked while its contents are being copied.  The
+    watched file is configured using the syslog option in the paths section
+    of logger.conf.
 
-    Once the log file has been read, it is truncated. The watched file
-    is configured using the syslog option in the paths section of
-    logger.conf.
+    :returns: The name of the spool file, or None if there is nothing to
+              process.
 
     """
     filename = config.get("paths", "syslog")
-    if config.has_option("paths", "charset"):
-        charset = config.get("paths", "charset")
-    else:
-        charset = "ISO-8859-1"
+    spool = get_spool_filename(config)
 
-    logfile = None
-    ## open log
     try:
-        logfile = open(filename, "r+")
+        logfile = open(filename, "rb+")
     except IOError as err:
         # If logfile can't be found, we ignore it.  We won't needlessly
         # spam the NAV admin every minute with a file not found error!
         if err.errno != errno.ENOENT:
             _logger.exception("Couldn't open logfile %s", filename)
+        logfile = None
 
-    ## if the file exists
     if logfile:
+        with logfile:
+            fcntl.flock(logfile, fcntl.LOCK_EX)
+            try:
+                with open(spool, "ab") as spoolfile:
+                    shutil.copyfileobj(logfile, spoolfile, COPY_CHUNK_SIZE)
+                    spoolfile.flush()
+                    os.fsync(spoolfile.fileno())
+                logfile.truncate(0)
+            finally:
+                fcntl.flock(logfile, fcntl.LOCK_UN)
 
-        ## lock logfile
-        fcntl.flock(logfile, fcntl.LOCK_EX)
+    if os.path.exists(spool):
+        return spool
 
-        ## read log
-        fcon = logfile.readlines()
 
-        ## truncate logfile
-        logfile.truncate(0)
+def read_log_lines(filename, charset="ISO-8859-1"):
+    """Reads and yields message lines from a log file, one at a time.
 
-        ## unlock logfile
-        fcntl.flock(logfile, fcntl.LOCK_UN)
-        ##close log
-        logfile.close()
-
-        for line in fcon:
-            # Make sure the data is encoded as UTF-8 before we begin work on it
-            line = line.decode(charset).encode("UTF-8")
-            yield line
-    else:
-        raise StopIteration
+    :param filename: The name of the file to read.
+    :param charset: The character set the file is encoded with.
 
+    """
+    with open(filename, "rb") as logfile:
+        for line in logfile:
+            yield line.decode(charset)
 
-# pylint: disable=W0703
-def parse_and_insert(line, database,
-                     categories, origins, types,
-                     exceptionorigin, exceptiontype, exceptiontypeorigin):
-    """Parse a line of cisco log text and insert into db."""
 
-    try:
-        message = create_message(line, database)
-    except Exception:
-        _logger.exception("Unhandled exception during message parse: %s",
-                          line)
-        return False
+def parse_messages(lines, database):
+    """Parses lines of cisco log text, and yields the resulting Message
+    objects.  Unparseable lines are skipped.
 
-    if message:
+    """
+    for line in lines:
         try:
-            insert_message(message, database,
-                           categories, origins, types,
-                           exceptionorigin, exceptiontype, exceptiontypeorigin)
-        except Exception:
-            _logger.exception("Unhandled exception during message insert: %s",
-                              line)
+            message = create_message(line, database)
+        except db.driver.Error:
             raise
+        except Exception:  # pylint: disable=W0703
+            _logger.exception("Unhandled exception during message parse: %s",
+                              line)
+            continue
+        if message:
+            yield message
 
 
-def insert_message(message, database,
-                   categories, origins, types,
-                   exceptionorigin, exceptiontype, exceptiontypeorigin):
-    ## check origin (host)
-    if message.origin not in origins:
-        if message.category not in categories:
-            add_category(message.category, categories, database)
-        add_origin(message.origin, message.category, origins, database)
-    originid = origins[message.origin]
-
-    ## check type
-    if (message.facility not in types or
-            message.mnemonic not in types[message.facility]):
-        add_type(message.facility, message.mnemonic, message.priorityid, types,
-                 database)
-    typeid = types[message.facility][message.mnemonic]
-
-    ## overload priority if exceptions are set
+def get_batches(iterable, size=BATCH_SIZE):
+    """Yields lists of up to size items from iterable"""
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def apply_priority_exceptions(message, exceptionorigin, exceptiontype,
+                              exceptiontypeorigin):
+    """Overloads the priority of message if exceptions are set"""
     m_type = message.type.lower()
     origin = message.origin.lower()
     if (m_type in exceptiontypeorigin and
@@ -400,44 +411,148 @@ def insert_message(message, database,
         except ValueError:
             pass
 
-    ## insert message into database
-    database.execute("INSERT INTO log_message (time, origin, "
-                     "newpriority, type, message) "
-                     "VALUES (%s, %s, %s, %s, %s)",
-                     (str(message.time), originid,
-                      message.priorityid, typeid,
-                      message.description))
 
+def insert_messages(messages, database,
+                    categories, origins, types,
+                    exceptionorigin, exceptiontype, exceptiontypeorigin):
+    """Inserts a batch of messages into the database, using a single
+    multi-row INSERT statement.
+
+    Any origins and message types that are not already known are added in
+    bulk first.
 
-def add_category(category, categories, database):
-    database.execute("INSERT INTO category (category) "
-                     "VALUES (%s)", (category,))
-    categories[category] = category
+    """
+    add_origins(messages, categories, origins, database)
+    add_types(messages, types, database)
 
+    rows = []
+    for message in messages:
+        apply_priority_exceptions(message, exceptionorigin, exceptiontype,
+                                  exceptiontypeorigin)
+        rows.append((str(message.time), origins[message.origin],
+                     message.priorityid,
+                     types[message.facility][message.mnemonic],
+                     message.description))
+    insert_rows(database, "log_message",
+                ("time", "origin", "newpriority", "type", "message"), rows)
 
-def add_origin(origin, category, origins, database):
-    database.execute("SELECT nextval('origin_origin_seq')")
-    originid = database.fetchone()[0]
-    assert type(originid) in six.integer_types
-    database.execute("INSERT INTO origin (origin, name, "
-                     "category) VALUES (%s, %s, %s)",
-                     (originid, origin, category))
-    origins[origin] = originid
-    return originid
 
+def insert_batch(messages, database,
+                 categories, origins, types,
+                 exceptionorigin, exceptiontype, exceptiontypeorigin):
+    """Inserts a batch of messages into the database.
 
-def add_type(facility, mnemonic, priorityid, types, database):
-    database.execute("SELECT nextval('log_message_type_type_seq')")
-    typeid = int(database.fetchone()[0])
-    assert type(typeid) in six.integer_types
+    If the database rejects the batch, the messages are inserted one by one
+    instead, and messages that are still rejected are logged and skipped, so
+    that a single bad message cannot keep the spool file from ever being
+    processed.
 
-    database.execute("INSERT INTO log_message_type (type, facility, "
-                     "mnemonic, priority) "
-                     "VALUES (%s, %s, %s, %s)",
-                     (typeid, facility, mnemonic, priorityid))
-    if facility not in types:
-        types[facility] = {}
-    types[facility][mnemonic] = typeid
+    :returns: The number of messages that were inserted.
+
+    """
+    args = (database, categories, origins, types,
+            exceptionorigin, exceptiontype, exceptiontypeorigin)
+    error = _insert_in_savepoint(messages, *args)
+    if error is None:
+        return len(messages)
+
+    _logger.warning("Failed to insert a batch of %d messages, retrying them "
+                    "one by one: %s", len(messages), error)
+    inserted = 0
+    for message in messages:
+        error = _insert_in_savepoint([message], *args)
+        if error is None:
+            inserted += 1
+        else:
+            _logger.error("Skipping message from %s at %s: %s",
+                          message.origin, message.time, error)
+    return inserted
+
+
+def _insert_in_savepoint(messages, database, categories, origins, types,
+                         *exceptions):
+    """Inserts messages under a savepoint, rolling back to it if the database
+    rejects them.
+
+    :returns: None on success, or the error that caused the rollback.
+
+    """
+    known = (dict(categories), dict(origins),
+             dict((facility, dict(mnemonics))
+                  for facility, mnemonics in types.items()))
+    database.execute("SAVEPOINT logengine_insert")
+    try:
+        insert_messages(messages, database, categories, origins, types,
+                        *exceptions)
+    except REJECTED_DATA_ERRORS as error:
+        database.execute("ROLLBACK TO SAVEPOINT logengine_insert")
+        # origins and types added under the savepoint are gone as well
+        for cache, saved in zip((categories, origins, types), known):
+            cache.clear()
+            cache.update(saved)
+        return error
+    database.execute("RELEASE SAVEPOINT logengine_insert")
+
+
+def insert_rows(database, table, columns, rows, returning=None):
+    """Inserts rows into table using a single multi-row INSERT statement.
+
+    :returns: The rows of the RETURNING clause, if returning is given.
+
+    """
+    row_template = "(%s)" % ", ".join(["%s"] * len(columns))
+    sql = "INSERT INTO {table} ({columns}) VALUES {values}".format(
+        table=table, columns=", ".join(columns),
+        values=", ".join([row_template] * len(rows)))
+    if returning:
+        sql += " RETURNING " + ", ".join(returning)
+    database.execute(sql, [value for row in rows for value in row])
+    if returning:
+        return database.fetchall()
+
+
+def add_origins(messages, categories, origins, database):
+    """Adds the unknown origins of messages, and their categories, to the
+    database in bulk.
+
+    """
+    new_origins = {}
+    for message in messages:
+        if message.origin not in origins:
+            new_origins[message.origin] = message.category
+    if not new_origins:
+        return
+
+    new_categories = set(new_origins.values()).difference(categories)
+    if new_categories:
+        insert_rows(database, "category", ("category",),
+                    [(category,) for category in new_categories])
+        categories.update((category, category) for category in new_categories)
+
+    for originid, name in insert_rows(database, "origin",
+                                      ("name", "category"),
+                                      list(new_origins.items()),
+                                      returning=("origin", "name")):
+        origins[name] = int(originid)
+
+
+def add_types(messages, types, database):
+    """Adds the unknown message types of messages to the database in bulk"""
+    new_types = {}
+    for message in messages:
+        if message.mnemonic not in types.get(message.facility, {}):
+            new_types[(message.facility, message.mnemonic)] = (
+                message.priorityid)
+    if not new_types:
+        return
+
+    rows = [(facility, mnemonic, priorityid)
+            for (facility, mnemonic), priorityid in new_types.items()]
+    for typeid, facility, mnemonic in insert_rows(
+            database, "log_message_type",
+            ("facility", "mnemonic", "priority"), rows,
+            returning=("type", "facility", "mnemonic")):
+        types.setdefault(facility, {})[mnemonic] = int(typeid)
 
 
 def logengine(config, options):
@@ -459,26 +574,28 @@ def logengine(config, options):
 
     ## add new records
     _logger.info("Reading new log entries")
-    my_parse_and_insert = swallow_all_but_db_exceptions(parse_and_insert)
-    for line in read_log_lines(config):
-        my_parse_and_insert(line, database,
-                            categories, origins, types,
-                            exceptionorigin, exceptiontype,
-                            exceptiontypeorigin)
-
-    # Make sure it all sticks
-    connection.commit()
+    spool = rotate_log_file(config)
+    if not spool:
+        return
 
+    if config.has_option("paths", "charset"):
+        charset = config.get("paths", "charset")
+    else:
+        charset = "ISO-8859-1"
 
-def swallow_all_but_db_exceptions(func):
-    def _swallow(*args, **kwargs):
-        try:
-            return func(*args, **kwargs)
-        except db.driver.Error:
-            raise
-        except Exception:
-            _logger.exception("Unhandled exception occurred, ignoring.")
-    return _swallow
+    count = 0
+    messages = parse_messages(read_log_lines(spool, charset), database)
+    for batch in get_batches(messages):
+        count += insert_batch(batch, database,
+                              categories, origins, types,
+                              exceptionorigin, exceptiontype,
+                              exceptiontypeorigin)
+
+    # Make sure it all sticks before the spooled lines are discarded
+    connection.commit()
+    os.remove(spool)
+    _logger.info("Inserted %d log messages", count)
+    return count
 
 
 def parse_options():
@@ -26,6 +26,10 @@ class GraphiteConfigParser(NAVConfigParser):
 [carbon]
 host = 127.0.0.1
 port = 2003
+protocol = udp
+queue size = 100000
+batch size = 500
+flush interval = 1.0
 
 [graphiteweb]
 base=http://localhost:8000/
@@ -15,15 +15,21 @@
 #
 """
 This module implements various common API to send metrics to a
-Graphite/Carbon backend. It currently only supports the UDP line protocol,
-as it's the easiest to implement, and will also work without vodoo in
-asynchronous programs (i .e. such as ipdevpoll, which is implemented using
-Twisted).
+Graphite/Carbon backend. It supports Carbon's UDP line protocol, TCP line
+protocol and TCP pickle protocol.
+
+Long-running programs can install a metric emitter (see
+:py:mod:`nav.metrics.emitter`) to have send_metrics() queue metrics and send
+them in batches in the background, instead of sending them synchronously.
 """
 import logging
 import socket
+import struct
 import time
 import warnings
+
+from django.utils.six.moves import cPickle as pickle
+
 from nav.metrics import CONFIG
 
 _logger = logging.getLogger(__name__)
@@ -35,9 +41,20 @@ _error_timestamp = 0
 # fragmentation, but should still work.
 MAX_UDP_PAYLOAD = 1400
 
+# Maximum number of metrics to send in a single pickle protocol message
+MAX_PICKLE_BATCH = 500
+
+# Timeout when connecting to a TCP-based carbon receiver, in seconds
+CONNECT_TIMEOUT = 5
+
 # Minimum interval between socket error log entries, in seconds
 SOCKET_ERROR_MESSAGE_INTERVAL = 1
 
+PROTOCOLS = ('udp', 'tcp', 'pickle')
+
+_emitter = None
+_transport = None
+
 
 class CarbonWarning(UserWarning):
     """Custom warning class for Carbon connection related warnings"""
@@ -112,13 +129,187 @@ def _reset_warning_registry():
 def send_metrics(metric_tuples):
     """Sends a list of metric tuples to the pre-configured carbon backend.
 
+    If a metric emitter has been installed using install_emitter(), the
+    metrics are handed off to the emitter's queue instead of being sent
+    synchronously.
+
     :param metric_tuples: A list of metric tuples in the form
                           [(path, (timestamp, value)), ...]
 
     """
+    if _emitter is not None:
+        return _emitter.emit(metric_tuples)
+
+    protocol = CONFIG.get("carbon", "protocol")
     host = CONFIG.get("carbon", "host")
     port = CONFIG.getint("carbon", "port")
-    return send_metrics_to(metric_tuples, host, port)
+    if protocol == 'udp':
+        return send_metrics_to(metric_tuples, host, port)
+
+    # pylint: disable=W0603
+    global _transport
+    if _transport is None:
+        _transport = make_transport(protocol, host, port)
+    try:
+        _transport.send(metric_tuples)
+    except socket.error as error:
+        _handle_error(error, host, port)
+
+
+class MetricBatch(object):
+    """Builds a list of metric tuples that share a timestamp, keeping paths
+    and values in separate columns until the tuples are needed.
+
+    :param timestamp: The timestamp of all the metrics, defaults to now.
+    """
+    def __init__(self, timestamp=None):
+        self.timestamp = timestamp or time.time()
+        self.paths = []
+        self.values = []
+
+    def __len__(self):
+        return len(self.paths)
+
+    def add(self, path, value):
+        """Adds a single metric to the batch"""
+        self.paths.append(path)
+        self.values.append(value)
+
+    def extend(self, paths, values):
+        """Adds a column of paths and a matching column of values"""
+        self.paths.extend(paths)
+        self.values.extend(values)
+
+    def to_tuples(self):
+        """Returns the batch as a list of metric tuples in the form
+        [(path, (timestamp, value)), ...]
+
+        """
+        timestamp = self.timestamp
+        return [(path, (timestamp, value))
+                for path, value in zip(self.paths, self.values)]
+
+    def send(self):
+        """Sends the batch to carbon using send_metrics(), if it isn't
+        empty.
+
+        """
+        if self.paths:
+            send_metrics(self.to_tuples())
+
+
+def install_emitter(emitter):
+    """Installs a metric emitter to be used by send_metrics().
+
+    :param emitter: An object with an emit() method that accepts a list of
+                    metric tuples, or None to revert to sending metrics
+                    synchronously.
+
+    """
+    # pylint: disable=W0603
+    global _emitter
+    _emitter = emitter
+
+
+def make_transport(protocol=None, host=None, port=None):
+    """Returns a CarbonTransport instance for the given protocol.
+
+    Any argument that is omitted is read from the [carbon] section of the
+    graphite config.
+
+    """
+    protocol = protocol or CONFIG.get("carbon", "protocol")
+    host = host or CONFIG.get("carbon", "host")
+    port = port or CONFIG.getint("carbon", "port")
+
+    transports = {
+        'udp': UDPLineTransport,
+        'tcp': TCPLineTransport,
+        'pickle': PickleTransport,
+    }
+    if protocol not in transports:
+        raise ValueError("unknown carbon protocol %r (valid protocols: %s)" %
+                         (protocol, ", ".join(PROTOCOLS)))
+    return transports[protocol](host, port)
+
+
+class CarbonTransport(object):
+    """Base class for synchronous transports of metrics to a carbon backend.
+
+    The transport connects lazily, and will reconnect on the next send()
+    after a socket error.
+
+    """
+    socktype = None
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._socket = None
+
+    def __repr__(self):
+        return "%s(%r, %r)" % (self.__class__.__name__, self.host, self.port)
+
+    def send(self, metric_tuples):
+        """Sends a list of metric tuples to the carbon backend.
+
+        :raises: socket.error if sending failed.
+
+        """
+        if self._socket is None:
+            self._socket = self._connect()
+        try:
+            for payload in self.encode(metric_tuples):
+                self._socket.sendall(payload)
+        except socket.error:
+            self.close()
+            raise
+
+    def close(self):
+        """Closes the transport's socket, if open"""
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            finally:
+                self._socket = None
+
+    def _connect(self):
+        sock = socket.socket(_socktype_from_addr(self.host), self.socktype)
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect((self.host, self.port))
+        except socket.error:
+            sock.close()
+            raise
+        return sock
+
+    def encode(self, metric_tuples):
+        """Encodes metric tuples as a series of protocol payloads"""
+        raise NotImplementedError
+
+
+class UDPLineTransport(CarbonTransport):
+    """Sends metrics using the plaintext line protocol over UDP"""
+    socktype = socket.SOCK_DGRAM
+
+    def encode(self, metric_tuples):
+        return metrics_to_packets(metric_tuples)
+
+
+class TCPLineTransport(CarbonTransport):
+    """Sends metrics using the plaintext line protocol over TCP"""
+    socktype = socket.SOCK_STREAM
+
+    def encode(self, metric_tuples):
+        return metrics_to_stream(metric_tuples)
+
+
+class PickleTransport(CarbonTransport):
+    """Sends metrics using carbon's pickle protocol over TCP"""
+    socktype = socket.SOCK_STREAM
+
+    def encode(self, metric_tuples):
+        return metrics_to_pickles(metric_tuples)
 
 
 def _socktype_from_addr(addr):
@@ -158,3 +349,40 @@ def metrics_to_packets(metric_tuples):
     if output:
         packet = bytes(output)
         yield packet
+
+
+def metrics_to_stream(metric_tuples):
+    """
+    Converts a list of metric tuples to Graphite/Carbon line protocol data
+    ready to transmit over a TCP stream to a Carbon backend.
+
+    :param metric_tuples: A list of metric tuples in the form
+                          [(path, (timestamp, value)), ...]
+
+    :return: A generator that yields a single payload containing all the
+             metrics, or nothing at all if there were no metrics.
+
+    """
+    payload = b"".join(_metric_to_line(metric) for metric in metric_tuples)
+    if payload:
+        yield payload
+
+
+def metrics_to_pickles(metric_tuples, batch_size=MAX_PICKLE_BATCH):
+    """
+    Converts a list of metric tuples to a series of Carbon pickle protocol
+    messages ready to transmit over a TCP stream to a Carbon backend.
+
+    :param metric_tuples: A list of metric tuples in the form
+                          [(path, (timestamp, value)), ...]
+    :param batch_size: The maximum number of metrics per message.
+
+    :return: A generator that yields a series of length-prefixed pickle
+             messages.
+
+    """
+    metric_tuples = list(metric_tuples)
+    for index in range(0, len(metric_tuples), batch_size):
+        batch = metric_tuples[index:index + batch_size]
+        payload = pickle.dumps(batch, protocol=2)
+        yield struct.pack("!L", len(payload)) + payload
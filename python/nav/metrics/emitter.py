@@ -0,0 +1,197 @@
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Background metric emitters for long-running NAV programs.
+
+An emitter keeps a bounded in-memory queue of metric tuples, and sends them
+to Carbon in batches whenever a full batch is available, or when the oldest
+queued metric has waited for the flush interval, whichever comes first.
+Metrics that do not fit in the queue are dropped and counted, rather than
+blocking the caller.
+
+An emitter is typically installed using
+:py:func:`nav.metrics.carbon.install_emitter`, after which every call to
+:py:func:`nav.metrics.carbon.send_metrics` is handed off to it.
+"""
+import logging
+import socket
+import threading
+import time
+
+from django.utils.six.moves import queue
+
+from nav.metrics import CONFIG
+from nav.metrics import carbon
+
+_logger = logging.getLogger(__name__)
+
+# Minimum interval between log entries about dropped metrics, in seconds
+DROP_MESSAGE_INTERVAL = 60
+
+
+class BaseMetricEmitter(object):
+    """Common functionality for metric emitters"""
+
+    def __init__(self, host, port, protocol='udp', queue_size=100000,
+                 batch_size=500, flush_interval=1.0):
+        if protocol not in carbon.PROTOCOLS:
+            raise ValueError("unknown carbon protocol %r" % protocol)
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.sent = 0
+        self.dropped = 0
+        self._last_drop_message = 0
+
+    @classmethod
+    def from_config(cls, config=CONFIG):
+        """Creates an emitter from the [carbon] section of a graphite
+        config parser.
+
+        """
+        return cls(host=config.get('carbon', 'host'),
+                   port=config.getint('carbon', 'port'),
+                   protocol=config.get('carbon', 'protocol'),
+                   queue_size=config.getint('carbon', 'queue size'),
+                   batch_size=config.getint('carbon', 'batch size'),
+                   flush_interval=config.getfloat('carbon', 'flush interval'))
+
+    def __repr__(self):
+        return "%s(%r, %r, protocol=%r)" % (self.__class__.__name__,
+                                            self.host, self.port,
+                                            self.protocol)
+
+    def emit(self, metric_tuples):
+        """Queues a list of metric tuples for sending.
+
+        :param metric_tuples: A list of metric tuples in the form
+                              [(path, (timestamp, value)), ...]
+
+        """
+        raise NotImplementedError
+
+    def _count_dropped(self, count):
+        self.dropped += count
+        now = time.time()
+        if now - self._last_drop_message >= DROP_MESSAGE_INTERVAL:
+            self._last_drop_message = now
+            _logger.warning("metric queue is full (%d metrics), %d metrics "
+                            "dropped so far", self.queue_size, self.dropped)
+
+
+class MetricEmitter(BaseMetricEmitter):
+    """A metric emitter that sends metrics from a background thread.
+
+    This is suitable for threaded or synchronous programs. For Twisted-based
+    programs, see :py:class:`nav.ipdevpoll.carbon.TwistedMetricEmitter`.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(MetricEmitter, self).__init__(*args, **kwargs)
+        self.transport = carbon.make_transport(self.protocol, self.host,
+                                               self.port)
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the background sender thread"""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name="metric-emitter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stops the background sender thread and sends any metrics that
+        remain in the queue.
+
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def emit(self, metric_tuples):
+        dropped = 0
+        for metric in metric_tuples:
+            try:
+                self._queue.put_nowait(metric)
+            except queue.Full:
+                dropped += 1
+        if dropped:
+            self._count_dropped(dropped)
+
+    def flush(self):
+        """Synchronously sends everything currently in the queue"""
+        while True:
+            batch = self._get_nowait(self.batch_size)
+            if not batch:
+                break
+            self._send(batch)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._send(batch)
+
+    def _collect_batch(self):
+        """Waits for a full batch of metrics, or for the flush interval to
+        pass after the first metric of the batch was collected.
+
+        """
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stopping.is_set():
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _get_nowait(self, count):
+        batch = []
+        while len(batch) < count:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _send(self, batch):
+        try:
+            self.transport.send(batch)
+        except socket.error as error:
+            # pylint: disable=W0212
+            carbon._handle_error(error, self.host, self.port)
+        else:
+            self.sent += len(batch)
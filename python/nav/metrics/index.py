@@ -0,0 +1,269 @@
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""A local index of Graphite metric names.
+
+Walking a metric hierarchy through Graphite's /metrics/find API takes one
+request per node.  This index instead loads whole subtrees of the hierarchy,
+e.g. everything below `nav.devices.<sysname>`, using one wildcard request per
+level, and keeps them in an in-memory trie for a while.  Prefix, wildcard and
+leaf queries are then answered without talking to Graphite at all.
+
+"""
+from fnmatch import fnmatchcase
+import logging
+import re
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_ROOT_DEPTH = 3  # i.e. nav.devices.<sysname>
+DEFAULT_TTL = 300
+MAX_LEVELS = 10
+
+_BRACES = re.compile(r'{([^{}]*)}')
+
+
+class _Node(object):
+    __slots__ = ('children', 'leaf')
+
+    def __init__(self):
+        self.children = {}
+        self.leaf = False
+
+
+class MetricIndex(object):
+    """An in-memory trie of metric names, loaded one subtree at a time.
+
+    :param query: A function that runs a Graphite /metrics/find query and
+                  returns a list of node dicts, like
+                  :py:func:`nav.metrics.names.raw_metric_query`.
+    :param root_depth: The number of path elements in the root of each
+                       subtree that is loaded at once.
+    :param ttl: The number of seconds to keep a loaded subtree for. Expired
+                subtrees are swept from the index at most once per ttl, as
+                part of a lookup.
+    """
+    def __init__(self, query, root_depth=DEFAULT_ROOT_DEPTH, ttl=DEFAULT_TTL):
+        self.query = query
+        self.root_depth = root_depth
+        self.ttl = ttl
+        self._root = _Node()
+        self._expiry = {}
+        self._next_sweep = 0
+        self._lock = threading.RLock()
+
+    def covers(self, path):
+        """Returns True if path is deep enough to be within a loadable
+        subtree.
+
+        """
+        return len(path.split('.')) >= self.root_depth
+
+    def add(self, path, leaf=True):
+        """Adds a metric path to the index"""
+        with self._lock:
+            _add_path(self._root, path.split('.'), leaf)
+
+    def is_leaf(self, path):
+        """Returns True if path is a known leaf metric"""
+        self._ensure_loaded(path)
+        with self._lock:
+            node = self._get_node(path)
+            return node is not None and node.leaf
+
+    def get_leaves_below(self, top, ignored=None):
+        """Returns a list of all leaf metrics below top, leaving out the
+        subtrees of the paths in ignored, or None if top is not in the
+        index.
+
+        """
+        self._ensure_loaded(top)
+        ignored = set(ignored or [])
+        with self._lock:
+            node = self._get_node(top)
+            if node is None:
+                return None
+            result = []
+            self._collect_leaves(top, node, ignored, result)
+            return result
+
+    def find(self, pattern):
+        """Returns a sorted list of the metric paths matching pattern.
+
+        As in Graphite, each element of the pattern may contain the wildcards
+        `*`, `?` and `[...]`, as well as lists of alternatives like `{a,b}`.
+        The first root_depth elements of the pattern must not contain
+        wildcards, so that the pattern is within a single loadable subtree.
+
+        :raises ValueError: if the pattern starts with a wildcard element.
+
+        """
+        elements = pattern.split('.')
+        root = '.'.join(elements[:self.root_depth])
+        if any(char in root for char in '*?[{'):
+            raise ValueError("pattern must start with %d literal elements: %s"
+                             % (self.root_depth, pattern))
+        self._ensure_loaded(root)
+        with self._lock:
+            nodes = [('', self._root)]
+            for element in elements:
+                matching = []
+                for path, node in nodes:
+                    for name in _match_children(node, element):
+                        matching.append((path + '.' + name if path else name,
+                                         node.children[name]))
+                nodes = matching
+            return sorted(path for path, _ in nodes)
+
+    def mark_empty(self, path):
+        """Records that path exists but has no metrics below it, so that
+        queries for it are answered from the index until its subtree expires.
+
+        """
+        self.add(path, leaf=False)
+
+    def invalidate(self, path=None):
+        """Forgets the subtree containing path, or everything if path is
+        None.
+
+        """
+        with self._lock:
+            if path is None:
+                self._root = _Node()
+                self._expiry.clear()
+                self._next_sweep = 0
+            else:
+                root = self._get_root(path)
+                self._expiry.pop(root, None)
+                self._remove(root)
+
+    def _ensure_loaded(self, path):
+        if not self.covers(path):
+            return
+        root = self._get_root(path)
+        with self._lock:
+            now = time.time()
+            if now >= self._next_sweep:
+                self._sweep(now)
+            if self._expiry.get(root, 0) > now:
+                return
+        # Graphite is queried without holding the lock, so that lookups in
+        # other subtrees aren't held up while this one loads
+        subtree = self._load(root)
+        with self._lock:
+            self._replace(root, subtree)
+            self._expiry[root] = time.time() + self.ttl
+
+    def _sweep(self, now):
+        """Removes all expired subtrees from the index"""
+        expired = [root for root, expiry in self._expiry.items()
+                   if expiry <= now]
+        for root in expired:
+            del self._expiry[root]
+            self._remove(root)
+        self._next_sweep = now + self.ttl
+        if expired:
+            _logger.debug("swept %d expired metric subtrees", len(expired))
+
+    def _load(self, root):
+        """Loads all metrics below root, using one query per level.
+
+        :returns: The root node of a new subtree holding the metrics.
+        """
+        subtree = _Node()
+        pattern = root
+        prefix_length = len(root) + 1
+        count = 0
+        for _level in range(MAX_LEVELS):
+            pattern += '.*'
+            nonleaves = False
+            for node in self.query(pattern):
+                leaf = node.get('leaf', False)
+                _add_path(subtree, node['id'][prefix_length:].split('.'),
+                          leaf)
+                nonleaves = nonleaves or not leaf
+                count += 1
+            if not nonleaves:
+                break
+        _logger.debug("loaded %d metric nodes below %s", count, root)
+        return subtree
+
+    def _replace(self, path, subtree):
+        parent_path, _, name = path.rpartition('.')
+        parent = self._root
+        if parent_path:
+            parent = _add_path(parent, parent_path.split('.'), leaf=False)
+        parent.children[name] = subtree
+
+    def _get_root(self, path):
+        return '.'.join(path.split('.')[:self.root_depth])
+
+    def _get_node(self, path):
+        node = self._root
+        for name in path.split('.'):
+            node = node.children.get(name)
+            if node is None:
+                return None
+        return node
+
+    def _remove(self, path):
+        parent_path, _, name = path.rpartition('.')
+        parent = self._get_node(parent_path) if parent_path else self._root
+        if parent is not None:
+            parent.children.pop(name, None)
+
+    def _collect_leaves(self, path, node, ignored, result):
+        children = sorted(node.children.items())
+        result.extend(path + '.' + name for name, child in children
+                      if child.leaf and path + '.' + name not in ignored)
+        for name, child in children:
+            child_path = path + '.' + name
+            if child.children and child_path not in ignored:
+                self._collect_leaves(child_path, child, ignored, result)
+
+
+def _add_path(node, names, leaf):
+    """Adds the path of names below node, and returns the node at the end of
+    the path.
+
+    """
+    for name in names:
+        node = node.children.setdefault(name, _Node())
+    node.leaf = node.leaf or leaf
+    return node
+
+
+def _match_children(node, element):
+    """Returns the names of the children of node matching a single pattern
+    element.
+
+    """
+    alternatives = _expand_braces(element)
+    if not any(char in element for char in '*?['):
+        return [name for name in alternatives if name in node.children]
+    return [name for name in node.children
+            if any(fnmatchcase(name, alt) for alt in alternatives)]
+
+
+def _expand_braces(element):
+    match = _BRACES.search(element)
+    if not match:
+        return [element]
+    head, tail = element[:match.start()], element[match.end():]
+    return [expanded
+            for alternative in match.group(1).split(',')
+            for expanded in _expand_braces(head + alternative + tail)]
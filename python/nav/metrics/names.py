@@ -18,10 +18,15 @@
 from collections import OrderedDict
 import itertools
 import json
+import logging
 from django.utils.six.moves.urllib.parse import urlencode, urljoin
 from django.utils.six.moves.urllib.request import Request, urlopen
 from django.utils.six.moves.urllib.error import URLError
 from nav.metrics import CONFIG, errors
+from nav.metrics.index import MetricIndex
+
+_logger = logging.getLogger(__name__)
+_metric_index = None
 
 
 def escape_metric_name(string):
@@ -53,11 +58,39 @@ def join_series(names):
     return ".".join(series)
 
 
+def get_metric_index():
+    """Returns the process-wide local index of Graphite metric names"""
+    global _metric_index  # pylint: disable=W0603
+    if _metric_index is None:
+        _metric_index = MetricIndex(raw_metric_query)
+    return _metric_index
+
+
 def get_all_leaves_below(top, ignored=None):
-    """Gets a list of all leaf nodes in the metric hierarchy below top"""
+    """Gets a list of all leaf nodes in the metric hierarchy below top.
+
+    Deep enough paths, such as those of devices and their ports, are looked
+    up in the local metric index.  If top is not found there, the hierarchy
+    is walked through Graphite instead, and the result is remembered.
+
+    """
+    index = get_metric_index()
+    if index.covers(top):
+        leaves = index.get_leaves_below(top, ignored)
+        if leaves is not None:
+            return leaves
+        _logger.debug("%s not in metric index, asking Graphite", top)
+
     walker = nodewalk(top, ignored)
     paths = (leaves for (name, nonleaves, leaves) in walker)
-    return list(itertools.chain(*paths))
+    leaves = list(itertools.chain(*paths))
+    if index.covers(top) and not ignored:
+        if leaves:
+            for leaf in leaves:
+                index.add(leaf)
+        else:
+            index.mark_empty(top)
+    return leaves
 
 
 def get_metric_leaf_children(path):
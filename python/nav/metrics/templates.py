@@ -16,6 +16,9 @@
 """
 Metric naming templates for various things that NAV sends/retrieves from
 Graphite.
+
+Programs that build the same metric paths over and over again, such as the
+ipdevpoll stat plugins, can cache them using :py:class:`MetricPathCache`.
 """
 from django.utils import six
 
@@ -30,6 +33,12 @@ def metric_prefix_for_ipdevpoll_job(sysname, job_name):
                        job_name=escape_metric_name(job_name))
 
 
+def metric_prefix_for_ipdevpoll_process(hostname, process):
+    tmpl = "nav.ipdevpoll.{hostname}.{process}"
+    return tmpl.format(hostname=escape_metric_name(hostname),
+                       process=escape_metric_name(process))
+
+
 def metric_path_for_bandwith(sysname, is_percent):
     tmpl = "{system}.bandwidth{percent}"
     return tmpl.format(system=metric_prefix_for_system(sysname),
@@ -169,3 +178,66 @@ def metric_path_for_multicast_usage(group, sysname):
         sysname = sysname.sysname
     return tmpl.format(group=metric_prefix_for_multicast_group(group),
                        sysname=escape_metric_name(sysname))
+
+
+#
+# Metric path caching
+#
+
+# Don't keep metric path caches for more netboxes than this
+MAX_PATH_CACHES = 20000
+
+_path_caches = {}
+
+
+def get_metric_path_cache(sysname, scope=None):
+    """Returns the metric path cache of a netbox.
+
+    :param sysname: The sysname of the netbox.
+    :param scope: The name of the user of the cache, e.g. a plugin name.
+                  Users that sweep their caches at different intervals
+                  should use different scopes.
+
+    """
+    key = (scope, sysname)
+    cache = _path_caches.get(key)
+    if cache is None:
+        if len(_path_caches) >= MAX_PATH_CACHES:
+            _path_caches.clear()
+        cache = _path_caches[key] = MetricPathCache()
+    return cache
+
+
+class MetricPathCache(object):
+    """A cache of metric paths built from template functions, typically all
+    of them for a single netbox.
+
+    Paths that haven't been asked for since the previous call to sweep() are
+    removed by the next, so that paths of e.g. renamed interfaces don't
+    linger in the cache.
+    """
+    def __init__(self):
+        self._paths = {}
+        self._previous = {}
+
+    def __len__(self):
+        return len(self._paths) + len(self._previous)
+
+    def get(self, template, *args):
+        """Returns template(*args), from the cache if possible"""
+        key = (template, args)
+        path = self._paths.get(key)
+        if path is None:
+            path = self._previous.pop(key, None)
+            if path is None:
+                path = template(*args)
+            self._paths[key] = path
+        return path
+
+    def sweep(self):
+        """Removes all paths that haven't been asked for since the previous
+        sweep.
+
+        """
+        self._previous = self._paths
+        self._paths = {}
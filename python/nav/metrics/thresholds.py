@@ -59,26 +59,30 @@ This module should provide an API for evaluating threshold expressions.
 Alerting is outside of the scope of this module.
 
 """
+from collections import defaultdict
 from datetime import timedelta
-from functools import partial
 import logging
+import operator
 import re
 
-from django.utils.six import iteritems, iterkeys
+from django.utils.six import iteritems
 
 from nav.metrics.data import get_metric_average
 from nav.metrics.graphs import get_metric_meta, extract_series_name
+from nav.metrics.names import escape_metric_name
 
 
 # Pattern to extract the ID of a metric from a series name returned in a
 # Graphite render response.
 from nav.metrics.lookup import lookup
-from nav.models.manage import Interface
+from nav.models.manage import Interface, Netbox
 
 
 EXPRESSION_PATTERN = re.compile(r'^ \s* (?P<operator> [<>] ) \s* '
                                 r'(?P<value> ([+-])? [0-9]+(\.[0-9]+)? ) \s*'
                                 r'(?P<percent>%)? \s* $', re.VERBOSE)
+INTERFACE_PATTERN = re.compile(
+    r'\.devices\.(?P<sysname>[^.]+)\.ports\.(?P<ifname>[^.]+)')
 
 DEFAULT_INTERVAL = timedelta(minutes=10)
 MINUTE = timedelta(minutes=1).total_seconds()
@@ -148,6 +152,10 @@ class ThresholdEvaluator(object):
         Evaluates expression for each of the retrieved values from the last
         call to get_values().
 
+        The expression is evaluated for the entire result set in one pass.
+        For relative (percent) expressions, the maximum values of all the
+        metrics are resolved in bulk beforehand.
+
         :param expression: A comparison expression to evaluate against the
                            collected data. Example: '>20%'.
         :type expression: basestring
@@ -156,45 +164,52 @@ class ThresholdEvaluator(object):
         :returns: A list of (metric, current_value) tuples for metrics whose
                   last retrieved current value matches the expression.
         """
-        matcher = self._get_matcher(expression)
-        result = [(metric, self.result[metric]['value'])
-                  for metric in iterkeys(self.result)
-                  if bool(matcher(metric)) ^ bool(invert)]
-        return result
+        compare, value, percent = parse_expression(expression)
+        metrics = list(self.result)
+        currents = self._calculate_currents(percent, metrics)
+        matches = [bool(current and compare(current, value)) ^ bool(invert)
+                   for current in currents]
+        return [(metric, self.result[metric]['value'])
+                for metric, match in zip(metrics, matches) if match]
+
+    def _calculate_currents(self, percent, metrics):
+        """Returns a list of current values for each of metrics, as
+        percentages of their maximum values if percent is True.
 
-    def _get_matcher(self, expression):
-        match = EXPRESSION_PATTERN.match(expression)
-        if not match:
-            raise InvalidExpressionError(expression)
-        value = float(match.group('value'))
-        percent = bool(match.group('percent'))
-        oper = match.group('operator')
-        if oper == '<':
-            matcher = partial(self._lt, value, percent)
-        else:
-            matcher = partial(self._gt, value, percent)
-        return matcher
-
-    def _gt(self, value, percent, metric):
-        current = self._calculate_current(percent, metric)
-        if current:
-            return current > value
-
-    def _lt(self, value, percent, metric):
-        current = self._calculate_current(percent, metric)
-        if current:
-            return current < value
-
-    def _calculate_current(self, percent, metric):
-        if metric in self.result:
-            current = self.result[metric]['value']
-            if percent:
-                maximum = get_metric_maximum(metric)
-                if not maximum:
-                    return None  # cannot relatively match a maximum=0
+        """
+        values = [self.result[metric]['value'] for metric in metrics]
+        if not percent:
+            return values
+
+        maxima = self._get_maxima(metrics)
+        return [(current / maximum) * 100.0 if maximum else None
+                for current, maximum in zip(values, maxima)]
+
+    def _get_maxima(self, metrics):
+        missing = [metric for metric in metrics
+                   if 'max' not in self.result[metric]]
+        if missing:
+            for metric, maximum in iteritems(get_metric_maxima(missing)):
                 self.result[metric]['max'] = maximum
-                current = (current / maximum) * 100.0
-            return current
+        return [self.result[metric]['max'] for metric in metrics]
+
+
+def parse_expression(expression):
+    """Parses a threshold expression.
+
+    :param expression: A comparison expression, e.g. '>20%'.
+    :returns: A tuple of (comparison function, value, percent), where percent
+              is True if the value is relative to a metric's maximum value.
+    :raises: InvalidExpressionError if the expression is invalid.
+
+    """
+    match = EXPRESSION_PATTERN.match(expression)
+    if not match:
+        raise InvalidExpressionError(expression)
+    value = float(match.group('value'))
+    percent = bool(match.group('percent'))
+    compare = operator.lt if match.group('operator') == '<' else operator.gt
+    return compare, value, percent
 
 
 def get_metric_maximum(metric):
@@ -213,6 +228,76 @@ def get_metric_maximum(metric):
                 return maximum
 
 
+def get_metric_maxima(metrics):
+    """
+    Returns the maximum values of a list of metrics, where they can be
+    determined.
+
+    This is equivalent to calling get_metric_maximum() for each metric, but
+    resolves all the metrics using a constant number of database queries.
+
+    :returns: A dict mapping each metric to its maximum value, or None.
+    """
+    result = dict((metric, None) for metric in metrics)
+    wanted = {}
+    for metric in metrics:
+        match = INTERFACE_PATTERN.search(metric)
+        counter = metric.split('.')[-1]
+        if match and 'octets' in counter.lower():
+            wanted[metric] = (match.group('sysname'), match.group('ifname'))
+    if not wanted:
+        return result
+
+    speeds = _get_interface_speeds(set(sysname for sysname, _ in
+                                       wanted.values()))
+    for metric, key in iteritems(wanted):
+        speed = speeds.get(key)
+        if speed:
+            # Making an unsafe assumption that interface traffic
+            # numbers are always retrieved in bits/s
+            result[metric] = speed * MEGA
+    return result
+
+
+def _get_interface_speeds(sysnames):
+    """Returns a dict mapping (sysname, ifname) tuples, as escaped in metric
+    names, to interface speeds, for all interfaces of the netboxes whose
+    escaped sysnames are listed in sysnames.
+
+    Like the metric reverse lookup, ifnames are matched against an interface's
+    ifname first, and its ifdescr second, and ambiguous matches are ignored.
+
+    """
+    # escaped characters are all replaced by underscores, which conveniently
+    # are single character wildcards in LIKE patterns
+    candidates = Netbox.objects.extra(
+        where=['sysname::TEXT LIKE ANY(%s)'],
+        params=[list(sysnames)]).values_list('id', 'sysname')
+    netboxes = dict((netboxid, escape_metric_name(sysname))
+                    for netboxid, sysname in candidates
+                    if escape_metric_name(sysname) in sysnames)
+    if not netboxes:
+        return {}
+
+    by_ifname = defaultdict(list)
+    by_ifdescr = defaultdict(list)
+    interfaces = Interface.objects.filter(
+        netbox__in=list(netboxes)).values_list(
+            'netbox_id', 'ifname', 'ifdescr', 'speed')
+    for netboxid, ifname, ifdescr, speed in interfaces:
+        sysname = netboxes[netboxid]
+        by_ifname[(sysname, escape_metric_name(ifname))].append(speed)
+        by_ifdescr[(sysname, escape_metric_name(ifdescr))].append(speed)
+
+    speeds = dict((key, values[0])
+                  for key, values in iteritems(by_ifdescr)
+                  if len(values) == 1)
+    speeds.update((key, values[0])
+                  for key, values in iteritems(by_ifname)
+                  if len(values) == 1)
+    return speeds
+
+
 class InvalidExpressionError(Exception):
     """Invalid threshold match expression"""
     pass
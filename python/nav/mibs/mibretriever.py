@@ -34,7 +34,7 @@ import logging
 
 from django.utils import six
 
-from twisted.internet import defer, reactor
+from twisted.internet import defer
 from twisted.internet.defer import returnValue
 from twisted.internet.error import TimeoutError
 
@@ -375,76 +375,83 @@ class MibRetriever(object):
         if node.raw_mib_data['nodetype'] != 'column':
             self._logger.debug("%s is not a table column", column_name)
 
-        def _result_formatter(result):
-            formatted_result = {}
+        deferred = self.agent_proxy.getTable([str(node.oid)])
+        deferred.addCallbacks(self._format_columns, self._valueerror_handler,
+                              callbackArgs=([column_name],),
+                              errbackArgs=([column_name],))
+        deferred.addCallback(lambda result: result.get(column_name, {}))
+        return deferred
+
+    def _format_columns(self, result, column_names):
+        """Formats a getTable result for a list of columns as a dictionary:
+
+          { column_name: { row_index: column_value } }
+
+        Unsupported columns are left out.
+        """
+        formatted_result = {}
+        for column_name in column_names:
+            node = self.nodes[column_name]
             # result keys may be OID objects/tuples or strings, depending on
             # snmp library used
             if node.oid not in result and str(node.oid) not in result:
                 self._logger.debug("%s (%s) seems to be unsupported, result "
                                    "keys were: %r",
                                    column_name, node.oid, result.keys())
-                return {}
+                continue
             varlist = result.get(node.oid, result.get(str(node.oid), None))
 
+            column = formatted_result[column_name] = {}
             for oid, value in varlist.items():
                 # Extract index information from oid
                 row_index = OID(oid).strip_prefix(node.oid)
-                formatted_result[row_index] = value
+                column[row_index] = value
 
-            return formatted_result
-
-        def _valueerror_handler(failure):
-            failure.trap(ValueError)
-            self._logger.warning("got a possibly strange response from device "
-                                 "when asking for %s::%s, ignoring: %s",
-                                 self.mib.get('moduleName', ''), column_name,
-                                 failure.getErrorMessage())
-            return {}  # alternative is to retry or raise a Timeout exception
+        return formatted_result
 
-        deferred = self.agent_proxy.getTable([str(node.oid)])
-        deferred.addCallbacks(_result_formatter, _valueerror_handler)
-        return deferred
+    def _valueerror_handler(self, failure, column_names):
+        failure.trap(ValueError)
+        self._logger.warning("got a possibly strange response from device "
+                             "when asking for %s::%s, ignoring: %s",
+                             self.mib.get('moduleName', ''),
+                             ", ".join(column_names),
+                             failure.getErrorMessage())
+        return {}  # alternative is to retry or raise a Timeout exception
 
     def retrieve_columns(self, column_names):
         """Retrieve a set of table columns.
 
         The table columns may come from different tables, as long as
-        the table rows are indexed the same way.
+        the table rows are indexed the same way. All the columns are
+        retrieved in parallel, using GETBULK requests that carry a varbind
+        for each column.
 
         Returns a deferred whose result is a dictionary:
 
           { row_index: MibTableResultRow instance }
 
         """
-        def _sortkey(col):
-            return self.nodes[col].oid
-        columns = iter(sorted(column_names, key=_sortkey))
-
-        final_result = {}
-        my_deferred = defer.Deferred()
-
-        def _result_aggregate(result, column):
-            for row_index, value in result.items():
-                if row_index not in final_result:
-                    final_result[row_index] = \
-                        MibTableResultRow(row_index, column_names)
-                final_result[row_index][column] = value
-            return True
-
-        # schedule the next iteration (i.e. collect next column)
-        def _schedule_next(_result=None):
-            try:
-                column = next(columns)
-            except StopIteration:
-                my_deferred.callback(final_result)
-                return
-            deferred = self.retrieve_column(column)
-            deferred.addCallback(_result_aggregate, column)
-            deferred.addCallback(_schedule_next)
-            deferred.addErrback(my_deferred.errback)
-
-        reactor.callLater(0, _schedule_next)
-        return my_deferred
+        column_names = sorted(column_names, key=lambda col: self.nodes[col].oid)
+
+        def _result_aggregate(result):
+            final_result = {}
+            for column, values in result.items():
+                for row_index, value in values.items():
+                    if row_index not in final_result:
+                        final_result[row_index] = \
+                            MibTableResultRow(row_index, column_names)
+                    final_result[row_index][column] = value
+            return final_result
+
+        if not column_names:
+            return defer.succeed({})
+        oids = [str(self.nodes[column].oid) for column in column_names]
+        deferred = self.agent_proxy.getTable(oids)
+        deferred.addCallbacks(self._format_columns, self._valueerror_handler,
+                              callbackArgs=(column_names,),
+                              errbackArgs=(column_names,))
+        deferred.addCallback(_result_aggregate)
+        return deferred
 
     def retrieve_table(self, table_name):
         """Table retriever and formatter.
@@ -669,7 +676,8 @@ class MultiMibMixIn(MibRetriever):
                   will be taken from the MIB instance list..
 
         """
-        agent = self._base_agent
+        # a job's handle to a pooled session isn't itself an AgentProxy
+        agent = getattr(self._base_agent, 'pooled_agent', self._base_agent)
         alt_agent = agent.__class__(
             agent.ip,
             agent.port,
@@ -541,24 +541,10 @@ class AlertProfile(models.Model):
         now = datetime.now()
 
         # Limit our query to the correct type of time periods
-        if now.isoweekday() in [6, 7]:
-            valid_during = [TimePeriod.ALL_WEEK, TimePeriod.WEEKENDS]
-        else:
-            valid_during = [TimePeriod.ALL_WEEK, TimePeriod.WEEKDAYS]
-
-        # The following code should get the currently active timeperiod.
-        active_timeperiod = None
-        timeperiods = list(self.timeperiod_set.filter(
-            valid_during__in=valid_during).order_by('start'))
-        # If the current time is before the start of the first time
-        # period, the active time period is the last one (i.e. from
-        # the day before)
-        if len(timeperiods) > 0 and timeperiods[0].start > now.time():
-            active_timeperiod = timeperiods[-1]
-        else:
-            for period in timeperiods:
-                if period.start <= now.time():
-                    active_timeperiod = period
+        valid_during = TimePeriod.get_valid_during(now)
+        timeperiods = self.timeperiod_set.filter(
+            valid_during__in=valid_during).order_by('start')
+        active_timeperiod = TimePeriod.find_active(timeperiods, now)
 
         if active_timeperiod:
             logger.debug("Active timeperiod for alertprofile %d is %s (%d)",
@@ -595,6 +581,37 @@ class TimePeriod(models.Model):
         return u'from %s for %s profile on %s' % (
             self.start, self.profile, self.get_valid_during_display())
 
+    @classmethod
+    def get_valid_during(cls, now):
+        """Returns the valid_during values of time periods that apply to the
+        weekday of now.
+
+        """
+        if now.isoweekday() in [6, 7]:
+            return [cls.ALL_WEEK, cls.WEEKENDS]
+        else:
+            return [cls.ALL_WEEK, cls.WEEKDAYS]
+
+    @staticmethod
+    def find_active(timeperiods, now):
+        """Finds the time period that is active at the time of now.
+
+        :param timeperiods: A profile's time periods that apply to the
+                            weekday of now, sorted by start time.
+        """
+        active_timeperiod = None
+        timeperiods = list(timeperiods)
+        # If the current time is before the start of the first time
+        # period, the active time period is the last one (i.e. from
+        # the day before)
+        if len(timeperiods) > 0 and timeperiods[0].start > now.time():
+            active_timeperiod = timeperiods[-1]
+        else:
+            for period in timeperiods:
+                if period.start <= now.time():
+                    active_timeperiod = period
+        return active_timeperiod
+
 
 @python_2_unicode_compatible
 class AlertSubscription(models.Model):
@@ -818,11 +835,56 @@ class Filter(models.Model):
         """
         logger = logging.getLogger('nav.alertengine.filter.check')
 
+        filtr, exclude, extra = self.get_query_arguments()
+
+        # Limit ourselves to our alert
+        filtr['id'] = alert.id
+
+        logger.debug(
+            'alert %d: checking against filter %d with filter: %s, exclude: '
+            '%s and extra: %s',
+            alert.id, self.id, filtr, exclude, extra)
+
+        # Check the alert maches whith a SELECT COUNT(*) FROM .... so that the
+        # db doesn't have to work as much.
+        if AlertQueue.objects.filter(**filtr).exclude(**exclude).extra(
+                **extra).count():
+            logger.debug('alert %d: matches filter %d', alert.id, self.id)
+            return True
+
+        logger.debug('alert %d: did not match filter %d', alert.id, self.id)
+        return False
+
+    def get_matching_alert_ids(self, alert_ids, expressions=None):
+        """Returns the set of ids from alert_ids whose alerts match this
+        filter, using a single query for the entire batch of alerts.
+
+        :param alert_ids: A collection of AlertQueue primary keys.
+        :param expressions: The expressions to match against, if not all of
+                            this filter's expressions.
+        """
+        filtr, exclude, extra = self.get_query_arguments(expressions)
+        filtr['id__in'] = list(alert_ids)
+        return set(AlertQueue.objects.filter(**filtr).exclude(
+            **exclude).extra(**extra).values_list('id', flat=True))
+
+    def get_query_arguments(self, expressions=None):
+        """Combines expressions to the arguments of an ORM query that selects
+        alerts matching this filter.
+
+        :param expressions: The expressions to combine, if not all of this
+                            filter's expressions.
+        :returns: A tuple of three dicts, to be used as arguments to the ORM
+                  .filter(), .exclude() and .extra() methods, respectively.
+        """
         filtr = {}
         exclude = {}
         extra = {'where': [], 'params': []}
 
-        for expression in self.expression_set.all():
+        if expressions is None:
+            expressions = self.expression_set.all()
+
+        for expression in expressions:
             # Handle IP datatypes:
             if expression.match_field.data_type == MatchField.IP:
                 # Trick the ORM into joining the tables we want
@@ -887,26 +949,10 @@ class Filter(models.Model):
                 else:
                     filtr[lookup] = expression.value
 
-        # Limit ourselves to our alert
-        filtr['id'] = alert.id
-
         if not extra['where']:
             extra = {}
 
-        logger.debug(
-            'alert %d: checking against filter %d with filter: %s, exclude: '
-            '%s and extra: %s',
-            alert.id, self.id, filtr, exclude, extra)
-
-        # Check the alert maches whith a SELECT COUNT(*) FROM .... so that the
-        # db doesn't have to work as much.
-        if AlertQueue.objects.filter(**filtr).exclude(**exclude).extra(
-                **extra).count():
-            logger.debug('alert %d: matches filter %d', alert.id, self.id)
-            return True
-
-        logger.debug('alert %d: did not match filter %d', alert.id, self.id)
-        return False
+        return filtr, exclude, extra
 
 
 @python_2_unicode_compatible
@@ -0,0 +1,255 @@
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Longest prefix match lookups of IPv4 and IPv6 addresses.
+
+A :py:class:`PrefixIndex` maps IP prefixes to arbitrary values, and finds
+the value of the most specific prefix that contains a given address. Each
+prefix length in use has its own hash table of network numbers, so a lookup
+costs one dictionary lookup per distinct prefix length in the index,
+regardless of the number of prefixes.
+
+A :py:class:`PrefixIdIndex` maps the prefixes of NAV's prefix table to their
+database ids, and can be kept up to date incrementally.
+"""
+from datetime import timedelta
+
+from IPy import IP
+
+ADDRESS_BITS = {4: 32, 6: 128}
+
+
+class PrefixIndex(object):
+    """An index of IPv4 and IPv6 prefixes, supporting longest prefix match
+    lookups.
+
+    :param prefixes: An optional iterable of (prefix, value) pairs to
+                     populate the index with.
+    """
+    def __init__(self, prefixes=()):
+        self._tables = {4: {}, 6: {}}
+        self._lengths = {4: (), 6: ()}
+        self._count = 0
+        for prefix, value in prefixes:
+            self.add(prefix, value)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, prefix):
+        version, length, key = _prefix_key(prefix)
+        return key in self._tables[version].get(length, ())
+
+    def __iter__(self):
+        """Iterates over all (prefix, value) pairs in the index"""
+        for version, tables in self._tables.items():
+            bits = ADDRESS_BITS[version]
+            for length, table in tables.items():
+                for key, value in table.items():
+                    prefix = IP(key << (bits - length), ipversion=version)
+                    yield prefix.make_net(length), value
+
+    def add(self, prefix, value):
+        """Adds a prefix to the index, replacing any existing value"""
+        version, length, key = _prefix_key(prefix)
+        tables = self._tables[version]
+        if length not in tables:
+            tables[length] = {}
+            self._lengths[version] = tuple(sorted(tables, reverse=True))
+        if key not in tables[length]:
+            self._count += 1
+        tables[length][key] = value
+
+    def remove(self, prefix):
+        """Removes a prefix from the index.
+
+        :raises KeyError: if prefix is not in the index.
+        """
+        version, length, key = _prefix_key(prefix)
+        tables = self._tables[version]
+        if key not in tables.get(length, ()):
+            raise KeyError(prefix)
+        del tables[length][key]
+        self._count -= 1
+        if not tables[length]:
+            del tables[length]
+            self._lengths[version] = tuple(sorted(tables, reverse=True))
+
+    def clear(self):
+        """Removes all prefixes from the index"""
+        self._tables = {4: {}, 6: {}}
+        self._lengths = {4: (), 6: ()}
+        self._count = 0
+
+    def get(self, prefix, default=None):
+        """Returns the value of exactly prefix, or default if prefix is not
+        in the index.
+
+        """
+        version, length, key = _prefix_key(prefix)
+        return self._tables[version].get(length, {}).get(key, default)
+
+    def lookup(self, address, default=None):
+        """Returns the value of the most specific prefix that contains
+        address, or default if no prefix contains it.
+
+        """
+        for _length, value in self._matches(address):
+            return value
+        return default
+
+    def lookup_all(self, address):
+        """Returns the values of all prefixes that contain address, from the
+        most specific to the least specific.
+
+        """
+        return [value for _length, value in self._matches(address)]
+
+    def _matches(self, address):
+        if not isinstance(address, IP):
+            address = IP(address)
+        version = address.version()
+        bits = ADDRESS_BITS[version]
+        number = address.int()
+        tables = self._tables[version]
+        # _lengths is replaced, not mutated, when prefix lengths change
+        for length in self._lengths[version]:
+            value = tables[length].get(number >> (bits - length), _MISSING)
+            if value is not _MISSING:
+                yield length, value
+
+
+_MISSING = object()
+
+
+def _prefix_key(prefix):
+    if not isinstance(prefix, IP):
+        prefix = IP(prefix)
+    version = prefix.version()
+    length = prefix.prefixlen()
+    return version, length, prefix.int() >> (ADDRESS_BITS[version] - length)
+
+
+class PrefixIdIndex(PrefixIndex):
+    """A PrefixIndex of NAV's prefix table, mapping each prefix to its
+    database id.
+
+    The index is populated and updated using :py:meth:`refresh`. After the
+    first load, only the prefixes that have been recorded as changed in the
+    prefix_change table since the previous refresh are reloaded. Since a
+    change may be committed some time after it was recorded, changes are
+    looked up from CHANGE_MARGIN before the previous refresh, and all
+    prefixes are reloaded every FULL_RELOAD_INTERVAL.
+
+    Database access is separated from updating the index, so that the
+    database queries can run in a different thread than the index lookups.
+
+    """
+    CHANGE_MARGIN = timedelta(minutes=10)
+    FULL_RELOAD_INTERVAL = timedelta(hours=1)
+
+    def __init__(self):
+        super(PrefixIdIndex, self).__init__()
+        self._prefixes = {}
+        self._last_load = None
+        self._last_full_load = None
+
+    def clear(self):
+        super(PrefixIdIndex, self).clear()
+        self._prefixes = {}
+        self._last_load = None
+        self._last_full_load = None
+
+    def refresh(self):
+        """Synchronously brings the index up to date with the database"""
+        self.apply_changes(self.get_changes())
+
+    def get_changes(self):
+        """Loads the changes that have been made to the prefix table since
+        the last refresh of this index.
+
+        A prefix whose net address has changed is reported both as removed
+        and as new.
+
+        :returns: A tuple of a set of removed prefix ids, a list of
+                  (prefix id, net address) tuples of new prefixes and the
+                  database time of the load, suitable as arguments to
+                  :py:meth:`apply_changes`.
+        """
+        from nav.models.manage import Prefix
+
+        load_time = get_database_time()
+        queryset = Prefix.objects.all()
+        if self._is_full_load_due(load_time):
+            candidate_ids = set(self._prefixes)
+        else:
+            candidate_ids = load_changed_prefix_ids(
+                self._last_load - self.CHANGE_MARGIN)
+            if not candidate_ids:
+                return set(), [], load_time
+            queryset = queryset.filter(id__in=candidate_ids)
+
+        current = set(queryset.values_list('id', 'net_address'))
+        known = set((prefix_id, self._prefixes[prefix_id])
+                    for prefix_id in candidate_ids
+                    if prefix_id in self._prefixes)
+        removed = set(prefix_id for prefix_id, _ in known - current)
+        new_prefixes = sorted(current - known)
+        return removed, new_prefixes, load_time
+
+    def _is_full_load_due(self, load_time):
+        return (self._last_full_load is None or
+                load_time - self._last_full_load >= self.FULL_RELOAD_INTERVAL)
+
+    def apply_changes(self, changes):
+        """Applies changes loaded by :py:meth:`get_changes` to the index"""
+        removed, new_prefixes, load_time = changes
+        for prefix_id in removed:
+            net_address = self._prefixes.pop(prefix_id, None)
+            if net_address is not None:
+                prefix = IP(net_address)
+                if self.get(prefix) == prefix_id:
+                    self.remove(prefix)
+        for prefix_id, net_address in new_prefixes:
+            self._prefixes[prefix_id] = net_address
+            self.add(net_address, prefix_id)
+
+        if self._is_full_load_due(load_time):
+            self._last_full_load = load_time
+        self._last_load = load_time
+
+
+def load_changed_prefix_ids(since):
+    """Loads the ids of prefixes that have changed in the database.
+
+    :param since: A timestamp, in database time, to look for changes from.
+    :returns: A set of prefix ids. Deleted prefixes are included.
+
+    """
+    from django.db import connection
+
+    cursor = connection.cursor()
+    cursor.execute("SELECT prefixid FROM prefix_change WHERE changed_at >= %s",
+                   [since])
+    return set(prefixid for prefixid, in cursor.fetchall())
+
+
+def get_database_time():
+    """Returns the current time of the database server"""
+    from django.db import connection
+
+    cursor = connection.cursor()
+    cursor.execute("SELECT LOCALTIMESTAMP")
+    return cursor.fetchone()[0]
@@ -0,0 +1,177 @@
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Lookup caches shared by all snmptrapd handler plugins.
+
+Most traps need to be mapped to the netbox that sent them, and often to one
+of its interfaces.  These lookups are cached for a while, so that a storm of
+traps from the same devices doesn't result in a storm of identical database
+queries.  Lookups that find nothing are cached for a shorter while, so that
+newly added devices are picked up quickly.
+
+The caches are safe to use from multiple handler threads.
+
+"""
+from collections import namedtuple
+import logging
+import threading
+import time
+
+from nav.db import getConnection
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+DEFAULT_NEGATIVE_TTL = 60
+
+NetboxInfo = namedtuple('NetboxInfo', 'netboxid sysname roomid')
+InterfaceInfo = namedtuple('InterfaceInfo',
+                           'interfaceid deviceid modulename ifname ifalias')
+
+
+class TTLCache(object):
+    """A thread-safe cache of values that expire after a time-to-live.
+
+    :param ttl: The number of seconds to keep values for.
+    :param negative_ttl: The number of seconds to keep None values for.
+    """
+    def __init__(self, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, loader, *args):
+        """Returns the cached value of key, calling loader(*args) to load it
+        if it isn't cached or has expired.
+
+        Exceptions raised by loader are passed on, and nothing is cached.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = loader(*args)
+        ttl = self.ttl if value is not None else self.negative_ttl
+        with self._lock:
+            self._entries[key] = (now + ttl, value)
+        return value
+
+    def peek(self, key):
+        """Returns the cached value of key, or None if it isn't cached"""
+        entry = self._entries.get(key)
+        return entry[1] if entry else None
+
+    def invalidate(self, key=None):
+        """Removes key from the cache, or everything if key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def invalidate_matching(self, predicate):
+        """Removes all keys for which predicate(key) is true"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def purge(self):
+        """Removes all expired entries from the cache"""
+        now = time.time()
+        with self._lock:
+            for key in [key for key, (expiry, _) in self._entries.items()
+                        if expiry <= now]:
+                del self._entries[key]
+
+
+netboxes = TTLCache()
+interfaces = TTLCache()
+
+
+def configure(ttl, negative_ttl=None):
+    """Sets the time-to-live of all the shared caches"""
+    for cache in (netboxes, interfaces):
+        cache.ttl = ttl
+        if negative_ttl is not None:
+            cache.negative_ttl = negative_ttl
+
+
+def get_netbox(ip):
+    """Returns a NetboxInfo tuple for the netbox with the given IP address,
+    or None if no such netbox exists.
+
+    """
+    return netboxes.get(ip, _load_netbox, ip)
+
+
+def get_interface(netboxid, ifindex):
+    """Returns an InterfaceInfo tuple for the interface with the given
+    ifindex on the given netbox, or None if no such interface exists.
+
+    """
+    return interfaces.get((netboxid, ifindex), _load_interface, netboxid,
+                          ifindex)
+
+
+def invalidate_agent(ip):
+    """Invalidates everything cached about the netbox with the given IP
+    address, e.g. because it was restarted.
+
+    """
+    netbox = netboxes.peek(ip)
+    netboxes.invalidate(ip)
+    if netbox:
+        interfaces.invalidate_matching(lambda key: key[0] == netbox.netboxid)
+
+
+def purge():
+    """Removes expired entries from all the shared caches"""
+    for cache in (netboxes, interfaces):
+        cache.purge()
+
+
+def _load_netbox(ip):
+    cursor = getConnection('default').cursor()
+    cursor.execute(
+        "SELECT netboxid, sysname, roomid FROM netbox WHERE ip = %s", (ip,))
+    row = cursor.fetchone()
+    if row:
+        return NetboxInfo(*row)
+
+
+def _load_interface(netboxid, ifindex):
+    cursor = getConnection('default').cursor()
+    cursor.execute("""SELECT
+                        interfaceid, module.deviceid,
+                        module.name AS modulename,
+                        interface.ifname, interface.ifalias
+                      FROM interface
+                      LEFT JOIN module USING (moduleid)
+                      WHERE interface.netboxid=%s AND ifindex = %s""",
+                   (netboxid, ifindex))
+    row = cursor.fetchone()
+    if row:
+        return InterfaceInfo(*row)
+    _logger.debug('Could not find ifindex %s on %s', ifindex, netboxid)
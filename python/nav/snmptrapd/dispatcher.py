@@ -0,0 +1,308 @@
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Dispatching of received traps to snmptrapd's handler plugins.
+
+The thread that receives traps only puts them on bounded queues, from which
+a pool of worker threads take them and give them to the handler plugins.
+Each worker has its own queue, and all traps from the same agent go to the
+same worker, so that they are handled in the order they were received.  If
+the handlers cannot keep up and a queue is full, new traps are dropped and
+counted, instead of blocking the receiving thread.
+
+Events posted by handlers using :py:func:`post_event` are collected by an
+:py:class:`EventBatcher` and posted to the event queue in batches.
+
+"""
+import logging
+import threading
+import time
+
+from django.utils.six.moves import queue
+
+import nav.db
+from nav.event import EventQ
+from nav.snmptrapd import cache
+
+_logger = logging.getLogger('nav.snmptrapd')
+_traplogger = logging.getLogger('nav.snmptrapd.traplog')
+
+METRIC_PREFIX = 'nav.snmptrapd'
+RESTART_TRAPS = ('COLDSTART', 'WARMSTART')
+
+_batcher = None
+
+
+def post_event(event):
+    """Posts an event to the event queue, as part of the next batch of events
+    if an EventBatcher is running, or immediately if not.
+
+    """
+    if _batcher:
+        _batcher.post(event)
+    else:
+        event.post()
+
+
+class TrapDispatcher(object):
+    """Dispatches traps to handler plugins, using a pool of worker threads.
+
+    :param handlermodules: A list of handler plugin modules.
+    :param config: The snmptrapd config, which is passed on to handlers.
+    :param workers: The number of worker threads to run.
+    :param queue_size: The maximum number of traps to queue for the workers,
+                       divided evenly between their queues.
+    """
+    def __init__(self, handlermodules, config, workers=4, queue_size=10000):
+        self.handlermodules = handlermodules
+        self.config = config
+        self.workers = max(1, workers)
+        self.queues = [queue.Queue(maxsize=max(1, queue_size // self.workers))
+                       for _ in range(self.workers)]
+        self.received = 0
+        self.dropped = 0
+        self.handled = 0
+        self.max_depth = 0
+        self._threads = []
+
+    def start(self):
+        """Starts the worker threads"""
+        for number, trap_queue in enumerate(self.queues):
+            thread = threading.Thread(target=self._work, args=(trap_queue,),
+                                      name="trapworker-%d" % number)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def dispatch(self, trap):
+        """Queues a trap for handling by the worker thread of its agent, or
+        drops it if that worker's queue is full.
+
+        :type trap: nav.snmptrapd.trap.SNMPTrap
+
+        """
+        self.received += 1
+        trap_queue = self.get_queue(trap.agent)
+        try:
+            trap_queue.put_nowait(trap)
+        except queue.Full:
+            self.dropped += 1
+            _logger.debug("trap queue is full, dropped trap from %s",
+                          trap.src)
+        else:
+            self.max_depth = max(self.max_depth, self.queued)
+
+    def get_queue(self, agent):
+        """Returns the queue of the worker that handles traps from agent"""
+        return self.queues[hash(agent) % self.workers]
+
+    @property
+    def queued(self):
+        """The number of traps currently queued for all workers"""
+        return sum(trap_queue.qsize() for trap_queue in self.queues)
+
+    def _work(self, trap_queue):
+        nav.db.use_private_connections()
+        while True:
+            trap = trap_queue.get()
+            try:
+                self.handle(trap)
+            except Exception:  # pylint: disable=W0703
+                _logger.exception("Unhandled exception while handling trap")
+            self.handled += 1
+
+    def handle(self, trap):
+        """Gives a trap to each handler module in turn.
+
+        :type trap: nav.snmptrapd.trap.SNMPTrap
+
+        """
+        _traplogger.debug("%s", trap)
+        if trap.genericType in RESTART_TRAPS:
+            cache.invalidate_agent(trap.agent)
+
+        connection = nav.db.getConnection('default')
+        handled_by = []
+        for mod in self.handlermodules:
+            _logger.debug("Giving trap to %s", mod)
+            try:
+                accepted = mod.handleTrap(trap, config=self.config)
+                if accepted:
+                    handled_by.append(mod.__name__)
+                _logger.debug("Module %s %s trap", mod.__name__,
+                              accepted and 'accepted' or 'ignored',)
+            except Exception as why:  # pylint: disable=W0703
+                _logger.exception("Error when handling trap with %s: %s",
+                                  mod.__name__, why)
+            # Assuming that the handler used the same connection as this
+            # function, we rollback any uncommitted changes.  This is to
+            # avoid idling in transactions.
+            connection.rollback()
+
+        if handled_by:
+            _logger.info("v%s trap received from %s, handled by %s",
+                         trap.version, trap.src, handled_by)
+        else:
+            _logger.info("v%s trap received from %s, no handlers wanted it",
+                         trap.version, trap.src)
+
+    def collect_stats(self):
+        """Returns statistics about traps received since the last time
+        statistics were collected, and resets the counters.
+
+        """
+        stats = dict(received=self.received, dropped=self.dropped,
+                     handled=self.handled, queued=self.queued,
+                     max_queued=self.max_depth)
+        self.received = self.dropped = self.handled = 0
+        self.max_depth = stats['queued']
+        return stats
+
+
+class EventBatcher(object):
+    """Posts events to the event queue in batches, from a separate thread.
+
+    :param batch_size: The maximum number of events to post in one batch.
+    :param max_delay: The maximum number of seconds to wait for more events
+                      before posting a batch.
+    """
+    def __init__(self, batch_size=100, max_delay=0.5):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.posted = 0
+        self.failed = 0
+        self.queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        """Starts the event posting thread, and makes post_event() use this
+        batcher.
+
+        """
+        global _batcher  # pylint: disable=W0603
+        _batcher = self
+        self._thread = threading.Thread(target=self._work,
+                                        name="eventbatcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def post(self, event):
+        """Queues an event to be posted in the next batch"""
+        self.queue.put(event)
+
+    def _work(self):
+        nav.db.use_private_connections()
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.time() + self.max_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._post(batch)
+
+    def flush(self):
+        """Synchronously posts all queued events"""
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(batch), self.batch_size):
+            self._post(batch[start:start + self.batch_size])
+
+    def _post(self, batch):
+        try:
+            EventQ.post_events(batch)
+        except Exception:  # pylint: disable=W0703
+            _logger.exception("Failed to post a batch of %d events",
+                              len(batch))
+            self.failed += len(batch)
+            try:
+                EventQ._get_connection().rollback()  # pylint: disable=W0212
+            except nav.db.driver.Error:
+                pass
+        else:
+            self.posted += len(batch)
+            _logger.debug("Posted a batch of %d events", len(batch))
+
+    def collect_stats(self):
+        """Returns statistics about events posted since the last time
+        statistics were collected, and resets the counters.
+
+        """
+        stats = dict(posted=self.posted, failed=self.failed,
+                     queued=self.queue.qsize())
+        self.posted = self.failed = 0
+        return stats
+
+
+class StatsReporter(object):
+    """Periodically logs and sends snmptrapd's trap and event statistics to
+    Graphite.
+
+    """
+    def __init__(self, dispatcher, batcher, interval=60):
+        self.dispatcher = dispatcher
+        self.batcher = batcher
+        self.interval = interval
+
+    def start(self):
+        """Starts the reporting thread"""
+        thread = threading.Thread(target=self._work, name="statsreporter")
+        thread.daemon = True
+        thread.start()
+
+    def _work(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.report()
+            except Exception:  # pylint: disable=W0703
+                _logger.exception("Failed to report statistics")
+
+    def report(self):
+        """Logs and sends the current statistics"""
+        traps = self.dispatcher.collect_stats()
+        events = self.batcher.collect_stats()
+        cache.purge()
+
+        log = _logger.warning if traps['dropped'] else _logger.debug
+        log("traps: %(received)d received, %(dropped)d dropped, "
+            "%(handled)d handled, %(queued)d queued (max %(max_queued)d)",
+            traps)
+        _logger.debug("events: %(posted)d posted, %(failed)d failed, "
+                      "%(queued)d queued", events)
+
+        from nav.metrics.carbon import send_metrics
+        timestamp = time.time()
+        metrics = [("%s.traps.%s" % (METRIC_PREFIX, key), (timestamp, value))
+                   for key, value in traps.items()]
+        metrics.extend(("%s.events.%s" % (METRIC_PREFIX, key),
+                        (timestamp, value))
+                       for key, value in events.items())
+        for name, lookups in (('netboxes', cache.netboxes),
+                              ('interfaces', cache.interfaces)):
+            metrics.append(("%s.cache.%s.hits" % (METRIC_PREFIX, name),
+                            (timestamp, lookups.hits)))
+            metrics.append(("%s.cache.%s.misses" % (METRIC_PREFIX, name),
+                            (timestamp, lookups.misses)))
+            lookups.hits = lookups.misses = 0
+        send_metrics(metrics)
@@ -22,6 +22,8 @@ import nav.errors
 
 from nav.db import getConnection
 from nav.event import Event
+from nav.snmptrapd import cache
+from nav.snmptrapd.dispatcher import post_event
 
 _logger = logging.getLogger('nav.snmptrapd.linkupdown')
 
@@ -67,42 +69,24 @@ def get_ifindex_from_trap(trap, config):
 
 def find_corresponding_netbox(ipaddr):
     """Find a netboxid corresponding to the given ip address"""
-    cursor = getConnection('default').cursor()
     try:
-        query = "SELECT netboxid FROM netbox WHERE ip = %s"
-        cursor.execute(query, (ipaddr,))
-        row = cursor.fetchone()
-        if row:
-            return row[0]
-
-    except Exception:
+        netbox = cache.get_netbox(ipaddr)
+    except nav.db.driver.Error:
         _logger.exception("Unexpected error when querying database")
-    finally:
-        _logger.debug("Query was: %s", cursor.query)
+    else:
+        if netbox:
+            return netbox.netboxid
 
 
 def get_interface_details(netboxid, ifindex):
     """Get interfaceid, deviceid, modulename, ifname, ifalias for interface"""
-    idquery = """SELECT
-                   interfaceid, module.deviceid,
-                   module.name AS modulename,
-                   interface.ifname, interface.ifalias
-                 FROM netbox
-                 JOIN interface USING (netboxid)
-                 LEFT JOIN module USING (moduleid)
-                 WHERE netbox.netboxid=%s AND ifindex = %s"""
-    _logger.debug(idquery)
-    cursor = getConnection('default').cursor()
     try:
-        cursor.execute(idquery, (netboxid, ifindex))
-    except nav.db.driver.ProgrammingError:
+        interface = cache.get_interface(netboxid, ifindex)
+    except nav.db.driver.Error:
         _logger.exception("Unexpected error when querying database")
     else:
-        if cursor.rowcount > 0:
-            return cursor.fetchone()
-        else:
-            _logger.debug('Could not find ifindex %s on %s',
-                          ifindex, netboxid)
+        if interface:
+            return interface
 
     return (None, None, None, None, None)
 
@@ -122,7 +106,7 @@ def post_link_event(down, netboxid, deviceid, interfaceid, modulename, ifname,
     event['ifalias'] = ifalias or ''
 
     try:
-        event.post()
+        post_event(event)
     except nav.errors.GeneralException:
         _logger.exception("Unexpected exception while posting event")
         return False
@@ -26,6 +26,7 @@ import logging
 from nav.db import getConnection
 from nav.event import Event
 from nav.Snmp import Snmp
+from nav.snmptrapd import cache
 
 # Create logger with modulename here
 logger = logging.getLogger('nav.snmptrapd.ups')
@@ -69,8 +70,6 @@ def handleTrap(trap, config=None):
     accepted.
     """
 
-    db = getConnection('default')
-
     # Event variables
     source = "snmptrapd"
     target = "eventEngine"
@@ -95,15 +94,13 @@ def handleTrap(trap, config=None):
                 logger.debug("batterytime: %s", batterytime)
 
             # Get netboxid from database
-            c = db.cursor()
-            c.execute("SELECT netboxid, sysname FROM netbox WHERE ip = %s",
-                      (trap.agent,))
-            if not c.rowcount > 0:
+            netbox = cache.get_netbox(trap.agent)
+            if not netbox:
                 logger.error("Could not find netbox in database, no event \
                 will be posted")
                 return False
 
-            netboxid, sysname = c.fetchone()
+            netboxid, sysname = netbox.netboxid, netbox.sysname
             state = 's'
 
             # Create event-object, fill it and post event.
@@ -127,15 +124,13 @@ def handleTrap(trap, config=None):
             logger.debug("Got ups on utility power trap (%s)", vendor)
 
             # Get netboxid from database
-            c = db.cursor()
-            c.execute("SELECT netboxid, sysname FROM netbox WHERE ip = %s",
-                      (trap.agent,))
-            if not c.rowcount > 0:
+            netbox = cache.get_netbox(trap.agent)
+            if not netbox:
                 logger.error("Could not find netbox in database, no event \
                 will be posted")
                 return False
 
-            netboxid, sysname = c.fetchone()
+            netboxid, sysname = netbox.netboxid, netbox.sysname
             state = 'e'
 
             # Create event-object, fill it and post event.
@@ -23,7 +23,7 @@ from collections import defaultdict
 import itertools
 
 import nav.event
-from nav.db import getConnection
+from nav.snmptrapd import cache
 
 logger = logging.getLogger('nav.snmptrapd.weathergoose')
 
@@ -221,21 +221,15 @@ HANDLER_CLASSES = (WeatherGoose1, WeatherGoose2, GeistWeatherGoose)
 def handleTrap(trap, config=None):
     """ This function is called from snmptrapd """
 
-    conn = getConnection('default')
-    cur = conn.cursor()
-    cur.execute("SELECT netboxid, sysname, roomid FROM netbox WHERE ip = %s",
-                (trap.agent,))
-
-    if cur.rowcount < 1:
-        logger.error("Could not find trapagent %s in database.", trap.agent)
-        return False
-
-    netboxid, sysname, roomid = cur.fetchone()
-
     oid = trap.snmpTrapOID
     for handler_class in HANDLER_CLASSES:
         if handler_class.can_handle(oid):
-            handler = handler_class(trap, netboxid, sysname, roomid)
+            netbox = cache.get_netbox(trap.agent)
+            if not netbox:
+                logger.error("Could not find trapagent %s in database.",
+                             trap.agent)
+                return False
+            handler = handler_class(trap, *netbox)
             return handler.post_event()
 
     return False
@@ -20,7 +20,7 @@ import logging
 
 from django.utils import six
 
-from nav.statemon import config, RunQueue, db, statistics, event
+from nav.statemon import config, db, statistics, event
 
 
 LOGGER = logging.getLogger(__name__)
@@ -65,6 +65,10 @@ class AbstractChecker(object):
         return Event.UP, version
     """
     IPV6_SUPPORT = False
+    # Set to True by checkers that run external programs or use client
+    # libraries that may block for longer than the timeout, to make the
+    # scheduler run them in a separate pool of worker threads.
+    BLOCKING = False
     DESCRIPTION = ""
     ARGS = ()
     OPTARGS = ()
@@ -97,13 +101,14 @@ class AbstractChecker(object):
         LOGGER.info("New checker instance for %s:%s ",
                     self.sysname, self.get_type())
         self.runcount = 0
-        self.runq = RunQueue.RunQueue()
+        self.retry_at = None
 
     def run(self):
         """
-        Calls execute_test(). If the status has changed it schedules a new
-        test. If the service has been unavailable for more than self.runcount
-        times, it marks the service as down.
+        Calls execute_test(). If the status has changed it asks the scheduler
+        to retry the test soon, by setting self.retry_at. If the service has
+        been unavailable for more than self.runcount times, it marks the
+        service as down.
         """
         orig_version = self.version
         status, info = self.execute_test()
@@ -128,9 +133,7 @@ class AbstractChecker(object):
                         "%s)", service, delay, status, info)
             # Update metrics every time to get proper 'uptime' for the service
             self.update_stats()
-            priority = delay + time.time()
-            # Queue ourself
-            self.runq.enq((priority, self))
+            self.retry_at = time.time() + delay
             return
 
         if status != self.status:
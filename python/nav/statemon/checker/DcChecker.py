@@ -24,6 +24,7 @@ import subprocess
 
 class DcChecker(AbstractChecker):
     """Domain Controller"""
+    BLOCKING = True
     DESCRIPTION = "Domain Controller"
     ARGS = (
         ('username', ''),
@@ -26,6 +26,7 @@ from nav.util import which, is_setuid_root
 
 class DhcpChecker(AbstractChecker):
     """DHCP"""
+    BLOCKING = True
     DESCRIPTION = "DHCP"
     OPTARGS = (
         ('timeout', ''),
@@ -25,6 +25,7 @@ import ldap
 class LdapChecker(AbstractChecker):
     """LDAP"""
     IPV6_SUPPORT = True
+    BLOCKING = True
     DESCRIPTION = "LDAP"
     OPTARGS = (
         ('url', "LDAP connection URL that will override the host's IP address"
@@ -57,6 +57,7 @@ class OracleChecker(AbstractChecker):
         return Event.DOWN, str(sys.exc_value)
 
     """
+    BLOCKING = True
     DESCRIPTION = "Oracle database"
     OPTARGS = (
         ('port', ''),
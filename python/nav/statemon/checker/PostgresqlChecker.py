@@ -24,6 +24,7 @@ from nav.statemon.event import Event
 class PostgresqlChecker(AbstractChecker):
     """PostgreSQL"""
     IPV6_SUPPORT = True
+    BLOCKING = True
     DESCRIPTION = "PostgreSQL"
     ARGS = (
         ('user', ''),
@@ -60,6 +60,7 @@ class RadiusChecker(AbstractChecker):
         return Event.DOWN, str(sys.exc_value)
     """
     # TODO: Check for IPv6 compatibility in pyrad
+    BLOCKING = True
     DESCRIPTION = "RADIUS"
     ARGS = (
         ('dictionary', 'Full path to a file containing the dictionary for '
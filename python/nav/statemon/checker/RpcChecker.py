@@ -23,6 +23,7 @@ from nav.util import which
 
 class RpcChecker(AbstractChecker):
     """RPC portmapper"""
+    BLOCKING = True
     DESCRIPTION = "RPC portmapper"
     OPTARGS = (
         ('required', 'A comma separated list of require services. Example: '
@@ -30,6 +30,7 @@ SMBCLIENT_PATTERN = re.compile(
 class SmbChecker(AbstractChecker):
     """Windows file sharing"""
     IPV6_SUPPORT = True
+    BLOCKING = True
     DESCRIPTION = "Windows file sharing"
     OPTARGS = (
         ('hostname', ''),
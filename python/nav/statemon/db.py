@@ -45,6 +45,9 @@ from .event import Event
 
 LOGGER = logging.getLogger(__name__)
 
+# The maximum number of events to commit in a single transaction
+EVENT_BATCH_SIZE = 1000
+
 
 def db():
     """Returns a db singleton"""
@@ -134,19 +137,27 @@ class _DB(threading.Thread):
         return cursor
 
     def run(self):
-        """Runs the event posting loop, popping events from the queue"""
+        """Runs the event posting loop, popping events from the queue and
+        committing them in batches.
+
+        """
         self.connect()
         while 1:
-            event = self.queue.get()
-            LOGGER.debug("Got event: [%s]", event)
+            events = self.queue.get()
+            while len(events) < EVENT_BATCH_SIZE:
+                try:
+                    events.extend(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            LOGGER.debug("Got %d events: %s", len(events), events)
             try:
-                self.commit_event(event)
-                self.db.commit()
+                self.commit_events(events)
             except Exception:
-                # If we fail to commit the event, place it
+                # If we fail to commit the events, place them
                 # back in our queue
-                LOGGER.debug("Failed to commit event, rescheduling...")
-                self.new_event(event)
+                LOGGER.debug("Failed to commit %d events, rescheduling...",
+                             len(events))
+                self.new_events(events)
                 time.sleep(5)
 
     @synchronized(_queryLock)
@@ -208,19 +219,93 @@ class _DB(threading.Thread):
 
     def new_event(self, event):
         """Places a new event on the queue to be posted to the db"""
-        self.queue.put(event)
+        self.queue.put([event])
+
+    def new_events(self, events):
+        """Places a list of new events on the queue to be posted to the db,
+        in the same transaction unless the list is very long.
+
+        """
+        if events:
+            self.queue.put(list(events))
 
     def commit_event(self, event):
         """Commits an event to the database event queue"""
-        if event.source not in ("serviceping", "pping"):
-            LOGGER.critical("Invalid source for event: %s", event.source)
-            return
-        if event.eventtype == "version":
-            statement = """UPDATE service SET version = %s
-                           WHERE serviceid = %s"""
-            self.execute(statement, (event.version, event.serviceid))
-            return
+        self.commit_events([event])
+
+    def commit_events(self, events):
+        """Commits a list of events to the database event queue, in a single
+        transaction.
+
+        If the transaction fails on a database integrity error, the events
+        are committed one by one, and the offending events are thrown away.
 
+        """
+        try:
+            self._commit_events(events)
+        except psycopg2.IntegrityError:
+            if len(events) == 1:
+                LOGGER.critical("Database integrity error, throwing away "
+                                "event: %s", events[0], exc_info=True)
+                return
+            LOGGER.warning("Database integrity error, committing %d events "
+                           "one by one", len(events))
+            for event in events:
+                self.commit_events([event])
+
+    @synchronized(_queryLock)
+    def _commit_events(self, events):
+        versions = []
+        rows = []
+        for event in events:
+            if event.source not in ("serviceping", "pping"):
+                LOGGER.critical("Invalid source for event: %s", event.source)
+            elif event.eventtype == "version":
+                versions.append((event.version, event.serviceid))
+            else:
+                rows.append(self._make_eventq_row(event))
+
+        cursor = self.cursor()
+        try:
+            for values in versions:
+                cursor.execute("""UPDATE service SET version = %s
+                                  WHERE serviceid = %s""", values)
+            if rows:
+                cursor.execute("SELECT nextval('eventq_eventqid_seq') "
+                               "FROM generate_series(1, %s)", (len(rows),))
+                ids = [nextid for nextid, in cursor.fetchall()]
+
+                statement = ("INSERT INTO eventq (eventqid, subid, netboxid, "
+                             "eventtypeid, state, value, source, target) "
+                             "VALUES ")
+                template = "(%s, %s, %s, %s, %s, %s, %s, %s)"
+                values = [value for nextid, row in zip(ids, rows)
+                          for value in (nextid,) + row[:-1]]
+                cursor.execute(statement + ", ".join([template] * len(rows)),
+                               values)
+
+                statement = "INSERT INTO eventqvar (eventqid, var, val) VALUES "
+                values = [value for nextid, row in zip(ids, rows)
+                          for value in (nextid, 'descr', row[-1])]
+                cursor.execute(
+                    statement + ", ".join(["(%s, %s, %s)"] * len(rows)),
+                    values)
+            self.db.commit()
+        except psycopg2.IntegrityError:
+            self.db.rollback()
+            raise
+        except Exception:
+            LOGGER.critical("Failed to commit %d events", len(events),
+                            exc_info=True)
+            self.db.rollback()
+            raise
+
+    @staticmethod
+    def _make_eventq_row(event):
+        """Returns the eventq column values of an event, followed by its
+        description.
+
+        """
         if event.status == Event.UP:
             value = 100
             state = 'e'
@@ -230,21 +315,8 @@ class _DB(threading.Thread):
         else:
             value = 1
             state = 'x'
-
-        nextid = self.query("SELECT nextval('eventq_eventqid_seq')")[0][0]
-        statement = """INSERT INTO eventq
-                       (eventqid, subid, netboxid, eventtypeid,
-                        state, value, source, target)
-                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
-        values = (nextid, event.serviceid, event.netboxid,
-                  event.eventtype, state, value, event.source, "eventEngine")
-        self.execute(statement, values)
-
-        statement = """INSERT INTO eventqvar
-                       (eventqid, var, val) VALUES
-                       (%s, %s, %s)"""
-        values = (nextid, 'descr', event.info)
-        self.execute(statement, values)
+        return (event.serviceid, event.netboxid, event.eventtype, state,
+                value, event.source, "eventEngine", event.info)
 
     def hosts_to_ping(self):
         """Returns a list of netboxes to ping, from the database"""
@@ -1,5 +1,5 @@
 #
-# Copyright (C) 2011, 2012 Uninett AS
+# Copyright (C) 2011, 2012, 2018 Uninett AS
 #
 # This file is part of Network Administration Visualized (NAV).
 #
@@ -13,9 +13,18 @@
 # details.  You should have received a copy of the GNU General Public License
 # along with NAV. If not, see <http://www.gnu.org/licenses/>.
 #
-"""Ping multiple hosts at once."""
+"""Ping multiple hosts at once.
 
-import threading
+Echo requests are sent and replies received by a single thread, using
+non-blocking sockets and select().  The rate at which requests are sent is
+limited by a token bucket, so that the time used to ping a set of hosts is
+decided by the packets per second budget rather than a fixed delay between
+each host.  Replies are matched to outstanding requests by the cookie in
+their payload.
+
+"""
+
+import errno
 import time
 import socket
 import select
@@ -24,7 +33,6 @@ import random
 import logging
 import hashlib
 
-from nav.daemon import safesleep as sleep
 from nav.statemon import config
 
 from .icmppacket import ICMP_MINLEN, PacketV4, PacketV6
@@ -82,6 +90,8 @@ class Host(object):
 
         self.packet.id = os.getpid() % 65536
         self.reply = None
+        # Round trip times of each request sent in the current sweep
+        self.replies = []
 
     def make_packet(self, size, cookie=None):
         """Makes the next echo reply packet"""
@@ -93,11 +103,15 @@ class Host(object):
     def make_cookie(self):
         """Makes and returns a request identifier to be used as data in a ping
         packet.
+
+        The sequence number is included, so that several requests sent to the
+        same host within the resolution of the clock get different cookies.
         """
         cookie = hashlib.new('md5')
         cookie.update(self.ip.encode('ASCII'))
         cookie.update(str(self.rnd).encode('ASCII'))
         cookie.update(str(self.time).encode('ASCII'))
+        cookie.update(str(self.packet.sequence).encode('ASCII'))
         return cookie.digest()
 
     def is_v6(self):
@@ -138,6 +152,49 @@ class Host(object):
             self.ip, self.packet.sequence)
 
 
+class TokenBucket(object):
+    """A token bucket to limit the rate of some operation.
+
+    :param rate: The number of tokens added per second.
+    :param capacity: The maximum number of tokens that can be saved up, i.e.
+                     the maximum burst size.
+    """
+    def __init__(self, rate, capacity, now=None):
+        self.rate = float(rate)
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.time() if now is None else now
+
+    def take(self, wanted, now=None):
+        """Takes up to wanted tokens from the bucket.
+
+        :returns: The number of tokens taken.
+
+        """
+        self._refill(time.time() if now is None else now)
+        taken = min(int(self.tokens), wanted)
+        self.tokens -= taken
+        return taken
+
+    def give_back(self, tokens):
+        """Returns unused tokens to the bucket"""
+        self.tokens = min(self.capacity, self.tokens + tokens)
+
+    def time_until_available(self, now=None):
+        """Returns the number of seconds until at least one token is
+        available.
+
+        """
+        self._refill(time.time() if now is None else now)
+        missing = 1 - self.tokens
+        return missing / self.rate if missing > 0 else 0
+
+    def _refill(self, now):
+        elapsed = max(0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+
 class MegaPing(object):
     """
     Sends icmp echo to multiple hosts in parallell.
@@ -147,7 +204,8 @@ class MegaPing(object):
     timeUsed = pinger.ping()
     results = pinger.results()
     """
-    _requests = _sender = _getter = _sender_finished = None
+    # The maximum number of packets to read from a socket at a time
+    MAX_READ_BURST = 256
 
     def __init__(self, sockets, conf=None):
 
@@ -161,12 +219,20 @@ class MegaPing(object):
         else:
             self._conf = conf
 
-        # Delay between each packet is transmitted
+        # Delay between each packet is transmitted, the default rate
         self._delay = float(self._conf.get('delay', 2))/1000  # convert from ms
+        # Maximum number of packets to send per second
+        self._rate = float(self._conf.get('rate', 0)) or 1 / self._delay
+        # Maximum number of packets to send in one burst
+        self._burst = int(self._conf.get('burst', 10))
+        # Number of echo requests to send to each host per sweep
+        self._count = max(1, int(self._conf.get('pingspercheck', 1)))
         # Timeout before considering hosts as down
-        self._timeout = int(self._conf.get('timeout', 5))
+        self._timeout = float(self._conf.get('timeout', 5))
         # Dictionary with all the hosts, populated by set_hosts()
         self._hosts = {}
+        # Outstanding requests: cookie -> (host, request number, send time)
+        self._requests = {}
 
         packetsize = int(self._conf.get('packetsize', 64))
         if packetsize < 44:
@@ -192,6 +258,9 @@ class MegaPing(object):
             self._sock4 = sockets[1]
             LOGGER.info("No sockets passed as argument, creating own")
 
+        for sock in (self._sock6, self._sock4):
+            sock.setblocking(False)
+
     def set_hosts(self, ips):
         """
         Specify a list of ip addresses to ping. If we alredy have the host
@@ -214,91 +283,92 @@ class MegaPing(object):
         self._requests = {}
         for host in self._hosts.values():
             host.reply = None
-        self._sender_finished = 0
+            host.replies = [None] * self._count
 
     def ping(self):
         """
         Send icmp echo to all configured hosts. Returns the
         time used.
         """
-        # Start working
         self.reset()
-        self._sender = threading.Thread(target=self._send_requests,
-                                        name="sender")
-        self._getter = threading.Thread(target=self._get_responses,
-                                        name="getter")
-        self._sender.daemon = True
-        self._getter.daemon = True
-        self._sender.start()
-        self._getter.start()
-        self._getter.join()
+        start = time.time()
+        hosts = list(self._hosts.values())
+        unsent = [(host, number)
+                  for number in range(self._count) for host in hosts]
+        unsent.reverse()  # so that we can pop requests off the end
+        bucket = TokenBucket(self._rate, self._burst, start)
+        last_sent = start
+
+        while True:
+            now = time.time()
+            if unsent:
+                tokens = bucket.take(len(unsent), now)
+                sent = self._send_requests(unsent, tokens)
+                bucket.give_back(tokens - sent)
+                if sent:
+                    last_sent = now
+                if unsent:
+                    wait = max(bucket.time_until_available(now),
+                               0 if sent else 1 / self._rate)
+            if not unsent:
+                wait = last_sent + self._timeout - now
+                if not self._requests or wait <= 0:
+                    break
+
+            readable, _wt, _er = select.select([self._sock6, self._sock4],
+                                               [], [], wait)
+            for sock in readable:
+                self._read_responses(sock, sock is self._sock6)
+
+        self._elapsedtime = time.time() - start
         return self._elapsedtime
 
-    def _send_requests(self):
+    def _send_requests(self, unsent, count):
+        """Sends up to count requests from the end of the unsent list.
 
-        # Get ip addresses to ping
-        hosts = self._hosts.values()
+        :returns: The number of requests that were sent or failed; requests
+                  that couldn't be sent because the socket buffer was full
+                  are left in the list.
 
-        # Ping each host
-        for host in hosts:
+        """
+        sent = 0
+        while sent < count and unsent:
+            host, number = unsent[-1]
             host.time = time.time()
             # create and save a request identifier
             packet, cookie = host.make_packet(self._packetsize)
-            self._requests[cookie] = host
-            host.next_seq()
 
             try:
                 if not host.is_v6():
                     self._sock4.sendto(packet, (host.ip, 0))
                 else:
                     self._sock6.sendto(packet, (host.ip, 0, 0, 0))
-            except Exception as error:
+            except socket.error as error:
+                if error.errno in (errno.EAGAIN, errno.EWOULDBLOCK,
+                                   errno.ENOBUFS):
+                    break
                 LOGGER.info("Failed to ping %s [%s]", host.ip, error)
+            else:
+                self._requests[cookie] = (host, number, host.time)
+                host.next_seq()
 
-            sleep(self._delay)
-        self._sender_finished = time.time()
-
-    def _get_responses(self):
-        start = time.time()
-        timeout = self._timeout
-
-        while not self._sender_finished or self._requests:
-            if self._sender_finished:
-                runtime = time.time() - self._sender_finished
-                if runtime > self._timeout:
-                    break
-                else:
-                    timeout = self._timeout - runtime
+            unsent.pop()
+            sent += 1
+        return sent
 
-            # Listen for incoming data on sockets
-            readable, _wt, _er = select.select([self._sock6, self._sock4],
-                                               [], [], timeout)
-
-            # If data found
-            if readable:
-                # okay to use time here, because select has told us
-                # there is data and we don't care to measure the time
-                # it takes the system to give us the packet.
-                arrival = time.time()
-
-                # Find out which socket got data and read
-                for sock in readable:
-                    try:
-                        raw_pong, sender = sock.recvfrom(4096)
-                    except socket.error:
-                        LOGGER.critical("RealityError -2", exc_info=True)
-                        continue
-
-                    is_ipv6 = sock == self._sock6
-                    self._process_response(raw_pong, sender, is_ipv6, arrival)
-            elif self._sender_finished:
-                break
-
-        # Everything else timed out
-        for host in self._requests.values():
-            host.reply = None
-        end = time.time()
-        self._elapsedtime = end - start
+    def _read_responses(self, sock, is_ipv6):
+        """Reads and processes all the packets waiting on sock"""
+        for _ in range(self.MAX_READ_BURST):
+            try:
+                raw_pong, sender = sock.recvfrom(4096)
+            except socket.error as error:
+                if error.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    LOGGER.critical("RealityError -2", exc_info=True)
+                return
+            # okay to use time here, because select has told us
+            # there is data and we don't care to measure the time
+            # it takes the system to give us the packet.
+            self._process_response(raw_pong, sender, is_ipv6, time.time())
 
     def _process_response(self, raw_pong, sender, is_ipv6, arrival):
         # Extract header info and payload
@@ -325,19 +395,24 @@ class MegaPing(object):
 
         # Find the host with this cookie
         try:
-            host = self._requests[cookie]
+            host, number, sent = self._requests.pop(cookie)
         except KeyError:
             LOGGER.debug("packet from %r does not match any outstanding "
                          "request: %r (raw packet: %r cookie: %r)",
                          sender, pong, raw_pong, cookie)
             return
 
-        # Delete the entry of the host who has replied and add the pingtime
-        pingtime = arrival - host.time
-        host.reply = pingtime
+        pingtime = arrival - sent
+        if pingtime > self._timeout:
+            LOGGER.debug("Response from %-16s arrived after the timeout",
+                         sender)
+            return
+
+        host.replies[number] = pingtime
+        if host.reply is None or pingtime < host.reply:
+            host.reply = pingtime
         LOGGER.debug("Response from %-16s in %03.3f ms",
                      sender, pingtime*1000)
-        del self._requests[cookie]
 
     def results(self):
         """
@@ -347,3 +422,12 @@ class MegaPing(object):
         """
         return [(host.ip, host.reply if host.reply else -1)
                 for host in self._hosts.values()]
+
+    def samples(self):
+        """
+        Returns a tuple of (ip, [roundtriptime, ...]) for all hosts, with
+        one round trip time for each request sent to the host in the last
+        sweep.  Unanswered requests will have roundtriptime = -1
+        """
+        return [(host.ip, [rtt if rtt else -1 for rtt in host.replies])
+                for host in self._hosts.values()]
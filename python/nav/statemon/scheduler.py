@@ -0,0 +1,262 @@
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Deadline based scheduling of service checkers.
+
+Each service checker has its own next run time, kept in a heap.  A single
+scheduler thread hands checkers that are due to one of two fixed pools of
+worker threads: Checkers that only talk to a socket run in one pool, while
+checkers marked as BLOCKING, i.e. those that run external programs or
+client libraries without reliable timeouts, run in a separate pool, so that
+they cannot hold up the rest.
+
+After a run, a checker is rescheduled one interval after the time it was
+due, or sooner if it asks to be retried.
+
+"""
+from __future__ import absolute_import
+
+import heapq
+import logging
+import random
+import threading
+import time
+
+from django.utils.six.moves import queue
+
+LOGGER = logging.getLogger(__name__)
+
+METRIC_PREFIX = 'nav.servicemon'
+
+
+class WorkerPool(object):
+    """A fixed number of worker threads that run checkers from a queue.
+
+    :param name: The name of the pool, used to name its threads.
+    :param size: The number of worker threads.
+    :param done: A function to call with (checker, started, finished) after
+                 each run.
+    """
+    def __init__(self, name, size, done):
+        self.name = name
+        self.size = size
+        self.queue = queue.Queue()
+        self.busy = 0
+        self.max_busy = 0
+        self._done = done
+        self._lock = threading.Lock()
+        self._running = {}
+
+    def start(self):
+        """Starts the worker threads"""
+        for number in range(self.size):
+            thread = threading.Thread(target=self._work,
+                                      name="%s%d" % (self.name, number))
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, checker):
+        """Queues a checker to be run by the next available worker"""
+        self.queue.put(checker)
+
+    def get_overrunning(self, now=None):
+        """Returns a list of (checker, seconds) for the checkers that have
+        been running for longer than twice their timeout.
+
+        """
+        now = now or time.time()
+        with self._lock:
+            running = list(self._running.values())
+        return [(checker, now - started) for checker, started in running
+                if now - started > 2 * checker.timeout]
+
+    def _work(self):
+        while True:
+            checker = self.queue.get()
+            started = time.time()
+            with self._lock:
+                self.busy += 1
+                self.max_busy = max(self.max_busy, self.busy)
+                self._running[threading.current_thread().ident] = (checker,
+                                                                   started)
+            try:
+                checker.run()
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Unhandled error in checker %r", checker)
+            finally:
+                with self._lock:
+                    self.busy -= 1
+                    del self._running[threading.current_thread().ident]
+                self._done(checker, started, time.time())
+
+
+class Scheduler(object):
+    """Runs each service checker once per interval, at its own deadline.
+
+    :param interval: The number of seconds between each check of a service.
+    :param workers: The number of worker threads for non-blocking checkers.
+    :param blocking_workers: The number of worker threads for blocking
+                             checkers.
+    """
+    def __init__(self, interval, workers=20, blocking_workers=5):
+        self.interval = interval
+        self.pools = {
+            False: WorkerPool('worker', workers, self._reschedule),
+            True: WorkerPool('blocking', blocking_workers, self._reschedule),
+        }
+        self._heap = []
+        self._counter = 0
+        self._checkers = set()
+        # the due times of all checkers that are scheduled or running
+        self._due = {}
+        self._condition = threading.Condition()
+        self._stats = self._make_stats()
+
+    @staticmethod
+    def _make_stats():
+        return dict(dispatched=0, runs=0, late_runs=0, max_lateness=0.0,
+                    total_lateness=0.0, max_runtime=0.0)
+
+    def start(self):
+        """Starts the worker pools and the scheduling thread"""
+        for pool in self.pools.values():
+            pool.start()
+        thread = threading.Thread(target=self._schedule_forever,
+                                  name="scheduler")
+        thread.daemon = True
+        thread.start()
+
+    def set_checkers(self, checkers):
+        """Sets the checkers to run.
+
+        New checkers are spread randomly over the next interval, while
+        checkers that are no longer present are dropped after their current
+        run, if any. A checker that is added back before it was dropped keeps
+        its current schedule.
+
+        """
+        now = time.time()
+        with self._condition:
+            checkers = set(checkers)
+            for checker in checkers - self._checkers:
+                if checker not in self._due:
+                    self._push(checker,
+                               now + random.uniform(0, self.interval))
+            self._checkers = checkers
+            self._condition.notify()
+
+    def _push(self, checker, due):
+        self._counter += 1
+        self._due[checker] = due
+        heapq.heappush(self._heap, (due, self._counter, checker))
+
+    def _schedule_forever(self):
+        while True:
+            with self._condition:
+                checker, due = self._pop_due()
+                self._submit(checker, due)
+
+    def _pop_due(self):
+        """Waits for and returns the next checker that is due to run, and
+        the time it was due.
+
+        """
+        while True:
+            if self._heap:
+                due, _, checker = self._heap[0]
+                wait = due - time.time()
+                if wait <= 0:
+                    heapq.heappop(self._heap)
+                    if checker in self._checkers:
+                        return checker, due
+                    self._due.pop(checker, None)
+                    continue
+            else:
+                wait = None
+            self._condition.wait(wait)
+
+    def _submit(self, checker, due):
+        lateness = max(0.0, time.time() - due)
+        stats = self._stats
+        stats['dispatched'] += 1
+        stats['max_lateness'] = max(stats['max_lateness'], lateness)
+        stats['total_lateness'] += lateness
+        if lateness > 1:
+            stats['late_runs'] += 1
+        self.pools[bool(getattr(checker, 'BLOCKING', False))].submit(checker)
+
+    def _reschedule(self, checker, started, finished):
+        """Schedules the next run of a checker that has finished"""
+        with self._condition:
+            stats = self._stats
+            stats['runs'] += 1
+            stats['max_runtime'] = max(stats['max_runtime'],
+                                       finished - started)
+            due = self._due.pop(checker, started)
+            if checker not in self._checkers:
+                return
+
+            retry_at = getattr(checker, 'retry_at', None)
+            if retry_at:
+                checker.retry_at = None
+                next_due = retry_at
+            else:
+                next_due = due + self.interval
+                if next_due < finished:
+                    # we've fallen more than an interval behind, skip ahead
+                    next_due = finished
+            self._push(checker, next_due)
+            self._condition.notify()
+
+    def collect_stats(self):
+        """Returns scheduling statistics collected since the last time
+        statistics were collected, and resets them.
+
+        """
+        with self._condition:
+            stats, self._stats = self._stats, self._make_stats()
+            stats['scheduled'] = len(self._heap)
+            stats['checkers'] = len(self._checkers)
+        dispatched = stats['dispatched']
+        total_lateness = stats.pop('total_lateness')
+        stats['avg_lateness'] = (total_lateness / dispatched if dispatched
+                                 else 0.0)
+        for blocking, pool in self.pools.items():
+            prefix = 'blocking_' if blocking else ''
+            stats[prefix + 'busy'] = pool.busy
+            stats[prefix + 'max_busy'] = pool.max_busy
+            stats[prefix + 'queued'] = pool.queue.qsize()
+            stats[prefix + 'overrunning'] = len(pool.get_overrunning())
+            pool.max_busy = pool.busy
+        return stats
+
+    def report(self):
+        """Logs and sends scheduling statistics to Graphite"""
+        stats = self.collect_stats()
+        LOGGER.info("%(runs)d checks run, %(late_runs)d late "
+                    "(avg %(avg_lateness).2fs, max %(max_lateness).2fs), "
+                    "%(busy)d+%(blocking_busy)d busy workers, "
+                    "%(overrunning)d+%(blocking_overrunning)d overrunning",
+                    stats)
+        for pool in self.pools.values():
+            for checker, runtime in pool.get_overrunning():
+                LOGGER.warning("%r has been running for %.0f seconds",
+                               checker, runtime)
+
+        from nav.metrics.carbon import send_metrics
+        timestamp = time.time()
+        send_metrics([("%s.scheduler.%s" % (METRIC_PREFIX, key),
+                       (timestamp, value))
+                      for key, value in stats.items()])
@@ -23,14 +23,18 @@ the statemon subsystem.
 """
 import time
 from . import event
-from nav.metrics.carbon import send_metrics
+from nav.metrics.carbon import send_metrics, MetricBatch
 from nav.metrics.templates import (
     metric_path_for_packet_loss,
     metric_path_for_roundtrip_time,
     metric_path_for_service_availability,
-    metric_path_for_service_response_time
+    metric_path_for_service_response_time,
+    MetricPathCache,
 )
 
+# The packet loss and round-trip time paths of all the pinged netboxes
+_pping_paths = MetricPathCache()
+
 
 def update(netboxid, sysname, timestamp, status, responsetime, serviceid=None,
            handler=""):
@@ -66,3 +70,28 @@ def update(netboxid, sysname, timestamp, status, responsetime, serviceid=None,
         (response_name, (timestamp, responsetime))
     ]
     send_metrics(metrics)
+
+
+def update_netboxes(updates, timestamp=None):
+    """Sends packet loss and round-trip time updates for multiple devices to
+    graphite in a single batch.
+
+    :param updates: A list of (sysname, status, responsetime) tuples, with
+                    the same meaning as the arguments to update(). It is
+                    expected to hold every pinged netbox, as the paths of
+                    netboxes missing from two consecutive calls are dropped
+                    from the path cache.
+    :param timestamp: Timestamp of the measurements. If None or 'N', the
+                      current time will be used.
+
+    """
+    if timestamp == 'N':
+        timestamp = None
+    batch = MetricBatch(timestamp)
+    for sysname, status, responsetime in updates:
+        batch.add(_pping_paths.get(metric_path_for_packet_loss, sysname),
+                  0 if status == event.Event.UP else 1)
+        batch.add(_pping_paths.get(metric_path_for_roundtrip_time, sysname),
+                  responsetime)
+    _pping_paths.sweep()
+    batch.send()
@@ -19,8 +19,10 @@ from __future__ import absolute_import
 
 import os
 import logging
+import time
 from optparse import OptionParser
 from collections import defaultdict
+from multiprocessing.pool import ThreadPool
 
 from nav import buildconf
 from nav.logs import init_generic_logging
@@ -37,13 +39,15 @@ from django.utils import six
 LOGFILE_NAME = 'thresholdmon.log'
 LOGFILE_PATH = os.path.join(buildconf.localstatedir, 'log', LOGFILE_NAME)
 
+DEFAULT_WORKERS = 4
+
 _logger = logging.getLogger('nav.thresholdmon')
 
 
 def main():
     """Main thresholdmon program"""
     parser = make_option_parser()
-    (_options, _args) = parser.parse_args()
+    (options, _args) = parser.parse_args()
 
     init_generic_logging(
         logfile=LOGFILE_PATH,
@@ -52,7 +56,7 @@ def main():
         read_config=True,
     )
     django.setup()
-    scan()
+    scan(workers=options.workers)
 
 
 def make_option_parser():
@@ -62,30 +66,105 @@ def make_option_parser():
         description=("Scans metric values for exceeded thresholds, according"
                      "to configured threshold rules.")
     )
+    parser.add_option(
+        "-j", "--workers", type="int", default=DEFAULT_WORKERS,
+        help="maximum number of concurrent metric fetches from Graphite "
+             "(default: %default)")
     return parser
 
 
-def scan():
-    """Scans for threshold rules and evaluates them"""
+def scan(workers=DEFAULT_WORKERS):
+    """Scans for threshold rules and evaluates them.
+
+    Metric values are fetched from Graphite before any rule is evaluated.
+    Rules that share the same target and period share a single fetch, and
+    distinct fetches are run concurrently by a pool of at most `workers`
+    threads.
+
+    """
     rules = ThresholdRule.objects.all()
     alerts = get_unresolved_threshold_alerts()
 
     _logger.info("evaluating %d rules", len(rules))
+    scan_start = time.time()
+    evaluators = dict((rule.id, rule.get_evaluator()) for rule in rules)
+    fetch_times = fetch_values(evaluators, workers)
+    fetch_end = time.time()
+
     for rule in rules:
-        evaluate_rule(rule, alerts)
-    _logger.info("done")
+        start = time.time()
+        evaluate_rule(rule, alerts, evaluator=evaluators[rule.id])
+        _logger.debug("rule %s timings: fetch=%.3fs, evaluate=%.3fs",
+                      rule.id, fetch_times[rule.id], time.time() - start)
+
+    _logger.info("done in %.2fs (fetching: %.2fs, evaluating: %.2fs)",
+                 time.time() - scan_start, fetch_end - scan_start,
+                 time.time() - fetch_end)
+
+
+def fetch_values(evaluators, workers=DEFAULT_WORKERS):
+    """Fetches current values for a set of threshold evaluators.
+
+    Evaluators that have identical targets and periods will share the result
+    of a single fetch.
+
+    :param evaluators: A dict of {key: ThresholdEvaluator} items.
+    :param workers: The maximum number of concurrent fetches.
+    :returns: A dict mapping the keys of evaluators to the number of seconds
+              spent fetching their values.
+
+    """
+    groups = defaultdict(list)
+    for key, evaluator in evaluators.items():
+        groups[(evaluator.target, evaluator.period)].append(key)
+    if not groups:
+        return {}
+    _logger.info("fetching %d distinct targets for %d rules",
+                 len(groups), len(evaluators))
+
+    def _fetch(keys):
+        evaluator = evaluators[keys[0]]
+        start = time.time()
+        try:
+            evaluator.get_values()
+        except Exception:
+            _logger.exception("Unhandled exception while fetching values "
+                              "for %r", evaluator)
+        return time.time() - start
+
+    group_keys = list(groups.values())
+    pool = ThreadPool(max(1, min(workers, len(group_keys))))
+    try:
+        durations = pool.map(_fetch, group_keys)
+    finally:
+        pool.close()
+        pool.join()
+
+    fetch_times = {}
+    for keys, duration in zip(group_keys, durations):
+        result = evaluators[keys[0]].result
+        for key in keys:
+            evaluators[key].result = result
+            fetch_times[key] = duration
+    return fetch_times
 
 
 # pylint: disable=W0703
-def evaluate_rule(rule, alerts):
+def evaluate_rule(rule, alerts, evaluator=None):
     """
     Evaluates the current status of a single rule and posts events if
     necessary.
+
+    :param evaluator: A ThresholdEvaluator for rule, whose values have already
+                      been fetched. If omitted, one will be created and its
+                      values fetched.
     """
     _logger.debug("evaluating rule %r", rule)
 
-    evaluator = rule.get_evaluator()
-    if not evaluator.get_values():
+    if evaluator is None:
+        evaluator = rule.get_evaluator()
+        evaluator.get_values()
+    if not evaluator.result:
         _logger.warning("did not find any matching values for rule %r %s",
                         rule.target, rule.alert)
 
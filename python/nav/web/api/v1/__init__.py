@@ -1,4 +1,5 @@
 from rest_framework import pagination
+from rest_framework.exceptions import ValidationError
 
 class NavPageNumberPagination(pagination.PageNumberPagination):
     """Custom pagination class for NAV API
@@ -7,3 +8,40 @@ class NavPageNumberPagination(pagination.PageNumberPagination):
     """
     page_size = 100
     page_size_query_param = 'page_size'
+
+
+class NavCursorPagination(pagination.CursorPagination):
+    """Keyset pagination for NAV API endpoints over very large tables.
+
+    Each page is found by filtering on the ordering key of the previous one,
+    rather than by skipping a number of rows, so that fetching a deep page
+    costs no more than fetching the first one.
+
+    See http://www.django-rest-framework.org/api-guide/pagination/
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    ordering = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        """Returns the requested ordering, ending with the unique id.
+
+        A cursor is positioned using values of the ordering keys. Ending the
+        ordering with the id makes sure that rows sharing the value of a
+        non-unique key, such as a MAC address, are ordered the same way on
+        every request, so that no row is skipped or repeated between pages.
+
+        :raises ValidationError: if the ordering starts with a field of a
+                                 related model, which a cursor can't be
+                                 positioned by.
+        """
+        ordering = tuple(super(NavCursorPagination, self).get_ordering(
+            request, queryset, view))
+        if '__' in ordering[0]:
+            raise ValidationError(
+                "Cannot order by {} using a cursor, use page numbers "
+                "instead".format(ordering[0].lstrip('-')))
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            descending = ordering[0].startswith('-')
+            ordering += ('-id' if descending else 'id',)
+        return ordering
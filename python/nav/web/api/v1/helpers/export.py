@@ -0,0 +1,96 @@
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Provides streaming exports of large querysets in the API"""
+
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+from django.utils import six
+from rest_framework.utils.encoders import JSONEncoder
+
+CHUNK_SIZE = 1000
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+FORMATS = tuple(CONTENT_TYPES)
+
+
+def iterate_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """Yields all objects of a queryset as lists of at most chunk_size
+    objects, in primary key order.
+
+    Each chunk is fetched by a separate query that continues after the
+    primary key of the previous chunk, so that memory use stays flat no
+    matter how large the queryset is.
+
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        if last_pk is not None:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        else:
+            chunk = list(queryset[:chunk_size])
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1].pk
+
+
+def stream_export(queryset, serializer_class, export_format, filename):
+    """Returns a response that streams all objects of queryset, serialized
+    by serializer_class, as either newline delimited JSON or CSV.
+
+    :param export_format: One of FORMATS
+    :param filename: The suggested file name to save the export as, without
+                     the extension.
+    """
+    rows = (row
+            for chunk in iterate_chunks(queryset)
+            for row in serializer_class(chunk, many=True).data)
+    if export_format == 'csv':
+        content = _csv_lines(rows, list(serializer_class().fields))
+    else:
+        content = (json.dumps(row, cls=JSONEncoder) + '\n' for row in rows)
+
+    response = StreamingHttpResponse(content,
+                                     content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(
+        filename, export_format)
+    return response
+
+
+class _Echo(object):
+    """A file-like object that just returns what is written to it"""
+    @staticmethod
+    def write(value):
+        """Returns value"""
+        return value
+
+
+def _csv_lines(rows, fields):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        values = [row.get(field) for field in fields]
+        if six.PY2:
+            values = [value.encode('utf-8')
+                      if isinstance(value, six.text_type) else value
+                      for value in values]
+        yield writer.writerow(values)
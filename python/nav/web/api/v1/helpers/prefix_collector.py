@@ -47,10 +47,19 @@ class UsageResult(object):
 
 
 def fetch_usages(prefixes, starttime, endtime):
-    """Fetch usage for a list of prefixes"""
+    """Fetch usage for a list of prefixes, using a single query to count the
+    active addresses of all of them.
+
+    :type prefixes: list of manage.Prefix
+    :type starttime: datetime.datetime
+    :type endtime: datetime.datetime
+    """
     if prefixes is None:
         prefixes = []
-    return [fetch_usage(prefix, starttime, endtime) for prefix in prefixes]
+    prefixes = list(prefixes)
+    counts = collect_active_ips(prefixes, starttime, endtime)
+    return [UsageResult(prefix, counts.get(prefix.pk, 0), starttime, endtime)
+            for prefix in prefixes]
 
 
 def fetch_usage(prefix, starttime, endtime):
@@ -82,26 +91,43 @@ def collect_active_ip(prefix, starttime=None, endtime=None):
 
     :returns: int -- an integer representing the active addresses
     """
+    return collect_active_ips([prefix], starttime, endtime).get(prefix.pk, 0)
 
-    cursor = connection.cursor()
-    basequery = "SELECT COUNT(DISTINCT ip) AS ipcount FROM arp"
-    prefix = prefix.net_address
+
+def collect_active_ips(prefixes, starttime=None, endtime=None):
+    """Collects the number of active ip addresses in each of a list of
+    prefixes, using a single query. The optional starttime and endtime work
+    as for collect_active_ip().
+
+    :type prefixes: list of manage.Prefix
+    :type starttime: datetime.datetime
+    :type endtime: datetime.datetime
+
+    :returns: dict -- a map of prefix primary keys to the number of active
+              addresses in them
+    """
+    if not prefixes:
+        return {}
 
     if starttime and endtime:
-        query = basequery + """
-        WHERE (ip << %s AND (start_time, end_time) OVERLAPS (%s, %s))
-        """
-        cursor.execute(query, (prefix, starttime, endtime))
+        condition = "(arp.start_time, arp.end_time) OVERLAPS (%s, %s)"
+        args = [starttime, endtime]
     elif starttime:
-        query = basequery + """
-        WHERE (ip << %s AND %s BETWEEN start_time AND end_time)
-        """
-        cursor.execute(query, (prefix, starttime))
+        condition = "%s BETWEEN arp.start_time AND arp.end_time"
+        args = [starttime]
     else:
-        query = basequery + """
-        WHERE (ip << %s AND end_time = 'infinity')
-        """
-        cursor.execute(query, (prefix,))
+        condition = "arp.end_time = 'infinity'"
+        args = []
+
+    query = """
+    SELECT prefix.prefixid, COUNT(DISTINCT arp.ip) AS ipcount
+    FROM prefix
+    JOIN arp ON (arp.ip << prefix.netaddr AND {condition})
+    WHERE prefix.prefixid = ANY(%s)
+    GROUP BY prefix.prefixid
+    """.format(condition=condition)
+    args.append([prefix.pk for prefix in prefixes])
 
-    result = cursor.fetchone()
-    return int(result[0])
+    cursor = connection.cursor()
+    cursor.execute(query, args)
+    return {prefixid: int(count) for prefixid, count in cursor.fetchall()}
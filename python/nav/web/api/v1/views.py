@@ -46,7 +46,8 @@ from nav.util import auth_token
 
 from nav.web.api.v1 import serializers, alert_serializers
 from .auth import APIPermission, APIAuthentication, NavBaseAuthentication
-from .helpers import prefix_collector
+from nav.web.api.v1 import NavPageNumberPagination, NavCursorPagination
+from .helpers import prefix_collector, export
 from .filter_backends import *
 from nav.web.status2 import STATELESS_THRESHOLD
 
@@ -471,7 +472,36 @@ SQL_BETWEEN = "'{}'::TIMESTAMP BETWEEN start_time AND end_time"
 
 
 class MachineTrackerViewSet(NAVAPIMixin, viewsets.ReadOnlyModelViewSet):
-    """Abstract base ViewSet for ARP and CAM tables"""
+    """Abstract base ViewSet for ARP and CAM tables.
+
+    Results are paginated using a cursor, unless a page number is given, and
+    can be exported in full by setting the `export` parameter to `ndjson` or
+    `csv`.
+    """
+    ordering = ('id',)
+
+    @property
+    def pagination_class(self):
+        """Uses keyset pagination, unless a page number is asked for"""
+        if 'page' in self.request.query_params:
+            return NavPageNumberPagination
+        return NavCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        """Streams all matching records if an export format is given"""
+        export_format = request.query_params.get('export', None)
+        if not export_format:
+            return super(MachineTrackerViewSet, self).list(
+                request, *args, **kwargs)
+        if export_format not in export.FORMATS:
+            message = "Unknown export format, use one of: {}".format(
+                ", ".join(export.FORMATS))
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.filter_queryset(self.get_queryset())
+        return export.stream_export(queryset, self.get_serializer_class(),
+                                    export_format,
+                                    self.model_class._meta.db_table)
+
     def get_queryset(self):
         """Filter on custom parameters"""
         queryset = self.model_class.objects.all()
@@ -495,10 +525,19 @@ class CamViewSet(MachineTrackerViewSet):
     *Because the number of cam records often is huge, the API does not support
     fetching all and will ask you to use a filter if you try.*
 
+    Results are paginated using a cursor: Follow the `next` link of each page
+    to get the next one. Deep pages are as fast as the first. The old
+    page numbers still work when the `page` parameter is given.
+
+    To fetch all matching records in one response, set `export` to `ndjson`
+    (one JSON object per line) or `csv`. The records are streamed in
+    chunks, so even a full history can be exported.
+
     Filters
     -------
     - `active`: *set this to list only records that has not ended. This will
       then ignore any start and endtimes set*
+    - `export`: *stream all matching records as `ndjson` or `csv`*
     - `starttime`: *if set without endtime: lists all active records at that
       timestamp*
     - `endtime`: *must be set with starttime: lists all active records in the
@@ -532,11 +571,20 @@ class ArpViewSet(MachineTrackerViewSet):
     *Because the number of arp records often is huge, the API does not support
     fetching all and will ask you to use a filter if you try.*
 
+    Results are paginated using a cursor: Follow the `next` link of each page
+    to get the next one. Deep pages are as fast as the first. The old
+    page numbers still work when the `page` parameter is given.
+
+    To fetch all matching records in one response, set `export` to `ndjson`
+    (one JSON object per line) or `csv`. The records are streamed in
+    chunks, so even a full history can be exported.
+
     Filters
     -------
 
     - `active`: *set this to list only records that has not ended. This will
       then ignore any start and endtimes set*
+    - `export`: *stream all matching records as `ndjson` or `csv`*
     - `starttime`: *if set without endtime: lists all active records at that
       timestamp*
     - `endtime`: *must be set with starttime: lists all active records in the
@@ -710,9 +758,8 @@ class PrefixUsageList(NAVAPIMixin, ListAPIView):
     def get_queryset(self):
         """Filter for ip family"""
         if 'scope' in self.request.GET:
-            queryset = (manage.Prefix.objects.within(
-                self.request.GET.get('scope')).select_related('vlan')
-                        .order_by('net_address'))
+            queryset = manage.Prefix.objects.within(
+                self.request.GET.get('scope'))
         elif self.request.GET.get('family'):
             queryset = manage.Prefix.objects.extra(
                 where=['family(netaddr)=%s'],
@@ -721,10 +768,13 @@ class PrefixUsageList(NAVAPIMixin, ListAPIView):
             queryset = manage.Prefix.objects.all()
 
         # Filter prefixes that is smaller than minimum prefix length
-        results = [p for p in queryset
-                   if IP(p.net_address).len() >= MINIMUMPREFIXLENGTH]
+        bits = MINIMUMPREFIXLENGTH.bit_length() - 1
+        queryset = queryset.extra(
+            where=['masklen(netaddr) <= '
+                   'CASE family(netaddr) WHEN 4 THEN %s ELSE %s END'],
+            params=[32 - bits, 128 - bits])
 
-        return results
+        return queryset.select_related('vlan').order_by('net_address')
 
     def get_serializer(self, data, *args, **kwargs):
         """Populate the serializer with usages based on the prefix list"""
@@ -47,6 +47,22 @@ class SuggestParams(serializers.Serializer):
     offset = serializers.IntegerField(default=0)
 
 
+def get_depth(request):
+    """Return the number of tree levels to serialize, as given by the depth
+    query parameter, or None for all of them.
+
+    :raises ValueError: if depth isn't a positive integer
+
+    """
+    depth = request.query_params.get("depth", None)
+    if not depth:
+        return None
+    depth = int(depth)
+    if depth < 1:
+        raise ValueError("depth must be a positive integer")
+    return depth
+
+
 class PrefixViewSet(viewsets.ViewSet):
     """Potpurri view for anything IPAM needs to function properly.
 
@@ -60,10 +76,13 @@ class PrefixViewSet(viewsets.ViewSet):
     - description: *Match against the VLAN's description*
     - within: *Find all prefixes within this range*
     - usage: *Find all prefixes with this usage description*
+    - subtree: *Only list the children of this prefix in the tree*
+    - depth: *Only list this many levels of the tree*
 
     Examples
     --------
     ?net_type=scope&organization=NTNU&within=10.0.0.0/8
+    ?within=10.0.0.0/8&subtree=10.1.0.0/16&depth=1
 
     """
 
@@ -138,9 +157,19 @@ class PrefixViewSet(viewsets.ViewSet):
                                                             "rfc1918"])
         within = self.request.query_params.get("within", None)
         show_all = self.request.query_params.get("show_all", None)
+        subtree = self.request.query_params.get("subtree", None)
+        try:
+            depth = get_depth(self.request)
+        except ValueError as error:
+            return Response(data=str(error),
+                            status=status.HTTP_400_BAD_REQUEST)
         result = make_tree(prefixes, root_ip=within, family=family,
                            show_all=show_all)
-        payload = result.fields["children"]
+        if subtree:
+            result = result.subtree(subtree)
+            if result is None:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+        payload = result.get_fields(depth)["children"]
         return Response(payload, status=status.HTTP_200_OK)
 
 
@@ -175,8 +204,14 @@ class PrefixFinderSet(viewsets.ViewSet):
         -------
         - prefix: *Range or prefix to query against (e.g. '10.0.0.0/8')*
         - prefix_size: *The maximum prefix length (mask, e.g. /32)*
+        - depth: *Only list this many levels of the tree*
 
         """
+        try:
+            depth = get_depth(self.request)
+        except ValueError as error:
+            return Response(data=str(error),
+                            status=status.HTTP_400_BAD_REQUEST)
         prefix = self.request.query_params.get("prefix", None)
         result = get_available_subnets(prefix)
         prefix_size = self.request.query_params.get("prefix_size", None)
@@ -188,7 +223,7 @@ class PrefixFinderSet(viewsets.ViewSet):
         payload = {
             "prefix": prefix,
             "prefixlen": prefix.split("/")[1],
-            "children": make_tree_from_ip(result).fields["children"]
+            "children": make_tree_from_ip(result).get_fields(depth)["children"]
         }
         return Response(payload, status=status.HTTP_200_OK)
 
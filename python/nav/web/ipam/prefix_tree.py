@@ -21,8 +21,11 @@ contains ad-hoc serializer methods (self.fields) for API purposes.
 """
 
 from __future__ import unicode_literals
+import bisect
 import json
 import logging
+from operator import attrgetter
+
 from IPy import IP, IPSet
 
 from django.core.urlresolvers import reverse, NoReverseMatch
@@ -34,7 +37,13 @@ from nav.models.manage import Prefix
 LOGGER = logging.getLogger('nav.web.ipam.prefix_tree')
 
 class PrefixHeap(object):
-    "Pseudo-heap ordered topologically by prefixes"
+    """Pseudo-heap ordered topologically by prefixes.
+
+    Children are kept sorted by address family, network address and prefix
+    length, which lets the heap be built from a list of nodes in a single
+    sorted pass, and lets subtrees be looked up without scanning every node.
+
+    """
     def __init__(self, children=None):
         if children is None:
             children = []
@@ -43,8 +52,15 @@ class PrefixHeap(object):
     @property
     def fields(self):
         "Return the children of the heap as a dictionary"
+        return self.get_fields()
+
+    def get_fields(self, depth=None):
+        """Return the children of the heap as a dictionary, serializing at most
+        depth levels of children (all levels if depth is None)
+
+        """
         payload = {
-            "children": [child.fields for child in self.children]
+            "children": serialize_children(self.children, depth)
         }
         return payload
 
@@ -89,15 +105,73 @@ class PrefixHeap(object):
             node.parent = child
             child.add(node)
             return
-        # if this fails, add to self
+        # if this fails, add to self, keeping the children sorted
         node.parent = self
-        self.children.append(node)
-        self.children.sort()
+        keys = [child.sort_key for child in self.children]
+        self.children.insert(bisect.bisect_right(keys, node.sort_key), node)
 
     def add_many(self, nodes):
-        "Add multiple nodes to heap"
+        """Add multiple nodes to heap.
+
+        Rather than adding each node in turn, the heap is rebuilt from all its
+        existing nodes and the new ones in a single pass: Sorted by network
+        address and then by prefix length, every node comes after the nodes
+        containing it, so a stack of the current node's ancestors is all that
+        is needed to find its parent.
+
+        """
+        nodes = list(nodes)
+        if not nodes:
+            return
+        nodes.extend(self.walk())
         for node in nodes:
-            self.add(node)
+            node.children = []
+        self.children = []
+
+        ancestors = []
+        for node in sorted(nodes, key=attrgetter("sort_key")):
+            while ancestors and node not in ancestors[-1]:
+                ancestors.pop()
+            parent = ancestors[-1] if ancestors else self
+            node.parent = parent
+            parent.children.append(node)
+            ancestors.append(node)
+
+    def subtree(self, ip_addr):
+        """Return the node of the prefix ip_addr, or None if it's not in the
+        heap
+
+        """
+        target = IpNode(ip_addr, None)
+        node = self
+        while node.children:
+            keys = [child.sort_key for child in node.children]
+            index = bisect.bisect_right(keys, target.sort_key) - 1
+            if index < 0:
+                return None
+            # siblings never overlap, so only the last child starting at or
+            # before the target can contain it
+            candidate = node.children[index]
+            if candidate.sort_key == target.sort_key:
+                return candidate
+            if target not in candidate:
+                return None
+            node = candidate
+        return None
+
+
+def serialize_children(children, depth=None, sort_fn=None):
+    """Serialize a list of nodes, recursing at most depth levels into their
+    children (all levels if depth is None)
+
+    """
+    if depth is not None:
+        if depth <= 0:
+            return []
+        depth -= 1
+    if sort_fn is not None:
+        children = sorted(children, key=sort_fn)
+    return [child.get_fields(depth) for child in children]
 
 
 # To maintain our sanity, we need a somewhat decent contract between the view
@@ -112,6 +186,9 @@ class IpNode(PrefixHeap):
         super(IpNode, self).__init__()
         self._ip = IP(ip_addr)
         self.net_type = net_type
+        first = self._ip.int()
+        self.last_address = first + self._ip.len() - 1
+        self.sort_key = (self._ip.version(), first, self._ip.prefixlen())
 
     @property
     # pylint: disable=invalid-name
@@ -136,7 +213,11 @@ class IpNode(PrefixHeap):
     def __contains__(self, other):
         assert isinstance(other, IpNode), \
             "Can only compare with other IpNode elements"
-        return other.ip in self.ip
+        version, first, _ = self.sort_key
+        other_version, other_first, _ = other.sort_key
+        return (version == other_version and
+                first <= other_first and
+                other.last_address <= self.last_address)
 
     def __cmp__(self, other):
         assert isinstance(other, IpNode), \
@@ -204,10 +285,11 @@ class IpNodeFacade(IpNode):
         "Numeric value of address"
         return self.ip.ip
 
-    @property
-    def fields(self):
+    def get_fields(self, depth=None):
         """Return all fields marked for serialization (in self.FIELDS) as a
-        Python dict. Also serializes children, creating a nested object.
+        Python dict. Also serializes at most depth levels of children (all
+        levels if depth is None), creating a nested object. Nodes whose
+        children were left out can be told from leaves by their children_pks.
 
         """
         payload = {}
@@ -217,11 +299,8 @@ class IpNodeFacade(IpNode):
                 payload[field] = value
             except AttributeError:
                 payload[field] = None
-        if self.sort_fn is not None:
-            children = [child.fields for child in self.children]
-            payload["children"] = sorted(children, key=self.sort_fn)
-        else:
-            payload["children"] = [child.fields for child in self.children]
+        payload["children"] = serialize_children(self.children, depth,
+                                                 self.sort_fn)
         return payload
 
     @property
@@ -351,7 +430,7 @@ class PrefixNode(IpNodeFacade):
         # Export usage field of VLAN
         if getattr(vlan, "usage"):
             self.vlan_usage = prefix.vlan.usage.description
-            self.FIELDS.append("vlan_usage")
+            self.FIELDS = self.FIELDS + ["vlan_usage"]
 
 
 def make_prefix_heap(prefixes, initial_children=None, family=None,
@@ -390,25 +469,22 @@ def make_prefix_heap(prefixes, initial_children=None, family=None,
             return True
         return False
 
-    heap = PrefixHeap(initial_children)
+    heap = PrefixHeap()
     filtered = [prefix for prefix in prefixes if accept(prefix)]
     nodes = [PrefixNode(prefix, sort_fn=sort_fn) for prefix in filtered]
-    for node in sorted(nodes, reverse=False):
-        heap.add(node)
+    heap.add_many(list(initial_children or []) + nodes)
     # Add marker nodes for available ranges/prefixes
     if show_available:
-        scopes = (child for child in heap.walk_roots() if child.net_type in
-                  ["scope"])
-        subnets = (get_available_nodes([scope.ip]) for scope in scopes)
-        for subnet in subnets:
-            heap.add_many(subnet)
+        scopes = [child for child in heap.walk_roots() if child.net_type in
+                  ["scope"]]
+        heap.add_many(node for scope in scopes
+                      for node in get_available_nodes([scope.ip]))
     # Add marker nodes for empty ranges, e.g. ranges not spanned by the
     # children of a node. This is useful for aligning visualizations and so on.
     if show_unused:
-        unused_prefixes = (child.not_in_use() for child in heap.walk())
-        for unused_prefix in unused_prefixes:
-            nodes = nodes_from_ips(unused_prefix, klass="empty")
-            heap.add_many(nodes)
+        unused_prefixes = [child.not_in_use() for child in heap.walk()]
+        heap.add_many(node for unused_prefix in unused_prefixes
+                      for node in nodes_from_ips(unused_prefix, klass="empty"))
     return heap
 
 SORT_BY = {
@@ -482,7 +558,6 @@ def make_tree_from_ip(cidr_addresses):
 
     """
     heap = PrefixHeap()
-    for addr in cidr_addresses:
-        prefix = FauxNode(addr, "available", "available")
-        heap.add(prefix)
+    heap.add_many(FauxNode(addr, "available", "available")
+                  for addr in cidr_addresses)
     return heap
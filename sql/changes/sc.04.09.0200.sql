@@ -0,0 +1,18 @@
+-- Notify the eventEngine whenever alert states are opened, closed or removed,
+-- so that it can keep its in-memory index of unresolved alerts up to date
+-- without reloading it from scratch.
+CREATE OR REPLACE FUNCTION alerthist_notify_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('alerthist_changed', OLD.alerthistid::text);
+    ELSE
+        PERFORM pg_notify('alerthist_changed', NEW.alerthistid::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER alerthist_notify_change
+  AFTER INSERT OR UPDATE OR DELETE ON alerthist
+  FOR EACH ROW EXECUTE PROCEDURE alerthist_notify_change();
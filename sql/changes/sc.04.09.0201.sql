@@ -0,0 +1,17 @@
+-- Notify the eventEngine whenever the layer 2 topology changes, so that it
+-- can invalidate its cache of VLAN topology graphs.
+CREATE OR REPLACE FUNCTION notify_topology_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    NOTIFY topology_changed;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER swportvlan_notify_topology_change
+  AFTER INSERT OR UPDATE OR DELETE ON swportvlan
+  FOR EACH STATEMENT EXECUTE PROCEDURE notify_topology_change();
+
+CREATE TRIGGER interface_notify_topology_change
+  AFTER UPDATE OF to_netboxid, to_interfaceid ON interface
+  FOR EACH STATEMENT EXECUTE PROCEDURE notify_topology_change();
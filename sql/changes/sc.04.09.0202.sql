@@ -0,0 +1,63 @@
+-- Notify alertengine whenever new alerts are queued, so that it can process
+-- them right away instead of waiting for its next queue check.
+CREATE OR REPLACE FUNCTION notify_new_alert()
+RETURNS TRIGGER AS $$
+BEGIN
+    NOTIFY new_alert;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER alertq_notify_new_alert
+  AFTER INSERT ON alertq
+  FOR EACH STATEMENT EXECUTE PROCEDURE notify_new_alert();
+
+-- Notify alertengine whenever alert profiles, subscriptions, filters or
+-- permissions change, so that it can invalidate its cached copies of them.
+CREATE OR REPLACE FUNCTION profiles.notify_alertprofiles_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    NOTIFY alertprofiles_changed;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER alertpreference_notify_change
+  AFTER INSERT OR UPDATE OR DELETE ON profiles.alertpreference
+  FOR EACH STATEMENT EXECUTE PROCEDURE profiles.notify_alertprofiles_change();
+
+CREATE TRIGGER alertprofile_notify_change
+  AFTER INSERT OR UPDATE OR DELETE ON profiles.alertprofile
+  FOR EACH STATEMENT EXECUTE PROCEDURE profiles.notify_alertprofiles_change();
+
+CREATE TRIGGER timeperiod_notify_change
+  AFTER INSERT OR UPDATE OR DELETE ON profiles.timeperiod
+  FOR EACH STATEMENT EXECUTE PROCEDURE profiles.notify_alertprofiles_change();
+
+CREATE TRIGGER alertsubscription_notify_change
+  AFTER INSERT OR UPDATE OR DELETE ON profiles.alertsubscription
+  FOR EACH STATEMENT EXECUTE PROCEDURE profiles.notify_alertprofiles_change();
+
+CREATE TRIGGER filtergroup_notify_change
+  AFTER INSERT OR UPDATE OR DELETE ON profiles.filtergroup
+  FOR EACH STATEMENT EXECUTE PROCEDURE profiles.notify_alertprofiles_change();
+
+CREATE TRIGGER filtergroupcontent_notify_change
+  AFTER INSERT OR UPDATE OR DELETE ON profiles.filtergroupcontent
+  FOR EACH STATEMENT EXECUTE PROCEDURE profiles.notify_alertprofiles_change();
+
+CREATE TRIGGER filter_notify_change
+  AFTER INSERT OR UPDATE OR DELETE ON profiles.filter
+  FOR EACH STATEMENT EXECUTE PROCEDURE profiles.notify_alertprofiles_change();
+
+CREATE TRIGGER expression_notify_change
+  AFTER INSERT OR UPDATE OR DELETE ON profiles.expression
+  FOR EACH STATEMENT EXECUTE PROCEDURE profiles.notify_alertprofiles_change();
+
+CREATE TRIGGER filtergroup_group_permission_notify_change
+  AFTER INSERT OR UPDATE OR DELETE ON profiles.filtergroup_group_permission
+  FOR EACH STATEMENT EXECUTE PROCEDURE profiles.notify_alertprofiles_change();
+
+CREATE TRIGGER accountgroup_accounts_notify_change
+  AFTER INSERT OR UPDATE OR DELETE ON profiles.accountgroup_accounts
+  FOR EACH STATEMENT EXECUTE PROCEDURE profiles.notify_alertprofiles_change();
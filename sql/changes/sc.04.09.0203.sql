@@ -0,0 +1,91 @@
+-- Track which netboxes have changed, and when, so that ipdevpoll can reload
+-- only the netboxes that changed since its last reload. Rows are kept for
+-- deleted netboxes, so that their removal can be detected as well.
+CREATE TABLE manage.netbox_change (
+  netboxid INTEGER NOT NULL PRIMARY KEY,
+  changed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX netbox_change_changed_at_btree ON netbox_change (changed_at);
+
+CREATE OR REPLACE FUNCTION record_netbox_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    changed_id INTEGER;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed_id := OLD.netboxid;
+    ELSE
+        changed_id := NEW.netboxid;
+    END IF;
+
+    LOOP
+        UPDATE netbox_change SET changed_at = NOW()
+          WHERE netboxid = changed_id;
+        IF FOUND THEN
+            RETURN NULL;
+        END IF;
+        BEGIN
+            INSERT INTO netbox_change (netboxid) VALUES (changed_id);
+            RETURN NULL;
+        EXCEPTION WHEN unique_violation THEN
+            -- inserted concurrently, try the update again
+        END;
+    END LOOP;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER netbox_record_change_on_insert_or_delete
+  AFTER INSERT OR DELETE ON netbox
+  FOR EACH ROW EXECUTE PROCEDURE record_netbox_change();
+
+CREATE TRIGGER netbox_record_change_on_update
+  AFTER UPDATE ON netbox
+  FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+  EXECUTE PROCEDURE record_netbox_change();
+
+-- Keep the time of the last successful run of each ipdevpoll job for each
+-- netbox, so that ipdevpoll needn't aggregate the entire job log to find it.
+CREATE TABLE manage.ipdevpoll_job_last_success (
+  netboxid INTEGER NOT NULL,
+  job_name VARCHAR NOT NULL,
+  end_time TIMESTAMP NOT NULL,
+
+  CONSTRAINT ipdevpoll_job_last_success_pkey PRIMARY KEY (netboxid, job_name),
+  CONSTRAINT ipdevpoll_job_last_success_netbox_fkey FOREIGN KEY (netboxid)
+             REFERENCES netbox (netboxid)
+             ON UPDATE CASCADE ON DELETE CASCADE
+);
+
+INSERT INTO ipdevpoll_job_last_success (netboxid, job_name, end_time)
+  SELECT netboxid, job_name, MAX(end_time)
+  FROM ipdevpoll_job_log
+  WHERE success
+  GROUP BY netboxid, job_name;
+
+CREATE OR REPLACE FUNCTION update_ipdevpoll_job_last_success()
+RETURNS TRIGGER AS $$
+BEGIN
+    LOOP
+        UPDATE ipdevpoll_job_last_success
+          SET end_time = GREATEST(end_time, NEW.end_time)
+          WHERE netboxid = NEW.netboxid AND job_name = NEW.job_name;
+        IF FOUND THEN
+            RETURN NULL;
+        END IF;
+        BEGIN
+            INSERT INTO ipdevpoll_job_last_success (netboxid, job_name,
+                                                    end_time)
+              VALUES (NEW.netboxid, NEW.job_name, NEW.end_time);
+            RETURN NULL;
+        EXCEPTION WHEN unique_violation THEN
+            -- inserted concurrently, try the update again
+        END;
+    END LOOP;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER ipdevpoll_job_log_update_last_success
+  AFTER INSERT ON ipdevpoll_job_log
+  FOR EACH ROW WHEN (NEW.success)
+  EXECUTE PROCEDURE update_ipdevpoll_job_last_success();
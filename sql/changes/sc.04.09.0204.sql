@@ -0,0 +1,13 @@
+-- Keep the latest count of active IP and MAC addresses of each prefix, so
+-- that the active IP collector needs only recount the prefixes that have
+-- seen ARP changes since its last run.
+CREATE TABLE manage.prefix_active_ip_count (
+  prefixid INTEGER NOT NULL PRIMARY KEY,
+  ip_count INTEGER NOT NULL,
+  mac_count INTEGER NOT NULL,
+  updated_at TIMESTAMP NOT NULL DEFAULT LOCALTIMESTAMP,
+
+  CONSTRAINT prefix_active_ip_count_prefix_fkey FOREIGN KEY (prefixid)
+             REFERENCES prefix (prefixid)
+             ON UPDATE CASCADE ON DELETE CASCADE
+);
@@ -0,0 +1,46 @@
+-- Track which prefixes have changed, and when, so that the prefix index of
+-- ipdevpoll's arp plugin can reload only the prefixes that changed since its
+-- last refresh. Rows are kept for deleted prefixes, so that their removal
+-- can be detected as well.
+CREATE TABLE manage.prefix_change (
+  prefixid INTEGER NOT NULL PRIMARY KEY,
+  changed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX prefix_change_changed_at_btree ON prefix_change (changed_at);
+
+CREATE OR REPLACE FUNCTION record_prefix_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    changed_id INTEGER;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed_id := OLD.prefixid;
+    ELSE
+        changed_id := NEW.prefixid;
+    END IF;
+
+    LOOP
+        UPDATE prefix_change SET changed_at = NOW()
+          WHERE prefixid = changed_id;
+        IF FOUND THEN
+            RETURN NULL;
+        END IF;
+        BEGIN
+            INSERT INTO prefix_change (prefixid) VALUES (changed_id);
+            RETURN NULL;
+        EXCEPTION WHEN unique_violation THEN
+            -- inserted concurrently, try the update again
+        END;
+    END LOOP;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER prefix_record_change_on_insert_or_delete
+  AFTER INSERT OR DELETE ON prefix
+  FOR EACH ROW EXECUTE PROCEDURE record_prefix_change();
+
+CREATE TRIGGER prefix_record_change_on_update
+  AFTER UPDATE ON prefix
+  FOR EACH ROW WHEN (OLD.netaddr IS DISTINCT FROM NEW.netaddr)
+  EXECUTE PROCEDURE record_prefix_change();
@@ -0,0 +1,117 @@
+from unittest import TestCase
+from mock import Mock
+
+from nav.models.profiles import Operator
+from nav.alertengine.matching import AlertMatcher, CompiledFilter
+
+
+def make_alert(alert_id, event_type, category=None):
+    alert = Mock(id=alert_id, event_type_id=event_type, alert_type_id=None)
+    if category:
+        alert.netbox_id = 1
+        alert.netbox.category_id = category
+    else:
+        alert.netbox_id = None
+    return alert
+
+
+def make_filter(filter_id, *expressions):
+    filtr = Mock(id=filter_id)
+    filtr.expression_set.select_related.return_value = [
+        Mock(match_field=Mock(value_id=value_id), operator=operator,
+             value=value)
+        for value_id, operator, value in expressions
+    ]
+    return filtr
+
+
+def make_content(filtr, include=True, positive=True):
+    return Mock(filter=filtr, include=include, positive=positive)
+
+
+class CompiledFilterTest(TestCase):
+    def test_should_index_equality_tests_on_event_type(self):
+        filtr = make_filter(
+            1, ('eventtype.eventtypeid', Operator.IN, 'boxState|linkState'))
+        compiled = CompiledFilter(filtr)
+        self.assertEqual(compiled.predicates,
+                         [('eventtype.eventtypeid',
+                           frozenset(['boxState', 'linkState']))])
+        self.assertEqual(compiled.residual, [])
+
+    def test_should_leave_other_tests_to_the_database(self):
+        filtr = make_filter(1, ('alertq.severity', Operator.GREATER, '50'),
+                            ('netbox.sysname', Operator.CONTAINS, 'gw'))
+        compiled = CompiledFilter(filtr)
+        self.assertEqual(compiled.predicates, [])
+        self.assertEqual(len(compiled.residual), 2)
+
+
+class AlertMatcherTest(TestCase):
+    def setUp(self):
+        self.alerts = [
+            make_alert(1, 'boxState', 'GW'),
+            make_alert(2, 'boxState', 'SW'),
+            make_alert(3, 'linkState', 'SW'),
+            make_alert(4, 'info'),
+        ]
+        self.matcher = AlertMatcher(self.alerts)
+        self.box_state = make_filter(
+            1, ('eventtype.eventtypeid', Operator.EQUALS, 'boxState'))
+        self.switches = make_filter(
+            2, ('cat.catid', Operator.IN, 'SW|EDGE'))
+
+    def test_should_match_filter_from_index(self):
+        self.assertEqual(self.matcher.match_filter(self.box_state),
+                         frozenset([1, 2]))
+        self.assertEqual(self.matcher.match_filter(self.switches),
+                         frozenset([2, 3]))
+
+    def test_should_match_empty_filter_against_all_alerts(self):
+        self.assertEqual(self.matcher.match_filter(make_filter(3)),
+                         frozenset([1, 2, 3, 4]))
+
+    def test_should_check_residual_expressions_for_candidates_only(self):
+        filtr = make_filter(
+            3, ('eventtype.eventtypeid', Operator.EQUALS, 'boxState'),
+            ('alertq.severity', Operator.GREATER, '50'))
+        filtr.get_matching_alert_ids.return_value = set([2])
+
+        self.assertEqual(self.matcher.match_filter(filtr), frozenset([2]))
+        candidates = filtr.get_matching_alert_ids.call_args[0][0]
+        self.assertEqual(set(candidates), set([1, 2]))
+
+    def test_should_not_query_database_when_there_are_no_candidates(self):
+        filtr = make_filter(
+            3, ('eventtype.eventtypeid', Operator.EQUALS, 'maintenanceState'),
+            ('alertq.severity', Operator.GREATER, '50'))
+        self.assertEqual(self.matcher.match_filter(filtr), frozenset())
+        self.assertFalse(filtr.get_matching_alert_ids.called)
+
+    def test_should_match_each_filter_only_once(self):
+        self.matcher.match_filter(self.box_state)
+        self.matcher.match_filter(self.box_state)
+        self.assertEqual(
+            self.box_state.expression_set.select_related.call_count, 1)
+
+    def test_should_include_and_exclude_by_filtergroup_contents(self):
+        contents = [make_content(self.box_state),
+                    make_content(self.switches, include=False)]
+        self.assertEqual(self.matcher.match_filtergroup(Mock(id=1), contents),
+                         frozenset([1]))
+
+    def test_should_intersect_on_inverted_exclusion(self):
+        contents = [make_content(self.box_state),
+                    make_content(self.switches, include=False,
+                                 positive=False)]
+        self.assertEqual(self.matcher.match_filtergroup(Mock(id=1), contents),
+                         frozenset([2]))
+
+    def test_should_include_complement_on_inverted_inclusion(self):
+        contents = [make_content(self.box_state, positive=False)]
+        self.assertEqual(self.matcher.match_filtergroup(Mock(id=1), contents),
+                         frozenset([3, 4]))
+
+    def test_should_not_match_empty_filtergroup(self):
+        self.assertEqual(self.matcher.match_filtergroup(Mock(id=1), []),
+                         frozenset())
@@ -0,0 +1,97 @@
+from unittest import TestCase
+from datetime import datetime, time
+
+from mock import Mock, patch
+
+from nav.models.profiles import TimePeriod
+from nav.alertengine import base
+
+
+class TimePeriodFindActiveTest(TestCase):
+    def setUp(self):
+        self.morning = Mock(start=time(8, 0))
+        self.evening = Mock(start=time(16, 0))
+        self.periods = [self.morning, self.evening]
+
+    def test_should_find_period_that_has_started(self):
+        now = datetime(2018, 3, 1, 12, 0)
+        self.assertEqual(TimePeriod.find_active(self.periods, now),
+                         self.morning)
+
+    def test_should_find_last_period_before_first_start(self):
+        now = datetime(2018, 3, 1, 6, 0)
+        self.assertEqual(TimePeriod.find_active(self.periods, now),
+                         self.evening)
+
+    def test_should_find_nothing_without_periods(self):
+        self.assertIsNone(TimePeriod.find_active([], datetime.now()))
+
+
+class SubscriptionCacheTest(TestCase):
+    def test_should_select_subscriptions_of_active_time_period(self):
+        morning = Mock(id=1, start=time(8, 0),
+                       valid_during=TimePeriod.ALL_WEEK)
+        evening = Mock(id=2, start=time(16, 0),
+                       valid_during=TimePeriod.ALL_WEEK)
+        account = Mock()
+        cache = base.SubscriptionCache()
+        cache._accounts = [(account, [morning, evening], [])]
+        cache._subscriptions = {1: ['morning'], 2: ['evening']}
+
+        now = datetime(2018, 3, 1, 17, 0)
+        self.assertEqual(cache.get_active_subscriptions(now),
+                         [(account, ['evening'], [])])
+
+    def test_invalidate_should_discard_everything(self):
+        cache = base.SubscriptionCache()
+        cache._accounts = []
+        cache.compiled_filters[1] = Mock()
+        cache.invalidate()
+        self.assertIsNone(cache._accounts)
+        self.assertEqual(cache.compiled_filters, {})
+
+
+@patch('nav.alertengine.base.select.select')
+@patch('nav.alertengine.base.connection')
+class WaitForAlertsTest(TestCase):
+    def _notify(self, conn, *channels):
+        def _poll():
+            conn.notifies.extend(Mock(channel=channel) for channel in channels)
+        conn.poll.side_effect = _poll
+
+    def test_should_return_on_new_alert(self, connection, _select):
+        conn = connection.connection
+        conn.notifies = []
+        self._notify(conn, base.NEW_ALERT_CHANNEL)
+        cache = Mock()
+
+        self.assertTrue(base.wait_for_alerts(10, cache))
+        self.assertFalse(cache.invalidate.called)
+        self.assertEqual(conn.notifies, [])
+
+    def test_should_invalidate_cache_on_profile_change(self, connection,
+                                                      _select):
+        conn = connection.connection
+        conn.notifies = []
+        self._notify(conn, base.PROFILES_CHANGED_CHANNEL,
+                     base.NEW_ALERT_CHANNEL)
+        cache = Mock()
+
+        self.assertTrue(base.wait_for_alerts(10, cache))
+        self.assertTrue(cache.invalidate.called)
+
+    def test_should_return_buffered_new_alert_without_waiting(self,
+                                                             connection,
+                                                             _select):
+        conn = connection.connection
+        conn.notifies = [Mock(channel=base.NEW_ALERT_CHANNEL)]
+        conn.poll.side_effect = None
+
+        self.assertTrue(base.wait_for_alerts(10, Mock()))
+        self.assertFalse(_select.called)
+        self.assertEqual(conn.notifies, [])
+
+    def test_should_time_out_without_notifications(self, connection,
+                                                   _select):
+        connection.connection.notifies = []
+        self.assertFalse(base.wait_for_alerts(0, Mock()))
@@ -0,0 +1,60 @@
+from unittest import TestCase
+
+import networkx
+
+from nav.eventengine import topology
+
+
+class Node(object):
+    UP_UP = 'y'
+    UP_DOWN = 'n'
+
+    def __init__(self, name, up=UP_UP):
+        self.name = name
+        self.up = up
+
+    def __repr__(self):
+        return "Node(%r)" % self.name
+
+
+class EvaluatePathsTest(TestCase):
+    """Tests evaluation of paths in the topology of a simple chain:
+
+    router - switch1 - switch2 - box
+
+    """
+    def setUp(self):
+        self.router = Node('router')
+        self.switch1 = Node('switch1')
+        self.switch2 = Node('switch2')
+        self.box = Node('box', up=Node.UP_DOWN)
+        self.graph = networkx.MultiGraph()
+        self.graph.add_edge(self.router, self.switch1)
+        self.graph.add_edge(self.switch1, self.switch2)
+        self.graph.add_edge(self.switch2, self.box)
+
+    def evaluate(self, *targets):
+        return topology._evaluate_paths(self.graph, 'vlan', self.router,
+                                        targets)
+
+    def test_down_box_behind_up_switches_should_be_reachable(self):
+        self.assertTrue(self.evaluate(self.box)[self.box])
+
+    def test_box_behind_down_switch_should_be_unreachable(self):
+        self.switch1.up = Node.UP_DOWN
+        result = self.evaluate(self.box, self.switch1, self.switch2)
+        self.assertFalse(result[self.box])
+        self.assertFalse(result[self.switch2])
+        self.assertTrue(result[self.switch1])
+
+    def test_box_should_be_unreachable_when_router_is_down(self):
+        self.router.up = Node.UP_DOWN
+        self.assertFalse(self.evaluate(self.box)[self.box])
+
+    def test_box_outside_topology_should_be_considered_reachable(self):
+        stranger = Node('stranger', up=Node.UP_DOWN)
+        self.assertTrue(self.evaluate(stranger)[stranger])
+
+    def test_router_that_is_down_should_be_reachable_from_itself(self):
+        self.router.up = Node.UP_DOWN
+        self.assertTrue(self.evaluate(self.router)[self.router])
@@ -0,0 +1,37 @@
+from unittest import TestCase
+import datetime
+
+from nav.models.event import AlertHistory, EventType
+from nav.models.fields import INFINITY
+from nav.eventengine import unresolved
+
+
+class UnresolvedNoteTest(TestCase):
+    def setUp(self):
+        unresolved.get_map().clear()
+        self.alert = AlertHistory(id=1, netbox_id=10, subid='',
+                                  event_type=EventType('boxState'),
+                                  start_time=datetime.datetime.now(),
+                                  end_time=INFINITY)
+
+    def tearDown(self):
+        unresolved.get_map().clear()
+
+    def test_open_alert_should_be_added(self):
+        unresolved.note(self.alert)
+        self.assertIs(unresolved.get_map()[self.alert.get_key()], self.alert)
+
+    def test_closed_alert_should_be_removed(self):
+        unresolved.note(self.alert)
+        self.alert.end_time = datetime.datetime.now()
+        unresolved.note(self.alert)
+        self.assertNotIn(self.alert.get_key(), unresolved.get_map())
+
+    def test_closing_other_alert_should_not_remove_open_alert(self):
+        unresolved.note(self.alert)
+        other = AlertHistory(id=2, netbox_id=10, subid='',
+                             event_type=EventType('boxState'),
+                             start_time=datetime.datetime.now(),
+                             end_time=datetime.datetime.now())
+        unresolved.note(other)
+        self.assertIs(unresolved.get_map()[self.alert.get_key()], self.alert)
@@ -0,0 +1,101 @@
+from unittest import TestCase
+
+from mock import Mock, patch
+from twisted.internet import defer
+from twisted.names import dns
+
+from nav.asyncdns import (ResolverService, DNSCache, DNSNameError,
+                          DNSQueryTimeoutError)
+
+
+def ptr_response(*names):
+    records = []
+    for name in names:
+        record = Mock(type=dns.PTR)
+        record.payload.name = name
+        records.append(record)
+    return defer.succeed((records, [], []))
+
+
+class ResolverServiceTest(TestCase):
+    def setUp(self):
+        self.resolver = Mock()
+        self.service = ResolverService(resolver=self.resolver)
+
+    def _reverse(self, address):
+        results = []
+        self.service.reverse(address).addBoth(results.append)
+        return results[0]
+
+    def test_should_extract_ptr_names(self):
+        self.resolver.lookupPointer.return_value = ptr_response(
+            'foo.example.org')
+        self.assertEqual(self._reverse('10.0.0.1'), ['foo.example.org'])
+
+    def test_should_ignore_non_ptr_records(self):
+        self.resolver.lookupPointer.return_value = defer.succeed(
+            ([Mock(type=dns.CNAME)], [], []))
+        self.assertEqual(self._reverse('10.0.0.1'), [])
+
+    def test_should_cache_results(self):
+        self.resolver.lookupPointer.return_value = ptr_response(
+            'foo.example.org')
+        self._reverse('10.0.0.1')
+        self._reverse('10.0.0.1')
+        self.assertEqual(self.resolver.lookupPointer.call_count, 1)
+
+    def test_cached_results_should_not_be_shared(self):
+        self.resolver.lookupPointer.return_value = ptr_response(
+            'foo.example.org')
+        self._reverse('10.0.0.1').pop()
+        self.assertEqual(self._reverse('10.0.0.1'), ['foo.example.org'])
+
+    def test_should_cache_nxdomain(self):
+        self.resolver.lookupPointer.side_effect = (
+            lambda *args: defer.fail(DNSNameError()))
+        self._reverse('10.0.0.1')
+        self.assertTrue(isinstance(self._reverse('10.0.0.1').value,
+                                   DNSNameError))
+        self.assertEqual(self.resolver.lookupPointer.call_count, 1)
+
+    def test_should_not_cache_timeouts(self):
+        self.resolver.lookupPointer.side_effect = (
+            lambda *args: defer.fail(DNSQueryTimeoutError(None)))
+        self._reverse('10.0.0.1')
+        self._reverse('10.0.0.1')
+        self.assertEqual(self.resolver.lookupPointer.call_count, 2)
+
+    def test_should_only_look_up_pending_names_once(self):
+        pending = defer.Deferred()
+        self.resolver.lookupPointer.return_value = pending
+        results = []
+        for _ in range(2):
+            self.service.reverse('10.0.0.1').addCallback(results.append)
+        pending.callback(ptr_response('foo.example.org').result)
+        self.assertEqual(results, [['foo.example.org']] * 2)
+        self.assertEqual(self.resolver.lookupPointer.call_count, 1)
+
+    def test_should_cap_concurrent_lookups(self):
+        service = ResolverService(resolver=self.resolver, max_concurrent=2)
+        self.resolver.lookupPointer.side_effect = (
+            lambda *args: defer.Deferred())
+        service.reverse_many(['10.0.0.%d' % i for i in range(5)])
+        self.assertEqual(self.resolver.lookupPointer.call_count, 2)
+
+    def test_reverse_many_should_map_failures_to_exceptions(self):
+        self.resolver.lookupPointer.side_effect = (
+            lambda *args: defer.fail(DNSNameError()))
+        results = []
+        self.service.reverse_many(['10.0.0.1']).addCallback(results.append)
+        self.assertTrue(isinstance(results[0]['10.0.0.1'], DNSNameError))
+
+
+class DNSCacheTest(TestCase):
+    @patch('nav.asyncdns.time')
+    def test_should_expire_entries(self, time):
+        cache = DNSCache()
+        time.time.return_value = 1000
+        cache.set('key', ['value'], 60)
+        self.assertEqual(cache.get('key'), ['value'])
+        time.time.return_value = 1061
+        self.assertTrue(cache.get('key') is None)
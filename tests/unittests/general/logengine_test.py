@@ -1,8 +1,10 @@
 import pytest
 from mock import Mock
 from unittest import TestCase
-import random
 import logging
+import os
+import shutil
+import tempfile
 logging.raiseExceptions = False
 
 import datetime
@@ -39,43 +41,165 @@ Oct 28 13:15:58 10.0.42.103 1043: Oct 28 13:15:57.560 CEST: %LINEPROTO-5-UPDOWN:
                              "Message has no facility: {0!r}\n{1!r}"
                              .format(line, vars(msg)))
 
-    def test_insert(self):
-        for line in self.loglines:
-            database = Mock('cursor')
-            database.fetchone = lambda: [random.randint(1, 10000)]
-
-            def execute(sql, params=()):
-                return sql % params
-            database.execute = execute
-            message = logengine.create_message(line)
-            self.assertTrue(message, "unparseable: %s" % line)
-            logengine.insert_message(message, database,
-                                     {}, {}, {},
-                                     {}, {}, {})
-
-    def test_swallow_generic_exceptions(self):
-        @logengine.swallow_all_but_db_exceptions
-        def raiser():
-            raise Exception("This is an ex-parrot")
-
-        raiser()
-
-    def test_raise_db_exception(self):
-        from nav.db import driver
 
-        @logengine.swallow_all_but_db_exceptions
-        def raiser():
-            raise driver.Error("This is an ex-database")
+class TestBatchedInsertWithMockedDatabase(TestCase):
+    lines = [
+        "Oct 28 13:15:06 10.0.42.103 1030: Oct 28 13:15:05.310 CEST: "
+        "%LINEPROTO-5-UPDOWN: Line protocol on Interface "
+        "GigabitEthernet1/0/29, changed state to up",
+        "Oct 28 13:15:21 10.0.42.103 1031: Oct 28 13:15:20.191 CEST: "
+        "%EC-5-COMPATIBLE: Gi1/0/30 is compatible with port-channel members",
+        "Oct 28 13:15:28 10.0.80.11 877630: Oct 28 13:15:27.383 CEST: "
+        "%LINEPROTO-5-UPDOWN: Line protocol on Interface "
+        "GigabitEthernet1/0/30, changed state to up",
+    ]
 
-        self.assertRaises(driver.Error, raiser)
-
-    def test_non_failing_function_should_run_fine(self):
-        @logengine.swallow_all_but_db_exceptions
-        def nonraiser(input):
-            return input
+    def setUp(self):
+        self.messages = [logengine.create_message(line)
+                         for line in self.lines]
+        self.database = Mock()
+        self.ids = iter(range(1, 1000))
+
+        def fetchall():
+            sql, params = self.database.execute.call_args[0]
+            width = 2 if sql.startswith("INSERT INTO origin") else 3
+            rows = [params[i:i + width]
+                    for i in range(0, len(params), width)]
+            if width == 2:
+                return [(next(self.ids), name) for name, _category in rows]
+            return [(next(self.ids), facility, mnemonic)
+                    for facility, mnemonic, _priority in rows]
+        self.database.fetchall = fetchall
+
+    def _statements(self, prefix):
+        return [call[0] for call in self.database.execute.call_args_list
+                if call[0][0].startswith(prefix)]
+
+    def test_should_insert_all_messages_in_one_statement(self):
+        logengine.insert_messages(self.messages, self.database,
+                                  {}, {}, {}, {}, {}, {})
+        inserts = self._statements("INSERT INTO log_message ")
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(len(inserts[0][1]), 5 * len(self.messages))
+
+    def test_should_add_new_origins_and_types_in_bulk(self):
+        categories, origins, types = {}, {}, {}
+        logengine.insert_messages(self.messages, self.database,
+                                  categories, origins, types, {}, {}, {})
+        self.assertEqual(len(self._statements("INSERT INTO origin")), 1)
+        self.assertEqual(len(self._statements("INSERT INTO log_message_type")),
+                         1)
+        self.assertEqual(set(origins), {'10.0.42.103', '10.0.80.11'})
+        self.assertEqual(set(types['LINEPROTO']), {'UPDOWN'})
+        self.assertEqual(set(categories), {'rest'})
+
+    def test_should_not_add_known_origins_and_types(self):
+        origins = {'10.0.42.103': 1, '10.0.80.11': 2}
+        types = {'LINEPROTO': {'UPDOWN': 3}, 'EC': {'COMPATIBLE': 4}}
+        logengine.insert_messages(self.messages, self.database,
+                                  {'rest': 'rest'}, origins, types,
+                                  {}, {}, {})
+        self.assertEqual(self.database.execute.call_count, 1)
+
+    def test_should_apply_priority_exceptions(self):
+        origins = {'10.0.42.103': 1, '10.0.80.11': 2}
+        types = {'LINEPROTO': {'UPDOWN': 3}, 'EC': {'COMPATIBLE': 4}}
+        logengine.insert_messages(self.messages, self.database,
+                                  {'rest': 'rest'}, origins, types,
+                                  {'10.0.80.11': '7'}, {}, {})
+        params = self.database.execute.call_args[0][1]
+        self.assertEqual(params[2::5], [5, 5, 7])
+
+
+class InsertBatchTest(TestCase):
+    def setUp(self):
+        self.messages = [logengine.create_message(line)
+                         for line in TestBatchedInsertWithMockedDatabase.lines]
+        self.database = Mock()
+        self.database.execute.side_effect = self._execute
+        self.inserted = []
 
-        value = 'foo'
-        self.assertEquals(nonraiser(value), value)
+    def _execute(self, sql, params=()):
+        from nav.db import driver
+        if sql.startswith("INSERT INTO log_message "):
+            descriptions = params[4::5]
+            if any('port-channel' in descr for descr in descriptions):
+                raise driver.DataError("rejected")
+            self.inserted.extend(descriptions)
+
+    def _insert(self, origins, types):
+        return logengine.insert_batch(self.messages, self.database,
+                                      {'rest': 'rest'}, origins, types,
+                                      {}, {}, {})
+
+    def test_should_insert_valid_batch_at_once(self):
+        del self.messages[1]
+        count = self._insert({'10.0.42.103': 1, '10.0.80.11': 2},
+                             {'LINEPROTO': {'UPDOWN': 3}})
+        self.assertEqual(count, 2)
+        self.assertEqual(len(self.inserted), 2)
+
+    def test_should_retry_failed_batch_row_by_row_and_skip_bad_rows(self):
+        count = self._insert({'10.0.42.103': 1, '10.0.80.11': 2},
+                             {'LINEPROTO': {'UPDOWN': 3},
+                              'EC': {'COMPATIBLE': 4}})
+        self.assertEqual(count, 2)
+        self.assertEqual(len(self.inserted), 2)
+        self.assertFalse(any('port-channel' in descr
+                             for descr in self.inserted))
+        rollbacks = [call for call in self.database.execute.call_args_list
+                     if call[0][0].startswith("ROLLBACK TO SAVEPOINT")]
+        self.assertEqual(len(rollbacks), 2)
+
+    def test_should_forget_types_added_in_rolled_back_savepoint(self):
+        self.database.fetchall.return_value = [(5, 'EC', 'COMPATIBLE')]
+        types = {'LINEPROTO': {'UPDOWN': 3}}
+        self._insert({'10.0.42.103': 1, '10.0.80.11': 2}, types)
+        self.assertEqual(types, {'LINEPROTO': {'UPDOWN': 3}})
+
+
+class GetBatchesTest(TestCase):
+    def test_should_split_into_batches_of_given_size(self):
+        batches = list(logengine.get_batches(range(5), size=2))
+        self.assertEqual(batches, [[0, 1], [2, 3], [4]])
+
+    def test_should_yield_nothing_from_empty_iterable(self):
+        self.assertEqual(list(logengine.get_batches([])), [])
+
+
+class RotateLogFileTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'cisco.log')
+        self.config = Mock()
+        self.config.get.return_value = self.filename
+        self.config.has_option.return_value = False
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_should_move_lines_to_spool_and_truncate_log(self):
+        with open(self.filename, 'w') as logfile:
+            logfile.write("first\nsecond\n")
+        spool = logengine.rotate_log_file(self.config)
+
+        self.assertEqual(os.path.getsize(self.filename), 0)
+        self.assertEqual(list(logengine.read_log_lines(spool)),
+                         ["first\n", "second\n"])
+
+    def test_should_append_to_unprocessed_spool(self):
+        with open(self.filename, 'w') as logfile:
+            logfile.write("first\n")
+        spool = logengine.rotate_log_file(self.config)
+        with open(self.filename, 'w') as logfile:
+            logfile.write("second\n")
+        logengine.rotate_log_file(self.config)
+
+        self.assertEqual(list(logengine.read_log_lines(spool)),
+                         ["first\n", "second\n"])
+
+    def test_should_return_none_without_log_or_spool(self):
+        self.assertIsNone(logengine.rotate_log_file(self.config))
 
 
 class ParseTest(TestCase):
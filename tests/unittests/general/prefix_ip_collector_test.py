@@ -4,7 +4,11 @@
 
 import unittest
 from datetime import datetime
-from nav.activeipcollector.manager import find_range, get_timestamp
+
+from mock import MagicMock, patch
+
+from nav.activeipcollector import collector
+from nav.activeipcollector.manager import find_range, get_timestamp, store
 
 
 class TestPrefixIpCollector(unittest.TestCase):
@@ -17,3 +21,54 @@ class TestPrefixIpCollector(unittest.TestCase):
     def test_find_timestamp(self):
         ts = datetime(2012, 10, 4, 14, 30)
         self.assertEqual(get_timestamp(ts), 1349353800)
+
+
+class TestStore(unittest.TestCase):
+
+    @patch('nav.activeipcollector.manager.send_metrics')
+    def test_store_should_send_all_metrics_at_once(self, send_metrics):
+        when = datetime(2012, 10, 4, 14, 30)
+        data = [('10.0.%d.0/24' % net, when, 10, 5) for net in range(250)]
+        store(data)
+        self.assertEqual(send_metrics.call_count, 1)
+        self.assertEqual(len(send_metrics.call_args[0][0]), 3 * len(data))
+
+
+@patch('nav.activeipcollector.collector.transaction', MagicMock())
+@patch('nav.activeipcollector.collector.connection')
+class TestCollectIncremental(unittest.TestCase):
+
+    def _mock_cursor(self, connection, last_collected):
+        cursor = connection.cursor.return_value
+        cursor.fetchone.return_value = (last_collected,)
+        return cursor
+
+    @patch('nav.activeipcollector.collector.update_counts')
+    def test_should_count_all_prefixes_on_first_run(self, update_counts,
+                                                    connection):
+        cursor = self._mock_cursor(connection, None)
+        collector.collect_incremental()
+        update_counts.assert_called_once_with(cursor, None)
+
+    @patch('nav.activeipcollector.collector.get_changed_prefixes')
+    @patch('nav.activeipcollector.collector.update_counts')
+    def test_should_only_recount_changed_prefixes(self, update_counts,
+                                                  get_changed_prefixes,
+                                                  connection):
+        last_collected = datetime(2012, 10, 4, 14, 30)
+        cursor = self._mock_cursor(connection, last_collected)
+        get_changed_prefixes.return_value = [1, 2]
+        collector.collect_incremental()
+        get_changed_prefixes.assert_called_once_with(
+            cursor, last_collected - collector.CHANGE_MARGIN)
+        update_counts.assert_called_once_with(cursor, [1, 2])
+
+    @patch('nav.activeipcollector.collector.get_changed_prefixes')
+    @patch('nav.activeipcollector.collector.update_counts')
+    def test_should_not_recount_when_nothing_changed(self, update_counts,
+                                                     get_changed_prefixes,
+                                                     connection):
+        self._mock_cursor(connection, datetime(2012, 10, 4, 14, 30))
+        get_changed_prefixes.return_value = []
+        collector.collect_incremental()
+        self.assertFalse(update_counts.called)
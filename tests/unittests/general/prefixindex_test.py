@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from IPy import IP
+from mock import patch
+
+from nav.prefixindex import PrefixIndex, PrefixIdIndex
+
+
+class PrefixIndexTest(TestCase):
+    def setUp(self):
+        self.index = PrefixIndex([
+            ('10.0.0.0/8', 'big'),
+            ('10.0.1.0/24', 'medium'),
+            ('10.0.1.128/25', 'small'),
+            ('2001:db8::/32', 'site'),
+            ('2001:db8:1::/64', 'lan'),
+        ])
+
+    def test_should_find_most_specific_ipv4_prefix(self):
+        self.assertEqual(self.index.lookup('10.0.1.200'), 'small')
+        self.assertEqual(self.index.lookup(IP('10.0.1.1')), 'medium')
+        self.assertEqual(self.index.lookup('10.200.0.1'), 'big')
+
+    def test_should_find_most_specific_ipv6_prefix(self):
+        self.assertEqual(self.index.lookup('2001:db8:1::1'), 'lan')
+        self.assertEqual(self.index.lookup('2001:db8:2::1'), 'site')
+
+    def test_should_return_default_on_no_match(self):
+        self.assertIsNone(self.index.lookup('192.168.0.1'))
+        self.assertEqual(self.index.lookup('2001:db9::1', 'none'), 'none')
+
+    def test_lookup_all_should_list_from_most_specific(self):
+        self.assertEqual(self.index.lookup_all('10.0.1.200'),
+                         ['small', 'medium', 'big'])
+
+    def test_remove_should_fall_back_to_less_specific_prefix(self):
+        self.index.remove('10.0.1.128/25')
+        self.assertEqual(self.index.lookup('10.0.1.200'), 'medium')
+        self.assertEqual(len(self.index), 4)
+
+    def test_remove_of_unknown_prefix_should_raise(self):
+        with self.assertRaises(KeyError):
+            self.index.remove('10.0.2.0/24')
+
+    def test_iteration_should_yield_all_prefixes(self):
+        prefixes = dict(self.index)
+        self.assertEqual(prefixes[IP('10.0.1.128/25')], 'small')
+        self.assertEqual(prefixes[IP('2001:db8:1::/64')], 'lan')
+        self.assertEqual(len(prefixes), 5)
+
+    def test_host_prefix_should_match_only_itself(self):
+        self.index.add('10.0.1.5/32', 'host')
+        self.assertEqual(self.index.lookup('10.0.1.5'), 'host')
+        self.assertEqual(self.index.lookup('10.0.1.6'), 'medium')
+
+
+NOW = datetime(2018, 6, 1, 12, 0)
+
+
+class PrefixIdIndexTest(TestCase):
+    def test_apply_changes_should_add_and_remove_prefixes(self):
+        index = PrefixIdIndex()
+        index.apply_changes(
+            (set(), [(1, '10.0.0.0/8'), (2, '10.0.1.0/24')], NOW))
+        self.assertEqual(index.lookup('10.0.1.1'), 2)
+
+        index.apply_changes(({2}, [], NOW))
+        self.assertEqual(index.lookup('10.0.1.1'), 1)
+        self.assertEqual(len(index), 1)
+
+    def test_removing_unknown_id_should_not_raise(self):
+        index = PrefixIdIndex()
+        index.apply_changes(({42}, [], NOW))
+        self.assertEqual(len(index), 0)
+
+
+@patch('nav.prefixindex.load_changed_prefix_ids')
+@patch('nav.prefixindex.get_database_time')
+@patch('nav.models.manage.Prefix')
+class PrefixIdIndexGetChangesTest(TestCase):
+    def setUp(self):
+        self.index = PrefixIdIndex()
+        self.index.apply_changes(
+            (set(), [(1, '10.0.0.0/8'), (2, '10.0.1.0/24')], NOW))
+
+    def test_first_load_should_load_all_prefixes(self, prefix, db_time,
+                                                 changed_ids):
+        db_time.return_value = NOW
+        prefix.objects.all.return_value.values_list.return_value = [
+            (1, '10.0.0.0/8')]
+
+        changes = PrefixIdIndex().get_changes()
+        self.assertEqual(changes, (set(), [(1, '10.0.0.0/8')], NOW))
+        self.assertFalse(changed_ids.called)
+
+    def test_should_load_only_changed_prefixes(self, prefix, db_time,
+                                               changed_ids):
+        db_time.return_value = NOW + timedelta(minutes=5)
+        changed_ids.return_value = {2, 3}
+        queryset = prefix.objects.all.return_value.filter.return_value
+        queryset.values_list.return_value = [(3, '10.0.3.0/24')]
+
+        changes = self.index.get_changes()
+        changed_ids.assert_called_once_with(
+            NOW - PrefixIdIndex.CHANGE_MARGIN)
+        prefix.objects.all.return_value.filter.assert_called_once_with(
+            id__in={2, 3})
+        self.assertEqual(changes[:2], ({2}, [(3, '10.0.3.0/24')]))
+
+    def test_should_not_query_prefixes_when_none_changed(self, prefix,
+                                                         db_time,
+                                                         changed_ids):
+        db_time.return_value = NOW + timedelta(minutes=5)
+        changed_ids.return_value = set()
+
+        changes = self.index.get_changes()
+        self.assertEqual(changes[:2], (set(), []))
+        self.assertFalse(prefix.objects.all.return_value.values_list.called)
+
+    def test_should_detect_changed_net_address(self, prefix, db_time,
+                                               changed_ids):
+        db_time.return_value = NOW + timedelta(minutes=5)
+        changed_ids.return_value = {2}
+        queryset = prefix.objects.all.return_value.filter.return_value
+        queryset.values_list.return_value = [(2, '10.0.2.0/24')]
+
+        changes = self.index.get_changes()
+        self.assertEqual(changes[:2], ({2}, [(2, '10.0.2.0/24')]))
+        self.index.apply_changes(changes)
+        self.assertEqual(self.index.lookup('10.0.1.1'), 1)
+        self.assertEqual(self.index.lookup('10.0.2.1'), 2)
+        self.assertEqual(len(self.index), 2)
+
+    def test_should_reload_all_prefixes_periodically(self, prefix, db_time,
+                                                     changed_ids):
+        db_time.return_value = NOW + PrefixIdIndex.FULL_RELOAD_INTERVAL
+        prefix.objects.all.return_value.values_list.return_value = [
+            (1, '10.0.0.0/8')]
+
+        changes = self.index.get_changes()
+        self.assertFalse(changed_ids.called)
+        self.assertEqual(changes[:2], ({2}, []))
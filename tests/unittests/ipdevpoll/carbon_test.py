@@ -0,0 +1,76 @@
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from nav.ipdevpoll.carbon import TwistedMetricEmitter, _StreamSender
+
+METRICS = [('nav.a.b', (1500000000, 1)), ('nav.a.c', (1500000000, 2.5)),
+           ('nav.a.d', (1500000000, 3))]
+
+
+@patch('nav.ipdevpoll.carbon.threadable.isInIOThread', Mock(return_value=True))
+@patch('nav.ipdevpoll.carbon.reactor')
+class TwistedMetricEmitterTest(TestCase):
+    def setUp(self):
+        self.emitter = TwistedMetricEmitter('127.0.0.1', 2003, protocol='tcp',
+                                            queue_size=3, batch_size=2)
+        self.emitter._sender = self.sender = Mock()
+
+    def test_should_drop_metrics_when_queue_is_full(self, _reactor):
+        self.emitter.emit(METRICS + METRICS[:1])
+        self.assertEqual(self.emitter.dropped, 1)
+
+    def test_should_schedule_flush_for_full_batch(self, reactor):
+        self.emitter.emit(METRICS[:1])
+        self.assertFalse(reactor.callLater.called)
+        self.emitter.emit(METRICS[1:2])
+        reactor.callLater.assert_called_once_with(0, self.emitter.flush)
+
+    def test_flush_should_send_in_batches(self, _reactor):
+        self.sender.send.return_value = True
+        self.emitter.emit(METRICS)
+        self.emitter.flush()
+        self.assertEqual(self.sender.send.call_count, 2)
+        self.assertEqual(self.emitter.sent, 3)
+
+    def test_flush_should_keep_metrics_that_could_not_be_sent(self, _reactor):
+        self.sender.send.side_effect = [True, False]
+        self.emitter.emit(METRICS)
+        self.emitter.flush()
+        self.assertEqual(self.emitter.sent, 2)
+        self.assertEqual(list(self.emitter._queue), METRICS[2:])
+
+
+@patch('nav.ipdevpoll.carbon.reactor')
+class StreamSenderTest(TestCase):
+    def connect(self, on_writable=None):
+        sender = _StreamSender('127.0.0.1', 2003, 'tcp',
+                               on_writable=on_writable)
+        client = sender.buildProtocol(('127.0.0.1', 2003))
+        client.makeConnection(Mock())
+        return sender, client
+
+    def test_should_not_send_without_connection(self, _reactor):
+        sender = _StreamSender('127.0.0.1', 2003, 'tcp')
+        self.assertFalse(sender.send(METRICS))
+
+    def test_should_register_as_streaming_producer(self, _reactor):
+        _sender, client = self.connect()
+        client.transport.registerProducer.assert_called_once_with(client,
+                                                                  True)
+
+    def test_should_not_send_while_write_buffer_is_full(self, _reactor):
+        sender, client = self.connect()
+        client.pauseProducing()
+        self.assertFalse(sender.send(METRICS))
+        self.assertFalse(client.transport.write.called)
+
+    def test_should_send_again_when_write_buffer_has_drained(self, _reactor):
+        on_writable = Mock()
+        sender, client = self.connect(on_writable)
+        client.pauseProducing()
+        on_writable.reset_mock()
+        client.resumeProducing()
+        self.assertTrue(on_writable.called)
+        self.assertTrue(sender.send(METRICS))
+        self.assertTrue(client.transport.write.called)
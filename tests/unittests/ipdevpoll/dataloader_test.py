@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from nav.ipdevpoll.dataloader import NetboxLoader
+
+START = datetime(2018, 3, 1, 12, 0)
+
+
+def make_netbox(netbox_id, **kwargs):
+    attrs = dict(id=netbox_id, ip='10.0.0.%d' % netbox_id, type=None,
+                 read_only='public', snmp_version=2, up='y', snmp_up=True,
+                 deleted_at=None, up_to_date=True, last_updated={})
+    attrs.update(kwargs)
+    return Mock(**attrs)
+
+
+@patch('nav.ipdevpoll.dataloader.django_debug_cleanup')
+@patch('nav.ipdevpoll.dataloader.event')
+@patch('nav.ipdevpoll.dataloader.load_changed_netbox_ids')
+@patch('nav.ipdevpoll.dataloader.get_database_time')
+class NetboxLoaderTest(TestCase):
+    def setUp(self):
+        self.loader = NetboxLoader()
+        self.loader._load_netboxes = Mock()
+
+    def _load(self, now, netboxes, snmp_down=()):
+        self.loader._load_netboxes.return_value = dict(
+            (netbox.id, netbox) for netbox in netboxes)
+        unresolved = self.event.AlertHistory.objects.unresolved
+        unresolved.return_value.values_list.return_value = list(snmp_down)
+        self.now.return_value = now
+        return self.loader.load_all_s()
+
+    def _setup(self, now, changed, event):
+        self.now = now
+        self.changed = changed
+        self.event = event
+
+    def test_first_load_should_be_full(self, now, changed, event, _cleanup):
+        self._setup(now, changed, event)
+        result = self._load(START, [make_netbox(1), make_netbox(2)])
+        self.assertEqual(result, ({1, 2}, set(), set()))
+        self.loader._load_netboxes.assert_called_with(None, set())
+        self.assertFalse(changed.called)
+
+    def test_next_load_should_only_load_changed_netboxes(
+            self, now, changed, event, _cleanup):
+        self._setup(now, changed, event)
+        self._load(START, [make_netbox(1), make_netbox(2)])
+
+        changed.return_value = {2, 3}
+        later = START + timedelta(minutes=2)
+        result = self._load(later, [make_netbox(2, up='n'), make_netbox(3)])
+
+        changed.assert_called_with(START - NetboxLoader.CHANGE_MARGIN)
+        self.loader._load_netboxes.assert_called_with({2, 3}, set())
+        self.assertEqual(result, ({3}, set(), {2}))
+        self.assertEqual(set(self.loader), {1, 2, 3})
+
+    def test_changed_netbox_that_is_gone_should_be_removed(
+            self, now, changed, event, _cleanup):
+        self._setup(now, changed, event)
+        self._load(START, [make_netbox(1), make_netbox(2)])
+
+        changed.return_value = {1}
+        result = self._load(START + timedelta(minutes=2), [])
+        self.assertEqual(result, (set(), {1}, set()))
+        self.assertEqual(set(self.loader), {2})
+
+    def test_snmp_agent_state_change_should_reload_netbox(
+            self, now, changed, event, _cleanup):
+        self._setup(now, changed, event)
+        self._load(START, [make_netbox(1), make_netbox(2)])
+
+        changed.return_value = set()
+        self._load(START + timedelta(minutes=2),
+                   [make_netbox(2, snmp_up=False)], snmp_down=[2])
+        self.loader._load_netboxes.assert_called_with({2}, {2})
+
+    def test_should_reload_fully_after_interval(
+            self, now, changed, event, _cleanup):
+        self._setup(now, changed, event)
+        self._load(START, [make_netbox(1)])
+        self._load(START + NetboxLoader.FULL_RELOAD_INTERVAL,
+                   [make_netbox(1)])
+        self.loader._load_netboxes.assert_called_with(None, set())
@@ -23,4 +23,11 @@ class StrangeDnsResponsesTest(TestCase):
 
     def test_response_without_ptr_record_should_translate_to_none(self):
         plugin = DnsName(Mock(), Mock(), Mock())
-        self.assertTrue(plugin._find_ptr_response([[Mock()]]) is None)
+        self.assertTrue(plugin._find_ptr_response([]) is None)
+
+    def test_should_keep_existing_name_among_multiple_ptr_records(self):
+        netbox = Mock(sysname='b.example.org')
+        plugin = DnsName(netbox, Mock(), Mock())
+        self.assertEqual(
+            plugin._find_ptr_response(['a.example.org', 'b.example.org']),
+            'b.example.org')
@@ -34,6 +34,7 @@ from nav.mibs.ip_mib import IpMib, IndexToIpException
 from nav.mibs.ipv6_mib import Ipv6Mib
 from nav.mibs.entity_mib import EntityMib, parse_dateandtime_tc
 from nav.mibs.snmpv2_mib import Snmpv2Mib
+from nav.mibs.if_mib import IfMib
 
 
 class IpMibTests(unittest.TestCase):
@@ -162,6 +163,37 @@ class CiscoHSRPMibTests(unittest.TestCase):
         self.assertTrue((IP('10.0.42.1'), 155) in df.result.items())
 
 
+class RetrieveColumnsTests(unittest.TestCase):
+    def setUp(self):
+        self.descr = IfMib.nodes['ifDescr'].oid
+        self.mtu = IfMib.nodes['ifMtu'].oid
+        self.agent = Mock()
+        self.agent.getTable.return_value = defer.succeed({
+            self.descr: {self.descr + (1,): 'eth0', self.descr + (2,): 'eth1'},
+            self.mtu: {self.mtu + (1,): 1500},
+        })
+
+    def test_should_walk_columns_in_a_single_table_retrieval(self):
+        mib = IfMib(self.agent)
+        mib.retrieve_columns(['ifMtu', 'ifDescr'])
+        self.agent.getTable.assert_called_once_with(
+            [str(self.descr), str(self.mtu)])
+
+    def test_should_build_rows_from_columns(self):
+        mib = IfMib(self.agent)
+        df = mib.retrieve_columns(['ifDescr', 'ifMtu'])
+        self.assertTrue(df.called)
+        self.assertEqual(df.result[(1,)]['ifDescr'], 'eth0')
+        self.assertEqual(df.result[(1,)]['ifMtu'], 1500)
+        self.assertEqual(df.result[(2,)]['ifDescr'], 'eth1')
+        self.assertIsNone(df.result[(2,)]['ifMtu'])
+
+    def test_should_retrieve_single_column(self):
+        mib = IfMib(self.agent)
+        df = mib.retrieve_column('ifDescr')
+        self.assertEqual(df.result, {(1,): 'eth0', (2,): 'eth1'})
+
+
 def test_short_dateandtime_parses_properly():
     parsed = parse_dateandtime_tc(b'\xdf\x07\x05\x0e\x0c\x1e*\x05')
     assert parsed == datetime.datetime(2015, 5, 14, 12, 30, 42, 500000)
@@ -0,0 +1,63 @@
+from datetime import datetime
+from unittest import TestCase
+
+from mock import patch
+
+from nav.models.fields import INFINITY
+from nav.ipdevpoll.db import bulk_update_from_values
+from nav.ipdevpoll.shadows.cam import CamManager, CamDetails, MAX_MISS_COUNT
+
+NOW = datetime(2018, 3, 1, 12, 0)
+EARLIER = datetime(2018, 3, 1, 11, 0)
+
+
+class CamCloseValuesTest(TestCase):
+    def test_open_record_should_be_closed_and_counted(self):
+        cam = CamDetails(1, INFINITY, 0)
+        self.assertEqual(CamManager._get_closed_values(cam, NOW),
+                         (1, NOW, 1))
+
+    def test_closed_record_should_keep_end_time(self):
+        cam = CamDetails(1, EARLIER, 1)
+        self.assertEqual(CamManager._get_closed_values(cam, NOW),
+                         (1, EARLIER, 2))
+
+    def test_miss_count_should_be_nulled_at_max(self):
+        cam = CamDetails(1, EARLIER, MAX_MISS_COUNT - 1)
+        self.assertEqual(CamManager._get_closed_values(cam, NOW),
+                         (1, EARLIER, None))
+
+    def test_open_record_without_miss_count_should_only_be_closed(self):
+        cam = CamDetails(1, INFINITY, None)
+        self.assertEqual(CamManager._get_closed_values(cam, NOW),
+                         (1, NOW, None))
+
+    def test_expired_record_should_not_be_updated(self):
+        cam = CamDetails(1, EARLIER, None)
+        self.assertIsNone(CamManager._get_closed_values(cam, NOW))
+
+
+@patch('nav.ipdevpoll.db.django.db.connection')
+class BulkUpdateFromValuesTest(TestCase):
+    def test_should_update_all_rows_in_one_statement(self, connection):
+        cursor = connection.cursor.return_value
+        bulk_update_from_values(
+            'cam', ('camid', 'integer'),
+            [('end_time', 'timestamp'), ('misscnt', 'integer')],
+            [(1, NOW, 1), (2, EARLIER, None)])
+
+        self.assertEqual(cursor.execute.call_count, 1)
+        sql, params = cursor.execute.call_args[0]
+        self.assertIn("SET end_time = v.end_time, misscnt = v.misscnt", sql)
+        self.assertIn("(%s::integer, %s::timestamp, %s::integer), "
+                      "(%s::integer, %s::timestamp, %s::integer)", sql)
+        self.assertIn("WHERE t.camid = v.camid", sql)
+        self.assertEqual(params, [1, NOW, 1, 2, EARLIER, None])
+
+    def test_should_split_rows_into_batches(self, connection):
+        cursor = connection.cursor.return_value
+        rows = [(i, NOW) for i in range(5)]
+        bulk_update_from_values('cam', ('camid', 'integer'),
+                                [('end_time', 'timestamp')], rows,
+                                batch_size=2)
+        self.assertEqual(cursor.execute.call_count, 3)
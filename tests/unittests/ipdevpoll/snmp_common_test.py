@@ -0,0 +1,177 @@
+from unittest import TestCase
+
+from mock import patch
+from twisted.internet import defer
+from twisted.internet.error import TimeoutError
+from twisted.python.failure import Failure
+
+from nav.ipdevpoll.snmp.bulkwalk import ColumnWalker
+from nav.ipdevpoll.snmp.common import (AgentProxyMixIn, BulkSizer,
+                                       SNMPParameters, SnmpError,
+                                       SNMP_ERR_TOOBIG)
+from nav.oids import OID
+
+
+class BulkSizerTest(TestCase):
+    def test_should_not_divide_value_among_columns(self):
+        sizer = BulkSizer(initial=10, limit=50)
+        self.assertEqual(sizer.max_repetitions(), 10)
+
+    def test_should_grow_when_any_column_needed_several_pdus(self):
+        sizer = BulkSizer(initial=10, limit=50)
+        sizer.succeeded({'short': dict.fromkeys(range(5)),
+                         'long': dict.fromkeys(range(15))})
+        self.assertEqual(sizer.value, 16)
+
+    def test_should_not_grow_when_columns_fit_in_single_pdus(self):
+        sizer = BulkSizer(initial=10, limit=50)
+        sizer.succeeded({'one': dict.fromkeys(range(10)),
+                         'two': dict.fromkeys(range(10))})
+        self.assertEqual(sizer.value, 10)
+
+    def test_should_grow_when_table_needed_several_pdus(self):
+        sizer = BulkSizer(initial=10, limit=50)
+        sizer.succeeded({'col': dict.fromkeys(range(25))})
+        self.assertEqual(sizer.value, 16)
+
+    def test_should_not_grow_beyond_limit(self):
+        sizer = BulkSizer(initial=40, limit=50)
+        sizer.succeeded({'col': dict.fromkeys(range(100))})
+        self.assertEqual(sizer.value, 50)
+
+    def test_should_not_grow_on_small_tables(self):
+        sizer = BulkSizer(initial=10, limit=50)
+        sizer.succeeded({'col': dict.fromkeys(range(5))})
+        self.assertEqual(sizer.value, 10)
+
+    def test_should_halve_on_timeout(self):
+        sizer = BulkSizer(initial=10, limit=50)
+        sizer.failed(Failure(TimeoutError()))
+        self.assertEqual(sizer.value, 5)
+
+    def test_should_halve_on_toobig(self):
+        sizer = BulkSizer(initial=10, limit=50)
+        error = SnmpError("packet error")
+        error.errstat = SNMP_ERR_TOOBIG
+        sizer.failed(Failure(error))
+        self.assertEqual(sizer.value, 5)
+
+    def test_should_not_look_for_toobig_in_error_text(self):
+        sizer = BulkSizer(initial=10, limit=50)
+        sizer.failed(Failure(SnmpError("no such name: tooBigCounter")))
+        self.assertEqual(sizer.value, 10)
+
+    def test_should_not_shrink_on_other_errors(self):
+        sizer = BulkSizer(initial=10, limit=50)
+        sizer.failed(Failure(SnmpError("noSuchName")))
+        self.assertEqual(sizer.value, 10)
+
+    def test_should_never_go_below_one(self):
+        sizer = BulkSizer(initial=1, limit=50)
+        sizer.failed(Failure(TimeoutError()))
+        self.assertEqual(sizer.value, 1)
+
+    def test_should_respect_initial_value_above_limit(self):
+        sizer = BulkSizer(initial=60, limit=50)
+        self.assertEqual(sizer.value, 60)
+        self.assertEqual(sizer.limit, 60)
+
+
+class BulkAgent(object):
+    """Answers GETBULK requests like an SNMP agent with the given MIB
+    contents, counting the requests.
+
+    """
+    def __init__(self, mib):
+        self.mib = sorted((OID(oid), value) for oid, value in mib.items())
+        self.requests = []
+
+    def _getbulk(self, nonrepeaters, maxrepetitions, oids, **_kwargs):
+        self.requests.append(list(oids))
+        columns = [self._walk_from(OID(oid), maxrepetitions) for oid in oids]
+        varbinds = []
+        for row in range(maxrepetitions):
+            varbinds.extend(column[row] for column in columns)
+        return defer.succeed(varbinds)
+
+    def _walk_from(self, oid, count):
+        following = [varbind for varbind in self.mib if varbind[0] > oid]
+        following += [(oid, None)] * count  # endOfMibView
+        return following[:count]
+
+
+def make_mib(columns, rows):
+    return dict(('.1.3.6.1.%d.%d' % (column, row), (column, row))
+                for column in columns for row in range(1, rows + 1))
+
+
+class ColumnWalkerTest(TestCase):
+    def walk(self, agent, oids, repetitions):
+        return ColumnWalker(agent, oids, maxRepetitions=repetitions).walk()
+
+    def test_should_retrieve_all_columns(self):
+        agent = BulkAgent(make_mib([1, 2, 3, 4], 5))
+        result = self.walk(agent, ['.1.3.6.1.1', '.1.3.6.1.2'], 2).result
+        self.assertEqual(sorted(result), ['.1.3.6.1.1', '.1.3.6.1.2'])
+        for column in (1, 2):
+            values = result['.1.3.6.1.%d' % column]
+            self.assertEqual(sorted(values.values()),
+                             [(column, row) for row in range(1, 6)])
+            self.assertIn('.1.3.6.1.%d.5' % column, values)
+
+    def test_should_send_a_varbind_for_each_column_in_one_request(self):
+        agent = BulkAgent(make_mib([1, 2, 3], 30))
+        self.walk(agent, ['.1.3.6.1.1', '.1.3.6.1.2', '.1.3.6.1.3'], 10)
+        self.assertEqual(len(agent.requests[0]), 3)
+        # 3 requests for the 30 rows, 1 to see that the columns have ended
+        self.assertEqual(len(agent.requests), 4)
+
+    def test_should_stop_asking_for_finished_columns(self):
+        mib = make_mib([1], 2)
+        mib.update(make_mib([2], 10))
+        agent = BulkAgent(mib)
+        result = self.walk(agent, ['.1.3.6.1.1', '.1.3.6.1.2'], 5).result
+        self.assertEqual(len(result['.1.3.6.1.1']), 2)
+        self.assertEqual(len(result['.1.3.6.1.2']), 10)
+        self.assertEqual([len(oids) for oids in agent.requests], [2, 1, 1])
+
+    def test_should_end_at_end_of_mib_view(self):
+        agent = BulkAgent(make_mib([1, 2], 3))
+        result = self.walk(agent, ['.1.3.6.1.1', '.1.3.6.1.2'], 10).result
+        self.assertEqual(len(result['.1.3.6.1.2']), 3)
+        self.assertEqual(len(agent.requests), 1)
+
+    def test_should_pass_on_failures(self):
+        agent = BulkAgent({})
+        agent._getbulk = lambda *args, **kwargs: defer.fail(
+            TimeoutError())
+        df = self.walk(agent, ['.1.3.6.1.1', '.1.3.6.1.2'], 10)
+        self.assertTrue(df.called)
+        df.addErrback(lambda failure: failure.trap(TimeoutError))
+
+
+class PynetsnmpAgent(BulkAgent):
+    snmpVersion = 'v2c'
+
+    def __init__(self, mib):
+        super(PynetsnmpAgent, self).__init__(mib)
+        self.ip = '10.0.0.1'
+
+
+class MixedInAgent(AgentProxyMixIn, PynetsnmpAgent):
+    pass
+
+
+@patch('nav.ipdevpoll.snmp.common._bulk_sizers', {})
+class AgentProxyGetTableTest(TestCase):
+    def test_should_walk_several_columns_in_shared_requests(self):
+        agent = MixedInAgent(make_mib([1, 2, 3], 30),
+                             snmp_parameters=SNMPParameters(
+                                 timeout=1, max_repetitions=10,
+                                 max_repetitions_limit=10, throttle_delay=0))
+        # bypass the request scheduler of the mixin
+        agent._getbulk = lambda *args, **kwargs: PynetsnmpAgent._getbulk(
+            agent, *args, **kwargs)
+        df = agent.getTable(['.1.3.6.1.1', '.1.3.6.1.2', '.1.3.6.1.3'])
+        self.assertEqual(len(df.result['.1.3.6.1.3']), 30)
+        self.assertEqual(len(agent.requests), 4)
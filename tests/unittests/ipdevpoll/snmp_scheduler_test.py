@@ -0,0 +1,147 @@
+from unittest import TestCase
+
+from mock import Mock, patch
+from twisted.internet import defer
+
+from nav.ipdevpoll.snmp.scheduler import RequestScheduler
+from nav.ipdevpoll.snmp.sessions import SessionPool
+
+
+class RequestSchedulerTest(TestCase):
+    def setUp(self):
+        self.requests = []
+
+    def request(self, name):
+        deferred = defer.Deferred()
+        self.requests.append((name, deferred))
+        return deferred
+
+    def sent(self):
+        return [name for name, _ in self.requests]
+
+    def test_should_send_requests_within_limits_immediately(self):
+        scheduler = RequestScheduler(max_requests=10,
+                                     max_requests_per_device=2)
+        scheduler.schedule('a', self.request, 'a1')
+        scheduler.schedule('b', self.request, 'b1')
+        self.assertEqual(self.sent(), ['a1', 'b1'])
+        self.assertEqual(scheduler.in_flight, 2)
+        self.assertEqual(scheduler.queued, 0)
+
+    def test_should_queue_requests_over_device_limit(self):
+        scheduler = RequestScheduler(max_requests=10,
+                                     max_requests_per_device=1)
+        scheduler.schedule('a', self.request, 'a1')
+        scheduler.schedule('a', self.request, 'a2')
+        scheduler.schedule('b', self.request, 'b1')
+        self.assertEqual(self.sent(), ['a1', 'b1'])
+        self.assertEqual(scheduler.queued, 1)
+
+        self.requests[0][1].callback('response')
+        self.assertEqual(self.sent(), ['a1', 'b1', 'a2'])
+        self.assertEqual(scheduler.queued, 0)
+
+    def test_should_queue_requests_over_global_limit(self):
+        scheduler = RequestScheduler(max_requests=1,
+                                     max_requests_per_device=0)
+        scheduler.schedule('a', self.request, 'a1')
+        scheduler.schedule('b', self.request, 'b1')
+        self.assertEqual(self.sent(), ['a1'])
+
+        self.requests[0][1].errback(Exception('timeout'))
+        self.assertEqual(self.sent(), ['a1', 'b1'])
+
+    def test_should_pass_on_results_and_failures(self):
+        scheduler = RequestScheduler()
+        results = []
+        scheduler.schedule('a', self.request, 'a1').addCallback(
+            results.append)
+        scheduler.schedule('a', self.request, 'a2').addErrback(
+            lambda failure: results.append(failure.value.args[0]))
+        self.requests[0][1].callback('response')
+        self.requests[1][1].errback(Exception('timeout'))
+        self.assertEqual(results, ['response', 'timeout'])
+
+    def test_should_survive_immediate_failures(self):
+        scheduler = RequestScheduler(max_requests=1)
+
+        def fail():
+            raise Exception('closed')
+
+        failures = []
+        for _ in range(3):
+            scheduler.schedule('a', fail).addErrback(failures.append)
+        self.assertEqual(len(failures), 3)
+        self.assertEqual(scheduler.in_flight, 0)
+
+    def test_should_collect_and_reset_stats(self):
+        scheduler = RequestScheduler()
+        scheduler.schedule('a', self.request, 'a1')
+        scheduler.schedule('a', self.request, 'a2')
+        self.requests[0][1].callback('response')
+        self.requests[1][1].errback(Exception('timeout'))
+        self.requests[1][1].addErrback(lambda failure: None)
+
+        stats = scheduler.collect_stats()
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['failures'], 1)
+        self.assertEqual(scheduler.collect_stats()['requests'], 0)
+
+
+@patch('nav.ipdevpoll.snmp.sessions.reactor')
+@patch('nav.ipdevpoll.snmp.sessions.snmpprotocol')
+@patch('nav.ipdevpoll.snmp.sessions.AgentProxy')
+class SessionPoolTest(TestCase):
+    def test_should_share_sessions_for_same_credentials(self, agentproxy,
+                                                       _protocol, _reactor):
+        agentproxy.side_effect = lambda *args, **kwargs: Mock()
+        pool = SessionPool()
+        first = pool.acquire('10.0.0.1', 'public', 2, Mock())
+        second = pool.acquire('10.0.0.1', 'public', 2, Mock())
+        other = pool.acquire('10.0.0.1', 'secret', 2, Mock())
+        self.assertIs(first.pooled_agent, second.pooled_agent)
+        self.assertIsNot(first.pooled_agent, other.pooled_agent)
+        self.assertEqual(len(pool), 2)
+
+    def test_should_close_session_after_idle_timeout(self, agentproxy,
+                                                     _protocol, reactor):
+        agentproxy.side_effect = lambda *args, **kwargs: Mock()
+        pool = SessionPool(idle_timeout=30)
+        agent = pool.acquire('10.0.0.1', 'public', 2, Mock())
+        pool.release(agent)
+        self.assertFalse(agent.close.called)
+
+        delay, close, key = reactor.callLater.call_args[0]
+        self.assertEqual(delay, 30)
+        close(key)
+        self.assertTrue(agent.close.called)
+        self.assertEqual(len(pool), 0)
+
+    def test_should_keep_session_in_use(self, agentproxy, _protocol,
+                                        reactor):
+        agentproxy.side_effect = lambda *args, **kwargs: Mock()
+        pool = SessionPool(idle_timeout=30)
+        agent = pool.acquire('10.0.0.1', 'public', 2, Mock())
+        pool.acquire('10.0.0.1', 'public', 2, Mock())
+        pool.release(agent)
+        self.assertFalse(reactor.callLater.called)
+
+    def test_overlapping_jobs_should_not_share_cached_tables(self, agentproxy,
+                                                             _protocol,
+                                                             _reactor):
+        agent = agentproxy.return_value
+        agent.getTable.side_effect = [defer.succeed('old table'),
+                                      defer.succeed('new table')]
+        pool = SessionPool()
+        first_job = pool.acquire('10.0.0.1', 'public', 2, Mock())
+        first_result = []
+        first_job.getTable(['1.2.3']).addCallback(first_result.append)
+
+        second_job = pool.acquire('10.0.0.1', 'public', 2, Mock())
+        second_result = []
+        second_job.getTable(['1.2.3']).addCallback(second_result.append)
+        self.assertEqual(second_result, ['new table'])
+
+        first_job.getTable(['1.2.3']).addCallback(first_result.append)
+        self.assertEqual(first_result, ['old table', 'old table'])
+        self.assertEqual(agent.getTable.call_count, 2)
@@ -1,3 +1,6 @@
+from mock import patch
+
+from nav.models import manage
 from nav.ipdevpoll.storage import get_shadow_sort_order
 from nav.ipdevpoll import shadows
 
@@ -8,3 +11,37 @@ from nav.ipdevpoll import shadows
 def test_netboxinfo_should_always_sort_last():
     classes = get_shadow_sort_order()
     assert classes[-1] is shadows.NetboxInfo
+
+
+class TestResolveExistingModels(object):
+    def test_should_resolve_shadows_from_single_query(self):
+        found = manage.Device(id=42, serial='1234')
+        known = shadows.Device(serial='1234')
+        unknown = shadows.Device(serial='5678')
+        with patch.object(manage.Device, 'objects') as objects:
+            objects.filter.return_value = [found]
+            resolved = shadows.Device.resolve_existing_models([known,
+                                                              unknown])
+            assert objects.filter.call_count == 1
+
+        assert resolved == 1
+        assert known.id == 42
+        assert known.get_existing_model() is found
+        assert unknown.id is None
+
+    def test_should_not_resolve_ambiguous_lookups(self):
+        duplicates = [manage.Device(id=1, serial='1234'),
+                      manage.Device(id=2, serial='1234')]
+        shadow = shadows.Device(serial='1234')
+        with patch.object(manage.Device, 'objects') as objects:
+            objects.filter.return_value = duplicates
+            resolved = shadows.Device.resolve_existing_models([shadow])
+
+        assert resolved == 0
+        assert shadow.id is None
+
+    def test_should_leave_custom_lookup_classes_alone(self):
+        vlan = shadows.Vlan(vlan=10, net_ident='foo')
+        with patch.object(manage.Vlan, 'objects') as objects:
+            assert shadows.Vlan.resolve_existing_models([vlan]) == 0
+            assert not objects.filter.called
@@ -0,0 +1,62 @@
+import pickle
+import struct
+from unittest import TestCase
+
+from mock import Mock
+
+from nav.metrics import carbon
+from nav.metrics.emitter import MetricEmitter
+
+METRICS = [('nav.a.b', (1500000000, 1)), ('nav.a.c', (1500000000, 2.5))]
+
+
+class CarbonEncodingTests(TestCase):
+    def test_stream_should_contain_all_lines(self):
+        payload = b"".join(carbon.metrics_to_stream(METRICS))
+        self.assertEqual(payload,
+                         b"nav.a.b 1 1500000000\nnav.a.c 2.5 1500000000\n")
+
+    def test_empty_stream_should_yield_nothing(self):
+        self.assertEqual(list(carbon.metrics_to_stream([])), [])
+
+    def test_pickles_should_be_length_prefixed(self):
+        message = list(carbon.metrics_to_pickles(METRICS))[0]
+        length, = struct.unpack("!L", message[:4])
+        self.assertEqual(length, len(message) - 4)
+        self.assertEqual(pickle.loads(message[4:]), METRICS)
+
+    def test_pickles_should_be_batched(self):
+        messages = list(carbon.metrics_to_pickles(METRICS, batch_size=1))
+        self.assertEqual(len(messages), 2)
+
+    def test_unknown_protocol_should_raise(self):
+        with self.assertRaises(ValueError):
+            carbon.make_transport('carrier-pigeon', 'localhost', 2003)
+
+
+class MetricEmitterTests(TestCase):
+    def setUp(self):
+        self.emitter = MetricEmitter('127.0.0.1', 2003, queue_size=3,
+                                     batch_size=2)
+        self.emitter.transport = Mock()
+
+    def test_should_drop_metrics_when_queue_is_full(self):
+        self.emitter.emit(METRICS * 2)
+        self.assertEqual(self.emitter.dropped, 1)
+
+    def test_flush_should_send_in_batches(self):
+        self.emitter.emit(METRICS + METRICS[:1])
+        self.emitter.flush()
+        self.assertEqual(self.emitter.transport.send.call_count, 2)
+        self.assertEqual(self.emitter.sent, 3)
+
+
+class MetricBatchTests(TestCase):
+    def test_to_tuples_should_share_timestamp(self):
+        batch = carbon.MetricBatch(1500000000)
+        batch.add('nav.a.b', 1)
+        batch.extend(['nav.a.c'], [2.5])
+        self.assertEqual(batch.to_tuples(), METRICS)
+
+    def test_empty_batch_should_be_false(self):
+        self.assertFalse(carbon.MetricBatch())
@@ -0,0 +1,133 @@
+from fnmatch import fnmatchcase
+import threading
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from nav.metrics import names
+from nav.metrics.index import MetricIndex
+
+METRICS = [
+    'nav.devices.sw1.cpu.cpu1.loadavg1min',
+    'nav.devices.sw1.ports.gi1_1.ifInOctets',
+    'nav.devices.sw1.ports.gi1_1.ifOutOctets',
+    'nav.devices.sw1.ports.gi1_2.ifInOctets',
+    'nav.devices.sw1.sensors.temp1',
+    'nav.devices.sw2.ports.gi1_1.ifInOctets',
+]
+
+
+def fake_find(pattern):
+    """Works like Graphite's /metrics/find on the METRICS list"""
+    depth = len(pattern.split('.'))
+    nodes = {}
+    for metric in METRICS:
+        elements = metric.split('.')
+        path = '.'.join(elements[:depth])
+        if len(elements) >= depth and fnmatchcase(path, pattern):
+            nodes[path] = len(elements) == depth
+    return [{'id': path, 'leaf': leaf} for path, leaf in nodes.items()]
+
+
+class MetricIndexTests(TestCase):
+    def setUp(self):
+        self.query = Mock(side_effect=fake_find)
+        self.index = MetricIndex(self.query)
+
+    def test_should_find_leaves_below_port(self):
+        self.assertEqual(
+            self.index.get_leaves_below('nav.devices.sw1.ports.gi1_1'),
+            ['nav.devices.sw1.ports.gi1_1.ifInOctets',
+             'nav.devices.sw1.ports.gi1_1.ifOutOctets'])
+
+    def test_should_load_device_with_one_query_per_level(self):
+        self.index.get_leaves_below('nav.devices.sw1.ports.gi1_1')
+        self.index.get_leaves_below('nav.devices.sw1.ports.gi1_2')
+        self.index.get_leaves_below('nav.devices.sw1')
+        self.assertEqual(self.query.call_count, 3)
+
+    def test_should_leave_out_ignored_subtrees(self):
+        leaves = self.index.get_leaves_below(
+            'nav.devices.sw1', ['nav.devices.sw1.ports',
+                                'nav.devices.sw1.sensors'])
+        self.assertEqual(leaves, ['nav.devices.sw1.cpu.cpu1.loadavg1min'])
+
+    def test_should_return_none_for_unknown_path(self):
+        self.assertIsNone(
+            self.index.get_leaves_below('nav.devices.sw1.ports.gi9_9'))
+
+    def test_should_reload_expired_subtree(self):
+        self.index.ttl = 0
+        self.index.get_leaves_below('nav.devices.sw2')
+        self.index.get_leaves_below('nav.devices.sw2')
+        self.assertEqual(self.query.call_count, 6)
+
+    def test_should_sweep_expired_subtrees_on_lookup(self):
+        with patch('nav.metrics.index.time.time', return_value=1000):
+            self.index.get_leaves_below('nav.devices.sw1')
+            self.index.get_leaves_below('nav.devices.sw2')
+        with patch('nav.metrics.index.time.time',
+                   return_value=1000 + self.index.ttl):
+            self.index.get_leaves_below('nav.devices.sw1')
+        self.assertIsNone(self.index._get_node('nav.devices.sw2'))
+        self.assertEqual(list(self.index._expiry), ['nav.devices.sw1'])
+
+    def test_should_not_hold_lock_while_querying_graphite(self):
+        acquired = []
+
+        def _try_lock():
+            if self.index._lock.acquire(False):
+                acquired.append(True)
+                self.index._lock.release()
+            else:
+                acquired.append(False)
+
+        def _find(pattern):
+            thread = threading.Thread(target=_try_lock)
+            thread.start()
+            thread.join()
+            return fake_find(pattern)
+        self.query.side_effect = _find
+        self.index.get_leaves_below('nav.devices.sw2')
+        self.assertEqual(acquired, [True] * self.query.call_count)
+
+    def test_should_find_wildcards(self):
+        self.assertEqual(
+            self.index.find('nav.devices.sw1.ports.*.{ifInOctets,ifFoo}'),
+            ['nav.devices.sw1.ports.gi1_1.ifInOctets',
+             'nav.devices.sw1.ports.gi1_2.ifInOctets'])
+
+    def test_should_refuse_wildcard_roots(self):
+        self.assertRaises(ValueError, self.index.find, 'nav.devices.*.ports')
+
+    def test_is_leaf(self):
+        self.assertTrue(self.index.is_leaf('nav.devices.sw1.sensors.temp1'))
+        self.assertFalse(self.index.is_leaf('nav.devices.sw1.sensors'))
+
+
+class GetAllLeavesBelowTests(TestCase):
+    def setUp(self):
+        self.query = Mock(side_effect=fake_find)
+        patcher = patch.object(names, '_metric_index', MetricIndex(self.query))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_should_answer_from_index(self):
+        with patch.object(names, 'nodewalk') as nodewalk:
+            leaves = names.get_all_leaves_below('nav.devices.sw2.ports.gi1_1')
+        self.assertEqual(leaves, ['nav.devices.sw2.ports.gi1_1.ifInOctets'])
+        self.assertFalse(nodewalk.called)
+
+    def test_should_ask_graphite_on_miss_and_remember_it(self):
+        walk = [('nav.devices.sw2.ports.new', [],
+                 ['nav.devices.sw2.ports.new.ifInOctets'])]
+        with patch.object(names, 'nodewalk', return_value=walk) as nodewalk:
+            names.get_all_leaves_below('nav.devices.sw2.ports.new')
+            leaves = names.get_all_leaves_below('nav.devices.sw2.ports.new')
+        self.assertEqual(leaves, ['nav.devices.sw2.ports.new.ifInOctets'])
+        self.assertEqual(nodewalk.call_count, 1)
+
+    def test_should_walk_shallow_paths_through_graphite(self):
+        with patch.object(names, 'nodewalk', return_value=[]) as nodewalk:
+            names.get_all_leaves_below('nav.devices')
+        self.assertTrue(nodewalk.called)
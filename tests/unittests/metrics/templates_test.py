@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+from mock import Mock
+
+from nav.metrics import templates
+
+
+class MetricPathCacheTests(TestCase):
+    def setUp(self):
+        self.cache = templates.MetricPathCache()
+
+    def test_should_build_same_path_as_template(self):
+        self.assertEqual(
+            self.cache.get(templates.metric_path_for_interface,
+                           'sw.example.org', 'Gi1/0/1', 'ifInOctets'),
+            templates.metric_path_for_interface(
+                'sw.example.org', 'Gi1/0/1', 'ifInOctets'))
+
+    def test_should_only_build_path_once(self):
+        template = Mock(return_value='nav.a.b')
+        self.cache.get(template, 'a', 'b')
+        self.cache.sweep()
+        self.cache.get(template, 'a', 'b')
+        self.assertEqual(template.call_count, 1)
+
+    def test_sweep_should_remove_unused_paths(self):
+        template = Mock(return_value='nav.a.b')
+        self.cache.get(template, 'old-name')
+        self.cache.sweep()
+        self.cache.get(template, 'new-name')
+        self.cache.sweep()
+        self.assertEqual(len(self.cache), 1)
+
+    def test_should_keep_caches_per_netbox_and_scope(self):
+        cache = templates.get_metric_path_cache('a', 'statports')
+        self.assertTrue(
+            cache is templates.get_metric_path_cache('a', 'statports'))
+        self.assertFalse(
+            cache is templates.get_metric_path_cache('b', 'statports'))
+        self.assertFalse(
+            cache is templates.get_metric_path_cache('a', 'statsystem'))
@@ -1,7 +1,10 @@
 import pytest
+from mock import patch
 
 from nav.metrics.graphs import (extract_series_name,
                                 translate_serieslist_to_regex)
+from nav.metrics.thresholds import (ThresholdEvaluator, InvalidExpressionError,
+                                    parse_expression)
 
 series_name_data = (
     ('scaleToSeconds(nonNegativeDerivative(scale(nav.devices.example-sw_example_org.ports.Po3.ifOutOctets,8)),1)',
@@ -39,3 +42,40 @@ def test_translate_serieslist_to_regex(series, matches, nonmatches):
 
     for string in nonmatches:
         assert not pattern.match(string), "%s matches %s" % (string, series)
+
+
+def test_parse_expression_should_parse_percent():
+    compare, value, percent = parse_expression('>20%')
+    assert compare(21, value)
+    assert value == 20.0
+    assert percent
+
+
+def test_parse_expression_should_raise_on_garbage():
+    with pytest.raises(InvalidExpressionError):
+        parse_expression('>=foo')
+
+
+class TestEvaluate(object):
+    def setup_method(self, method):
+        self.evaluator = ThresholdEvaluator('foo.*', raw=True)
+        self.evaluator.result = {
+            'foo.bar': dict(value=50.0),
+            'foo.baz': dict(value=90.0),
+            'foo.zero': dict(value=0),
+        }
+
+    def test_absolute_expression(self):
+        assert self.evaluator.evaluate('>60') == [('foo.baz', 90.0)]
+
+    def test_inverted_expression_should_include_unknown_values(self):
+        result = sorted(self.evaluator.evaluate('>60', invert=True))
+        assert result == [('foo.bar', 50.0), ('foo.zero', 0)]
+
+    def test_percent_expression_should_resolve_maxima_once(self):
+        maxima = {'foo.bar': 100.0, 'foo.baz': 1000.0, 'foo.zero': None}
+        with patch('nav.metrics.thresholds.get_metric_maxima',
+                   return_value=maxima) as getter:
+            assert self.evaluator.evaluate('>40%') == [('foo.bar', 50.0)]
+            assert self.evaluator.evaluate('<40%') == [('foo.baz', 90.0)]
+            assert getter.call_count == 1
@@ -0,0 +1,114 @@
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from nav.snmptrapd import cache
+from nav.snmptrapd.dispatcher import TrapDispatcher, EventBatcher
+
+
+class TTLCacheTest(TestCase):
+    def test_should_only_load_once_within_ttl(self):
+        ttlcache = cache.TTLCache(ttl=60)
+        loader = Mock(return_value='value')
+        self.assertEqual(ttlcache.get('key', loader, 'arg'), 'value')
+        self.assertEqual(ttlcache.get('key', loader, 'arg'), 'value')
+        loader.assert_called_once_with('arg')
+        self.assertEqual((ttlcache.hits, ttlcache.misses), (1, 1))
+
+    @patch('nav.snmptrapd.cache.time')
+    def test_should_reload_after_ttl(self, time):
+        ttlcache = cache.TTLCache(ttl=60)
+        loader = Mock(return_value='value')
+        time.time.return_value = 1000
+        ttlcache.get('key', loader)
+        time.time.return_value = 1061
+        ttlcache.get('key', loader)
+        self.assertEqual(loader.call_count, 2)
+
+    @patch('nav.snmptrapd.cache.time')
+    def test_should_expire_negative_results_sooner(self, time):
+        ttlcache = cache.TTLCache(ttl=300, negative_ttl=60)
+        loader = Mock(return_value=None)
+        time.time.return_value = 1000
+        ttlcache.get('key', loader)
+        time.time.return_value = 1061
+        ttlcache.get('key', loader)
+        self.assertEqual(loader.call_count, 2)
+
+    def test_should_not_cache_failures(self):
+        ttlcache = cache.TTLCache()
+        loader = Mock(side_effect=[Exception('db down'), 'value'])
+        self.assertRaises(Exception, ttlcache.get, 'key', loader)
+        self.assertEqual(ttlcache.get('key', loader), 'value')
+
+    def test_invalidate_agent_should_remove_its_interfaces(self):
+        cache.netboxes.invalidate()
+        cache.interfaces.invalidate()
+        netbox = cache.NetboxInfo(1, 'sw1', 'room')
+        cache.netboxes.get('10.0.0.1', lambda: netbox)
+        cache.interfaces.get((1, '10'), lambda: 'gi1/0/10')
+        cache.interfaces.get((2, '10'), lambda: 'gi1/0/10')
+
+        cache.invalidate_agent('10.0.0.1')
+        self.assertEqual(len(cache.netboxes), 0)
+        self.assertEqual(len(cache.interfaces), 1)
+
+
+@patch('nav.snmptrapd.dispatcher.nav.db.getConnection')
+class TrapDispatcherTest(TestCase):
+    def test_should_drop_traps_when_queue_is_full(self, _getconnection):
+        dispatcher = TrapDispatcher([], Mock(), workers=1, queue_size=2)
+        for _ in range(3):
+            dispatcher.dispatch(Mock(agent='10.0.0.1'))
+        stats = dispatcher.collect_stats()
+        self.assertEqual(stats['received'], 3)
+        self.assertEqual(stats['dropped'], 1)
+        self.assertEqual(stats['queued'], 2)
+
+    def test_should_queue_traps_from_same_agent_for_same_worker(
+            self, _getconnection):
+        dispatcher = TrapDispatcher([], Mock(), workers=4)
+        agents = ['10.0.0.%d' % host for host in range(1, 21)]
+        for agent in agents + agents:
+            dispatcher.dispatch(Mock(agent=agent))
+
+        for agent in agents:
+            queued = [trap.agent for trap in dispatcher.get_queue(agent).queue]
+            self.assertEqual(queued.count(agent), 2)
+        self.assertEqual(
+            sum(queue.qsize() for queue in dispatcher.queues), 40)
+
+    def test_should_give_trap_to_all_handlers(self, _getconnection):
+        handlers = [Mock(__name__='one'), Mock(__name__='two')]
+        handlers[0].handleTrap.side_effect = Exception('boom')
+        dispatcher = TrapDispatcher(handlers, Mock())
+        trap = Mock(genericType='LINKDOWN')
+        dispatcher.handle(trap)
+        for handler in handlers:
+            self.assertTrue(handler.handleTrap.called)
+
+    @patch('nav.snmptrapd.dispatcher.cache')
+    def test_restart_trap_should_invalidate_agent(self, cache_,
+                                                  _getconnection):
+        dispatcher = TrapDispatcher([], Mock())
+        dispatcher.handle(Mock(genericType='COLDSTART', agent='10.0.0.1'))
+        cache_.invalidate_agent.assert_called_with('10.0.0.1')
+
+
+@patch('nav.snmptrapd.dispatcher.EventQ')
+class EventBatcherTest(TestCase):
+    def test_flush_should_post_queued_events_in_batches(self, eventq):
+        batcher = EventBatcher(batch_size=2)
+        for event in range(5):
+            batcher.post(event)
+        batcher.flush()
+        batches = [call[0][0] for call in eventq.post_events.call_args_list]
+        self.assertEqual(batches, [[0, 1], [2, 3], [4]])
+        self.assertEqual(batcher.collect_stats()['posted'], 5)
+
+    def test_failed_batch_should_be_counted(self, eventq):
+        eventq.post_events.side_effect = Exception('db down')
+        batcher = EventBatcher()
+        batcher.post(Mock())
+        batcher.flush()
+        self.assertEqual(batcher.collect_stats()['failed'], 1)
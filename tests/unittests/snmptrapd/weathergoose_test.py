@@ -6,8 +6,7 @@ from nav.snmptrapd.handlers import weathergoose as wg
 
 class WeatherGooseMockedDb(TestCase):
     def setUp(self):
-        self.getConnection = patch('nav.snmptrapd.handlers.weathergoose'
-                                   '.getConnection')
+        self.getConnection = patch('nav.snmptrapd.cache.getConnection')
         self.getConnection.start()
 
     def tearDown(self):
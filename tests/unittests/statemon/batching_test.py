@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from nav.statemon import statistics
+from nav.statemon.db import _DB
+from nav.statemon.event import Event
+
+
+class UpdateNetboxesTest(TestCase):
+    @patch('nav.metrics.carbon.send_metrics')
+    def test_should_send_all_updates_at_once(self, send_metrics):
+        statistics.update_netboxes([('a', Event.UP, 0.1),
+                                    ('b', Event.DOWN, 5)], timestamp=1000)
+        self.assertEqual(send_metrics.call_count, 1)
+        metrics = dict(send_metrics.call_args[0][0])
+        self.assertEqual(metrics['nav.devices.a.ping.packetLoss'], (1000, 0))
+        self.assertEqual(metrics['nav.devices.b.ping.packetLoss'], (1000, 1))
+        self.assertEqual(metrics['nav.devices.a.ping.roundTripTime'],
+                         (1000, 0.1))
+
+    @patch('nav.metrics.carbon.send_metrics')
+    def test_should_keep_paths_of_pinged_netboxes_only(self, _send_metrics):
+        with patch.object(statistics, '_pping_paths',
+                          statistics.MetricPathCache()) as paths:
+            statistics.update_netboxes([('a', Event.UP, 0.1),
+                                        ('b', Event.UP, 0.1)])
+            self.assertEqual(len(paths), 4)
+            statistics.update_netboxes([('a', Event.UP, 0.1)])
+            statistics.update_netboxes([('a', Event.UP, 0.1)])
+            self.assertEqual(len(paths), 2)
+
+
+class CommitEventsTest(TestCase):
+    def setUp(self):
+        self.database = _DB()
+        self.database.db = Mock()
+        self.cursor = Mock()
+        self.cursor.fetchall.return_value = [(1,), (2,)]
+        self.database.cursor = Mock(return_value=self.cursor)
+
+    def _events(self):
+        return [Event(None, netboxid, None, Event.boxState, 'pping',
+                      Event.DOWN) for netboxid in (10, 20)]
+
+    def test_should_insert_events_in_one_transaction(self):
+        self.database.commit_events(self._events())
+        statements = [call[0][0] for call in self.cursor.execute.call_args_list]
+        self.assertEqual(len(statements), 3)
+        self.assertTrue('generate_series' in statements[0])
+        self.assertTrue(statements[1].startswith('INSERT INTO eventq '))
+        self.assertTrue(statements[2].startswith('INSERT INTO eventqvar '))
+        self.assertEqual(self.database.db.commit.call_count, 1)
+
+    def test_should_queue_event_lists_as_one_item(self):
+        self.database.new_events(self._events())
+        self.assertEqual(len(self.database.queue.get_nowait()), 2)
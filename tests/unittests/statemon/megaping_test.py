@@ -0,0 +1,111 @@
+import errno
+import socket
+import time
+from unittest import TestCase
+
+from mock import patch
+
+from nav.statemon.megaping import MegaPing, TokenBucket
+from nav.statemon.icmppacket import PacketV4
+
+CONFIG = {'rate': '1000', 'burst': '10', 'timeout': '0.05'}
+
+
+class FakeSocket(object):
+    """A fake raw ICMP socket that answers requests to some hosts"""
+    def __init__(self, answering=()):
+        self.answering = set(answering)
+        self.sent = []
+        self.inbox = []
+
+    def setblocking(self, flag):
+        pass
+
+    def sendto(self, packet, address):
+        self.sent.append(address[0])
+        if address[0] in self.answering:
+            self.inbox.append((echo_reply(packet), address))
+
+    def recvfrom(self, _size):
+        if not self.inbox:
+            raise socket.error(errno.EAGAIN, "no data")
+        return self.inbox.pop(0)
+
+
+def echo_reply(request):
+    ip_header = b'\0' * 20
+    packet = PacketV4(ip_header + request)
+    packet.type = PacketV4.ICMP_ECHO_REPLY
+    return ip_header + packet.assemble()
+
+
+def fake_select(readers, _writers, _errors, timeout):
+    readable = [sock for sock in readers if sock.inbox]
+    if not readable:
+        time.sleep(timeout)
+    return readable, [], []
+
+
+@patch('nav.statemon.megaping.select.select', fake_select)
+class MegaPingTest(TestCase):
+    def setUp(self):
+        self.sock4 = FakeSocket(answering=['10.0.0.1'])
+        self.sock6 = FakeSocket()
+
+    def _ping(self, hosts, **config):
+        config = dict(CONFIG, **config)
+        pinger = MegaPing([self.sock6, self.sock4], conf=config)
+        pinger.set_hosts(hosts)
+        pinger.ping()
+        return pinger
+
+    def test_should_find_answering_host(self):
+        pinger = self._ping(['10.0.0.1', '10.0.0.2'])
+        results = dict(pinger.results())
+        self.assertTrue(results['10.0.0.1'] >= 0)
+        self.assertEqual(results['10.0.0.2'], -1)
+
+    def test_should_send_several_requests_per_host(self):
+        pinger = self._ping(['10.0.0.1', '10.0.0.2'], pingspercheck='3')
+        self.assertEqual(len(self.sock4.sent), 6)
+        samples = dict(pinger.samples())
+        self.assertEqual(len(samples['10.0.0.1']), 3)
+        self.assertTrue(all(rtt >= 0 for rtt in samples['10.0.0.1']))
+        self.assertEqual(samples['10.0.0.2'], [-1, -1, -1])
+
+    def test_should_stop_sending_when_buffer_is_full(self):
+        pinger = MegaPing([self.sock6, self.sock4], conf=CONFIG)
+        pinger.set_hosts(['10.0.0.1'])
+        pinger.reset()
+        unsent = [(pinger._hosts['10.0.0.1'], 0)]
+        with patch.object(self.sock4, 'sendto',
+                          side_effect=socket.error(errno.ENOBUFS, "full")):
+            self.assertEqual(pinger._send_requests(unsent, 1), 0)
+        self.assertEqual(len(unsent), 1)
+
+    def test_should_give_each_request_in_a_burst_its_own_cookie(self):
+        pinger = MegaPing([self.sock6, self.sock4], conf=CONFIG)
+        pinger.set_hosts(['10.0.0.2'])
+        pinger.reset()
+        host = pinger._hosts['10.0.0.2']
+        unsent = [(host, 2), (host, 1), (host, 0)]
+        with patch('nav.statemon.megaping.time.time', return_value=1000.0):
+            self.assertEqual(pinger._send_requests(unsent, 3), 3)
+        numbers = sorted(number for _, number, _ in pinger._requests.values())
+        self.assertEqual(numbers, [0, 1, 2])
+
+
+class TokenBucketTest(TestCase):
+    def test_should_not_give_more_than_capacity(self):
+        bucket = TokenBucket(rate=100, capacity=10, now=0)
+        self.assertEqual(bucket.take(50, now=10), 10)
+
+    def test_should_refill_at_rate(self):
+        bucket = TokenBucket(rate=100, capacity=10, now=0)
+        bucket.take(10, now=0)
+        self.assertEqual(bucket.take(10, now=0.05), 5)
+
+    def test_should_tell_time_until_next_token(self):
+        bucket = TokenBucket(rate=100, capacity=10, now=0)
+        bucket.take(10, now=0)
+        self.assertAlmostEqual(bucket.time_until_available(now=0), 0.01)
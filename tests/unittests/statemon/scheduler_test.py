@@ -0,0 +1,101 @@
+import time
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from nav.statemon.scheduler import Scheduler
+
+
+def make_checker(blocking=False, timeout=5):
+    checker = Mock(BLOCKING=blocking, timeout=timeout, retry_at=None)
+    return checker
+
+
+class SchedulerTest(TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler(60, workers=2, blocking_workers=1)
+
+    @patch('nav.statemon.scheduler.time.time', return_value=1000.0)
+    def test_new_checkers_should_be_spread_over_the_interval(self, _time):
+        checkers = [make_checker() for _ in range(10)]
+        self.scheduler.set_checkers(checkers)
+        deadlines = [due for due, _, _ in self.scheduler._heap]
+        self.assertEqual(len(deadlines), 10)
+        self.assertTrue(all(1000 <= due <= 1060 for due in deadlines))
+
+    def test_known_checkers_should_not_be_rescheduled(self):
+        checker = make_checker()
+        self.scheduler.set_checkers([checker])
+        self.scheduler.set_checkers([checker])
+        self.assertEqual(len(self.scheduler._heap), 1)
+
+    def test_readded_checker_should_not_be_scheduled_twice(self):
+        checker = make_checker()
+        self.scheduler.set_checkers([checker])
+        self.scheduler.set_checkers([])
+        self.scheduler.set_checkers([checker])
+        self.assertEqual(len(self.scheduler._heap), 1)
+
+    def test_checker_readded_while_running_should_be_scheduled_once(self):
+        checker = make_checker()
+        self.scheduler.set_checkers([checker])
+        self.scheduler._heap[0] = (0, 0, checker)
+        self.assertEqual(self.scheduler._pop_due()[0], checker)
+
+        self.scheduler.set_checkers([])
+        self.scheduler.set_checkers([checker])
+        self.assertEqual(self.scheduler._heap, [])
+        self.scheduler._reschedule(checker, 1.0, 2.0)
+        self.assertEqual(len(self.scheduler._heap), 1)
+
+    def test_blocking_checker_should_run_in_blocking_pool(self):
+        checker = make_checker(blocking=True)
+        self.scheduler._submit(checker, 0)
+        self.assertEqual(self.scheduler.pools[True].queue.get_nowait(),
+                         checker)
+        self.assertTrue(self.scheduler.pools[False].queue.empty())
+
+    def test_finished_checker_should_be_due_one_interval_later(self):
+        checker = make_checker()
+        self.scheduler._checkers = {checker}
+        self.scheduler._due[checker] = 1000.0
+        self.scheduler._reschedule(checker, 1000.5, 1002.0)
+        self.assertEqual(self.scheduler._heap[0][0], 1060.0)
+
+    def test_checker_asking_for_retry_should_be_due_at_retry_time(self):
+        checker = make_checker()
+        checker.retry_at = 1007.0
+        self.scheduler._checkers = {checker}
+        self.scheduler._due[checker] = 1000.0
+        self.scheduler._reschedule(checker, 1000.5, 1002.0)
+        self.assertEqual(self.scheduler._heap[0][0], 1007.0)
+        self.assertIsNone(checker.retry_at)
+
+    def test_removed_checker_should_not_be_rescheduled(self):
+        checker = make_checker()
+        self.scheduler._due[checker] = 1000.0
+        self.scheduler._reschedule(checker, 1000.5, 1002.0)
+        self.assertEqual(self.scheduler._heap, [])
+
+    @patch('nav.statemon.scheduler.time.time', return_value=1010.0)
+    def test_lateness_should_be_counted(self, _time):
+        self.scheduler._submit(make_checker(), 1000.0)
+        self.scheduler._submit(make_checker(), 1010.0)
+        stats = self.scheduler.collect_stats()
+        self.assertEqual(stats['dispatched'], 2)
+        self.assertEqual(stats['late_runs'], 1)
+        self.assertEqual(stats['max_lateness'], 10.0)
+        self.assertEqual(stats['avg_lateness'], 5.0)
+        self.assertEqual(stats['queued'], 2)
+
+    def test_due_checkers_should_be_run(self):
+        checker = make_checker()
+        self.scheduler.start()
+        with patch('nav.statemon.scheduler.random.uniform', return_value=0):
+            self.scheduler.set_checkers([checker])
+        for _ in range(100):
+            if self.scheduler._heap and checker.run.called:
+                break
+            time.sleep(0.01)
+        checker.run.assert_called_once_with()
+        self.assertTrue(self.scheduler._heap[0][0] > 0)
@@ -1,8 +1,29 @@
-from mock import patch
-from nav.thresholdmon import _add_subject_details
+from mock import patch, Mock
+from nav.thresholdmon import _add_subject_details, fetch_values
 
 
 def test_non_model_subject_should_not_crash():
     varmap = {}
     with patch("nav.thresholdmon.lookup", return_value="bar"):
         _add_subject_details(None, 'foo', varmap)
+
+
+def test_fetch_values_should_share_identical_fetches():
+    def _make_evaluator(target, period):
+        evaluator = Mock(target=target, period=period, result={})
+        evaluator.get_values.side_effect = lambda: evaluator.result.update(
+            {target: dict(value=1)})
+        return evaluator
+
+    evaluators = {
+        1: _make_evaluator('nav.a.*', 600),
+        2: _make_evaluator('nav.a.*', 600),
+        3: _make_evaluator('nav.b.*', 600),
+    }
+    fetch_times = fetch_values(evaluators, workers=2)
+
+    fetches = sum(e.get_values.call_count for e in evaluators.values())
+    assert fetches == 2
+    assert evaluators[1].result is evaluators[2].result
+    assert 'nav.b.*' in evaluators[3].result
+    assert sorted(fetch_times) == [1, 2, 3]
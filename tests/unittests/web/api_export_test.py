@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from mock import Mock
+
+from nav.web.api.v1.helpers import export
+
+
+class FakeQueryset(object):
+    def __init__(self, pks, min_pk=None):
+        self.pks = pks
+        self.min_pk = min_pk
+        self.slices = []
+
+    def order_by(self, *_args):
+        return self
+
+    def filter(self, pk__gt):
+        return FakeQueryset(self.pks, pk__gt)
+
+    def __getitem__(self, key):
+        pks = [pk for pk in self.pks
+               if self.min_pk is None or pk > self.min_pk]
+        return [Mock(pk=pk) for pk in pks[key]]
+
+
+class IterateChunksTest(TestCase):
+    def test_should_return_all_objects_in_chunks(self):
+        queryset = FakeQueryset(list(range(1, 8)))
+        chunks = list(export.iterate_chunks(queryset, chunk_size=3))
+        self.assertEqual([[obj.pk for obj in chunk] for chunk in chunks],
+                         [[1, 2, 3], [4, 5, 6], [7]])
+
+    def test_should_stop_after_full_last_chunk(self):
+        queryset = FakeQueryset(list(range(1, 7)))
+        chunks = list(export.iterate_chunks(queryset, chunk_size=3))
+        self.assertEqual(len(chunks), 2)
+
+    def test_should_return_nothing_for_empty_queryset(self):
+        self.assertEqual(list(export.iterate_chunks(FakeQueryset([]))), [])
+
+
+class CsvLinesTest(TestCase):
+    def test_should_start_with_header(self):
+        rows = [{'id': 1, 'mac': '00:11:22:33:44:55'}]
+        lines = list(export._csv_lines(rows, ['id', 'mac']))
+        self.assertEqual(lines, ['id,mac\r\n', '1,00:11:22:33:44:55\r\n'])
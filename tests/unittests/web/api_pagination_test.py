@@ -0,0 +1,28 @@
+from unittest import TestCase
+
+from mock import Mock, patch
+from rest_framework.exceptions import ValidationError
+
+from nav.web.api.v1 import NavCursorPagination
+
+GET_ORDERING = 'rest_framework.pagination.CursorPagination.get_ordering'
+
+
+class NavCursorPaginationOrderingTest(TestCase):
+    def get_ordering(self, requested):
+        with patch(GET_ORDERING, return_value=requested):
+            return NavCursorPagination().get_ordering(Mock(), Mock(), Mock())
+
+    def test_should_end_non_unique_ordering_with_id(self):
+        self.assertEqual(self.get_ordering(('mac',)), ('mac', 'id'))
+
+    def test_should_follow_direction_of_first_key(self):
+        self.assertEqual(self.get_ordering(['-mac']), ('-mac', '-id'))
+
+    def test_should_keep_ordering_that_ends_with_id(self):
+        self.assertEqual(self.get_ordering(('mac', '-id')), ('mac', '-id'))
+        self.assertEqual(self.get_ordering(('id',)), ('id',))
+
+    def test_should_reject_ordering_by_related_field(self):
+        with self.assertRaises(ValidationError):
+            self.get_ordering(('netbox__sysname',))
@@ -18,3 +18,43 @@ class PrefixTreeTest(unittest.TestCase):
         child = tree.children[0].children[0]
         self.assertEqual(child.prefix, "10.0.1.0/24")
         self.assertEqual(child.prefixlen, 24)
+
+    def test_prefix_tree_should_nest_regardless_of_order(self):
+        cidrs = ["10.0.1.0/24", "2001:db8::/48", "10.0.0.0/8", "10.0.0.0/16",
+                 "192.168.0.0/24", "2001:db8::/32"]
+        tree = make_tree_from_ip(cidrs)
+        self.assertEqual([child.prefix for child in tree.children],
+                         ["10.0.0.0/8", "192.168.0.0/24", "2001:db8::/32"])
+        ten = tree.children[0]
+        self.assertEqual([child.prefix for child in ten.children],
+                         ["10.0.0.0/16"])
+        self.assertEqual([child.prefix for child in ten.children[0].children],
+                         ["10.0.1.0/24"])
+        self.assertEqual(ten.children[0].parent, ten)
+
+    def test_add_many_should_merge_with_existing_nodes(self):
+        tree = make_tree_from_ip(["10.0.0.0/16", "10.0.0.0/24"])
+        tree.add_many(make_tree_from_ip(["10.0.0.0/8", "10.0.1.0/24"]).walk())
+        self.assertEqual(len(tree.children), 1)
+        self.assertEqual(
+            sorted(child.prefix for child in tree.children[0].walk()),
+            ["10.0.0.0/16", "10.0.0.0/24", "10.0.1.0/24"])
+
+    def test_subtree_should_find_nested_prefix(self):
+        tree = make_tree_from_ip(["10.0.0.0/8", "10.0.0.0/16", "10.1.0.0/16",
+                                  "10.1.2.0/24"])
+        node = tree.subtree("10.1.0.0/16")
+        self.assertEqual(node.prefix, "10.1.0.0/16")
+        self.assertEqual(node.children[0].prefix, "10.1.2.0/24")
+
+    def test_subtree_should_return_none_for_missing_prefix(self):
+        tree = make_tree_from_ip(["10.0.0.0/8", "10.0.0.0/16"])
+        self.assertIsNone(tree.subtree("10.2.0.0/16"))
+        self.assertIsNone(tree.subtree("192.168.0.0/16"))
+
+    def test_get_fields_should_stop_at_depth(self):
+        tree = make_tree_from_ip(["10.0.0.0/8", "10.0.0.0/16", "10.0.1.0/24"])
+        fields = tree.get_fields(depth=1)
+        top = fields["children"][0]
+        self.assertEqual(top["children"], [])
+        self.assertEqual(len(top["children_pks"]), 1)
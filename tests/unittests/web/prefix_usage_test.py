@@ -0,0 +1,38 @@
+from datetime import datetime
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from nav.web.api.v1.helpers import prefix_collector
+
+
+class CollectActiveIpsTest(TestCase):
+    def setUp(self):
+        self.cursor = Mock()
+        self.cursor.fetchall.return_value = [(1, 10), (3, 5)]
+        connection = patch.object(prefix_collector, 'connection')
+        connection.start().cursor.return_value = self.cursor
+        self.addCleanup(connection.stop)
+        self.prefixes = [Mock(pk=1), Mock(pk=2), Mock(pk=3)]
+
+    def test_should_count_all_prefixes_in_one_query(self):
+        counts = prefix_collector.collect_active_ips(self.prefixes)
+        self.assertEqual(self.cursor.execute.call_count, 1)
+        self.assertEqual(counts, {1: 10, 3: 5})
+        args = self.cursor.execute.call_args[0][1]
+        self.assertEqual(args, [[1, 2, 3]])
+
+    def test_should_count_active_addresses_at_starttime(self):
+        starttime = datetime(2018, 1, 1)
+        prefix_collector.collect_active_ips(self.prefixes, starttime)
+        query, args = self.cursor.execute.call_args[0]
+        self.assertIn("BETWEEN arp.start_time AND arp.end_time", query)
+        self.assertEqual(args, [starttime, [1, 2, 3]])
+
+    def test_should_not_query_for_no_prefixes(self):
+        self.assertEqual(prefix_collector.collect_active_ips([]), {})
+        self.assertFalse(self.cursor.execute.called)
+
+    def test_collect_active_ip_should_default_to_zero(self):
+        self.assertEqual(
+            prefix_collector.collect_active_ip(self.prefixes[1]), 0)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV)
+#
+# NAV is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# NAV is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NAV; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+"""Benchmarks ipdevpoll's CAM record storage against forwarding table size.
+
+For each forwarding table size, a synthetic table is stored for a netbox the
+way a topo job would, first into an empty cam table, and then again with a
+portion of the entries replaced, so that both inserts and closes are
+measured.  All changes are rolled back afterwards.
+
+"""
+
+from __future__ import print_function
+import argparse
+import random
+import time
+
+from django.db import transaction
+
+from nav.models.manage import Netbox
+from nav.ipdevpoll.storage import ContainerRepository
+from nav.ipdevpoll import shadows
+
+
+class Rollback(Exception):
+    """Raised to roll back the benchmark transaction"""
+    pass
+
+
+def main():
+    """Main script controller"""
+    args = create_parser().parse_args()
+    netbox = Netbox.objects.filter(sysname=args.netbox).first() if \
+        args.netbox else Netbox.objects.first()
+    if not netbox:
+        print("There is no netbox to store CAM records for")
+        exit(1)
+
+    print("Storing CAM records for %s" % netbox.sysname)
+    print("%10s %12s %12s" % ("fdb size", "initial (s)", "churn (s)"))
+    for size in args.sizes:
+        initial, churn = benchmark(netbox, size, args.churn)
+        print("%10d %12.03f %12.03f" % (size, initial, churn))
+
+
+def create_parser():
+    """Create a parser for the script arguments"""
+    parser = argparse.ArgumentParser(
+        description="Benchmarks ipdevpoll's CAM record storage")
+    parser.add_argument('sizes', type=int, nargs='*',
+                        default=[100, 1000, 10000, 50000],
+                        help='Forwarding table sizes to benchmark')
+    parser.add_argument('--netbox',
+                        help='The sysname of the netbox to use')
+    parser.add_argument('--churn', type=float, default=0.1,
+                        help='The fraction of entries replaced between runs')
+    return parser
+
+
+def benchmark(netbox, size, churn):
+    """Stores a forwarding table of size entries twice, replacing a fraction
+    of the entries in the second run.
+
+    :returns: A tuple of the elapsed seconds of each run.
+
+    """
+    entries = make_entries(size)
+    replaced = int(size * churn)
+    changed = entries[replaced:] + make_entries(replaced, offset=size)
+    timings = []
+    try:
+        with transaction.atomic():
+            timings.append(store(netbox, entries))
+            timings.append(store(netbox, changed))
+            raise Rollback()
+    except Rollback:
+        pass
+    return tuple(timings)
+
+
+def make_entries(count, offset=0):
+    """Makes a list of count unique (ifindex, mac) entries"""
+    entries = []
+    for index in range(offset, offset + count):
+        mac = ':'.join('%02x' % ((index >> shift) & 0xff)
+                       for shift in (40, 32, 24, 16, 8, 0))
+        entries.append((random.randint(1, 48), mac))
+    return entries
+
+
+def store(netbox, entries):
+    """Stores entries as the CAM records of netbox, the way a topo job
+    would.
+
+    :returns: The number of seconds elapsed.
+
+    """
+    containers = ContainerRepository()
+    box = containers.factory(None, shadows.Netbox)
+    box.id = netbox.id
+    box.sysname = netbox.sysname
+    for ifindex, mac in entries:
+        containers.factory((ifindex, mac), shadows.Cam, ifindex, mac)
+    shadows.Cam.manager.add_sentinel(containers)
+
+    start = time.time()
+    manager = shadows.Cam.manager(shadows.Cam, containers)
+    manager.prepare()
+    manager.save()
+    manager.cleanup()
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV)
+#
+# NAV is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# NAV is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NAV; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+"""Benchmarks eventengine throughput using a synthetic storm of events.
+
+A burst of stateful start events (followed by the matching end events) is
+posted to the event queue, and the time it takes for a running eventengine
+to drain the queue is measured.
+
+"""
+
+from __future__ import print_function
+import argparse
+import time
+
+from nav.models.event import EventQueue as Event, Subsystem, EventType
+from nav.models.manage import Netbox
+from django.db import transaction
+
+
+def main():
+    """Main script controller"""
+    args = create_parser().parse_args()
+    netboxes = list(Netbox.objects.all()[:args.netboxes])
+    if not netboxes:
+        print("There are no netboxes to generate events for")
+        exit(1)
+
+    for state in (Event.STATE_START, Event.STATE_END):
+        count = post_storm(netboxes, args.count, state)
+        elapsed = wait_for_empty_queue(args.timeout)
+        if elapsed is None:
+            print("Timed out waiting for eventengine to process %d events" %
+                  count)
+            exit(2)
+        print("%d %s events processed in %.02f seconds (%.01f events/s)" %
+              (count, state, elapsed, count / max(elapsed, 0.001)))
+
+
+def create_parser():
+    """Create a parser for the script arguments"""
+    parser = argparse.ArgumentParser(
+        description='Benchmarks eventengine using a synthetic event storm')
+    parser.add_argument('--count', type=int, default=1000,
+                        help='Number of events to post for each state')
+    parser.add_argument('--netboxes', type=int, default=100,
+                        help='Number of netboxes to spread events across')
+    parser.add_argument('--timeout', type=int, default=600,
+                        help='Seconds to wait for the queue to be drained')
+    return parser
+
+
+@transaction.atomic
+def post_storm(netboxes, count, state):
+    """Posts count generic stateful events to the eventengine, spread evenly
+    across netboxes.
+
+    """
+    source = Subsystem.objects.get(pk='ipdevpoll')
+    target = Subsystem.objects.get(pk='eventEngine')
+    event_type = EventType.objects.get(pk='apState')
+    for index in range(count):
+        netbox = netboxes[index % len(netboxes)]
+        event = Event(source=source, target=target, event_type=event_type,
+                      netbox=netbox, subid=str(index // len(netboxes)),
+                      state=state)
+        event.save()
+    return count
+
+
+def wait_for_empty_queue(timeout):
+    """Waits for the eventengine's queue to become empty.
+
+    :returns: The number of seconds elapsed, or None on timeout.
+
+    """
+    start = time.time()
+    while time.time() - start < timeout:
+        if not Event.objects.filter(target='eventEngine').exists():
+            return time.time() - start
+        time.sleep(0.1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 Uninett AS
+#
+# This file is part of Network Administration Visualized (NAV)
+#
+# NAV is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# NAV is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NAV; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+"""Benchmarks logengine's ingest throughput in lines per second.
+
+A synthetic Cisco syslog file is generated, and is parsed and inserted into
+the logger database the same way logengine does it.  Parsing is measured
+both on its own and together with the database inserts.  All database
+changes are rolled back afterwards.
+
+"""
+
+from __future__ import print_function
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from nav import db
+from nav import logengine
+
+LINE_TEMPLATE = ("Oct 28 13:15:{second:02d} 10.0.{net}.{host} {counter}: "
+                 "Oct 28 13:15:{second:02d}.310 CEST: %{msgtype}: {text}\n")
+
+MESSAGE_TYPES = [
+    ("LINEPROTO-5-UPDOWN", "Line protocol on Interface "
+                           "GigabitEthernet1/0/{port}, changed state to up"),
+    ("LINK-3-UPDOWN", "Interface GigabitEthernet1/0/{port}, "
+                      "changed state to down"),
+    ("EC-5-COMPATIBLE", "Gi1/0/{port} is compatible with port-channel "
+                        "members"),
+    ("SPANTREE-5-TOPOTRAP", "Topology Change Trap for vlan {port}"),
+]
+
+
+def main():
+    """Main script controller"""
+    args = create_parser().parse_args()
+    filename = generate_log_file(args.lines, args.origins)
+    try:
+        elapsed = benchmark_parse(filename)
+        report("parse only", args.lines, elapsed)
+        elapsed = benchmark_ingest(filename, args.batch_size)
+        report("parse and insert", args.lines, elapsed)
+    finally:
+        os.remove(filename)
+
+
+def create_parser():
+    """Create a parser for the script arguments"""
+    parser = argparse.ArgumentParser(
+        description="Benchmarks logengine's ingest throughput")
+    parser.add_argument('--lines', type=int, default=100000,
+                        help='Number of log lines to generate')
+    parser.add_argument('--origins', type=int, default=500,
+                        help='Number of distinct origins to generate lines '
+                             'from')
+    parser.add_argument('--batch-size', type=int,
+                        default=logengine.BATCH_SIZE,
+                        help='Number of messages to insert per statement')
+    return parser
+
+
+def report(description, lines, elapsed):
+    """Prints a line of benchmark results"""
+    print("%-20s %d lines in %.02f seconds (%.0f lines/s)" % (
+        description, lines, elapsed, lines / max(elapsed, 0.001)))
+
+
+def generate_log_file(lines, origins):
+    """Generates a temporary syslog file of synthetic Cisco log lines.
+
+    :returns: The name of the generated file.
+
+    """
+    handle, filename = tempfile.mkstemp(prefix='logengine-benchmark')
+    with os.fdopen(handle, 'w') as logfile:
+        for counter in range(lines):
+            origin = random.randint(0, origins - 1)
+            msgtype, text = random.choice(MESSAGE_TYPES)
+            logfile.write(LINE_TEMPLATE.format(
+                second=counter % 60, net=origin // 250, host=origin % 250,
+                counter=counter, msgtype=msgtype,
+                text=text.format(port=random.randint(1, 48))))
+    return filename
+
+
+def benchmark_parse(filename):
+    """Parses all lines of filename, returning the elapsed time"""
+    start = time.time()
+    for _message in logengine.parse_messages(
+            logengine.read_log_lines(filename), None):
+        pass
+    return time.time() - start
+
+
+def benchmark_ingest(filename, batch_size):
+    """Parses and inserts all lines of filename into the database, returning
+    the elapsed time.
+
+    """
+    connection = db.getConnection('logger', 'logger')
+    database = connection.cursor()
+    try:
+        start = time.time()
+        categories = logengine.get_categories(database)
+        origins = logengine.get_origins(database)
+        types = logengine.get_types(database)
+        messages = logengine.parse_messages(
+            logengine.read_log_lines(filename), database)
+        for batch in logengine.get_batches(messages, batch_size):
+            logengine.insert_messages(batch, database,
+                                      categories, origins, types, {}, {}, {})
+        return time.time() - start
+    finally:
+        connection.rollback()
+
+
+if __name__ == '__main__':
+    main()